@@ -0,0 +1,119 @@
+"""
+Throughput of the sharded mode with a growing number of shards
+
+Every shard count is started with redis_clone/launcher.py and loaded by client processes,
+each one sending pipelined GET/SET of keys owned by a single shard, the way a cluster aware
+client routes them. Clients need CPU too, so the machine needs about
+shards * (1 + clients per shard) cores for the scaling to show.
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_cluster.py [shard counts, default 1,2,4] [seconds per run, default 5]
+"""
+import multiprocessing
+import os
+import sys
+import time
+
+import redis
+
+from redis_clone.cluster import key_hash_slot
+from redis_clone.launcher import start_shards
+
+BASE_PORT = int(os.environ.get("BENCH_BASE_PORT", 17000))
+CLIENTS_PER_SHARD = int(os.environ.get("BENCH_CLIENTS_PER_SHARD", 2))
+PIPELINE = 64
+KEYS_PER_CLIENT = 1000
+
+
+def _wait_for_shards(shards):
+    deadline = time.time() + 10
+    for port in range(BASE_PORT, BASE_PORT + shards):
+        while True:
+            try:
+                redis.StrictRedis(host="127.0.0.1", port=port).ping()
+                break
+            except redis.ConnectionError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+
+
+def _owned_keys(slot_range, count):
+    """
+    Keys whose hash slot is in slot_range
+    """
+    start, end = slot_range
+    keys = []
+    i = 0
+    while len(keys) < count:
+        key = b"key:%d" % i
+        if start <= key_hash_slot(key) <= end:
+            keys.append(key)
+        i += 1
+    return keys
+
+
+def _client(port, slot_range, seconds, results):
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    keys = _owned_keys(slot_range, KEYS_PER_CLIENT)
+    operations = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pipe = client.pipeline(transaction=False)
+        for i in range(PIPELINE):
+            key = keys[(operations + i) % len(keys)]
+            if i % 2:
+                pipe.get(key)
+            else:
+                pipe.set(key, b"value")
+        pipe.execute()
+        operations += PIPELINE
+    results.put(operations)
+    client.close()
+
+
+def run(shards, seconds):
+    processes = start_shards(shards, host="127.0.0.1", base_port=BASE_PORT)
+    try:
+        _wait_for_shards(shards)
+        slot_ranges = [
+            (start, end)
+            for start, end, _ in redis.StrictRedis(host="127.0.0.1", port=BASE_PORT).execute_command("CLUSTER SLOTS")
+        ]
+
+        results = multiprocessing.Queue()
+        clients = [
+            multiprocessing.Process(
+                target=_client,
+                args=(BASE_PORT + shard_index, slot_ranges[shard_index], seconds, results),
+            )
+            for shard_index in range(shards)
+            for _ in range(CLIENTS_PER_SHARD)
+        ]
+        for client in clients:
+            client.start()
+        operations = sum(results.get() for _ in clients)
+        for client in clients:
+            client.join()
+        return operations / seconds
+    finally:
+        for process in processes:
+            process.terminate()
+            process.join()
+
+
+def main():
+    shard_counts = [int(count) for count in sys.argv[1].split(",")] if len(sys.argv) > 1 else [1, 2, 4]
+    seconds = float(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    print(f"cores: {os.cpu_count()}, clients per shard: {CLIENTS_PER_SHARD}, pipeline: {PIPELINE}")
+    baseline = None
+    for shards in shard_counts:
+        ops = run(shards, seconds)
+        baseline = baseline or ops
+        print(f"shards: {shards:3d}  ops/sec: {ops:12.0f}  scaling: {ops / baseline:5.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+"""
+Compares INCR with the GET + SET round trip a client does without it,
+and INCR on an int encoded counter with INCR on a counter stored as a string
+
+Commands are executed through RedisServer._process_command, so the numbers include
+dispatching and reply building but no network
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_counters.py
+"""
+import timeit
+
+from redis_clone.server import RedisServer
+
+NUMBER = 200000
+
+
+def main():
+    server = RedisServer(host="127.0.0.1", port=0)
+    process_command = server._process_command
+    keyspace = server.keyspace
+
+    def incr():
+        process_command("INCR", [b"counter"])
+
+    def get_set():
+        value = int(keyspace.lookup(b"string_counter") or 0)
+        process_command("GET", [b"string_counter"])
+        process_command("SET", [b"string_counter", b"%d" % (value + 1)])
+
+    def incr_string_encoded():
+        # Value reset to bytes before every increment, so INCR has to parse it
+        keyspace.data[b"string_encoded_counter"] = b"12345"
+        process_command("INCR", [b"string_encoded_counter"])
+
+    cases = {
+        "INCR": incr,
+        "GET + SET": get_set,
+        "INCR on string encoded value": incr_string_encoded,
+    }
+
+    print(f"{'command':<32}{'ops/sec':>12}{'ns/op':>10}")
+    for name, func in cases.items():
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=3))
+        print(f"{name:<32}{NUMBER / seconds:>12.0f}{seconds / NUMBER * 1e9:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
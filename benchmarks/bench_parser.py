@@ -0,0 +1,56 @@
+"""
+Microbenchmark of request parsing with the python Parser and the HiRedisParser
+
+Every case feeds a buffer of pipelined commands and reads all of them back, the way a
+connection parses one read
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_parser.py
+"""
+import timeit
+
+from redis_clone.aof import encode_command
+from redis_clone.parser.hi_redis_parser import HiRedisParser
+from redis_clone.parser.redis_parser import Parser
+
+NUMBER = 2000
+PIPELINE = 100
+
+
+def build_cases():
+    """
+    Case name -> (function, commands parsed by one call)
+    """
+    requests = {
+        "GET": bytes(encode_command("GET", [b"key:000000000001"])) * PIPELINE,
+        "SET 16 bytes": bytes(encode_command("SET", [b"key:000000000001", b"x" * 16])) * PIPELINE,
+        "SET 1 KB": bytes(encode_command("SET", [b"key:000000000001", b"x" * 1024])) * PIPELINE,
+        "MSET 10 keys": bytes(encode_command("MSET", [b"key:%d" % (i // 2) for i in range(20)])) * PIPELINE,
+    }
+    parser_classes = {"python": Parser, "hiredis": HiRedisParser}
+
+    cases = {}
+    for parser_name, parser_class in parser_classes.items():
+        parser = parser_class(protocol_version=2)
+        for request_name, data in requests.items():
+
+            def parse(parser=parser, data=data):
+                parser.feed(data)
+                for _ in parser:
+                    pass
+
+            cases[f"{parser_name} {request_name}"] = (parse, PIPELINE)
+    return cases
+
+
+def main():
+    print(f"{'parser and command':<32}{'commands/sec':>14}{'ns/command':>12}")
+    for name, (func, commands) in build_cases().items():
+        seconds = min(timeit.repeat(func, number=NUMBER, repeat=3))
+        total = NUMBER * commands
+        print(f"{name:<32}{total / seconds:>14.0f}{seconds / total * 1e9:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Snapshot save and load time compared with replaying the same keys as SET commands
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_rdb.py [number of keys, default 1000000]
+"""
+import os
+import sys
+import tempfile
+import time
+
+from redis_clone import rdb
+from redis_clone.keyspace import Keyspace, now_ms
+from redis_clone.parser.redis_parser import Parser
+from redis_clone.server import RedisServer
+
+
+def main():
+    keys = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    keyspace = Keyspace()
+    for i in range(keys):
+        keyspace.data[b"key:%d" % i] = b"value:%d" % i
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "dump.rdb")
+
+        start = time.perf_counter()
+        size = rdb.dump(keyspace, path)
+        save_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        rdb.load(Keyspace(), path, now_ms())
+        load_seconds = time.perf_counter() - start
+
+    commands = bytearray()
+    for key, value in keyspace.data.items():
+        commands += b"*3\r\n$3\r\nSET\r\n$%d\r\n%s\r\n$%d\r\n%s\r\n" % (len(key), key, len(value), value)
+
+    server = RedisServer(host="127.0.0.1", port=0)
+    parser = Parser(protocol_version=2)
+    start = time.perf_counter()
+    parser.feed(commands)
+    for command_name, command_args in parser:
+        server._process_command(command_name, command_args)
+    replay_seconds = time.perf_counter() - start
+
+    print(f"keys:                {keys}")
+    print(f"snapshot size:       {size / 1024 / 1024:.1f} MB")
+    print(f"save:                {save_seconds:.2f} s")
+    print(f"load:                {load_seconds:.2f} s ({keys / load_seconds:.0f} keys/sec)")
+    print(f"replay SET commands: {replay_seconds:.2f} s ({keys / replay_seconds:.0f} keys/sec)")
+    print(f"load speedup:        {replay_seconds / load_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+"""
+Microbenchmark of the reply building cost per command
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_response_builder.py
+"""
+import timeit
+
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+from redis_clone.response_builder import ResponseBuilder
+
+NUMBER = 200000
+
+
+def build_cases():
+    """
+    Case name -> (function, replies built by one call)
+    """
+    builder = ResponseBuilder(protocol_version=2)
+    small_value = b"x" * 16
+    value_1kb = b"x" * 1024
+    array_100 = [b"value:%d" % i for i in range(100)]
+    nested = [[b"member:%d" % i, i] for i in range(100)]
+
+    cases = {
+        "+OK": lambda: builder.build_response(Protocol_2_Data_Types.SIMPLE_STRING, "OK"),
+        "nil bulk string": lambda: builder.build_response(Protocol_2_Data_Types.BULK_STRING),
+        "shared integer": lambda: builder.build_response(Protocol_2_Data_Types.INTEGER, 42),
+        "large integer": lambda: builder.build_response(Protocol_2_Data_Types.INTEGER, 1 << 40),
+        "16 byte bulk string": lambda: builder.build_response(Protocol_2_Data_Types.BULK_STRING, small_value),
+        "1 KB bulk string": lambda: builder.build_response(Protocol_2_Data_Types.BULK_STRING, value_1kb),
+        "error": lambda: builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error"),
+        "array of 100 bulk strings": lambda: builder.build_response(Protocol_2_Data_Types.ARRAY, array_100),
+        "nested array 100x2": lambda: builder.build_response(Protocol_2_Data_Types.ARRAY, nested),
+    }
+
+    out = bytearray()
+
+    def write_into_output_buffer():
+        builder.write_array(out, array_100)
+        out.clear()
+
+    cases["array of 100 written to output buffer"] = write_into_output_buffer
+    return {name: (func, 1) for name, func in cases.items()}
+
+
+def main():
+    print(f"{'reply':<42}{'ns/reply':>12}")
+    for name, (func, _) in build_cases().items():
+        number = NUMBER // 20 if "array" in name else NUMBER
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        print(f"{name:<42}{seconds / number * 1e9:>12.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,59 @@
+"""
+Time of every SCAN call over a whole keyspace, it depends on COUNT and not on the number of
+keys, so even with 10M keys no call holds the event loop for more than a fraction of a
+millisecond. KEYS over the same keyspace is shown for comparison
+
+Commands are executed through RedisServer._process_command, so the numbers include
+dispatching and reply building but no network
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_scan.py [keys, default 10000000]
+"""
+import gc
+import sys
+import time
+
+from redis_clone.server import RedisServer
+
+COUNTS = (10, 100, 1000)
+
+
+def main():
+    key_count = int(sys.argv[1]) if len(sys.argv) > 1 else 10000000
+    server = RedisServer(host="127.0.0.1", port=0)
+    process_command = server._process_command
+
+    start = time.perf_counter()
+    # Stored straight into data like a snapshot load, much faster than SET commands
+    server.keyspace.data.update((b"key:%d" % i, b"value") for i in range(key_count))
+    server.keyspace.rebuild_after_load()
+    gc.collect()
+    print(f"{key_count} keys loaded in {time.perf_counter() - start:.1f}s")
+
+    print(f"{'COUNT':>8}{'calls':>10}{'median':>10}{'p99':>10}{'max':>10}  usec/call")
+    for count in COUNTS:
+        durations = []
+        cursor = b"0"
+        while True:
+            start = time.perf_counter()
+            response = process_command("SCAN", [cursor, b"COUNT", b"%d" % count])
+            durations.append(time.perf_counter() - start)
+            cursor = bytes(response).split(b"\r\n")[2]
+            if cursor == b"0":
+                break
+        durations.sort()
+        print(
+            f"{count:>8}{len(durations):>10}"
+            f"{durations[len(durations) // 2] * 1e6:>10.1f}"
+            f"{durations[len(durations) * 99 // 100] * 1e6:>10.1f}"
+            f"{durations[-1] * 1e6:>10.1f}"
+        )
+
+    start = time.perf_counter()
+    process_command("KEYS", [b"key:1*"])
+    print(f"KEYS key:1* blocks for {(time.perf_counter() - start) * 1000:.0f}ms")
+
+
+if __name__ == "__main__":
+    main()
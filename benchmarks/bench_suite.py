@@ -0,0 +1,103 @@
+"""
+Regression suite: the parser and reply microbenchmarks plus a load generator run against
+a server started for the occasion
+
+Results can be saved as a baseline, later runs fail with exit code 1 when any throughput
+is more than --max-regression percent below it. Baselines are only comparable on the
+same machine.
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_suite.py --save-baseline baseline.json
+    PYTHONPATH=. python benchmarks/bench_suite.py --baseline baseline.json [--max-regression 10] [--no-load]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import timeit
+
+import bench_parser
+import bench_response_builder
+
+from redis_clone.benchmark import DEFAULT_MAX_REGRESSION, check_baseline, run_benchmark
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LOAD_RUNS = {
+    "load get/set": {"clients": 50, "pipeline": 1, "requests": 50000},
+    "load get/set pipeline 16": {"clients": 50, "pipeline": 16, "requests": 200000},
+}
+
+
+def run_microbenchmarks(cases, results):
+    for name, (func, operations) in cases.items():
+        # Calibrated so every case runs for at least 0.2 seconds whatever its speed
+        number, _ = timeit.Timer(func).autorange()
+        seconds = min(timeit.repeat(func, number=number, repeat=3))
+        results[name] = {"ops_per_sec": round(number * operations / seconds)}
+        print(f"{name:<48}{results[name]['ops_per_sec']:>14}")
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def run_load(results):
+    port = _free_port()
+    env = dict(os.environ, REDIS_HOST="127.0.0.1", REDIS_PORT=str(port), PYTHONPATH=ROOT_DIR)
+    server = subprocess.Popen(
+        [sys.executable, os.path.join(ROOT_DIR, "redis_clone", "server.py")],
+        env=env,
+        cwd=ROOT_DIR,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = time.time() + 10
+        while True:
+            try:
+                socket.create_connection(("127.0.0.1", port)).close()
+                break
+            except ConnectionError:
+                if time.time() > deadline:
+                    raise
+                time.sleep(0.05)
+
+        for name, options in LOAD_RUNS.items():
+            results[name] = asyncio.run(run_benchmark("127.0.0.1", port, seed=0, **options))
+            print(
+                f"{name:<48}{results[name]['ops_per_sec']:>14}"
+                f"  p50 {results[name]['p50_usec']} usec  p99 {results[name]['p99_usec']} usec"
+            )
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark regression suite")
+    parser.add_argument("--save-baseline", help="write the results to this json file")
+    parser.add_argument("--baseline", help="fail if throughput regressed compared with this json file")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION)
+    parser.add_argument("--no-load", action="store_true", help="only run the microbenchmarks")
+    args = parser.parse_args()
+
+    results = {}
+    print(f"{'benchmark':<48}{'ops/sec':>14}")
+    run_microbenchmarks({f"parser {name}": case for name, case in bench_parser.build_cases().items()}, results)
+    run_microbenchmarks(
+        {f"reply {name}": case for name, case in bench_response_builder.build_cases().items()}, results
+    )
+    if not args.no_load:
+        run_load(results)
+    return check_baseline(results, args.baseline, args.save_baseline, args.max_regression)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,75 @@
+"""
+Latency of sorted set commands as the set grows, rank and range lookups go through the
+skiplist spans so they should stay flat from thousands to a million members
+
+Commands are executed through RedisServer._process_command, so the numbers include
+dispatching and reply building but no network
+
+Usage, from the root of the checkout. PYTHONPATH can be left out once redis_clone is
+installed with pip install -e .
+    PYTHONPATH=. python benchmarks/bench_zset.py [max members, default 1000000]
+"""
+import random
+import sys
+import time
+import timeit
+
+from redis_clone.server import RedisServer
+
+NUMBER = 20000
+# Members added with one ZADD while the set is filled
+FILL_BATCH = 1000
+
+
+def main():
+    max_members = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    server = RedisServer(host="127.0.0.1", port=0)
+    process_command = server._process_command
+    rand = random.Random(0)
+
+    sizes = []
+    size = 1000
+    while size <= max_members:
+        sizes.append(size)
+        size *= 10
+
+    print(f"{'members':>10}{'ZADD':>10}{'ZSCORE':>10}{'ZRANK':>10}{'ZRANGE 10':>12}{'ZRANGEBYSCORE LIMIT 10':>24}{'ZCOUNT':>10}  usec/op")
+    filled = 0
+    for size in sizes:
+        start = time.perf_counter()
+        while filled < size:
+            args = [b"board"]
+            for i in range(filled, filled + FILL_BATCH):
+                args += [b"%d" % rand.randrange(size * 10), b"member_%d" % i]
+            process_command("ZADD", args)
+            filled += FILL_BATCH
+        fill_seconds = time.perf_counter() - start
+
+        def member():
+            return b"member_%d" % rand.randrange(size)
+
+        def zrange_10():
+            start_rank = rand.randrange(size - 10)
+            return process_command("ZRANGE", [b"board", b"%d" % start_rank, b"%d" % (start_rank + 9)])
+
+        cases = [
+            lambda: process_command("ZADD", [b"board", b"%d" % rand.randrange(size * 10), member()]),
+            lambda: process_command("ZSCORE", [b"board", member()]),
+            lambda: process_command("ZRANK", [b"board", member()]),
+            zrange_10,
+            lambda: process_command(
+                "ZRANGEBYSCORE", [b"board", b"%d" % rand.randrange(size * 10), b"+inf", b"LIMIT", b"0", b"10"]
+            ),
+            lambda: process_command(
+                "ZCOUNT", [b"board", b"%d" % rand.randrange(size * 5), b"%d" % (size * 5 + rand.randrange(size * 5))]
+            ),
+        ]
+        usec = [min(timeit.repeat(case, number=NUMBER, repeat=3)) / NUMBER * 1e6 for case in cases]
+        print(
+            f"{size:>10}{usec[0]:>10.2f}{usec[1]:>10.2f}{usec[2]:>10.2f}{usec[3]:>12.2f}{usec[4]:>24.2f}{usec[5]:>10.2f}"
+            f"  (filled in {fill_seconds:.1f}s)"
+        )
+
+
+if __name__ == "__main__":
+    main()
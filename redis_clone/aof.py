@@ -0,0 +1,351 @@
+"""
+Append only file, every write command is logged in the same RESP format clients send
+
+Commands are appended to an in memory buffer and written to the file once per event loop
+iteration, so all the writes of an iteration share a single write and a single fsync (group commit).
+fsync runs in a background thread and is controlled by the appendfsync policy:
+    always: replies of write commands are sent only after their commands are on disk
+    everysec: the file is synced once per second, up to one second of writes can be lost
+    no: syncing is left to the operating system
+"""
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+from redis_clone.hashes import Hash
+from redis_clone.keyspace import now_ms
+from redis_clone.response_builder import format_double
+from redis_clone.quicklist import Quicklist
+from redis_clone.zsets import SortedSet
+from redis_clone.parser.redis_parser import Parser
+
+logger = logging.getLogger(__name__)
+
+FSYNC_POLICIES = ("always", "everysec", "no")
+
+# Keys written by a single MSET of a rewritten file, same as redis AOF_REWRITE_ITEMS_PER_CMD
+AOF_REWRITE_ITEMS_PER_CMD = 64
+# Rewritten commands are gathered in chunks of this size before being written to the file
+WRITE_CHUNK_SIZE = 1024 * 1024
+# Size of the reads feeding the parser when the file is loaded
+LOAD_CHUNK_SIZE = 1024 * 1024
+
+
+class AOFError(Exception):
+    pass
+
+
+def encode_command(command_name, command_args):
+    """
+    Encodes a command as a RESP array of bulk strings
+    """
+    out = bytearray(b"*%d\r\n" % (len(command_args) + 1))
+    for arg in (command_name, *command_args):
+        if isinstance(arg, str):
+            arg = arg.encode("latin-1")
+        elif type(arg) is int:
+            arg = b"%d" % arg
+        out += b"$%d\r\n" % len(arg)
+        out += arg
+        out += b"\r\n"
+    return out
+
+
+class AppendOnlyFile:
+    """
+    Open append only file of a running server
+    Must be created while the event loop is running
+    """
+
+    def __init__(self, path, fsync_policy="everysec", loop=None, stats=None) -> None:
+        if fsync_policy not in FSYNC_POLICIES:
+            raise Exception(f"Invalid appendfsync policy {fsync_policy}")
+        self.path = path
+        self.fsync_policy = fsync_policy
+        self.loop = loop
+        self.fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # Commands appended since the last write to the file
+        self.buffer = bytearray()
+        # Commands appended while a rewrite is running, added to the rewritten file once it's done
+        self.rewrite_buffer = None
+        self.stats = stats if stats is not None else {}
+        self.stats.update({
+            "aof_current_size": os.fstat(self.fd).st_size,
+            "aof_last_write_status": "ok",
+            "aof_delayed_fsync": 0,
+        })
+
+        self._flush_scheduled = False
+        # Futures of clients waiting for their writes to be written or synced
+        self._write_waiters = []
+        self._fsync_waiters = []
+        self._fsync_in_progress = False
+        self._unsynced = False
+        self._last_fsync = time.monotonic()
+        # A single thread, so fsyncs and closes of old files run in order
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="aof-fsync")
+
+    def append(self, data):
+        """
+        Queues a command encoded by encode_command, it's written to the file at the end of
+        the current loop iteration
+        """
+        self.buffer += data
+        if self.rewrite_buffer is not None:
+            self.rewrite_buffer += data
+        if not self._flush_scheduled:
+            self._flush_scheduled = True
+            self.loop.call_soon(self.flush)
+
+    def wait_for_flush(self):
+        """
+        Returns a future which is done once every command appended so far is written to the file,
+        with the always policy once it's also synced to disk
+        Replies wait for it, so a client never sees a write which is not in the file
+        """
+        waiter = self.loop.create_future()
+        if self.fsync_policy == "always":
+            self._fsync_waiters.append(waiter)
+        else:
+            self._write_waiters.append(waiter)
+        return waiter
+
+    def flush(self):
+        """
+        Writes the buffered commands of every client with a single write
+        """
+        self._flush_scheduled = False
+        if self.buffer:
+            data, self.buffer = self.buffer, bytearray()
+            try:
+                written = 0
+                with memoryview(data) as view:
+                    while written < len(data):
+                        written += os.write(self.fd, view[written:])
+            except OSError as e:
+                # Keep what was not written, it's retried with the next flush
+                logger.error(f"Error writing to the append only file: {e}")
+                self.stats["aof_last_write_status"] = "err"
+                self.buffer = data[written:] + self.buffer
+                return
+            self.stats["aof_current_size"] += len(data)
+            self.stats["aof_last_write_status"] = "ok"
+            self._unsynced = True
+
+        waiters, self._write_waiters = self._write_waiters, []
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        if self._fsync_waiters:
+            self._background_fsync()
+
+    def cron(self):
+        """
+        Called by the server cron, syncs the file once per second with the everysec policy
+        and retries writes which failed
+        """
+        if self.buffer and not self._flush_scheduled:
+            self.flush()
+        if self.fsync_policy != "everysec" or not self._unsynced:
+            return
+        if time.monotonic() - self._last_fsync < 1:
+            return
+        if self._fsync_in_progress:
+            # Disk is slower than the writes, the next cron tries again
+            self.stats["aof_delayed_fsync"] += 1
+            return
+        self._background_fsync()
+
+    def _background_fsync(self):
+        if self._fsync_in_progress:
+            # Waiters are picked up by the next fsync, started once this one is done
+            return
+        self._fsync_in_progress = True
+        self._unsynced = False
+        self._last_fsync = time.monotonic()
+        waiters, self._fsync_waiters = self._fsync_waiters, []
+        future = self.loop.run_in_executor(self._executor, os.fsync, self.fd)
+        future.add_done_callback(partial(self._fsync_done, waiters))
+
+    def _fsync_done(self, waiters, future):
+        self._fsync_in_progress = False
+        if future.exception() is not None:
+            logger.error(f"Error syncing the append only file: {future.exception()}")
+            self.stats["aof_last_write_status"] = "err"
+            self._unsynced = True
+        for waiter in waiters:
+            if not waiter.done():
+                waiter.set_result(None)
+        if self._fsync_waiters:
+            self.flush()
+
+    def start_rewrite(self):
+        """
+        Commands appended from now on are also kept for the rewritten file
+        """
+        self.rewrite_buffer = bytearray()
+
+    def finish_rewrite(self, temp_path):
+        """
+        Adds the commands appended during the rewrite to the rewritten file at temp_path
+        and replaces the current file with it
+        """
+        # Buffered commands are already in the rewrite buffer, they belong to the old file only
+        self.flush()
+        rewrite_buffer, self.rewrite_buffer = self.rewrite_buffer, None
+        with open(temp_path, "ab") as file:
+            file.write(rewrite_buffer)
+            file.flush()
+            os.fsync(file.fileno())
+        os.replace(temp_path, self.path)
+
+        old_fd = self.fd
+        self.fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        # Closed after any fsync still running on it
+        self._executor.submit(os.close, old_fd)
+        self.stats["aof_current_size"] = os.fstat(self.fd).st_size
+        self._unsynced = False
+
+    def abort_rewrite(self):
+        self.rewrite_buffer = None
+
+    def close(self):
+        """
+        Writes and syncs everything left, used on shutdown
+        """
+        self.flush()
+        self._executor.shutdown(wait=True)
+        os.fsync(self.fd)
+        os.close(self.fd)
+
+
+def rewrite(keyspace, path):
+    """
+    Writes the shortest list of commands recreating keyspace to path, returns the size of the file
+    Keys without a ttl are grouped in MSET commands, keys with a ttl use SET with an absolute PXAT
+    """
+    expires = keyspace.expires
+    now = now_ms()
+    size = 0
+    mset_args = []
+
+    try:
+        with open(path, "wb") as file:
+            chunk = bytearray()
+            for key, value in keyspace.data.items():
+                deadline = expires.get(key)
+                if type(value) is Hash:
+                    if deadline is None or deadline >= now:
+                        _rewrite_hash(chunk, key, value, deadline)
+                elif type(value) is SortedSet:
+                    if deadline is None or deadline >= now:
+                        _rewrite_zset(chunk, key, value, deadline)
+                elif type(value) is Quicklist:
+                    if deadline is None or deadline >= now:
+                        _rewrite_list(chunk, key, value, deadline)
+                elif deadline is None:
+                    mset_args.append(key)
+                    mset_args.append(value)
+                    if len(mset_args) == AOF_REWRITE_ITEMS_PER_CMD * 2:
+                        chunk += encode_command("MSET", mset_args)
+                        mset_args = []
+                elif deadline >= now:
+                    chunk += encode_command("SET", (key, value, b"PXAT", deadline))
+
+                if len(chunk) >= WRITE_CHUNK_SIZE:
+                    size += len(chunk)
+                    file.write(chunk)
+                    chunk = bytearray()
+
+            if mset_args:
+                chunk += encode_command("MSET", mset_args)
+            size += len(chunk)
+            file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        # Nothing half written is left behind, eg: a value which can't be encoded
+        if os.path.exists(path):
+            os.unlink(path)
+        raise
+
+    return size
+
+
+def _rewrite_hash(chunk, key, value, deadline):
+    """
+    Appends the HSET commands recreating a hash, followed by its deadline
+    """
+    args = [key]
+    for field, field_value in value.items():
+        args.append(field)
+        args.append(field_value)
+        if len(args) == AOF_REWRITE_ITEMS_PER_CMD * 2 + 1:
+            chunk += encode_command("HSET", args)
+            args = [key]
+    if len(args) > 1:
+        chunk += encode_command("HSET", args)
+    if deadline is not None:
+        chunk += encode_command("PEXPIREAT", (key, deadline))
+
+
+def _rewrite_zset(chunk, key, value, deadline):
+    """
+    Appends the ZADD commands recreating a sorted set, followed by its deadline
+    """
+    args = [key]
+    for member, score in value.items():
+        args.append(format_double(score))
+        args.append(member)
+        if len(args) == AOF_REWRITE_ITEMS_PER_CMD * 2 + 1:
+            chunk += encode_command("ZADD", args)
+            args = [key]
+    if len(args) > 1:
+        chunk += encode_command("ZADD", args)
+    if deadline is not None:
+        chunk += encode_command("PEXPIREAT", (key, deadline))
+
+
+def _rewrite_list(chunk, key, value, deadline):
+    """
+    Appends the RPUSH commands recreating a list, followed by its deadline
+    """
+    args = [key]
+    for entry in value:
+        args.append(entry)
+        if len(args) == AOF_REWRITE_ITEMS_PER_CMD + 1:
+            chunk += encode_command("RPUSH", args)
+            args = [key]
+    if len(args) > 1:
+        chunk += encode_command("RPUSH", args)
+    if deadline is not None:
+        chunk += encode_command("PEXPIREAT", (key, deadline))
+
+
+def load(path, process_command):
+    """
+    Replays the commands logged in the file at path with process_command, returns their number
+    The file is read in large chunks and fed to a single streaming parser
+    A command cut short by a crash while it was written is dropped from the end of the file
+    """
+    parser = Parser(protocol_version=2)
+    commands = 0
+
+    with open(path, "rb") as file:
+        while chunk := file.read(LOAD_CHUNK_SIZE):
+            parser.feed(chunk)
+            try:
+                for command_name, command_args in parser:
+                    process_command(command_name, command_args)
+                    commands += 1
+            except Exception as e:
+                raise AOFError(f"Bad file format reading the append only file at offset {parser.processed_bytes()}: {e}")
+        size = file.tell()
+
+    valid_size = parser.processed_bytes()
+    if valid_size < size:
+        logger.warning(f"Append only file ends with an incomplete command, truncating it from {size} to {valid_size} bytes")
+        os.truncate(path, valid_size)
+    return commands
@@ -0,0 +1,277 @@
+"""
+Load generator in the spirit of redis-benchmark
+
+Every client is a coroutine with its own connection sending pipelines of commands picked
+from the command mix, the latency of a pipeline is counted for every command in it, same
+as redis-benchmark. Results can be saved as a baseline and later runs compared with it.
+
+Usage:
+    python -m redis_clone.benchmark [-p port | -s unix socket] [-c clients] [-P pipeline]
+        [-n requests] [-r keyspace] [-d value sizes eg: 16,1024] [--mix get:80,set:20] [--save-baseline file]
+        [--baseline file [--max-regression percent]]
+"""
+import argparse
+import asyncio
+import json
+import random
+import sys
+import time
+
+from redis_clone.aof import encode_command
+from redis_clone.metrics import LatencyHistogram
+
+# Commands of the mix, keys are drawn from the keyspace and values from the value sizes
+BENCHMARK_COMMANDS = ("get", "set", "incr", "del", "ping", "mget", "mset")
+# Keys of a MGET or MSET, same as redis-benchmark
+MULTI_KEY_COUNT = 10
+# Reported latency percentiles
+BENCHMARK_PERCENTILES = (50, 99, 99.9)
+DEFAULT_MAX_REGRESSION = 10
+
+READ_SIZE = 64 * 1024
+SIMPLE_REPLY_PREFIXES = b"+-:"
+
+
+def parse_command_mix(mix):
+    """
+    Parses "get:80,set:20" into {"get": 80, "set": 20}
+    """
+    weights = {}
+    for item in mix.split(","):
+        name, _, weight = item.partition(":")
+        name = name.strip().lower()
+        if name not in BENCHMARK_COMMANDS:
+            raise Exception(f"Unknown command {name} in the command mix")
+        weights[name] = int(weight or 1)
+    return weights
+
+
+def reply_end(buffer, pos):
+    """
+    Returns the position right after the reply starting at pos, -1 if it's not complete yet
+    """
+    line_end = buffer.find(b"\r\n", pos)
+    if line_end < 0:
+        return -1
+    prefix = buffer[pos:pos + 1]
+    if prefix in SIMPLE_REPLY_PREFIXES:
+        return line_end + 2
+    length = int(buffer[pos + 1:line_end])
+    if prefix == b"$":
+        end = line_end + 2 if length < 0 else line_end + 4 + length
+        return end if end <= len(buffer) else -1
+    if prefix == b"*":
+        pos = line_end + 2
+        for _ in range(max(length, 0)):
+            pos = reply_end(buffer, pos)
+            if pos < 0:
+                return -1
+        return pos
+    raise Exception(f"Unexpected reply {bytes(buffer[pos:line_end])!r}")
+
+
+class Workload:
+    """
+    Builds the pipelines sent by the clients
+    """
+
+    def __init__(self, keyspace, value_sizes, command_mix, seed=None) -> None:
+        self.random = random.Random(seed)
+        self.keyspace = keyspace
+        self.values = [b"x" * size for size in value_sizes]
+        self.commands = list(command_mix)
+        self.weights = list(command_mix.values())
+
+    def _key(self):
+        return b"key:%012d" % self.random.randrange(self.keyspace)
+
+    def encode(self, name):
+        if name == "get":
+            return encode_command("GET", [self._key()])
+        if name == "set":
+            return encode_command("SET", [self._key(), self.random.choice(self.values)])
+        if name == "incr":
+            return encode_command("INCR", [b"counter:%d" % self.random.randrange(self.keyspace)])
+        if name == "del":
+            return encode_command("DEL", [self._key()])
+        if name == "mget":
+            return encode_command("MGET", [self._key() for _ in range(MULTI_KEY_COUNT)])
+        if name == "mset":
+            args = []
+            for _ in range(MULTI_KEY_COUNT):
+                args += [self._key(), self.random.choice(self.values)]
+            return encode_command("MSET", args)
+        return encode_command("PING", [])
+
+    def pipeline(self, count):
+        """
+        Returns count commands encoded in one buffer
+        """
+        payload = bytearray()
+        for name in self.random.choices(self.commands, self.weights, k=count):
+            payload += self.encode(name)
+        return payload
+
+
+class BenchmarkRun:
+    """
+    State shared by the clients of a run
+    """
+
+    def __init__(self, requests) -> None:
+        self.remaining = requests
+        self.latency = LatencyHistogram()
+        self.errors = 0
+
+    def take(self, pipeline):
+        count = min(pipeline, self.remaining)
+        self.remaining -= count
+        return count
+
+
+async def _open_connection(host, port, unix_socket):
+    if unix_socket:
+        return await asyncio.open_unix_connection(unix_socket)
+    return await asyncio.open_connection(host, port)
+
+
+async def _run_client(host, port, unix_socket, run, workload, pipeline):
+    reader, writer = await _open_connection(host, port, unix_socket)
+    buffer = bytearray()
+    try:
+        while True:
+            count = run.take(pipeline)
+            if not count:
+                break
+            start = time.perf_counter()
+            writer.write(workload.pipeline(count))
+
+            replies = 0
+            pos = 0
+            while replies < count:
+                end = reply_end(buffer, pos) if pos < len(buffer) else -1
+                if end < 0:
+                    data = await reader.read(READ_SIZE)
+                    if not data:
+                        raise Exception("Connection closed by the server")
+                    buffer += data
+                    continue
+                if buffer[pos:pos + 1] == b"-":
+                    run.errors += 1
+                pos = end
+                replies += 1
+            del buffer[:pos]
+            run.latency.record_many(int((time.perf_counter() - start) * 1000000), count)
+    finally:
+        writer.close()
+
+
+async def run_benchmark(host, port, clients=50, pipeline=1, requests=100000, keyspace=100000,
+                        value_sizes=(3,), command_mix=None, seed=None, unix_socket=None):
+    """
+    Runs requests commands over clients connections, returns the throughput and latency percentiles
+    Connections go to unix_socket instead of host and port when it's given
+    """
+    run = BenchmarkRun(requests)
+    workload = Workload(keyspace, value_sizes, command_mix or {"get": 50, "set": 50}, seed)
+    start = time.perf_counter()
+    await asyncio.gather(*(_run_client(host, port, unix_socket, run, workload, pipeline) for _ in range(clients)))
+    seconds = time.perf_counter() - start
+
+    results = {
+        "requests": requests,
+        "seconds": round(seconds, 3),
+        "ops_per_sec": round(requests / seconds),
+        "errors": run.errors,
+    }
+    for percentile in BENCHMARK_PERCENTILES:
+        results[f"p{percentile:g}_usec"] = run.latency.percentile(percentile)
+    return results
+
+
+def compare_with_baseline(results, baseline, max_regression=DEFAULT_MAX_REGRESSION):
+    """
+    Returns a message for every throughput in results which is more than max_regression
+    percent below the same entry of baseline
+    results and baseline map names to either an ops_per_sec number or a dict holding one
+    """
+    regressions = []
+    for name, entry in results.items():
+        if name not in baseline:
+            continue
+        current = entry["ops_per_sec"] if isinstance(entry, dict) else entry
+        previous = baseline[name]["ops_per_sec"] if isinstance(baseline[name], dict) else baseline[name]
+        if current < previous * (1 - max_regression / 100):
+            regressions.append(
+                f"{name}: {current:.0f} ops/sec is {(1 - current / previous) * 100:.1f}% below the baseline {previous:.0f}"
+            )
+    return regressions
+
+
+def check_baseline(results, baseline_path, save_baseline_path, max_regression):
+    """
+    Saves and compares results with a baseline file, returns the exit code of the process
+    """
+    if save_baseline_path:
+        with open(save_baseline_path, "w") as file:
+            json.dump(results, file, indent=2, sort_keys=True)
+        print(f"Baseline saved to {save_baseline_path}")
+    if not baseline_path:
+        return 0
+
+    with open(baseline_path) as file:
+        baseline = json.load(file)
+    regressions = compare_with_baseline(results, baseline, max_regression)
+    for regression in regressions:
+        print(f"REGRESSION {regression}")
+    if regressions:
+        return 1
+    print(f"No regression above {max_regression}% compared with {baseline_path}")
+    return 0
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load generator for redis_clone, similar to redis-benchmark")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("-p", "--port", type=int, default=9999)
+    parser.add_argument("-s", "--socket", help="unix socket path, overrides host and port")
+    parser.add_argument("-c", "--clients", type=int, default=50)
+    parser.add_argument("-P", "--pipeline", type=int, default=1)
+    parser.add_argument("-n", "--requests", type=int, default=100000)
+    parser.add_argument("-r", "--keyspace", type=int, default=100000, help="number of distinct keys")
+    parser.add_argument("-d", "--value-sizes", default="3", help="comma separated value sizes in bytes")
+    parser.add_argument("--mix", default="get:50,set:50", help="command:weight list eg: get:80,set:20")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--save-baseline", help="write the results to this json file")
+    parser.add_argument("--baseline", help="fail if throughput regressed compared with this json file")
+    parser.add_argument("--max-regression", type=float, default=DEFAULT_MAX_REGRESSION,
+                        help="percent of throughput lost before failing")
+    args = parser.parse_args(argv)
+
+    command_mix = parse_command_mix(args.mix)
+    results = asyncio.run(run_benchmark(
+        args.host,
+        args.port,
+        clients=args.clients,
+        pipeline=args.pipeline,
+        requests=args.requests,
+        keyspace=args.keyspace,
+        value_sizes=[int(size) for size in args.value_sizes.split(",")],
+        command_mix=command_mix,
+        seed=args.seed,
+        unix_socket=args.socket,
+    ))
+
+    print(f"transport: {'unix socket' if args.socket else 'tcp'}  clients: {args.clients}  pipeline: {args.pipeline}  mix: {args.mix}  value sizes: {args.value_sizes}")
+    print(
+        f"{results['requests']} requests in {results['seconds']} seconds, {results['ops_per_sec']} ops/sec, "
+        f"{results['errors']} errors"
+    )
+    print(
+        f"latency usec  p50: {results['p50_usec']}  p99: {results['p99_usec']}  p99.9: {results['p99.9_usec']}"
+    )
+    return check_baseline({"load": results}, args.baseline, args.save_baseline, args.max_regression)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,103 @@
+import time
+
+
+class Client:
+    """
+    State of a single client connection
+    Replies are gathered in the output buffer and sent with one write per batch of commands
+    """
+
+    def __init__(self, reader, writer, parser, output_buffer_limit=0, client_id=0) -> None:
+        self.reader = reader
+        self.writer = writer
+        self.parser = parser
+        self.address = writer.get_extra_info("peername")
+        self.id = client_id
+        self.name = b""
+        # RESP version of the replies, switched with HELLO. Requests have the same format in both
+        self.protocol_version = 2
+        # Max bytes of pending replies, 0 means no limit
+        self.output_buffer_limit = output_buffer_limit
+        self.output_buffer = bytearray()
+        # "normal", "replica" for a replica connected to this server or "master" for the
+        # connection of a replica to its primary
+        self.role = "normal"
+        # State of a replica, see ReplicationCommandsMixin
+        self.replica_state = None
+        # Replication stream held back while a replica waits for its snapshot
+        self.replica_pending = None
+        self.replica_listening_port = 0
+        self.repl_ack_offset = 0
+        self.repl_ack_time = 0
+        # Monotonic time of the last read from the connection, for the idle timeout
+        self.last_interaction = time.monotonic()
+        # Client side caching, see TrackingCommandsMixin
+        self.tracking = False
+        self.tracking_bcast = False
+        self.tracking_noloop = False
+        self.tracking_prefixes = []
+        # Id of the client invalidation messages are sent to instead of this one, 0 for none
+        self.tracking_redirect = 0
+        # Blocking pop the client waits in, see ListCommandsMixin. blocked_future is None when not blocked
+        self.blocked_future = None
+        self.blocked_keys = ()
+        self.blocked_timeout = 0
+        self.blocked_left = True
+        # Data read while the client was blocked, parsed once it's unblocked
+        self.pending_input = bytearray()
+        # Commands queued since MULTI, None outside of a transaction, see TransactionCommandsMixin
+        self.multi_state = None
+        # A command couldn't be queued, EXEC fails
+        self.multi_error = False
+        # Set while EXEC runs the queued commands
+        self.in_exec = False
+        # Set while the replies in the output buffer wait for their writes to be in the append
+        # only file, nothing queued for the client can be sent before them
+        self.replies_held = False
+        # Watched key -> its version when WATCH was called
+        self.watched_keys = {}
+        # Pub/sub subscriptions, see PubSubCommandsMixin
+        self.subscribed_channels = set()
+        self.subscribed_patterns = set()
+        # Monotonic time since when the pending output of a subscriber is over the soft limit
+        self.soft_limit_reached_time = None
+
+    def add_reply(self, response):
+        """
+        Queues a reply, it's sent on the next flush
+        """
+        if not self.output_buffer and type(response) is bytearray:
+            # Replies encoded into their own buffer become the output buffer without a copy
+            self.output_buffer = response
+        else:
+            self.output_buffer += response
+
+    def output_buffer_size(self):
+        """
+        Bytes waiting to be sent, both queued replies and data buffered by the transport
+        """
+        return len(self.output_buffer) + self.writer.transport.get_write_buffer_size()
+
+    def is_output_buffer_over_limit(self):
+        if not self.output_buffer_limit:
+            return False
+        return self.output_buffer_size() > self.output_buffer_limit
+
+    async def flush(self):
+        """
+        Writes all queued replies with a single write and a single drain
+        """
+        if not self.output_buffer:
+            return
+
+        # Hand the buffer over to the transport instead of copying it
+        data, self.output_buffer = self.output_buffer, bytearray()
+        self.writer.write(data)
+        await self.writer.drain()
+
+    def abort(self):
+        """
+        Drops the connection together with everything still buffered for it
+        """
+        self.output_buffer = bytearray()
+        self.writer.transport.abort()
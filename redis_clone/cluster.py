@@ -0,0 +1,75 @@
+"""
+Hash slots and the static topology of a sharded deployment
+
+Keys are mapped to one of CLUSTER_SLOTS hash slots with CRC16, the same as redis cluster, so
+cluster aware clients compute the node of a key on their own and connect to it directly.
+Shards are started together by redis_clone/launcher.py, shard i listens on base port + i and
+owns an equal contiguous range of slots. The topology never changes, so there is no gossip.
+"""
+import hashlib
+from binascii import crc_hqx
+
+CLUSTER_SLOTS = 16384
+
+
+def key_hash_slot(key):
+    """
+    Returns the hash slot of key
+    Only the part between the first { and the next } is hashed when it's not empty,
+    so related keys like {user:1}:name and {user:1}:email are kept in the same slot
+    """
+    start = key.find(b"{")
+    if start != -1:
+        end = key.find(b"}", start + 1)
+        if end > start + 1:
+            key = key[start + 1:end]
+    # CRC16 XMODEM, the variant used by redis cluster
+    return crc_hqx(key, 0) & (CLUSTER_SLOTS - 1)
+
+
+def split_slots(shards):
+    """
+    Splits the hash slots into shards contiguous ranges of almost the same size
+    """
+    return [
+        (index * CLUSTER_SLOTS // shards, (index + 1) * CLUSTER_SLOTS // shards - 1)
+        for index in range(shards)
+    ]
+
+
+class ClusterNode:
+    __slots__ = ("id", "host", "port", "slot_range")
+
+    def __init__(self, host, port, slot_range) -> None:
+        # Node ids are 40 hex chars like in redis, derived from the address so every shard agrees on them
+        self.id = hashlib.sha1(f"{host}:{port}".encode()).hexdigest()
+        self.host = host
+        self.port = port
+        self.slot_range = slot_range
+
+    @property
+    def address(self):
+        return f"{self.host}:{self.port}"
+
+
+class ClusterState:
+    """
+    Nodes of the deployment as seen by one of its shards
+    """
+
+    def __init__(self, host, base_port, shards, shard_index) -> None:
+        if not 0 <= shard_index < shards:
+            raise Exception(f"Invalid shard index {shard_index} for {shards} shards")
+        self.nodes = [
+            ClusterNode(host, base_port + index, slot_range)
+            for index, slot_range in enumerate(split_slots(shards))
+        ]
+        self.myself = self.nodes[shard_index]
+        # Owner of every slot, looked up for each command with keys
+        self.slot_owners = []
+        for node in self.nodes:
+            start, end = node.slot_range
+            self.slot_owners.extend([node] * (end - start + 1))
+
+    def owner(self, slot):
+        return self.slot_owners[slot]
@@ -0,0 +1,14 @@
+from redis_clone.commands.registry import RedisCommand, command, build_command_table, group_subarguments
+from redis_clone.commands.cluster import ClusterCommandsMixin
+from redis_clone.commands.connection import ConnectionCommandsMixin
+from redis_clone.commands.generic import GenericCommandsMixin
+from redis_clone.commands.hashes import HashCommandsMixin
+from redis_clone.commands.lists import BLOCKED_RESPONSE, ListCommandsMixin
+from redis_clone.commands.persistence import PersistenceCommandsMixin
+from redis_clone.commands.pubsub import PubSubCommandsMixin
+from redis_clone.commands.replication import ReplicationCommandsMixin
+from redis_clone.commands.server import ServerCommandsMixin
+from redis_clone.commands.strings import StringCommandsMixin
+from redis_clone.commands.zsets import SortedSetCommandsMixin
+from redis_clone.commands.tracking import TrackingCommandsMixin
+from redis_clone.commands.multi import TRANSACTION_COMMANDS, TransactionCommandsMixin
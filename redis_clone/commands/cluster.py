@@ -0,0 +1,124 @@
+from redis_clone.cluster import CLUSTER_SLOTS, ClusterState, key_hash_slot
+from redis_clone.commands.registry import command, normalize_token
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+
+
+class ClusterCommandsMixin:
+    """
+    Sharded mode, every server process owns a range of hash slots
+    Commands for keys of other slots are answered with a MOVED redirect to their owner
+    """
+
+    def _init_cluster(self):
+        # Topology of the deployment, None when cluster mode is disabled
+        self.cluster = None
+        if self.config["cluster-enabled"]:
+            shard_index = self.config["cluster-shard-index"]
+            self.cluster = ClusterState(
+                self.config["cluster-announce-ip"],
+                self.port - shard_index,
+                self.config["cluster-shards"],
+                shard_index,
+            )
+
+    def _cluster_redirect(self, redis_command, command_args):
+        """
+        Returns the error for a command whose keys are not served by this shard,
+        None if it can run here
+        """
+        slot = None
+        for key in redis_command.get_keys(command_args):
+            key_slot = key_hash_slot(key)
+            if slot is None:
+                slot = key_slot
+            elif key_slot != slot:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "CROSSSLOT Keys in request don't hash to the same slot"
+                )
+
+        if slot is None:
+            return None
+        node = self.cluster.owner(slot)
+        if node is self.cluster.myself:
+            return None
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.ERROR, f"MOVED {slot} {node.address}"
+        )
+
+    @command("CLUSTER", arity=-2, flags=("loading", "stale"))
+    def _handle_cluster_command(self, client, command_args):
+        """
+        CLUSTER INFO, MYID, SLOTS, SHARDS, NODES and KEYSLOT key
+        """
+        subcommand = normalize_token(command_args[0])
+        if self.cluster is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR This instance has cluster support disabled"
+            )
+
+        if subcommand == "KEYSLOT" and len(command_args) == 2:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.INTEGER, key_hash_slot(command_args[1])
+            )
+        elif subcommand == "MYID":
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.BULK_STRING, self.cluster.myself.id
+            )
+        elif subcommand == "SLOTS":
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ARRAY,
+                [
+                    [node.slot_range[0], node.slot_range[1], [node.host, node.port, node.id]]
+                    for node in self.cluster.nodes
+                ],
+            )
+        elif subcommand == "SHARDS":
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ARRAY,
+                [self._cluster_shard_info(node) for node in self.cluster.nodes],
+            )
+        elif subcommand == "NODES":
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.BULK_STRING,
+                "".join(self._cluster_node_line(node) for node in self.cluster.nodes),
+            )
+        elif subcommand == "INFO":
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.BULK_STRING, self._cluster_info()
+            )
+
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.ERROR,
+            f"ERR unknown subcommand or wrong number of arguments for '{subcommand}'. Try CLUSTER HELP.",
+        )
+
+    def _cluster_shard_info(self, node):
+        return [
+            "slots", list(node.slot_range),
+            "nodes", [[
+                "id", node.id,
+                "port", node.port,
+                "ip", node.host,
+                "endpoint", node.host,
+                "role", "master",
+                "replication-offset", 0,
+                "health", "online",
+            ]],
+        ]
+
+    def _cluster_node_line(self, node):
+        flags = "myself,master" if node is self.cluster.myself else "master"
+        start, end = node.slot_range
+        return f"{node.id} {node.address}@{node.port + 10000} {flags} - 0 0 0 connected {start}-{end}\n"
+
+    def _cluster_info(self):
+        return (
+            "cluster_enabled:1\r\n"
+            "cluster_state:ok\r\n"
+            f"cluster_slots_assigned:{CLUSTER_SLOTS}\r\n"
+            f"cluster_slots_ok:{CLUSTER_SLOTS}\r\n"
+            "cluster_slots_pfail:0\r\n"
+            "cluster_slots_fail:0\r\n"
+            f"cluster_known_nodes:{len(self.cluster.nodes)}\r\n"
+            f"cluster_size:{len(self.cluster.nodes)}\r\n"
+        )
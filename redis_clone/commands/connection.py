@@ -0,0 +1,120 @@
+from redis_clone.commands.registry import command, normalize_token
+from redis_clone.commands.server import REDIS_VERSION
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types, Protocol_3_Data_Types, SUPPORTED_PROTOCOL_VERSIONS
+
+
+class ConnectionCommandsMixin:
+    """
+    Commands about the client connection
+    """
+
+    @command("PING", arity=-1, flags=("fast", "stale"))
+    def _handle_ping_command(self, client, command_args):
+        if client is not None and client.protocol_version == 2 and (client.subscribed_channels or client.subscribed_patterns):
+            # Replies of subscribed RESP2 clients have the shape of messages
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ARRAY, [b"pong", command_args[0] if command_args else b""]
+            )
+        if command_args:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.BULK_STRING, command_args[0]
+            )
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.SIMPLE_STRING, "PONG"
+        )
+
+    @command("ECHO", arity=-2, flags=("fast",))
+    def _handle_echo_command(self, client, command_args):
+        # Echo command returns the same string, as a bulk string since it can be binary
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.BULK_STRING, b" ".join(command_args)
+        )
+
+    @command("HELLO", arity=-1, flags=("fast", "noscript", "loading", "stale"))
+    def _handle_hello_command(self, client, command_args):
+        """
+        HELLO [protover [AUTH username password] [SETNAME clientname]]
+        Switches the protocol of the replies and returns the server properties as a map
+        There are no passwords, AUTH only checks the user is the default one
+        """
+        protocol_version = client.protocol_version
+        if command_args:
+            try:
+                protocol_version = int(command_args[0])
+            except ValueError:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "ERR Protocol version is not an integer or out of range"
+                )
+            if protocol_version not in SUPPORTED_PROTOCOL_VERSIONS:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "NOPROTO unsupported protocol version"
+                )
+
+        name = None
+        idx = 1
+        while idx < len(command_args):
+            token = normalize_token(command_args[idx])
+            if token == "AUTH" and idx + 2 < len(command_args):
+                if bytes(command_args[idx + 1]) != b"default":
+                    return self.response_builder.build_response(
+                        Protocol_2_Data_Types.ERROR,
+                        "WRONGPASS invalid username-password pair or user is disabled.",
+                    )
+                idx += 3
+            elif token == "SETNAME" and idx + 1 < len(command_args):
+                name = bytes(command_args[idx + 1])
+                if b" " in name:
+                    return self.response_builder.build_response(
+                        Protocol_2_Data_Types.ERROR, "ERR Client names cannot contain spaces, newlines or special characters."
+                    )
+                idx += 2
+            else:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, f"ERR Syntax error in HELLO option '{token.lower()}'"
+                )
+
+        if name is not None:
+            client.name = name
+        client.protocol_version = protocol_version
+        # The reply and the rest of the batch already use the new protocol
+        self.response_builder = self.response_builders[protocol_version]
+        return self.response_builder.build_response(Protocol_3_Data_Types.MAP, {
+            b"server": b"redis",
+            b"version": REDIS_VERSION.encode(),
+            b"proto": protocol_version,
+            b"id": client.id,
+            b"mode": b"cluster" if self.cluster is not None else b"standalone",
+            b"role": b"replica" if self.master_host is not None else b"master",
+            b"modules": [],
+        })
+
+    @command("CLIENT", arity=-2, flags=("admin", "noscript", "loading", "stale"))
+    def _handle_client_command(self, client, command_args):
+        """
+        CLIENT ID | GETNAME | SETNAME name | SETINFO attr value | GETREDIR | TRACKING ...
+        """
+        subcommand = normalize_token(command_args[0])
+        if subcommand == "ID" and len(command_args) == 1:
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, client.id)
+        if subcommand == "GETNAME" and len(command_args) == 1:
+            return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, client.name or None)
+        if subcommand == "SETNAME" and len(command_args) == 2:
+            name = bytes(command_args[1])
+            if b" " in name:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "ERR Client names cannot contain spaces, newlines or special characters."
+                )
+            client.name = name
+            return self.response_builder.respond_with_ok()
+        if subcommand == "SETINFO" and len(command_args) == 3:
+            # Library name and version sent by clients on connect, not shown anywhere yet
+            return self.response_builder.respond_with_ok()
+        if subcommand == "GETREDIR" and len(command_args) == 1:
+            redirect = client.tracking_redirect if client.tracking else -1
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, redirect)
+        if subcommand == "TRACKING" and len(command_args) >= 2:
+            return self._client_tracking(client, command_args[1:])
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.ERROR,
+            f"ERR unknown subcommand or wrong number of arguments for '{subcommand}'. Try CLIENT HELP.",
+        )
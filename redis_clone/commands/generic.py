@@ -0,0 +1,236 @@
+from redis_clone.commands.registry import command, normalize_token
+from redis_clone.commands.strings import INTEGER_MAX, INTEGER_MIN, parse_integer
+from redis_clone.glob import compile_pattern
+from redis_clone.hashes import Hash
+from redis_clone.quicklist import Quicklist
+from redis_clone.zsets import SortedSet
+from redis_clone.keyspace import WRONGTYPE_ERROR, now_ms, value_type
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+
+# Cursors are unsigned 64 bit integers, same as redis
+CURSOR_MAX = (1 << 64) - 1
+# Keys asked of every step of the iteration behind KEYS
+KEYS_SCAN_COUNT = 1024
+
+
+class GenericCommandsMixin:
+    """
+    Commands working on keys of any type
+    """
+
+    def _wrong_type(self):
+        return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, WRONGTYPE_ERROR)
+
+    @command("DEL", arity=-2, flags=("write",), first_key=1, last_key=-1, step=1)
+    def _handle_del_command(self, client, command_args):
+        keys_deleted = 0
+        for key in command_args:
+            if self.keyspace.delete(key):
+                keys_deleted += 1
+
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.INTEGER, keys_deleted
+        )
+
+    @command("EXISTS", arity=-2, flags=("readonly", "fast"), first_key=1, last_key=-1, step=1)
+    def _handle_exists_command(self, client, command_args):
+        """
+        Returns the number of keys that exist, a key given twice is counted twice
+        """
+        existing = 0
+        for key in command_args:
+            if self.keyspace.exists(key):
+                existing += 1
+
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.INTEGER, existing
+        )
+
+    @command("TTL", arity=2, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_ttl_command(self, client, command_args):
+        return self._get_ttl(command_args[0], milliseconds=False)
+
+    @command("PTTL", arity=2, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_pttl_command(self, client, command_args):
+        return self._get_ttl(command_args[0], milliseconds=True)
+
+    def _get_ttl(self, key, milliseconds):
+        """
+        TTL and PTTL return the remaining time to live of a key
+        -2 if the key does not exist and -1 if it has no ttl
+        """
+        if not self.keyspace.exists(key):
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, -2)
+
+        deadline_ms = self.keyspace.get_deadline(key)
+        if deadline_ms is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, -1)
+
+        ttl_ms = max(deadline_ms - now_ms(), 0)
+        if milliseconds:
+            ttl = ttl_ms
+        else:
+            # Rounded like redis does
+            ttl = (ttl_ms + 500) // 1000
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, ttl)
+
+    @command("EXPIRE", arity=3, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_expire_command(self, client, command_args):
+        return self._set_expire("expire", command_args, lambda when: now_ms() + when * 1000)
+
+    @command("PEXPIRE", arity=3, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_pexpire_command(self, client, command_args):
+        return self._set_expire("pexpire", command_args, lambda when: now_ms() + when)
+
+    @command("EXPIREAT", arity=3, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_expireat_command(self, client, command_args):
+        return self._set_expire("expireat", command_args, lambda when: when * 1000)
+
+    @command("PEXPIREAT", arity=3, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_pexpireat_command(self, client, command_args):
+        return self._set_expire("pexpireat", command_args, lambda when: when)
+
+    def _set_expire(self, command_name, command_args, to_deadline_ms):
+        """
+        EXPIRE, PEXPIRE, EXPIREAT and PEXPIREAT set the deadline of a key
+        Returns 1 if the deadline was set, 0 if the key does not exist
+        A deadline in the past deletes the key
+        """
+        key = command_args[0]
+        when = parse_integer(command_args[1])
+        if when is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR value is not an integer or out of range",
+            )
+
+        deadline_ms = to_deadline_ms(when)
+        if not INTEGER_MIN <= deadline_ms <= INTEGER_MAX:
+            # Deadlines are 64 bit milliseconds, in snapshots too
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                f"ERR invalid expire time in '{command_name}' command",
+            )
+
+        if not self.keyspace.exists(key):
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 0)
+
+        if deadline_ms <= now_ms():
+            self.keyspace.delete(key)
+            self.rewrite_propagated_command("DEL", [key])
+        else:
+            self.keyspace.set_deadline(key, deadline_ms)
+            self.rewrite_propagated_command("PEXPIREAT", [key, deadline_ms])
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 1)
+
+    @command("PERSIST", arity=2, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_persist_command(self, client, command_args):
+        """
+        Removes the ttl of a key, returns 1 if the ttl was removed
+        """
+        key = command_args[0]
+        persisted = self.keyspace.exists(key) and self.keyspace.persist(key)
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.INTEGER, 1 if persisted else 0
+        )
+
+    @command("TYPE", arity=2, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_type_command(self, client, command_args):
+        value = self.keyspace.lookup(command_args[0])
+        type_name = "none" if value is None else value_type(value)
+        return self.response_builder.build_response(Protocol_2_Data_Types.SIMPLE_STRING, type_name)
+
+    @command("OBJECT", arity=-2, flags=("readonly",), first_key=2, last_key=2, step=1)
+    def _handle_object_command(self, client, command_args):
+        """
+        OBJECT ENCODING key, the internal representation of the value
+        """
+        subcommand = normalize_token(command_args[0])
+        if subcommand != "ENCODING" or len(command_args) != 2:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                f"ERR unknown subcommand or wrong number of arguments for '{subcommand}'. Try OBJECT HELP.",
+            )
+        value = self.keyspace.lookup(command_args[1])
+        if value is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, None)
+        if type(value) is Hash or type(value) is SortedSet or type(value) is Quicklist:
+            encoding = value.encoding
+        elif type(value) is int:
+            encoding = "int"
+        else:
+            # Same limit as redis OBJ_ENCODING_EMBSTR_SIZE_LIMIT, kept for compatibility
+            encoding = "embstr" if len(value) <= 44 else "raw"
+        return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, encoding)
+
+    @command("DBSIZE", arity=1, flags=("readonly", "fast"))
+    def _handle_dbsize_command(self, client, command_args):
+        """
+        Number of keys, including the expired ones not reclaimed yet, same as redis
+        """
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, len(self.keyspace))
+
+    @command("SCAN", arity=-2, flags=("readonly",))
+    def _handle_scan_command(self, client, command_args):
+        """
+        SCAN cursor [MATCH pattern] [COUNT count] [TYPE type]
+        Returns the cursor to continue from, 0 once done, and a few keys. Every call does a
+        bounded amount of work, see KeyTable.scan for what's guaranteed across calls.
+        MATCH and TYPE filter the keys after they're read, so a call can return none
+        """
+        try:
+            cursor = int(command_args[0])
+        except ValueError:
+            cursor = -1
+        if not 0 <= cursor <= CURSOR_MAX:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR invalid cursor")
+
+        match = None
+        count = 10
+        type_name = None
+        idx = 1
+        while idx < len(command_args):
+            token = normalize_token(command_args[idx])
+            if idx + 1 >= len(command_args):
+                return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+            if token == "MATCH":
+                match = compile_pattern(command_args[idx + 1])
+            elif token == "COUNT":
+                try:
+                    count = int(command_args[idx + 1])
+                except ValueError:
+                    return self.response_builder.build_response(
+                        Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+                    )
+                if count < 1:
+                    return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+            elif token == "TYPE":
+                type_name = normalize_token(command_args[idx + 1]).lower()
+            else:
+                return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+            idx += 2
+
+        keys, cursor = self.keyspace.scan(cursor, count)
+        if match is not None:
+            keys = [key for key in keys if match(key)]
+        if type_name is not None:
+            data = self.keyspace.data
+            keys = [key for key in keys if value_type(data[key]) == type_name]
+        return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, [b"%d" % cursor, keys])
+
+    @command("KEYS", arity=2, flags=("readonly",))
+    def _handle_keys_command(self, client, command_args):
+        """
+        KEYS pattern, every matching key at once. It's a full iteration with the SCAN
+        iterator, O(keys) in a single call, so SCAN is the one for large keyspaces
+        """
+        match = compile_pattern(command_args[0])
+        result = []
+        cursor = 0
+        while True:
+            # Expired keys are only skipped, deleting them could shrink the table mid iteration
+            keys, cursor = self.keyspace.scan(cursor, KEYS_SCAN_COUNT, delete_expired=False)
+            result.extend(keys if match is None else [key for key in keys if match(key)])
+            if not cursor:
+                break
+        return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, result)
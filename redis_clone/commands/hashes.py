@@ -0,0 +1,145 @@
+import sys
+
+from redis_clone.commands.registry import command
+from redis_clone.commands.strings import INTEGER_MAX, INTEGER_MIN, parse_integer
+from redis_clone.hashes import Hash
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types, Protocol_3_Data_Types
+
+
+class HashCommandsMixin:
+    """
+    Commands working on hash values, see redis_clone/hashes.py for their encodings
+    """
+
+    def _lookup_hash(self, key):
+        """
+        Returns the hash at key, None if it doesn't exist or False if the key holds another type
+        """
+        value = self.keyspace.lookup(key)
+        if value is None or type(value) is Hash:
+            return value
+        return False
+
+    def _hash_set(self, key, hash_value, pairs):
+        """
+        Sets the field and value pairs of the hash at key, creating it if needed
+        Returns the number of new fields
+        """
+        if hash_value is None:
+            hash_value = Hash()
+            self.keyspace.set(key, hash_value)
+        old_size = sys.getsizeof(hash_value)
+        max_entries = self.config["hash-max-listpack-entries"]
+        max_value = self.config["hash-max-listpack-value"]
+        added = 0
+        for idx in range(0, len(pairs), 2):
+            if hash_value.set(pairs[idx], pairs[idx + 1], max_entries, max_value):
+                added += 1
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += len(pairs) // 2
+        return added
+
+    @command("HSET", arity=-4, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_hset_command(self, client, command_args):
+        """
+        HSET key field value [field value ...], returns the number of fields added
+        """
+        if len(command_args) % 2 == 0:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR wrong number of arguments for 'HSET' command"
+            )
+        hash_value = self._lookup_hash(command_args[0])
+        if hash_value is False:
+            return self._wrong_type()
+        added = self._hash_set(command_args[0], hash_value, command_args[1:])
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, added)
+
+    @command("HGET", arity=3, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_hget_command(self, client, command_args):
+        hash_value = self._lookup_hash(command_args[0])
+        if hash_value is False:
+            return self._wrong_type()
+        value = hash_value.get(command_args[1]) if hash_value is not None else None
+        return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, value)
+
+    @command("HMGET", arity=-3, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_hmget_command(self, client, command_args):
+        hash_value = self._lookup_hash(command_args[0])
+        if hash_value is False:
+            return self._wrong_type()
+        if hash_value is None:
+            values = [None] * (len(command_args) - 1)
+        else:
+            values = [hash_value.get(field) for field in command_args[1:]]
+        return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, values)
+
+    @command("HDEL", arity=-3, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_hdel_command(self, client, command_args):
+        """
+        Returns the number of fields deleted, the key is deleted with its last field
+        """
+        key = command_args[0]
+        hash_value = self._lookup_hash(key)
+        if hash_value is False:
+            return self._wrong_type()
+        if hash_value is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 0)
+
+        old_size = sys.getsizeof(hash_value)
+        deleted = 0
+        for field in command_args[1:]:
+            if hash_value.delete(field):
+                deleted += 1
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += deleted
+        if not len(hash_value):
+            self.keyspace.delete(key)
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, deleted)
+
+    @command("HGETALL", arity=2, flags=("readonly",), first_key=1, last_key=1, step=1)
+    def _handle_hgetall_command(self, client, command_args):
+        """
+        Fields and values as a map for RESP3 clients, alternated in a flat array for RESP2
+        """
+        hash_value = self._lookup_hash(command_args[0])
+        if hash_value is False:
+            return self._wrong_type()
+        items = dict(hash_value.items()) if hash_value is not None else {}
+        return self.response_builder.build_response(Protocol_3_Data_Types.MAP, items)
+
+    @command("HLEN", arity=2, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_hlen_command(self, client, command_args):
+        hash_value = self._lookup_hash(command_args[0])
+        if hash_value is False:
+            return self._wrong_type()
+        length = len(hash_value) if hash_value is not None else 0
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, length)
+
+    @command("HINCRBY", arity=4, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_hincrby_command(self, client, command_args):
+        """
+        Adds an integer increment to the value of field, a missing field counts as 0
+        """
+        key, field = command_args[0], command_args[1]
+        increment = parse_integer(command_args[2])
+        if increment is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+        hash_value = self._lookup_hash(key)
+        if hash_value is False:
+            return self._wrong_type()
+
+        value = hash_value.get(field) if hash_value is not None else None
+        current = 0 if value is None else parse_integer(value)
+        if current is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR hash value is not an integer"
+            )
+        new_value = current + increment
+        if not INTEGER_MIN <= new_value <= INTEGER_MAX:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR increment or decrement would overflow"
+            )
+        self._hash_set(key, hash_value, [field, b"%d" % new_value])
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, new_value)
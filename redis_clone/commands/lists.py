@@ -0,0 +1,287 @@
+import asyncio
+import math
+import sys
+from collections import deque
+
+from redis_clone.commands.registry import command
+from redis_clone.commands.strings import parse_integer
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+from redis_clone.quicklist import Quicklist, node_size_limit
+
+# Returned by the handler of a blocking command which found nothing to pop, the connection
+# waits for the client to be served or to time out instead of sending a reply
+BLOCKED_RESPONSE = object()
+
+
+def parse_timeout(data):
+    """
+    Parses the timeout of a blocking command, seconds as a float where 0 means forever
+    Returns None if it isn't a valid float
+    """
+    try:
+        timeout = float(data)
+    except ValueError:
+        return None
+    if not math.isfinite(timeout):
+        return None
+    return timeout
+
+
+class ListCommandsMixin:
+    """
+    Commands working on list values, see redis_clone/quicklist.py for their encoding
+
+    BLPOP and BRPOP park the client on the keys they wait for, same as redis blocked.c:
+        the handler registers the client in blocking_keys and returns BLOCKED_RESPONSE
+        the connection awaits client.blocked_future, see RedisServer._wait_until_unblocked
+        a push to a key with waiting clients marks it ready and once the pushing command is
+        done _process_command calls serve_blocked_clients, which pops for the waiting clients
+        in the order they blocked and resolves their future with the reply
+    Nothing runs while clients wait, a timeout is a single timer of the event loop.
+    """
+
+    def _init_lists(self):
+        fill = self.config["list-max-listpack-size"]
+        if fill <= 0:
+            # Fails at startup rather than on the first push
+            node_size_limit(fill)
+        # Key -> deque of the clients blocked on it, oldest first
+        self.blocking_keys = {}
+        # Keys with blocked clients which got pushed to by the running command
+        self.ready_keys = {}
+        self.blocked_clients = 0
+
+    def _lookup_list(self, key):
+        """
+        Returns the list at key, None if it doesn't exist or False if the key holds another type
+        """
+        value = self.keyspace.lookup(key)
+        if value is None or type(value) is Quicklist:
+            return value
+        return False
+
+    def _list_pop(self, key, quicklist, left):
+        """
+        Pops an entry of the list at key, the key is deleted with its last entry
+        """
+        old_size = sys.getsizeof(quicklist)
+        entry = quicklist.pop(left)
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += 1
+        if not len(quicklist):
+            self.keyspace.delete(key)
+        return entry
+
+    def _push(self, command_args, left):
+        key = command_args[0]
+        quicklist = self._lookup_list(key)
+        if quicklist is False:
+            return self._wrong_type()
+        if quicklist is None:
+            quicklist = Quicklist()
+            self.keyspace.set(key, quicklist)
+        old_size = sys.getsizeof(quicklist)
+        fill = self.config["list-max-listpack-size"]
+        for entry in command_args[1:]:
+            quicklist.push(entry, fill, left)
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += len(command_args) - 1
+        if self.blocking_keys and bytes(key) in self.blocking_keys:
+            self.ready_keys[bytes(key)] = None
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, len(quicklist))
+
+    @command("LPUSH", arity=-3, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_lpush_command(self, client, command_args):
+        """
+        LPUSH key element [element ...], every element is pushed to the head in turn
+        Returns the length of the list
+        """
+        return self._push(command_args, left=True)
+
+    @command("RPUSH", arity=-3, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_rpush_command(self, client, command_args):
+        return self._push(command_args, left=False)
+
+    def _pop(self, command_args, left):
+        """
+        LPOP/RPOP key [count], a single entry without count or an array of up to count entries
+        """
+        key = command_args[0]
+        count = None
+        if len(command_args) > 2:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+        if len(command_args) == 2:
+            count = parse_integer(command_args[1])
+            if count is None or count < 0:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "ERR value is out of range, must be positive"
+                )
+
+        quicklist = self._lookup_list(key)
+        if quicklist is False:
+            return self._wrong_type()
+        if quicklist is None:
+            if count is None:
+                return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, None)
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, None)
+        if count is None:
+            entry = self._list_pop(key, quicklist, left)
+            return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, entry)
+
+        old_size = sys.getsizeof(quicklist)
+        entries = [quicklist.pop(left) for _ in range(min(count, len(quicklist)))]
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += len(entries)
+        if not len(quicklist):
+            self.keyspace.delete(key)
+        return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, entries)
+
+    @command("LPOP", arity=-2, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_lpop_command(self, client, command_args):
+        return self._pop(command_args, left=True)
+
+    @command("RPOP", arity=-2, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_rpop_command(self, client, command_args):
+        return self._pop(command_args, left=False)
+
+    @command("LLEN", arity=2, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_llen_command(self, client, command_args):
+        quicklist = self._lookup_list(command_args[0])
+        if quicklist is False:
+            return self._wrong_type()
+        length = len(quicklist) if quicklist is not None else 0
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, length)
+
+    @command("LINDEX", arity=3, flags=("readonly",), first_key=1, last_key=1, step=1)
+    def _handle_lindex_command(self, client, command_args):
+        index = parse_integer(command_args[1])
+        if index is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+        quicklist = self._lookup_list(command_args[0])
+        if quicklist is False:
+            return self._wrong_type()
+        entry = quicklist.index(index) if quicklist is not None else None
+        return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, entry)
+
+    @command("LRANGE", arity=4, flags=("readonly",), first_key=1, last_key=1, step=1)
+    def _handle_lrange_command(self, client, command_args):
+        """
+        LRANGE key start stop, stop is included and negative indexes count from the end
+        """
+        start = parse_integer(command_args[1])
+        stop = parse_integer(command_args[2])
+        if start is None or stop is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+        quicklist = self._lookup_list(command_args[0])
+        if quicklist is False:
+            return self._wrong_type()
+        if quicklist is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, [])
+
+        length = len(quicklist)
+        if start < 0:
+            start = max(start + length, 0)
+        if stop < 0:
+            stop += length
+        stop = min(stop, length - 1)
+        return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, quicklist.range(start, stop))
+
+    def _blocking_pop(self, client, command_args, left):
+        """
+        BLPOP/BRPOP key [key ...] timeout
+        Pops from the first non empty list, or blocks until one of the keys gets pushed to
+        """
+        timeout = parse_timeout(command_args[-1])
+        if timeout is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR timeout is not a float or out of range"
+            )
+        if timeout < 0:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR timeout is negative")
+
+        keys = command_args[:-1]
+        for key in keys:
+            quicklist = self._lookup_list(key)
+            if quicklist is False:
+                return self._wrong_type()
+            if quicklist is not None:
+                entry = self._list_pop(key, quicklist, left)
+                # Replaying the log must not block, it gets the pop itself
+                self.rewrite_propagated_command("LPOP" if left else "RPOP", [key])
+                return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, [key, entry])
+
+        if client is None or client.in_exec:
+            # Commands replayed from the log or the primary have no connection to block and
+            # a transaction can't wait in the middle, both time out right away
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, None)
+        self.block_client(client, [bytes(key) for key in keys], timeout, left)
+        return BLOCKED_RESPONSE
+
+    @command("BLPOP", arity=-3, flags=("write", "blocking"), first_key=1, last_key=-2, step=1)
+    def _handle_blpop_command(self, client, command_args):
+        return self._blocking_pop(client, command_args, left=True)
+
+    @command("BRPOP", arity=-3, flags=("write", "blocking"), first_key=1, last_key=-2, step=1)
+    def _handle_brpop_command(self, client, command_args):
+        return self._blocking_pop(client, command_args, left=False)
+
+    def block_client(self, client, keys, timeout, left):
+        client.blocked_keys = keys
+        client.blocked_timeout = timeout
+        client.blocked_left = left
+        client.blocked_future = asyncio.get_running_loop().create_future()
+        for key in keys:
+            waiting = self.blocking_keys.get(key)
+            if waiting is None:
+                waiting = self.blocking_keys[key] = deque()
+            waiting.append(client)
+        self.blocked_clients += 1
+
+    def unblock_client(self, client):
+        """
+        Removes client from the keys it waits for, its future is left as it is
+        """
+        if client.blocked_future is None:
+            return
+        for key in client.blocked_keys:
+            waiting = self.blocking_keys[key]
+            waiting.remove(client)
+            if not waiting:
+                del self.blocking_keys[key]
+        client.blocked_keys = ()
+        client.blocked_future = None
+        self.blocked_clients -= 1
+
+    def serve_blocked_clients(self):
+        """
+        Pops for the clients blocked on the keys pushed to by the command which just ran
+        The pops are propagated as LPOP/RPOP right after the push, so replicas and the log
+        see the same list
+        """
+        ready_keys, self.ready_keys = self.ready_keys, {}
+        for key in ready_keys:
+            waiting = self.blocking_keys.get(key)
+            while waiting:
+                quicklist = self._lookup_list(key)
+                if not quicklist:
+                    break
+                client = waiting[0]
+                future = client.blocked_future
+                left = client.blocked_left
+                self.unblock_client(client)
+                entry = self._list_pop(key, quicklist, left)
+                self.touch_watched_key(key)
+                flushed = None
+                if self.aof is not None or self.repl_backlog is not None:
+                    self.propagate("LPOP" if left else "RPOP", [key])
+                    if self.aof is not None:
+                        # Same as the replies of writes, the client gets the entry once the pop is in the file
+                        flushed = self.aof.wait_for_flush()
+                response_builder = self.response_builders[client.protocol_version]
+                future.set_result((response_builder.build_response(Protocol_2_Data_Types.ARRAY, [key, entry]), flushed))
+                # BLPOP waiting on several keys is not served twice
+                waiting = self.blocking_keys.get(key)
@@ -0,0 +1,157 @@
+from redis_clone.commands.registry import command
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+
+QUEUED_RESPONSE = b"+QUEUED\r\n"
+EXECABORT_ERROR = "EXECABORT Transaction discarded because of previous errors."
+
+# Commands run right away inside MULTI instead of being queued
+TRANSACTION_COMMANDS = {"MULTI", "EXEC", "DISCARD", "WATCH", "UNWATCH"}
+
+
+class TransactionCommandsMixin:
+    """
+    MULTI/EXEC transactions and WATCH, same as redis multi.c
+
+    Between MULTI and EXEC the commands of a client are only queued, see _process_command.
+    EXEC runs them back to back, nothing else runs in between since handlers are synchronous,
+    and replies with all their replies in one array.
+
+    WATCH is optimistic locking through version counters. Every watched key has a version,
+    bumped by every write which changed the key and when it expires or is evicted. A client remembers
+    the versions of the keys it watches and EXEC compares them, so a check costs
+    O(watched keys) and keys nobody watches cost nothing.
+    """
+
+    def _init_transactions(self):
+        # Key -> [version, number of clients watching it], only for keys being watched
+        self.watched_keys = {}
+        # None outside of EXEC, inside it whether MULTI was propagated, see propagate
+        self._exec_multi_propagated = None
+
+    def touch_watched_key(self, key):
+        """
+        Called with every key modified, makes the transactions watching it fail
+        """
+        entry = self.watched_keys.get(key)
+        if entry is not None:
+            entry[0] += 1
+
+    def touch_all_watched_keys(self):
+        """
+        Called when every key is deleted at once, makes every transaction watching a key fail
+        """
+        for entry in self.watched_keys.values():
+            entry[0] += 1
+
+    def queue_multi_command(self, client, command_name, command_args):
+        client.multi_state.append((command_name, command_args))
+        return QUEUED_RESPONSE
+
+    def flag_multi_error(self, client):
+        """
+        Called when a command can't be queued, EXEC then discards the transaction
+        """
+        if client is not None and client.multi_state is not None:
+            client.multi_error = True
+
+    def _discard_transaction(self, client):
+        client.multi_state = None
+        client.multi_error = False
+        self._unwatch_all_keys(client)
+
+    def _unwatch_all_keys(self, client):
+        watched_keys = self.watched_keys
+        for key in client.watched_keys:
+            entry = watched_keys[key]
+            entry[1] -= 1
+            if not entry[1]:
+                del watched_keys[key]
+        client.watched_keys = {}
+
+    @command("MULTI", arity=1, flags=("fast", "noscript"))
+    def _handle_multi_command(self, client, command_args):
+        if client is None:
+            # Replayed from the log, commands run as they come since nothing runs in between
+            return self.response_builder.respond_with_ok()
+        if client.multi_state is not None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR MULTI calls can not be nested"
+            )
+        client.multi_state = []
+        client.multi_error = False
+        return self.response_builder.respond_with_ok()
+
+    @command("DISCARD", arity=1, flags=("fast", "noscript"))
+    def _handle_discard_command(self, client, command_args):
+        if client is None or client.multi_state is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR DISCARD without MULTI")
+        self._discard_transaction(client)
+        return self.response_builder.respond_with_ok()
+
+    @command("EXEC", arity=1, flags=("noscript",))
+    def _handle_exec_command(self, client, command_args):
+        """
+        Runs the queued commands, replies with an array of their replies
+        A nil reply means a watched key was modified and nothing ran
+        """
+        if client is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, [])
+        if client.multi_state is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR EXEC without MULTI")
+        if client.multi_error:
+            self._discard_transaction(client)
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, EXECABORT_ERROR)
+
+        watched_keys = self.watched_keys
+        for key, version in client.watched_keys.items():
+            # A key which expired since WATCH was modified, reclaiming it bumps its version
+            self.keyspace.expire_if_needed(key)
+            if watched_keys[key][0] != version:
+                self._discard_transaction(client)
+                return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, None)
+
+        queued = client.multi_state
+        self._discard_transaction(client)
+        # Replies are already encoded, the array is built around them
+        response = bytearray(b"*%d\r\n" % len(queued))
+        client.in_exec = True
+        # Replicas and the log get the writes wrapped the same way, so they are applied
+        # together. MULTI is propagated with the first write which changed something
+        self._exec_multi_propagated = False
+        try:
+            for command_name, queued_args in queued:
+                response += self._process_command(command_name, queued_args, client)
+        finally:
+            client.in_exec = False
+            multi_propagated, self._exec_multi_propagated = self._exec_multi_propagated, None
+        if multi_propagated:
+            self.propagate("EXEC", [])
+        return response
+
+    @command("WATCH", arity=-2, flags=("fast", "noscript"), first_key=1, last_key=-1, step=1)
+    def _handle_watch_command(self, client, command_args):
+        if client is None:
+            return self.response_builder.respond_with_ok()
+        if client.multi_state is not None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR WATCH inside MULTI is not allowed"
+            )
+        watched_keys = self.watched_keys
+        for key in command_args:
+            key = bytes(key)
+            if key in client.watched_keys:
+                continue
+            # Already expired keys are reclaimed now, so they don't count as modified by EXEC
+            self.keyspace.expire_if_needed(key)
+            entry = watched_keys.get(key)
+            if entry is None:
+                entry = watched_keys[key] = [0, 0]
+            entry[1] += 1
+            client.watched_keys[key] = entry[0]
+        return self.response_builder.respond_with_ok()
+
+    @command("UNWATCH", arity=1, flags=("fast", "noscript"))
+    def _handle_unwatch_command(self, client, command_args):
+        if client is not None:
+            self._unwatch_all_keys(client)
+        return self.response_builder.respond_with_ok()
@@ -0,0 +1,322 @@
+import asyncio
+import gc
+import logging
+import os
+import time
+
+from redis_clone import aof, rdb
+from redis_clone.commands.registry import command
+from redis_clone.keyspace import EXPIRE_IGNORE, now_ms
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+
+logger = logging.getLogger(__name__)
+
+
+class PersistenceCommandsMixin:
+    """
+    Snapshots of the keyspace, SAVE writes them in the foreground and BGSAVE in a forked
+    child process which gets a copy on write view of the keyspace frozen at fork time
+
+    With appendonly enabled write commands are also logged to the append only file,
+    which BGREWRITEAOF compacts the same way BGSAVE writes a snapshot
+    """
+
+    def _init_persistence(self):
+        self.rdb_child_pid = None
+        self.rdb_child_start = None
+        self.rdb_child_changes = 0
+        # Open append only file, None when appendonly is disabled
+        self.aof = None
+        self.aof_child_pid = None
+        self.aof_child_start = None
+        self.aof_rewrite_scheduled = False
+        self.stats.update({
+            "rdb_changes_since_last_save": 0,
+            "rdb_bgsave_in_progress": 0,
+            "rdb_last_save_time": int(time.time()),
+            "rdb_last_bgsave_status": "ok",
+            "rdb_last_save_duration_ms": -1,
+            "rdb_last_save_size": -1,
+            "rdb_last_load_time_ms": -1,
+            "rdb_last_load_keys": 0,
+            "aof_enabled": int(self.config["appendonly"]),
+            "aof_rewrite_in_progress": 0,
+            "aof_rewrite_scheduled": 0,
+            "aof_last_rewrite_time_ms": -1,
+            "aof_last_bgrewrite_status": "ok",
+            "aof_base_size": 0,
+            "aof_last_load_commands": 0,
+        })
+
+    def _rdb_path(self):
+        return os.path.join(self.config["dir"], self.config["dbfilename"])
+
+    def _aof_path(self):
+        return os.path.join(self.config["dir"], self.config["appendfilename"])
+
+    @command("SAVE", arity=1, flags=("admin", "noscript"))
+    def _handle_save_command(self, client, command_args):
+        if self.rdb_child_pid is not None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR Background save already in progress"
+            )
+        if not self.rdb_save():
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR")
+        return self.response_builder.respond_with_ok()
+
+    @command("BGSAVE", arity=-1, flags=("admin", "noscript"))
+    def _handle_bgsave_command(self, client, command_args):
+        if self.rdb_child_pid is not None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR Background save already in progress"
+            )
+        if self.aof_child_pid is not None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR Another child process is active (AOF?): can't BGSAVE right now"
+            )
+        if not self.rdb_background_save():
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR")
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.SIMPLE_STRING, "Background saving started"
+        )
+
+    @command("BGREWRITEAOF", arity=1, flags=("admin", "noscript"))
+    def _handle_bgrewriteaof_command(self, client, command_args):
+        if self.aof_child_pid is not None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR Background append only file rewriting already in progress"
+            )
+        if self.rdb_child_pid is not None:
+            # Started by the server cron once the snapshot is written
+            self.aof_rewrite_scheduled = True
+            self.stats["aof_rewrite_scheduled"] = 1
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.SIMPLE_STRING, "Background append only file rewriting scheduled"
+            )
+        if not self.aof_background_rewrite():
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR Can't execute an AOF background rewriting"
+            )
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.SIMPLE_STRING, "Background append only file rewriting started"
+        )
+
+    @command("LASTSAVE", arity=1, flags=("fast", "loading", "stale"))
+    def _handle_lastsave_command(self, client, command_args):
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.INTEGER, self.stats["rdb_last_save_time"]
+        )
+
+    def rdb_save(self):
+        """
+        Writes the snapshot in the foreground, the event loop is blocked until it's done
+        """
+        start = time.monotonic()
+        changes = self.stats["rdb_changes_since_last_save"]
+        try:
+            size = rdb.dump(self.keyspace, self._rdb_path())
+        except Exception as e:
+            logger.error(f"Error saving the snapshot: {e}")
+            self.stats["rdb_last_bgsave_status"] = "err"
+            return False
+
+        self._rdb_save_done(start, size, changes)
+        return True
+
+    def rdb_background_save(self):
+        """
+        Forks a child which writes the snapshot while the parent keeps serving clients
+        The child's memory is a copy on write snapshot of the parent, so the keyspace
+        doesn't need to be copied or locked
+        """
+        if not hasattr(os, "fork"):
+            # No copy on write snapshots on this platform, fall back to a foreground save
+            return self.rdb_save()
+
+        self.rdb_child_start = time.monotonic()
+        self.rdb_child_changes = self.stats["rdb_changes_since_last_save"]
+        pid = os.fork()
+        if pid == 0:
+            # Child process, the garbage collector would touch every object and copy its page
+            gc.disable()
+            exit_code = 0
+            try:
+                rdb.dump(self.keyspace, self._rdb_path())
+            except BaseException as e:
+                logger.error(f"Error saving the snapshot: {e}")
+                exit_code = 1
+            os._exit(exit_code)
+
+        logger.info(f"Background saving started by pid {pid}")
+        self.rdb_child_pid = pid
+        self.stats["rdb_bgsave_in_progress"] = 1
+        return True
+
+    def _check_background_save(self):
+        """
+        Called by the server cron, reaps the child of BGSAVE once it exits
+        """
+        if self.rdb_child_pid is None:
+            return
+
+        pid, status = os.waitpid(self.rdb_child_pid, os.WNOHANG)
+        if pid == 0:
+            return
+
+        self.rdb_child_pid = None
+        self.stats["rdb_bgsave_in_progress"] = 0
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            logger.info("Background saving terminated with success")
+            self._rdb_save_done(self.rdb_child_start, os.path.getsize(self._rdb_path()), self.rdb_child_changes)
+            self._replication_snapshot_done(True)
+        else:
+            logger.error("Background saving error")
+            self.stats["rdb_last_bgsave_status"] = "err"
+            self._replication_snapshot_done(False)
+
+    def _rdb_save_done(self, start, size, changes):
+        # Writes done while the snapshot was written are kept as changes since the last save
+        self.stats["rdb_changes_since_last_save"] -= changes
+        self.stats["rdb_last_save_time"] = int(time.time())
+        self.stats["rdb_last_bgsave_status"] = "ok"
+        self.stats["rdb_last_save_duration_ms"] = int((time.monotonic() - start) * 1000)
+        self.stats["rdb_last_save_size"] = size
+
+    def aof_background_rewrite(self):
+        """
+        Forks a child which writes the commands recreating the keyspace to a temporary file
+        Writes done meanwhile are kept in the rewrite buffer and added to that file once the
+        child exits, then it replaces the append only file
+        Without appendonly only the file is written, the same as redis
+        """
+        self.aof_rewrite_scheduled = False
+        self.stats["aof_rewrite_scheduled"] = 0
+        temp_path = self._aof_path() + ".temp-rewrite"
+        self.aof_child_start = time.monotonic()
+
+        if not hasattr(os, "fork"):
+            # No copy on write snapshots on this platform, fall back to a foreground rewrite
+            try:
+                aof.rewrite(self.keyspace, temp_path)
+            except Exception as e:
+                logger.error(f"Error rewriting the append only file: {e}")
+                self.stats["aof_last_bgrewrite_status"] = "err"
+                return False
+            self._aof_rewrite_done(temp_path)
+            return True
+
+        if self.aof is not None:
+            self.aof.start_rewrite()
+        pid = os.fork()
+        if pid == 0:
+            # Child process, the garbage collector would touch every object and copy its page
+            gc.disable()
+            exit_code = 0
+            try:
+                aof.rewrite(self.keyspace, temp_path)
+            except BaseException as e:
+                logger.error(f"Error rewriting the append only file: {e}")
+                exit_code = 1
+            os._exit(exit_code)
+
+        logger.info(f"Background append only file rewriting started by pid {pid}")
+        self.aof_child_pid = pid
+        self.stats["aof_rewrite_in_progress"] = 1
+        return True
+
+    def _check_background_rewrite(self):
+        """
+        Called by the server cron, reaps the child of BGREWRITEAOF once it exits
+        and starts a rewrite scheduled while BGSAVE was running
+        """
+        if self.aof_child_pid is None:
+            if self.aof_rewrite_scheduled and self.rdb_child_pid is None:
+                self.aof_background_rewrite()
+            return
+
+        pid, status = os.waitpid(self.aof_child_pid, os.WNOHANG)
+        if pid == 0:
+            return
+
+        self.aof_child_pid = None
+        self.stats["aof_rewrite_in_progress"] = 0
+        temp_path = self._aof_path() + ".temp-rewrite"
+        if os.WIFEXITED(status) and os.WEXITSTATUS(status) == 0:
+            logger.info("Background append only file rewriting terminated with success")
+            self._aof_rewrite_done(temp_path)
+        else:
+            logger.error("Background append only file rewriting error")
+            self.stats["aof_last_bgrewrite_status"] = "err"
+            if self.aof is not None:
+                self.aof.abort_rewrite()
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def _aof_rewrite_done(self, temp_path):
+        if self.aof is not None:
+            self.aof.finish_rewrite(temp_path)
+        else:
+            os.replace(temp_path, self._aof_path())
+        self.stats["aof_base_size"] = os.path.getsize(self._aof_path())
+        self.stats["aof_last_rewrite_time_ms"] = int((time.monotonic() - self.aof_child_start) * 1000)
+        self.stats["aof_last_bgrewrite_status"] = "ok"
+
+    def aof_open(self):
+        """
+        Opens the append only file at startup, must be called from the running event loop
+        A server started with appendonly and no file yet writes one from the loaded keyspace,
+        otherwise a snapshot loaded at startup would be ignored on the next restart
+        """
+        path = self._aof_path()
+        if not os.path.exists(path):
+            aof.rewrite(self.keyspace, path)
+        self.aof = aof.AppendOnlyFile(
+            path,
+            fsync_policy=self.config["appendfsync"],
+            loop=asyncio.get_running_loop(),
+            stats=self.stats,
+        )
+        self.stats["aof_base_size"] = self.stats["aof_current_size"]
+
+    def aof_load(self):
+        """
+        Replays the append only file, returns False if there is none
+        """
+        path = self._aof_path()
+        if not os.path.exists(path):
+            return False
+
+        start = time.monotonic()
+        expire_mode, self.keyspace.expire_mode = self.keyspace.expire_mode, EXPIRE_IGNORE
+        try:
+            commands = aof.load(path, self._process_command)
+        finally:
+            self.keyspace.expire_mode = expire_mode
+        # Replayed writes are already on disk
+        self.stats["rdb_changes_since_last_save"] = 0
+        self.stats["aof_last_load_commands"] = commands
+        logger.info(f"Replayed {commands} commands from {path} in {int((time.monotonic() - start) * 1000)} ms")
+        return True
+
+    def load_data(self):
+        """
+        Loads the keyspace at startup, the append only file has all the writes so it's
+        preferred over the snapshot when appendonly is enabled
+        """
+        if self.config["appendonly"] and self.aof_load():
+            return
+        self.rdb_load()
+
+    def rdb_load(self):
+        """
+        Loads the snapshot at startup if there is one
+        """
+        path = self._rdb_path()
+        if not os.path.exists(path):
+            return
+
+        start = time.monotonic()
+        loaded = rdb.load(self.keyspace, path, now_ms())
+        self.stats["rdb_last_load_time_ms"] = int((time.monotonic() - start) * 1000)
+        self.stats["rdb_last_load_keys"] = loaded
+        logger.info(f"Loaded {loaded} keys from {path} in {self.stats['rdb_last_load_time_ms']} ms")
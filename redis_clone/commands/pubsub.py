@@ -0,0 +1,226 @@
+import logging
+import time
+
+from redis_clone.commands.registry import command, normalize_token
+from redis_clone.glob import compile_pattern
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types, Protocol_3_Data_Types
+from redis_clone.pubsub import PatternIndex
+
+logger = logging.getLogger(__name__)
+
+# Commands a RESP2 client can send once subscribed, its connection only carries messages
+PUBSUB_CONTEXT_COMMANDS = {"SUBSCRIBE", "UNSUBSCRIBE", "PSUBSCRIBE", "PUNSUBSCRIBE", "PING"}
+
+
+class PubSubCommandsMixin:
+    """
+    Publish/subscribe, same as redis pubsub.c
+
+    PUBLISH encodes a message once per protocol, and once per pattern for pattern
+    subscribers, and every subscriber gets the same bytes. Subscribers matching a pattern
+    are found through PatternIndex, see redis_clone/pubsub.py.
+
+    Messages are written straight to the transport of the subscriber, without waiting for
+    it to drain, so a slow subscriber never holds back the publisher. Instead what it has
+    pending is checked against client-output-buffer-limit-pubsub-*. Past the hard limit, or
+    past the soft one for longer than soft-seconds, the subscriber is disconnected.
+    """
+
+    def _init_pubsub(self):
+        # Channel -> subscribed clients, in the order they subscribed
+        self.pubsub_channels = {}
+        self.pubsub_patterns = PatternIndex()
+        self.stats.setdefault("client_output_buffer_limit_disconnections", 0)
+
+    def _pubsub_reply(self, kind, target, count):
+        """
+        Confirmation of a (un)subscription, a push for RESP3 clients
+        """
+        data_type = Protocol_3_Data_Types.PUSH if self.response_builder.resp3 else Protocol_2_Data_Types.ARRAY
+        return self.response_builder.build_response(data_type, [kind, target, count])
+
+    def _subscription_count(self, client):
+        return len(client.subscribed_channels) + len(client.subscribed_patterns)
+
+    def is_pubsub_context_rejected(self, client, command_name):
+        """
+        True for commands a subscribed RESP2 client is not allowed to send
+        """
+        return (
+            client.protocol_version == 2
+            and (client.subscribed_channels or client.subscribed_patterns)
+            and command_name not in PUBSUB_CONTEXT_COMMANDS
+        )
+
+    @command("SUBSCRIBE", arity=-2, flags=("pubsub", "noscript"))
+    def _handle_subscribe_command(self, client, command_args):
+        if client is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR SUBSCRIBE needs a connection")
+        response = bytearray()
+        for channel in command_args:
+            channel = bytes(channel)
+            if channel not in client.subscribed_channels:
+                client.subscribed_channels.add(channel)
+                subscribers = self.pubsub_channels.get(channel)
+                if subscribers is None:
+                    subscribers = self.pubsub_channels[channel] = {}
+                subscribers[client] = None
+            response += self._pubsub_reply(b"subscribe", channel, self._subscription_count(client))
+        return response
+
+    def _unsubscribe_channel(self, client, channel):
+        client.subscribed_channels.discard(channel)
+        subscribers = self.pubsub_channels.get(channel)
+        if subscribers is not None:
+            subscribers.pop(client, None)
+            if not subscribers:
+                del self.pubsub_channels[channel]
+
+    @command("UNSUBSCRIBE", arity=-1, flags=("pubsub", "noscript"))
+    def _handle_unsubscribe_command(self, client, command_args):
+        """
+        Without channels the client is unsubscribed from all of them
+        """
+        if client is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR UNSUBSCRIBE needs a connection")
+        channels = [bytes(channel) for channel in command_args] or list(client.subscribed_channels)
+        if not channels:
+            return self._pubsub_reply(b"unsubscribe", None, self._subscription_count(client))
+        response = bytearray()
+        for channel in channels:
+            self._unsubscribe_channel(client, channel)
+            response += self._pubsub_reply(b"unsubscribe", channel, self._subscription_count(client))
+        return response
+
+    @command("PSUBSCRIBE", arity=-2, flags=("pubsub", "noscript"))
+    def _handle_psubscribe_command(self, client, command_args):
+        if client is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR PSUBSCRIBE needs a connection")
+        response = bytearray()
+        for pattern in command_args:
+            pattern = bytes(pattern)
+            if self.pubsub_patterns.add(pattern, client):
+                client.subscribed_patterns.add(pattern)
+            response += self._pubsub_reply(b"psubscribe", pattern, self._subscription_count(client))
+        return response
+
+    @command("PUNSUBSCRIBE", arity=-1, flags=("pubsub", "noscript"))
+    def _handle_punsubscribe_command(self, client, command_args):
+        if client is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR PUNSUBSCRIBE needs a connection")
+        patterns = [bytes(pattern) for pattern in command_args] or list(client.subscribed_patterns)
+        if not patterns:
+            return self._pubsub_reply(b"punsubscribe", None, self._subscription_count(client))
+        response = bytearray()
+        for pattern in patterns:
+            if self.pubsub_patterns.remove(pattern, client):
+                client.subscribed_patterns.discard(pattern)
+            response += self._pubsub_reply(b"punsubscribe", pattern, self._subscription_count(client))
+        return response
+
+    def _pubsub_unsubscribe_all(self, client):
+        for channel in list(client.subscribed_channels):
+            self._unsubscribe_channel(client, channel)
+        for pattern in client.subscribed_patterns:
+            self.pubsub_patterns.remove(pattern, client)
+        client.subscribed_patterns = set()
+
+    @command("PUBLISH", arity=3, flags=("pubsub", "fast"))
+    def _handle_publish_command(self, client, command_args):
+        """
+        Returns the number of clients which got the message
+        """
+        receivers = self.publish(bytes(command_args[0]), bytes(command_args[1]))
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, receivers)
+
+    def publish(self, channel, message):
+        receivers = 0
+        subscribers = self.pubsub_channels.get(channel)
+        if subscribers:
+            encoded = {}
+            for subscriber in list(subscribers):
+                data = encoded.get(subscriber.protocol_version)
+                if data is None:
+                    data = encoded[subscriber.protocol_version] = self._encode_message(
+                        subscriber.protocol_version, [b"message", channel, message]
+                    )
+                self.deliver_message(subscriber, data)
+                receivers += 1
+
+        if len(self.pubsub_patterns):
+            for subscription in self.pubsub_patterns.matching(channel):
+                encoded = {}
+                for subscriber in list(subscription.clients):
+                    data = encoded.get(subscriber.protocol_version)
+                    if data is None:
+                        data = encoded[subscriber.protocol_version] = self._encode_message(
+                            subscriber.protocol_version, [b"pmessage", subscription.pattern, channel, message]
+                        )
+                    self.deliver_message(subscriber, data)
+                    receivers += 1
+        return receivers
+
+    def _encode_message(self, protocol_version, items):
+        response_builder = self.response_builders[protocol_version]
+        data_type = Protocol_3_Data_Types.PUSH if response_builder.resp3 else Protocol_2_Data_Types.ARRAY
+        # Immutable, the same object is handed to every subscriber
+        return bytes(response_builder.build_response(data_type, items))
+
+    def deliver_message(self, client, data):
+        """
+        Sends a message to a subscriber then checks its pending output against the limits
+        """
+        if client.writer.is_closing():
+            return
+        if client.output_buffer or client.replies_held:
+            # It's running commands or has tracking messages queued, both flush the buffer
+            # soon and the message must not overtake them
+            client.add_reply(data)
+        else:
+            client.writer.write(data)
+        self._check_pubsub_output_limits(client)
+
+    def _check_pubsub_output_limits(self, client):
+        hard_limit = self.config["client-output-buffer-limit-pubsub-hard"]
+        soft_limit = self.config["client-output-buffer-limit-pubsub-soft"]
+        if not hard_limit and not soft_limit:
+            return
+        size = client.output_buffer_size()
+        over_limit = hard_limit and size > hard_limit
+        if soft_limit and size > soft_limit:
+            # Over the soft limit for a while, a subscriber catching up after a burst is fine
+            now = time.monotonic()
+            if client.soft_limit_reached_time is None:
+                client.soft_limit_reached_time = now
+            soft_seconds = self.config["client-output-buffer-limit-pubsub-soft-seconds"]
+            over_limit = over_limit or now - client.soft_limit_reached_time > soft_seconds
+        else:
+            client.soft_limit_reached_time = None
+        if over_limit:
+            logger.warning(f"Subscriber {client.address} closed for overcoming of output buffer limits")
+            self.stats["client_output_buffer_limit_disconnections"] += 1
+            client.abort()
+
+    @command("PUBSUB", arity=-2, flags=("pubsub",))
+    def _handle_pubsub_command(self, client, command_args):
+        """
+        PUBSUB CHANNELS [pattern], NUMSUB [channel ...] and NUMPAT
+        """
+        subcommand = normalize_token(command_args[0])
+        if subcommand == "CHANNELS" and len(command_args) <= 2:
+            match = compile_pattern(command_args[1]) if len(command_args) == 2 else None
+            channels = [channel for channel in self.pubsub_channels if match is None or match(channel)]
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, channels)
+        if subcommand == "NUMSUB":
+            # A flat array with both protocols, same as redis, a channel can be asked twice
+            counts = []
+            for channel in command_args[1:]:
+                counts.append(channel)
+                counts.append(len(self.pubsub_channels.get(bytes(channel), ())))
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, counts)
+        if subcommand == "NUMPAT" and len(command_args) == 1:
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, len(self.pubsub_patterns))
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.ERROR,
+            f"ERR unknown subcommand or wrong number of arguments for '{subcommand}'. Try PUBSUB HELP.",
+        )
@@ -0,0 +1,155 @@
+"""
+Command registry, every command is described once with its handler and metadata
+
+Metadata follows the COMMAND reply of redis:
+    arity: number of arguments including the command name, negative means at least -arity
+    flags: eg: write, readonly, fast, denyoom
+    first_key, last_key, step: positions of the keys in the arguments, the command name is
+    position 0 and a negative last_key counts from the end
+"""
+from redis_clone.metrics import LatencyHistogram
+
+
+class RedisCommand:
+    __slots__ = (
+        "name", "handler", "arity", "flags", "first_key", "last_key", "step", "subargs",
+        "calls", "microseconds", "failed_calls", "rejected_calls", "latency",
+    )
+
+    def __init__(self, name, handler, arity, flags=(), first_key=0, last_key=0, step=0, subargs=None) -> None:
+        self.name = name
+        self.handler = handler
+        self.arity = arity
+        self.flags = frozenset(flags)
+        self.first_key = first_key
+        self.last_key = last_key
+        self.step = step
+        # Optional subargs eg: SET key value EX 10 NX, mapping the subarg name to its metadata
+        self.subargs = subargs
+        # Statistics of INFO commandstats and latencystats, rejected calls never ran the handler
+        self.calls = 0
+        self.microseconds = 0
+        self.failed_calls = 0
+        self.rejected_calls = 0
+        self.latency = LatencyHistogram()
+
+    @property
+    def is_write(self):
+        return "write" in self.flags
+
+    def check_arity(self, command_args):
+        """
+        command_args doesn't include the command name
+        """
+        argc = len(command_args) + 1
+        if self.arity >= 0:
+            return argc == self.arity
+        return argc >= -self.arity
+
+    def get_keys(self, command_args):
+        """
+        Returns the keys among the arguments
+        """
+        if not self.first_key:
+            return []
+        last_key = self.last_key if self.last_key >= 0 else len(command_args) + 1 + self.last_key
+        return command_args[self.first_key - 1:last_key:self.step]
+
+    def group_subargs(self, command_args):
+        """
+        Groups the optional subargs after the positional arguments, see group_subarguments
+        """
+        positional = -self.arity - 1 if self.arity < 0 else self.arity - 1
+        return command_args[:positional] + group_subarguments(self.subargs, command_args[positional:])
+
+    def info(self):
+        """
+        Command description as returned by COMMAND INFO
+        """
+        return [
+            self.name.lower(),
+            self.arity,
+            sorted(self.flags),
+            self.first_key,
+            self.last_key,
+            self.step,
+        ]
+
+
+def normalize_token(arg):
+    """
+    Converts an option token or subcommand to an uppercase str, other arguments stay bytes
+    """
+    if isinstance(arg, (bytes, bytearray, memoryview)):
+        return bytes(arg).decode("latin-1").upper()
+    return arg.upper()
+
+
+def group_subarguments(subargs_metadata, arguments):
+    """
+    Some commands in redis supports optional subargs eg: SET mykey myvalue EX 10 NX
+    Known subargs are uppercased and grouped as (subarg, value) tuples
+    Subargs that do not take a value are grouped as (subarg, True)
+    """
+    command_args = []
+    idx = 0
+
+    while idx < len(arguments):
+        # Fetch the argument but keep its original casing.
+        arg = arguments[idx]
+
+        # If the argument is a subargument, uppercase it for consistent processing.
+        token = normalize_token(arg)
+        if token in subargs_metadata:
+            arg = token  # Convert subarguments to uppercase.
+
+            if subargs_metadata[arg]["takes_value"]:
+                idx += 1
+                if idx < len(arguments):
+                    command_args.append((arg, arguments[idx]))
+                else:
+                    raise Exception(f"Expected value for subargument {arg}, but none provided.")
+            else:
+                # Subargument does not take a value, so just append it to the command args.
+                # Adding True as a placeholder value to indicate that the subargument is present.
+                command_args.append((arg, True))
+        else:
+            command_args.append(arg)
+
+        idx += 1
+
+    return command_args
+
+
+def command(name, arity, flags=(), first_key=0, last_key=0, step=0, subargs=None):
+    """
+    Marks a method as the handler of a redis command
+    Handlers are called with the client and the command arguments and return the response
+    """
+    def decorator(handler):
+        handler.redis_command = {
+            "name": name,
+            "arity": arity,
+            "flags": flags,
+            "first_key": first_key,
+            "last_key": last_key,
+            "step": step,
+            "subargs": subargs,
+        }
+        return handler
+
+    return decorator
+
+
+def build_command_table(server):
+    """
+    Collects the commands handled by the server's methods into a name -> RedisCommand mapping
+    """
+    command_table = {}
+    for cls in reversed(type(server).__mro__):
+        for attr, value in vars(cls).items():
+            metadata = getattr(value, "redis_command", None)
+            if metadata is None:
+                continue
+            command_table[metadata["name"]] = RedisCommand(handler=getattr(server, attr), **metadata)
+    return command_table
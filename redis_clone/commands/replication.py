@@ -0,0 +1,433 @@
+import asyncio
+import logging
+import os
+import tempfile
+import time
+
+from redis_clone import rdb
+from redis_clone.aof import encode_command
+from redis_clone.client import Client
+from redis_clone.commands.registry import command, normalize_token
+from redis_clone.keyspace import EXPIRE_DELETE, EXPIRE_HIDE, EXPIRE_IGNORE, now_ms
+from redis_clone.parser.redis_parser import Parser, Protocol_2_Data_Types
+from redis_clone.replication import ReplicationBacklog, new_replication_id
+
+logger = logging.getLogger(__name__)
+
+# Seconds between REPLCONF ACK sent by replicas and between attempts to reconnect to the primary
+REPL_ACK_PERIOD = 1
+REPL_RECONNECT_PERIOD = 1
+# Size of the chunks of a snapshot sent to a replica and of the reads of the replication stream
+REPL_TRANSFER_CHUNK_SIZE = 1024 * 1024
+REPL_READ_BUFFER_SIZE = 16 * 1024
+
+# States of a replica connected to this server
+REPLICA_STATE_WAIT_BGSAVE_START = "wait_bgsave"
+REPLICA_STATE_WAIT_BGSAVE_END = "wait_bgsave_end"
+REPLICA_STATE_SEND_BULK = "send_bulk"
+REPLICA_STATE_ONLINE = "online"
+
+
+class ReplicationCommandsMixin:
+    """
+    Primary/replica replication
+
+    A replica connects to its primary and sends PSYNC with the replication id and offset it has.
+    The primary either continues the stream from the backlog or forks a snapshot, sends it and
+    then every write command propagated since the fork.
+    Replicas apply the stream like commands of a client, serve reads and reject writes.
+    They never expire keys on their own, a key past its deadline is reported missing to
+    their clients but kept until the primary sends its DEL. Otherwise a write of the primary
+    right before the deadline could find the key on the primary and not on the replica.
+    """
+
+    def _init_replication(self):
+        self.replid = new_replication_id()
+        # Offset of the last byte of the replication stream sent, or processed on a replica
+        self.repl_offset = 0
+        # Created when the first replica connects, the stream is not kept before that
+        self.repl_backlog = None
+        # Clients of the replicas connected to this server
+        self.replicas = []
+        self._replicas_flush_scheduled = False
+
+        # Primary of this server when it's a replica
+        self.master_host = None
+        self.master_port = None
+        self.master_client = None
+        self.master_link_status = "down"
+        self.master_sync_in_progress = False
+        self.master_last_io = 0
+        self._last_repl_ack = 0
+        self._replication_task = None
+
+        replicaof = self.config["replicaof"].split()
+        if replicaof:
+            self.master_host, self.master_port = replicaof[0], int(replicaof[1])
+            self.keyspace.expire_mode = EXPIRE_HIDE
+
+    def start_replication(self):
+        """
+        Connects to the primary in the background, must be called from the running event loop
+        """
+        if self.master_host is not None:
+            self._replication_task = asyncio.create_task(self._replication_link())
+
+    def feed_replicas(self, data):
+        """
+        Appends an encoded write command to the replication stream
+        """
+        self.repl_backlog.feed(data)
+        self.repl_offset = self.repl_backlog.offset
+        for client in self.replicas:
+            if client.replica_state == REPLICA_STATE_ONLINE:
+                client.add_reply(data)
+            elif client.replica_state != REPLICA_STATE_WAIT_BGSAVE_START:
+                # Commands after the fork of the snapshot, sent right after the snapshot
+                client.replica_pending += data
+
+        if not self._replicas_flush_scheduled:
+            self._replicas_flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_replicas)
+
+    def _flush_replicas(self):
+        """
+        Sends the stream of the current loop iteration to every online replica with a single write
+        """
+        self._replicas_flush_scheduled = False
+        for client in self.replicas:
+            if client.replica_state != REPLICA_STATE_ONLINE or not client.output_buffer:
+                continue
+            data, client.output_buffer = client.output_buffer, bytearray()
+            client.writer.write(data)
+
+    def _is_read_only_replica_write(self, redis_command, client):
+        """
+        True for writes sent to a read only replica by a client other than its primary
+        """
+        return (
+            self.master_host is not None
+            and redis_command.is_write
+            and self.config["replica-read-only"]
+            and client is not None
+            and client.role != "master"
+        )
+
+    @command("PSYNC", arity=3, flags=("admin", "noscript"))
+    def _handle_psync_command(self, client, command_args):
+        """
+        PSYNC replid offset, sent by a replica to start or continue replicating from this server
+        """
+        if client is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR PSYNC can only be sent by a replica connection"
+            )
+        if self.master_host is not None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR Replicas of replicas are not supported"
+            )
+
+        replid = command_args[0].decode("latin-1")
+        try:
+            offset = int(command_args[1])
+        except ValueError:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+
+        client.role = "replica"
+        client.repl_ack_time = time.monotonic()
+        if client not in self.replicas:
+            self.replicas.append(client)
+
+        if (
+            self.repl_backlog is not None
+            and replid == self.replid
+            and self.repl_backlog.can_continue_from(offset)
+        ):
+            logger.info(f"Partial resynchronization of replica {client.address} from offset {offset}")
+            client.replica_state = REPLICA_STATE_ONLINE
+            client.repl_ack_offset = offset - 1
+            return b"+CONTINUE %s\r\n" % self.replid.encode() + self.repl_backlog.read_from(offset)
+
+        if self.repl_backlog is None:
+            self.repl_backlog = ReplicationBacklog(self.config["repl-backlog-size"], offset=self.repl_offset)
+
+        logger.info(f"Full resynchronization of replica {client.address}")
+        client.replica_state = REPLICA_STATE_WAIT_BGSAVE_START
+        # +FULLRESYNC is sent by the server cron when the snapshot is forked, with the offset at that time
+        return b""
+
+    @command("REPLCONF", arity=-1, flags=("admin", "noscript", "loading", "stale"))
+    def _handle_replconf_command(self, client, command_args):
+        """
+        REPLCONF listening-port <port> | capa <capability> | ACK <offset>
+        """
+        if len(command_args) % 2:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+
+        for idx in range(0, len(command_args), 2):
+            option = normalize_token(command_args[idx])
+            value = command_args[idx + 1]
+            if option == "ACK":
+                # Acks are not replied to, they would end up in the replication stream
+                if client is not None:
+                    client.repl_ack_offset = int(value)
+                    client.repl_ack_time = time.monotonic()
+                return b""
+            elif option == "LISTENING-PORT" and client is not None:
+                client.replica_listening_port = int(value)
+        return self.response_builder.respond_with_ok()
+
+    @command("REPLICAOF", arity=3, flags=("admin", "noscript", "stale"))
+    def _handle_replicaof_command(self, client, command_args):
+        """
+        REPLICAOF host port makes this server a replica, REPLICAOF NO ONE a primary again
+        """
+        if normalize_token(command_args[0]) == "NO" and normalize_token(command_args[1]) == "ONE":
+            if self.master_host is not None:
+                self._stop_replication()
+                # The data may diverge from the former primary from now on
+                self.replid = new_replication_id()
+                logger.info("Replication stopped, this server is a primary now")
+            return self.response_builder.respond_with_ok()
+
+        try:
+            port = int(command_args[1])
+        except ValueError:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR Invalid master port"
+            )
+
+        self._stop_replication()
+        # Replicas of this server would get a different history
+        for replica in list(self.replicas):
+            replica.abort()
+        self.replicas = []
+        self.repl_backlog = None
+        self.master_host = command_args[0].decode("latin-1")
+        self.master_port = port
+        self.keyspace.expire_mode = EXPIRE_HIDE
+        self.start_replication()
+        return self.response_builder.respond_with_ok()
+
+    def _stop_replication(self):
+        if self._replication_task is not None:
+            self._replication_task.cancel()
+            self._replication_task = None
+        if self.master_client is not None:
+            self.master_client.abort()
+            self.master_client = None
+        self.master_host = None
+        self.master_port = None
+        self.master_link_status = "down"
+        self.master_sync_in_progress = False
+        # Keys past their deadline are deleted from now on, and their DEL sent to replicas
+        self.keyspace.expire_mode = EXPIRE_DELETE
+
+    def _replication_cron(self):
+        """
+        Called by the server cron, starts the snapshots of replicas waiting for a full
+        resync and sends the acks of a replica to its primary
+        """
+        waiting = [client for client in self.replicas if client.replica_state == REPLICA_STATE_WAIT_BGSAVE_START]
+        if waiting and self.rdb_child_pid is None and self.aof_child_pid is None:
+            self._start_replication_snapshot(waiting)
+
+        if self.master_client is not None and self.master_link_status == "up":
+            now = time.monotonic()
+            if now - self._last_repl_ack >= REPL_ACK_PERIOD:
+                self._last_repl_ack = now
+                self.master_client.writer.write(encode_command("REPLCONF", [b"ACK", self.repl_offset]))
+
+    def _start_replication_snapshot(self, replicas):
+        for client in replicas:
+            # Stream propagated after the fork is not in the snapshot, it's held back until the snapshot is sent
+            client.replica_state = REPLICA_STATE_WAIT_BGSAVE_END
+            client.replica_pending = bytearray()
+            client.writer.write(b"+FULLRESYNC %s %d\r\n" % (self.replid.encode(), self.repl_offset))
+        if not self.rdb_background_save():
+            self._replication_snapshot_done(False)
+        elif self.rdb_child_pid is None:
+            # Saved in the foreground
+            self._replication_snapshot_done(True)
+
+    def _replication_snapshot_done(self, success):
+        """
+        Called once the snapshot of a full resync is written, sends it to the waiting replicas
+        """
+        for client in list(self.replicas):
+            if client.replica_state != REPLICA_STATE_WAIT_BGSAVE_END:
+                continue
+            if not success:
+                logger.error(f"Snapshot for replica {client.address} failed, closing its connection")
+                self.replicas.remove(client)
+                client.abort()
+                continue
+            client.replica_state = REPLICA_STATE_SEND_BULK
+            # Opened now, a later save can replace the file while it's sent
+            snapshot = open(self._rdb_path(), "rb")
+            asyncio.get_running_loop().create_task(self._send_snapshot(client, snapshot))
+
+    async def _send_snapshot(self, client, snapshot):
+        """
+        Sends the snapshot as $<length>\\r\\n<data>, then the stream held back meanwhile
+        """
+        writer = client.writer
+        try:
+            with snapshot:
+                writer.write(b"$%d\r\n" % os.fstat(snapshot.fileno()).st_size)
+                while chunk := snapshot.read(REPL_TRANSFER_CHUNK_SIZE):
+                    writer.write(chunk)
+                    await writer.drain()
+        except (ConnectionError, OSError) as e:
+            logger.error(f"Error sending the snapshot to replica {client.address}: {e}")
+            if client in self.replicas:
+                self.replicas.remove(client)
+            client.abort()
+            return
+
+        pending, client.replica_pending = client.replica_pending, None
+        client.replica_state = REPLICA_STATE_ONLINE
+        writer.write(pending)
+        logger.info(f"Synchronization with replica {client.address} succeeded")
+
+    def _replica_disconnected(self, client):
+        if client in self.replicas:
+            logger.info(f"Connection with replica {client.address} lost")
+            self.replicas.remove(client)
+
+    async def _replication_link(self):
+        """
+        Keeps this replica connected to its primary, reconnecting with a partial resync
+        """
+        while True:
+            try:
+                await self._sync_with_master()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Connection with primary {self.master_host}:{self.master_port} lost: {e}")
+            self.master_client = None
+            self.master_link_status = "down"
+            self.master_sync_in_progress = False
+            await asyncio.sleep(REPL_RECONNECT_PERIOD)
+
+    async def _sync_with_master(self):
+        reader, writer = await asyncio.open_connection(self.master_host, self.master_port)
+        try:
+            await self._send_to_master(reader, writer, "PING")
+            await self._send_to_master(reader, writer, "REPLCONF", [b"listening-port", self.port])
+            await self._send_to_master(reader, writer, "REPLCONF", [b"capa", b"psync2"])
+
+            self.master_sync_in_progress = True
+            writer.write(encode_command("PSYNC", [self.replid, self.repl_offset + 1]))
+            reply = (await reader.readline()).rstrip(b"\r\n")
+            if reply.startswith(b"+FULLRESYNC"):
+                _, replid, offset = reply.split()
+                await self._load_snapshot_from_master(reader)
+                self.replid = replid.decode("latin-1")
+                self.repl_offset = int(offset)
+                if self.aof is not None:
+                    # The append only file doesn't have the data of the snapshot
+                    self.aof_rewrite_scheduled = True
+            elif reply.startswith(b"+CONTINUE"):
+                logger.info(f"Partial resynchronization with primary from offset {self.repl_offset + 1}")
+            else:
+                raise Exception(f"Unexpected reply to PSYNC: {reply}")
+
+            self.master_sync_in_progress = False
+            self.master_link_status = "up"
+            self.master_client = Client(reader, writer, Parser(protocol_version=2))
+            self.master_client.role = "master"
+            await self._apply_replication_stream(self.master_client)
+        finally:
+            writer.close()
+
+    async def _send_to_master(self, reader, writer, command_name, command_args=()):
+        writer.write(encode_command(command_name, command_args))
+        reply = await reader.readline()
+        if reply.startswith(b"-"):
+            raise Exception(f"Error reply from primary: {reply.rstrip().decode('latin-1')}")
+
+    async def _load_snapshot_from_master(self, reader):
+        """
+        Receives the snapshot into a temporary file and loads it in place of the current data
+        """
+        # The primary can send newlines while it prepares the snapshot
+        header = b"\n"
+        while header in (b"\n", b"\r\n"):
+            header = await reader.readline()
+        if not header.startswith(b"$"):
+            raise Exception(f"Bad snapshot header from primary: {header}")
+        remaining = int(header[1:])
+
+        start = time.monotonic()
+        with tempfile.NamedTemporaryFile(dir=self.config["dir"], prefix="temp-replica-", suffix=".rdb") as file:
+            while remaining:
+                chunk = await reader.readexactly(min(remaining, REPL_TRANSFER_CHUNK_SIZE))
+                file.write(chunk)
+                remaining -= len(chunk)
+            file.flush()
+            self.keyspace.clear()
+            # Nothing cached or watched before is valid for the data of the primary
+            self.touch_all_watched_keys()
+            self.tracking_invalidate_keys_on_flush()
+            loaded = rdb.load(self.keyspace, file.name, now_ms())
+        logger.info(f"Loaded {loaded} keys from the primary in {int((time.monotonic() - start) * 1000)} ms")
+
+    async def _apply_replication_stream(self, client):
+        """
+        Applies the commands sent by the primary, replies are not sent back
+        """
+        start_offset = self.repl_offset
+        while True:
+            data = await client.reader.read(REPL_READ_BUFFER_SIZE)
+            if not data:
+                raise ConnectionError("Connection closed by the primary")
+            self.master_last_io = time.monotonic()
+            client.parser.feed(data)
+            # Keys are expired by the primary, its commands find them until its DEL
+            self.keyspace.expire_mode = EXPIRE_IGNORE
+            try:
+                for command_name, command_args in client.parser:
+                    self._process_command(command_name, command_args, client)
+            finally:
+                self.keyspace.expire_mode = EXPIRE_HIDE
+            self.repl_offset = start_offset + client.parser.processed_bytes()
+
+    def _info_replication(self):
+        if self.master_host is not None:
+            last_io = int(time.monotonic() - self.master_last_io) if self.master_link_status == "up" else -1
+            return [
+                ("role", "slave"),
+                ("master_host", self.master_host),
+                ("master_port", self.master_port),
+                ("master_link_status", self.master_link_status),
+                ("master_last_io_seconds_ago", last_io),
+                ("master_sync_in_progress", int(self.master_sync_in_progress)),
+                ("slave_repl_offset", self.repl_offset),
+                ("slave_read_only", int(self.config["replica-read-only"])),
+                ("connected_slaves", 0),
+                ("master_replid", self.replid),
+                ("master_repl_offset", self.repl_offset),
+            ]
+
+        now = time.monotonic()
+        fields = [("role", "master"), ("connected_slaves", len(self.replicas))]
+        for index, client in enumerate(self.replicas):
+            fields.append((
+                f"slave{index}",
+                f"ip={client.address[0]},port={client.replica_listening_port},state={client.replica_state},"
+                f"offset={client.repl_ack_offset},lag={int(now - client.repl_ack_time)}",
+            ))
+        backlog = self.repl_backlog
+        fields.extend([
+            ("master_replid", self.replid),
+            ("master_repl_offset", self.repl_offset),
+            ("repl_backlog_active", 0 if backlog is None else 1),
+            ("repl_backlog_size", self.config["repl-backlog-size"]),
+            ("repl_backlog_first_byte_offset", 0 if backlog is None else backlog.first_byte_offset),
+            ("repl_backlog_histlen", 0 if backlog is None else len(backlog.buffer)),
+        ])
+        return fields
@@ -0,0 +1,276 @@
+import os
+import resource
+import time
+
+from redis_clone.commands.registry import command, normalize_token
+from redis_clone.keyspace import entry_memory
+from redis_clone.metrics import LATENCY_PERCENTILES
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+
+# Version reported to clients, some of them enable features based on it
+REDIS_VERSION = "7.0.0"
+
+# Sections left out of INFO without arguments, they have a line per command
+INFO_NON_DEFAULT_SECTIONS = ("commandstats", "latencystats")
+
+MEMORY_HUMAN_UNITS = ("B", "K", "M", "G", "T")
+
+
+def bytes_to_human(size):
+    """
+    Memory size as shown by the *_human INFO fields eg: 1.50M
+    """
+    unit = 0
+    size = float(size)
+    while size >= 1024 and unit < len(MEMORY_HUMAN_UNITS) - 1:
+        size /= 1024
+        unit += 1
+    if unit == 0:
+        return f"{int(size)}B"
+    return f"{size:.2f}{MEMORY_HUMAN_UNITS[unit]}"
+
+
+def process_rss():
+    """
+    Resident set size of the process in bytes, 0 where /proc is not available
+    """
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return 0
+
+
+class ServerCommandsMixin:
+    """
+    Commands about the server itself
+    """
+
+    @command("COMMAND", arity=-1, flags=("loading", "stale"))
+    def _handle_command_command(self, client, command_args):
+        """
+        COMMAND, COMMAND COUNT, COMMAND INFO [name ...] and COMMAND DOCS
+        Replies are built from the command table used for dispatching
+        """
+        if not command_args:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ARRAY,
+                [redis_command.info() for redis_command in self.command_table.values()],
+            )
+
+        subcommand = normalize_token(command_args[0])
+        if subcommand == "COUNT":
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.INTEGER, len(self.command_table)
+            )
+        elif subcommand == "INFO":
+            names = [normalize_token(name) for name in command_args[1:]] or list(self.command_table)
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ARRAY,
+                [
+                    self.command_table[name].info() if name in self.command_table else None
+                    for name in names
+                ],
+            )
+        elif subcommand == "DOCS":
+            # Docs are not kept, clients fall back to the COMMAND INFO metadata
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, [])
+
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.ERROR,
+            f"ERR unknown subcommand '{subcommand}'. Try COMMAND HELP.",
+        )
+
+    @command("MEMORY", arity=-2, flags=("readonly",))
+    def _handle_memory_command(self, client, command_args):
+        """
+        MEMORY USAGE key [SAMPLES count], bytes used by a key and its value
+        Values are measured whole so SAMPLES is accepted and ignored
+        """
+        subcommand = normalize_token(command_args[0])
+        if subcommand != "USAGE":
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                f"ERR unknown subcommand '{subcommand}'. Try MEMORY HELP.",
+            )
+        if len(command_args) not in (2, 4) or (len(command_args) == 4 and normalize_token(command_args[2]) != "SAMPLES"):
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+
+        key = command_args[1]
+        value = self.keyspace.lookup(key)
+        if value is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, None)
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, entry_memory(key, value))
+
+    @command("SLOWLOG", arity=-2, flags=("admin", "loading", "stale"))
+    def _handle_slowlog_command(self, client, command_args):
+        """
+        SLOWLOG GET [count], SLOWLOG LEN and SLOWLOG RESET
+        GET returns the newest count entries, 10 by default and all of them with -1
+        """
+        subcommand = normalize_token(command_args[0])
+        if subcommand == "GET" and len(command_args) <= 2:
+            count = 10
+            if len(command_args) == 2:
+                try:
+                    count = int(command_args[1])
+                except ValueError:
+                    count = None
+                if count is None or count < -1:
+                    return self.response_builder.build_response(
+                        Protocol_2_Data_Types.ERROR, "ERR count should be greater than or equal to -1"
+                    )
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, self.slowlog.get(count))
+        elif subcommand == "LEN" and len(command_args) == 1:
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, len(self.slowlog))
+        elif subcommand == "RESET" and len(command_args) == 1:
+            self.slowlog.reset()
+            return self.response_builder.respond_with_ok()
+
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.ERROR,
+            f"ERR unknown subcommand or wrong number of arguments for '{subcommand}'. Try SLOWLOG HELP.",
+        )
+
+    @command("INFO", arity=-1, flags=("loading", "stale"))
+    def _handle_info_command(self, client, command_args):
+        """
+        INFO [section ...], every section is a list of field:value lines
+        Without arguments or with default the per command sections are left out
+        """
+        sections = self._info_sections()
+        names = [normalize_token(name).lower() for name in command_args]
+        if "all" in names or "everything" in names:
+            names = list(sections)
+        elif not names or "default" in names:
+            names = [name for name in sections if name not in INFO_NON_DEFAULT_SECTIONS]
+
+        lines = []
+        for name in names:
+            if name not in sections:
+                continue
+            if lines:
+                lines.append("")
+            lines.append(f"# {name.capitalize()}")
+            lines.extend(f"{field}:{value}" for field, value in sections[name]())
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.BULK_STRING, "\r\n".join(lines) + "\r\n"
+        )
+
+    def _info_sections(self):
+        """
+        Section name -> function returning its (field, value) pairs, in the order of INFO
+        """
+        return {
+            "server": self._info_server,
+            "clients": self._info_clients,
+            "memory": self._info_memory,
+            "persistence": self._info_persistence,
+            "stats": self._info_stats,
+            "replication": self._info_replication,
+            "cpu": self._info_cpu,
+            "commandstats": self._info_commandstats,
+            "latencystats": self._info_latencystats,
+            "cluster": self._info_cluster,
+            "keyspace": self._info_keyspace,
+        }
+
+    def _info_server(self):
+        return [
+            ("redis_version", REDIS_VERSION),
+            ("process_id", os.getpid()),
+            ("tcp_port", self.port),
+            ("uptime_in_seconds", int(time.monotonic() - self.start_time)),
+            ("hz", self.config["hz"]),
+        ]
+
+    def _info_clients(self):
+        return [
+            ("connected_clients", len(self.clients)),
+            ("maxclients", self.config["maxclients"]),
+            ("client_recent_max_output_buffer", max((len(client.output_buffer) for client in self.clients.values()), default=0)),
+            ("blocked_clients", self.blocked_clients),
+            ("tracking_clients", self.tracking_clients),
+        ]
+
+    def _info_memory(self):
+        """
+        used_memory is the memory of keys and values as estimated by the keyspace, rss is the whole process
+        """
+        used_memory = self.keyspace.used_memory
+        used_memory_peak = max(self.stats["used_memory_peak"], used_memory)
+        return [
+            ("used_memory", used_memory),
+            ("used_memory_human", bytes_to_human(used_memory)),
+            ("used_memory_rss", process_rss()),
+            ("used_memory_peak", used_memory_peak),
+            ("used_memory_peak_human", bytes_to_human(used_memory_peak)),
+            ("maxmemory", self.config["maxmemory"]),
+            ("maxmemory_human", bytes_to_human(self.config["maxmemory"])),
+            ("maxmemory_policy", self.config["maxmemory-policy"]),
+        ]
+
+    def _info_persistence(self):
+        return [("loading", 0)] + [
+            (field, value) for field, value in self.stats.items() if field.startswith(("rdb_", "aof_"))
+        ]
+
+    def _info_stats(self):
+        return [
+            ("total_connections_received", self.stats["total_connections_received"]),
+            ("rejected_connections", self.stats["rejected_connections"]),
+            ("total_commands_processed", self._total_commands_processed()),
+            ("instantaneous_ops_per_sec", self.ops_per_sec.rate()),
+            ("rejected_calls", sum(redis_command.rejected_calls for redis_command in self.command_table.values())),
+            ("expired_keys", self.stats["expired_keys"]),
+            ("expire_cycle_cpu_milliseconds", int(self.stats["expire_cycle_cpu_milliseconds"])),
+            ("evicted_keys", self.stats["evicted_keys"]),
+            ("tracking_total_keys", len(self.tracking_table)),
+            ("tracking_total_prefixes", len(self.tracking_prefixes)),
+            ("pubsub_channels", len(self.pubsub_channels)),
+            ("pubsub_patterns", len(self.pubsub_patterns)),
+            ("client_output_buffer_limit_disconnections", self.stats["client_output_buffer_limit_disconnections"]),
+        ]
+
+    def _info_cpu(self):
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        children = resource.getrusage(resource.RUSAGE_CHILDREN)
+        return [
+            ("used_cpu_sys", f"{usage.ru_stime:.6f}"),
+            ("used_cpu_user", f"{usage.ru_utime:.6f}"),
+            ("used_cpu_sys_children", f"{children.ru_stime:.6f}"),
+            ("used_cpu_user_children", f"{children.ru_utime:.6f}"),
+        ]
+
+    def _info_commandstats(self):
+        return [
+            (
+                f"cmdstat_{redis_command.name.lower()}",
+                f"calls={redis_command.calls},usec={redis_command.microseconds},"
+                f"usec_per_call={redis_command.microseconds / max(redis_command.calls, 1):.2f},"
+                f"rejected_calls={redis_command.rejected_calls},failed_calls={redis_command.failed_calls}",
+            )
+            for redis_command in self.command_table.values()
+            if redis_command.calls or redis_command.rejected_calls
+        ]
+
+    def _info_latencystats(self):
+        return [
+            (
+                f"latency_percentiles_usec_{redis_command.name.lower()}",
+                ",".join(
+                    f"p{percentile:g}={redis_command.latency.percentile(percentile):.3f}"
+                    for percentile in LATENCY_PERCENTILES
+                ),
+            )
+            for redis_command in self.command_table.values()
+            if redis_command.calls
+        ]
+
+    def _info_cluster(self):
+        return [("cluster_enabled", 0 if self.cluster is None else 1)]
+
+    def _info_keyspace(self):
+        if not self.keyspace.data:
+            return []
+        return [("db0", f"keys={len(self.keyspace.data)},expires={len(self.keyspace.expires)},avg_ttl=0")]
@@ -0,0 +1,349 @@
+import math
+import re
+from decimal import Decimal
+
+from redis_clone.commands.registry import command
+from redis_clone.keyspace import now_ms
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+
+# Counters are 64 bit signed integers like in redis
+INTEGER_MIN = -(2 ** 63)
+INTEGER_MAX = 2 ** 63 - 1
+# Same strictness as redis string2ll, no spaces, sign prefix or leading zeros
+INTEGER_PATTERN = re.compile(rb"-?(0|[1-9][0-9]{0,18})")
+
+SET_SUBARGS = {
+    "EX": {"takes_value": True},
+    "PX": {"takes_value": True},
+    "EXAT": {"takes_value": True},
+    "PXAT": {"takes_value": True},
+    "NX": {"takes_value": False},
+    "XX": {"takes_value": False},
+    "KEEPTTL": {"takes_value": False},
+    "GET": {"takes_value": False},
+}
+
+
+def is_string_value(value):
+    return type(value) is bytes or type(value) is int
+
+
+def string_value_to_bytes(value):
+    """
+    Counters are stored as int and only rendered when they are read
+    """
+    if type(value) is int:
+        return b"%d" % value
+    return value
+
+
+def parse_integer(data):
+    """
+    Parses a string value or argument as a 64 bit integer, returns None if it isn't one
+    """
+    if type(data) is int:
+        return data
+    if not INTEGER_PATTERN.fullmatch(data):
+        return None
+    value = int(data)
+    if not INTEGER_MIN <= value <= INTEGER_MAX:
+        return None
+    return value
+
+
+def parse_float(data):
+    """
+    Parses a string value or argument as a finite float, returns None if it isn't one
+    """
+    if type(data) is int:
+        return float(data)
+    # python accepts digit separators eg: 1_000, redis string2ld doesn't
+    if b"_" in data:
+        return None
+    try:
+        value = float(data)
+    except ValueError:
+        return None
+    if math.isnan(value) or math.isinf(value) or data.strip() != data:
+        return None
+    return value
+
+
+def format_float(value):
+    """
+    Renders a float without exponent and trailing zeros, eg: 10.5, 3 or 100000000000000000000
+    """
+    if value.is_integer():
+        return b"%d" % value
+    return format(Decimal(repr(value)), "f").encode()
+
+
+class StringCommandsMixin:
+    """
+    Commands working on string values
+    """
+
+    @command("GET", arity=2, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_get_command(self, client, command_args):
+        value = self.keyspace.lookup(command_args[0])
+        if value is not None and not is_string_value(value):
+            return self._wrong_type()
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.BULK_STRING, string_value_to_bytes(value)
+        )
+
+    @command("MGET", arity=-2, flags=("readonly", "fast"), first_key=1, last_key=-1, step=1)
+    def _handle_mget_command(self, client, command_args):
+        """
+        Returns the values of all the keys as one array, nil for the missing ones and the
+        ones which are not strings
+        """
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.ARRAY,
+            [
+                string_value_to_bytes(value) if is_string_value(value) else None
+                for value in self.keyspace.lookup_many(command_args)
+            ],
+        )
+
+    @command("MSET", arity=-3, flags=("write", "denyoom"), first_key=1, last_key=-1, step=2)
+    def _handle_mset_command(self, client, command_args):
+        """
+        Sets every key to its value, removing their ttl like SET does
+        """
+        if len(command_args) % 2:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR wrong number of arguments for 'MSET' command",
+            )
+
+        for idx in range(0, len(command_args), 2):
+            self.keyspace.set(command_args[idx], command_args[idx + 1])
+        return self.response_builder.respond_with_ok()
+
+    @command("MSETNX", arity=-3, flags=("write", "denyoom"), first_key=1, last_key=-1, step=2)
+    def _handle_msetnx_command(self, client, command_args):
+        """
+        Sets every key to its value only if none of the keys exist
+        Returns 1 if the keys were set, 0 if no key was set
+        """
+        if len(command_args) % 2:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR wrong number of arguments for 'MSETNX' command",
+            )
+
+        # Commands run one at a time on the event loop, so nothing can create a key between the check and the sets
+        for idx in range(0, len(command_args), 2):
+            if self.keyspace.exists(command_args[idx]):
+                return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 0)
+
+        for idx in range(0, len(command_args), 2):
+            self.keyspace.set(command_args[idx], command_args[idx + 1])
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 1)
+
+    @command("SET", arity=-3, flags=("write", "denyoom"), first_key=1, last_key=1, step=1, subargs=SET_SUBARGS)
+    def _handle_set_command(self, client, command_args):
+        key = command_args[0]
+        value = command_args[1]
+        
+        subarg_values = {
+            "EX": None, # seconds
+            "PX": None, # milliseconds
+            "EXAT": None, # unix timestamp in seconds
+            "PXAT": None, # unix timestamp in milliseconds
+            "KEEPTTL": None, # keep the ttl of the key boolean
+            "GET": None, # return the value of the key booelan
+            "NX": None, # set if key does not exist boolean
+            "XX": None, # set if key exists boolean
+        }
+
+        # Check set command has optional arguments
+        if len(command_args) > 2:
+            # Subargs are in format (arg, value)
+            for subarg in command_args[2:]:
+                if not isinstance(subarg, tuple):
+                    return self.response_builder.build_response(
+                        Protocol_2_Data_Types.ERROR, "ERR syntax error"
+                    )
+                subarg_values[subarg[0]] = subarg[1]
+        
+        # Process subargs
+        # Check keepttl is not set with any other expiry subarg
+        if subarg_values["KEEPTTL"] and any(subarg_values[subarg] is not None for subarg in ("EX", "PX", "EXAT", "PXAT")):
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR invalid expire command syntax",
+            )
+        
+        # Return error if both NX and XX are set
+        if subarg_values["NX"] and subarg_values["XX"]:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR XX and NX options at the same time are not compatible",
+            )
+        
+        # Handle NX
+        # NX -- Only set the key if it does not already exist.
+        if subarg_values["NX"]:
+            if self.keyspace.exists(key):
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.BULK_STRING
+                )
+            else:
+                return self._assign_key_to_value(key, value, subarg_values)
+        
+        # Handle XX
+        # XX -- Only set the key if it already exists.
+        if subarg_values["XX"]:
+            if not self.keyspace.exists(key):
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.BULK_STRING
+                )
+            else:
+                return self._assign_key_to_value(key, value, subarg_values)
+        
+        # Handle GET
+        # GET -- Return the value of key
+        if subarg_values["GET"]:
+            old_value = self.keyspace.lookup(key)
+            if old_value is not None and not is_string_value(old_value):
+                return self._wrong_type()
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.BULK_STRING, string_value_to_bytes(old_value)
+            )
+        
+        # Normal case for set
+        return self._assign_key_to_value(key, value, subarg_values)
+
+    def _assign_key_to_value(self, key, value, subargs):
+        try:
+            deadline_ms = self._get_set_deadline(subargs)
+        except ValueError:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR value is not an integer or out of range",
+            )
+        if deadline_ms is not None and deadline_ms <= 0:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR invalid expire time in 'set' command",
+            )
+
+        # KEEPTTL -- Retain the time to live associated with the key.
+        self.keyspace.set(key, value, deadline_ms=deadline_ms, keep_ttl=bool(subargs["KEEPTTL"]))
+        if deadline_ms is not None:
+            # Logged with an absolute deadline so replaying it later gives the same one
+            self.rewrite_propagated_command("SET", [key, value, b"PXAT", deadline_ms])
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.SIMPLE_STRING, "OK"
+        )
+
+    def _get_set_deadline(self, subargs):
+        """
+        Converts the expiry subargs of SET to a unix time in milliseconds
+        Returns 0, which the caller rejects, for a time which is not positive or whose
+        deadline doesn't fit in 64 bits, and raises ValueError if it's not an integer
+        """
+        # Tested against None, an empty time is not an integer rather than no time at all
+        if subargs["EX"] is not None:
+            when, unit_ms, base_ms = subargs["EX"], 1000, now_ms()
+        elif subargs["PX"] is not None:
+            when, unit_ms, base_ms = subargs["PX"], 1, now_ms()
+        elif subargs["EXAT"] is not None:
+            when, unit_ms, base_ms = subargs["EXAT"], 1000, 0
+        elif subargs["PXAT"] is not None:
+            when, unit_ms, base_ms = subargs["PXAT"], 1, 0
+        else:
+            return None
+        when = parse_integer(when)
+        if when is None:
+            raise ValueError("Expire time is not an integer")
+        if when <= 0:
+            return 0
+        deadline_ms = base_ms + when * unit_ms
+        return deadline_ms if deadline_ms <= INTEGER_MAX else 0
+
+    @command("INCR", arity=2, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_incr_command(self, client, command_args):
+        return self._increment(command_args[0], 1)
+
+    @command("DECR", arity=2, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_decr_command(self, client, command_args):
+        return self._increment(command_args[0], -1)
+
+    @command("INCRBY", arity=3, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_incrby_command(self, client, command_args):
+        increment = parse_integer(command_args[1])
+        if increment is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+        return self._increment(command_args[0], increment)
+
+    @command("DECRBY", arity=3, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_decrby_command(self, client, command_args):
+        decrement = parse_integer(command_args[1])
+        if decrement is None or decrement == INTEGER_MIN:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+        return self._increment(command_args[0], -decrement)
+
+    def _increment(self, key, increment):
+        """
+        Adds increment to the counter stored at key, a missing key counts as 0
+        The result is stored as an int, so the next increment doesn't parse it again
+        The ttl of the key is kept
+        """
+        value = self.keyspace.lookup(key)
+        if value is None:
+            current = 0
+        elif not is_string_value(value):
+            return self._wrong_type()
+        else:
+            current = parse_integer(value)
+            if current is None:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+                )
+
+        new_value = current + increment
+        if not INTEGER_MIN <= new_value <= INTEGER_MAX:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR increment or decrement would overflow"
+            )
+
+        self.keyspace.set(key, new_value, keep_ttl=True)
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, new_value)
+
+    @command("INCRBYFLOAT", arity=3, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_incrbyfloat_command(self, client, command_args):
+        """
+        Adds a float increment to the value stored at key, the result is stored as a string
+        """
+        key = command_args[0]
+        increment = parse_float(command_args[1])
+        if increment is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not a valid float"
+            )
+
+        value = self.keyspace.lookup(key)
+        if value is not None and not is_string_value(value):
+            return self._wrong_type()
+        current = 0.0 if value is None else parse_float(value)
+        if current is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not a valid float"
+            )
+
+        new_value = current + increment
+        if math.isnan(new_value) or math.isinf(new_value):
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR increment would produce NaN or Infinity"
+            )
+
+        new_value = format_float(new_value)
+        self.keyspace.set(key, new_value, keep_ttl=True)
+        return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, new_value)
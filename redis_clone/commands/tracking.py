@@ -0,0 +1,247 @@
+import asyncio
+
+from redis_clone.commands.registry import normalize_token
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types, Protocol_3_Data_Types
+
+# Channel RESP2 clients subscribe to in the connection given to REDIRECT
+TRACKING_CHANNEL = b"__redis__:invalidate"
+
+
+class BroadcastPrefix:
+    """
+    Clients tracking a prefix in BCAST mode and the keys with that prefix modified since
+    the last broadcast, mapped to the id of the client which modified them
+    """
+
+    def __init__(self) -> None:
+        self.clients = set()
+        self.keys = {}
+
+
+class TrackingCommandsMixin:
+    """
+    Client side caching, same as redis tracking.c
+
+    In the default mode the server remembers which clients read every key and sends them an
+    invalidation message the next time the key is modified, expired or evicted, then forgets
+    them until they read it again. In BCAST mode clients get the keys starting with their
+    prefixes modified in every event loop iteration instead, nothing is remembered per key.
+    Messages are RESP3 pushes, RESP2 clients can only get them through REDIRECT to a
+    connection subscribed to __redis__:invalidate, as pub/sub messages.
+    """
+
+    def _init_tracking(self):
+        # Key -> ids of the clients which read it since its last invalidation
+        self.tracking_table = {}
+        # Prefix -> BroadcastPrefix
+        self.tracking_prefixes = {}
+        # Clients with tracking enabled, invalidation is skipped entirely without any
+        self.tracking_clients = 0
+        self._tracking_pending_clients = set()
+        self._tracking_flush_scheduled = False
+
+    def _client_tracking(self, client, command_args):
+        """
+        CLIENT TRACKING ON|OFF [REDIRECT id] [PREFIX prefix ...] [BCAST] [NOLOOP]
+        """
+        mode = normalize_token(command_args[0])
+        redirect = 0
+        bcast = False
+        noloop = False
+        prefixes = []
+        idx = 1
+        while idx < len(command_args):
+            token = normalize_token(command_args[idx])
+            if token == "REDIRECT" and idx + 1 < len(command_args):
+                try:
+                    redirect = int(command_args[idx + 1])
+                except ValueError:
+                    return self.response_builder.build_response(
+                        Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+                    )
+                idx += 2
+            elif token == "PREFIX" and idx + 1 < len(command_args):
+                prefixes.append(bytes(command_args[idx + 1]))
+                idx += 2
+            elif token == "BCAST":
+                bcast = True
+                idx += 1
+            elif token == "NOLOOP":
+                noloop = True
+                idx += 1
+            elif token in ("OPTIN", "OPTOUT"):
+                # Caching every read key is the only default mode, CLIENT CACHING doesn't exist
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, f"ERR {token} mode is not supported"
+                )
+            else:
+                return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+
+        if mode == "OFF":
+            self._disable_tracking(client)
+            return self.response_builder.respond_with_ok()
+        if mode != "ON":
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+
+        if prefixes and not bcast:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR PREFIX option requires BCAST mode to be enabled"
+            )
+        if client.tracking and client.tracking_bcast != bcast:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR,
+                "ERR You can't switch BCAST mode on/off before disabling tracking for this client, "
+                "and then re-enabling it with a different mode.",
+            )
+        if redirect and redirect not in self.clients:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR The client ID you want redirect to does not exist"
+            )
+
+        if not client.tracking:
+            self.tracking_clients += 1
+        client.tracking = True
+        client.tracking_bcast = bcast
+        client.tracking_noloop = noloop
+        client.tracking_redirect = redirect
+        if bcast:
+            # Without prefixes every key is broadcast
+            for prefix in prefixes or [b""]:
+                if prefix not in client.tracking_prefixes:
+                    client.tracking_prefixes.append(prefix)
+                    self.tracking_prefixes.setdefault(prefix, BroadcastPrefix()).clients.add(client.id)
+        return self.response_builder.respond_with_ok()
+
+    def _disable_tracking(self, client):
+        """
+        Keys the client read stay in the tracking table, the client is skipped when they are invalidated
+        """
+        if not client.tracking:
+            return
+        for prefix in client.tracking_prefixes:
+            broadcast = self.tracking_prefixes[prefix]
+            broadcast.clients.discard(client.id)
+            if not broadcast.clients:
+                del self.tracking_prefixes[prefix]
+        client.tracking = False
+        client.tracking_bcast = False
+        client.tracking_noloop = False
+        client.tracking_prefixes = []
+        client.tracking_redirect = 0
+        self.tracking_clients -= 1
+
+    def tracking_remember_keys(self, client, keys):
+        """
+        Records that client read keys, it's told when they change
+        """
+        table = self.tracking_table
+        for key in keys:
+            readers = table.get(key)
+            if readers is None:
+                table[key] = {client.id}
+            else:
+                readers.add(client.id)
+        while len(table) > self.config["tracking-table-max-keys"]:
+            # Dicts keep insertion order, the key tracked for the longest time goes first
+            self.tracking_invalidate_key(next(iter(table)))
+
+    def tracking_invalidate_key(self, key, writer=None):
+        """
+        Tells the clients caching key that it changed, writer is the client which modified it
+        """
+        if not self.tracking_clients:
+            return
+        writer_id = writer.id if writer is not None else None
+        for prefix, broadcast in self.tracking_prefixes.items():
+            if key.startswith(prefix):
+                # Modified by several clients in the same iteration, none of them can skip it
+                if broadcast.keys.setdefault(key, writer_id) != writer_id:
+                    broadcast.keys[key] = None
+                self._schedule_tracking_flush()
+
+        readers = self.tracking_table.pop(key, None)
+        if not readers:
+            return
+        for client_id in readers:
+            client = self.clients.get(client_id)
+            # Clients which disconnected or disabled tracking since they read the key
+            if client is None or not client.tracking or client.tracking_bcast:
+                continue
+            if client.tracking_noloop and client is writer:
+                continue
+            self._send_tracking_message(client, [key])
+
+    def tracking_invalidate_keys_on_flush(self):
+        """
+        Called when every key is deleted at once, same as redis trackingInvalidateKeysOnFlush
+        Every tracking client gets an invalidation with a null key list, which drops its whole
+        cache, and nothing read before is remembered anymore
+        """
+        if not self.tracking_clients:
+            return
+        for client in list(self.clients.values()):
+            if client.tracking:
+                self._send_tracking_message(client, None)
+        self.tracking_table.clear()
+        for broadcast in self.tracking_prefixes.values():
+            broadcast.keys.clear()
+
+    def _send_tracking_message(self, client, keys):
+        target = client
+        if client.tracking_redirect:
+            target = self.clients.get(client.tracking_redirect)
+            if target is None:
+                if client.protocol_version == 3:
+                    client.add_reply(self.response_builders[3].build_response(
+                        Protocol_3_Data_Types.PUSH, [b"tracking-redir-broken", client.tracking_redirect]
+                    ))
+                    self._tracking_pending_clients.add(client)
+                    self._schedule_tracking_flush()
+                return
+        if target.protocol_version != 3:
+            # RESP2 clients can only receive invalidations as pub/sub messages
+            if TRACKING_CHANNEL in target.subscribed_channels:
+                target.add_reply(self.response_builders[2].build_response(
+                    Protocol_2_Data_Types.ARRAY, [b"message", TRACKING_CHANNEL, keys]
+                ))
+                self._tracking_pending_clients.add(target)
+                self._schedule_tracking_flush()
+            return
+        target.add_reply(self.response_builders[3].build_response(
+            Protocol_3_Data_Types.PUSH, [b"invalidate", keys]
+        ))
+        self._tracking_pending_clients.add(target)
+        self._schedule_tracking_flush()
+
+    def _schedule_tracking_flush(self):
+        if not self._tracking_flush_scheduled:
+            self._tracking_flush_scheduled = True
+            asyncio.get_running_loop().call_soon(self._flush_tracking_messages)
+
+    def _flush_tracking_messages(self):
+        """
+        Sends the broadcasts of this loop iteration and writes the invalidation messages
+        queued for clients. Clients whose replies wait for the append only file are skipped,
+        their messages are sent right after those replies
+        """
+        self._tracking_flush_scheduled = False
+        for broadcast in self.tracking_prefixes.values():
+            if not broadcast.keys:
+                continue
+            keys, broadcast.keys = broadcast.keys, {}
+            for client_id in broadcast.clients:
+                client = self.clients.get(client_id)
+                if client is None:
+                    continue
+                if client.tracking_noloop:
+                    client_keys = [key for key, writer_id in keys.items() if writer_id != client_id]
+                else:
+                    client_keys = list(keys)
+                if client_keys:
+                    self._send_tracking_message(client, client_keys)
+
+        pending, self._tracking_pending_clients = self._tracking_pending_clients, set()
+        for client in pending:
+            if client.output_buffer and not client.replies_held and not client.writer.is_closing():
+                data, client.output_buffer = client.output_buffer, bytearray()
+                client.writer.write(data)
@@ -0,0 +1,370 @@
+import math
+import sys
+
+from redis_clone.commands.registry import command, normalize_token
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types, Protocol_3_Data_Types
+from redis_clone.zsets import SortedSet
+
+ZADD_FLAGS = {"NX", "XX", "GT", "LT", "CH", "INCR"}
+
+
+def parse_score(data):
+    """
+    Parses a score, which unlike string floats can be inf, +inf or -inf
+    Returns None if it isn't a valid float
+    """
+    # python accepts digit separators eg: 1_000, redis strtod doesn't
+    if b"_" in data:
+        return None
+    try:
+        score = float(data)
+    except ValueError:
+        return None
+    if math.isnan(score) or data.strip() != data:
+        return None
+    return score
+
+
+def parse_score_bound(data):
+    """
+    Parses a ZRANGEBYSCORE bound, a score optionally prefixed by ( to exclude it
+    Returns (score, exclusive) or None if it isn't valid
+    """
+    exclusive = data[:1] == b"("
+    score = parse_score(data[1:] if exclusive else data)
+    if score is None:
+        return None
+    return score, exclusive
+
+
+class SortedSetCommandsMixin:
+    """
+    Commands working on sorted set values, see redis_clone/zsets.py for their encodings
+    """
+
+    def _lookup_zset(self, key):
+        """
+        Returns the sorted set at key, None if it doesn't exist or False if the key holds another type
+        """
+        value = self.keyspace.lookup(key)
+        if value is None or type(value) is SortedSet:
+            return value
+        return False
+
+    def _zset_reply(self, entries, with_scores):
+        """
+        Members of a range, followed by their scores with WITHSCORES
+        RESP3 clients get every member and its score as a pair, RESP2 clients a flat array
+        """
+        if not with_scores:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ARRAY, [member for member, _ in entries]
+            )
+        if self.response_builder.resp3:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ARRAY, [[member, score] for member, score in entries]
+            )
+        flat = []
+        for member, score in entries:
+            flat.append(member)
+            flat.append(score)
+        return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, flat)
+
+    @command("ZADD", arity=-4, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zadd_command(self, client, command_args):
+        """
+        ZADD key [NX|XX] [GT|LT] [CH] [INCR] score member [score member ...]
+        Returns the number of members added, or changed with CH, or the new score with INCR
+        """
+        key = command_args[0]
+        flags = set()
+        idx = 1
+        while idx < len(command_args) and normalize_token(command_args[idx]) in ZADD_FLAGS:
+            flags.add(normalize_token(command_args[idx]))
+            idx += 1
+        pairs = command_args[idx:]
+        if not pairs or len(pairs) % 2:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+        if "NX" in flags and "XX" in flags:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR XX and NX options at the same time are not compatible"
+            )
+        if len(flags & {"NX", "GT", "LT"}) > 1:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR GT, LT, and/or NX options at the same time are not compatible"
+            )
+        incr = "INCR" in flags
+        if incr and len(pairs) != 2:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR INCR option supports a single increment-element pair"
+            )
+        scores = [parse_score(score) for score in pairs[::2]]
+        if None in scores:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not a valid float"
+            )
+
+        sorted_set = self._lookup_zset(key)
+        if sorted_set is False:
+            return self._wrong_type()
+        if sorted_set is None:
+            if "XX" in flags:
+                if incr:
+                    return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, None)
+                return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 0)
+            sorted_set = SortedSet()
+            self.keyspace.set(key, sorted_set)
+
+        old_size = sys.getsizeof(sorted_set)
+        max_entries = self.config["zset-max-listpack-entries"]
+        max_value = self.config["zset-max-listpack-value"]
+        added = changed = 0
+        new_score = None
+        for score, member in zip(scores, pairs[1::2]):
+            current = sorted_set.score(member)
+            if current is None:
+                if "XX" in flags:
+                    continue
+            else:
+                if "NX" in flags:
+                    continue
+                if incr:
+                    score = current + score
+                    if math.isnan(score):
+                        self.keyspace.value_resized(key, old_size)
+                        return self.response_builder.build_response(
+                            Protocol_2_Data_Types.ERROR, "ERR resulting score is not a number (NaN)"
+                        )
+                if ("GT" in flags and score <= current) or ("LT" in flags and score >= current):
+                    continue
+            if sorted_set.add(member, score, max_entries, max_value):
+                added += 1
+            elif score != current:
+                changed += 1
+            new_score = score
+
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += added + changed
+        if not len(sorted_set):
+            # Created for nothing eg: every member was skipped by XX
+            self.keyspace.delete(key)
+        if incr:
+            if new_score is None:
+                return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, None)
+            return self.response_builder.build_response(Protocol_3_Data_Types.DOUBLE, new_score)
+        return self.response_builder.build_response(
+            Protocol_2_Data_Types.INTEGER, added + changed if "CH" in flags else added
+        )
+
+    @command("ZINCRBY", arity=4, flags=("write", "denyoom", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zincrby_command(self, client, command_args):
+        key, increment, member = command_args
+        return self._handle_zadd_command(client, [key, b"INCR", increment, member])
+
+    @command("ZREM", arity=-3, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zrem_command(self, client, command_args):
+        """
+        Returns the number of members removed, the key is deleted with its last member
+        """
+        key = command_args[0]
+        sorted_set = self._lookup_zset(key)
+        if sorted_set is False:
+            return self._wrong_type()
+        if sorted_set is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 0)
+
+        old_size = sys.getsizeof(sorted_set)
+        removed = 0
+        for member in command_args[1:]:
+            if sorted_set.remove(member):
+                removed += 1
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += removed
+        if not len(sorted_set):
+            self.keyspace.delete(key)
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, removed)
+
+    @command("ZCARD", arity=2, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zcard_command(self, client, command_args):
+        sorted_set = self._lookup_zset(command_args[0])
+        if sorted_set is False:
+            return self._wrong_type()
+        length = len(sorted_set) if sorted_set is not None else 0
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, length)
+
+    @command("ZSCORE", arity=3, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zscore_command(self, client, command_args):
+        sorted_set = self._lookup_zset(command_args[0])
+        if sorted_set is False:
+            return self._wrong_type()
+        score = sorted_set.score(command_args[1]) if sorted_set is not None else None
+        if score is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, None)
+        return self.response_builder.build_response(Protocol_3_Data_Types.DOUBLE, score)
+
+    @command("ZRANK", arity=3, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zrank_command(self, client, command_args):
+        return self._zrank(command_args, reverse=False)
+
+    @command("ZREVRANK", arity=3, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zrevrank_command(self, client, command_args):
+        return self._zrank(command_args, reverse=True)
+
+    def _zrank(self, command_args, reverse):
+        sorted_set = self._lookup_zset(command_args[0])
+        if sorted_set is False:
+            return self._wrong_type()
+        rank = sorted_set.rank(command_args[1], reverse=reverse) if sorted_set is not None else None
+        if rank is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.BULK_STRING, None)
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, rank)
+
+    @command("ZRANGE", arity=-4, flags=("readonly",), first_key=1, last_key=1, step=1)
+    def _handle_zrange_command(self, client, command_args):
+        """
+        ZRANGE key start stop [REV] [WITHSCORES], negative ranks count from the end
+        """
+        reverse = with_scores = False
+        for option in command_args[3:]:
+            token = normalize_token(option)
+            if token == "REV":
+                reverse = True
+            elif token == "WITHSCORES":
+                with_scores = True
+            else:
+                return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+        try:
+            start = int(command_args[1])
+            stop = int(command_args[2])
+        except ValueError:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+
+        sorted_set = self._lookup_zset(command_args[0])
+        if sorted_set is False:
+            return self._wrong_type()
+        if sorted_set is None:
+            return self._zset_reply([], with_scores)
+        length = len(sorted_set)
+        if start < 0:
+            start = max(start + length, 0)
+        if stop < 0:
+            stop += length
+        stop = min(stop, length - 1)
+        return self._zset_reply(sorted_set.range_by_rank(start, stop, reverse=reverse), with_scores)
+
+    @command("ZREVRANGE", arity=-4, flags=("readonly",), first_key=1, last_key=1, step=1)
+    def _handle_zrevrange_command(self, client, command_args):
+        """
+        ZREVRANGE key start stop [WITHSCORES], same as ZRANGE with REV
+        """
+        if len(command_args) > 4 or (len(command_args) == 4 and normalize_token(command_args[3]) != "WITHSCORES"):
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+        return self._handle_zrange_command(client, command_args + [b"REV"])
+
+    @command("ZRANGEBYSCORE", arity=-4, flags=("readonly",), first_key=1, last_key=1, step=1)
+    def _handle_zrangebyscore_command(self, client, command_args):
+        """
+        ZRANGEBYSCORE key min max [WITHSCORES] [LIMIT offset count]
+        The first member is found by rank, so a LIMIT offset doesn't walk the members it skips
+        """
+        with_scores = False
+        offset, count = 0, -1
+        idx = 3
+        try:
+            while idx < len(command_args):
+                token = normalize_token(command_args[idx])
+                if token == "WITHSCORES":
+                    with_scores = True
+                    idx += 1
+                elif token == "LIMIT" and idx + 2 < len(command_args):
+                    offset, count = int(command_args[idx + 1]), int(command_args[idx + 2])
+                    idx += 3
+                else:
+                    return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+        except ValueError:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR value is not an integer or out of range"
+            )
+        bounds = self._parse_score_range(command_args[1], command_args[2])
+        if isinstance(bounds, (bytes, bytearray)):
+            return bounds
+
+        sorted_set = self._lookup_zset(command_args[0])
+        if sorted_set is False:
+            return self._wrong_type()
+        if sorted_set is None or offset < 0:
+            return self._zset_reply([], with_scores)
+        first, end = sorted_set.score_range_ranks(*bounds)
+        first += offset
+        if count >= 0:
+            end = min(end, first + count)
+        return self._zset_reply(sorted_set.range_by_rank(first, end - 1), with_scores)
+
+    @command("ZCOUNT", arity=4, flags=("readonly", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zcount_command(self, client, command_args):
+        """
+        Number of members within the score range, counted from two rank lookups
+        """
+        bounds = self._parse_score_range(command_args[1], command_args[2])
+        if isinstance(bounds, (bytes, bytearray)):
+            return bounds
+        sorted_set = self._lookup_zset(command_args[0])
+        if sorted_set is False:
+            return self._wrong_type()
+        if sorted_set is None:
+            return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, 0)
+        first, end = sorted_set.score_range_ranks(*bounds)
+        return self.response_builder.build_response(Protocol_2_Data_Types.INTEGER, end - first)
+
+    def _parse_score_range(self, min_arg, max_arg):
+        """
+        Returns (min, min exclusive, max, max exclusive) or an error response
+        """
+        min_bound = parse_score_bound(min_arg)
+        max_bound = parse_score_bound(max_arg)
+        if min_bound is None or max_bound is None:
+            return self.response_builder.build_response(
+                Protocol_2_Data_Types.ERROR, "ERR min or max is not a float"
+            )
+        return min_bound + max_bound
+
+    @command("ZPOPMIN", arity=-2, flags=("write", "fast"), first_key=1, last_key=1, step=1)
+    def _handle_zpopmin_command(self, client, command_args):
+        """
+        ZPOPMIN key [count], removes and returns the members with the lowest scores
+        """
+        key = command_args[0]
+        count = 1
+        if len(command_args) > 2:
+            return self.response_builder.build_response(Protocol_2_Data_Types.ERROR, "ERR syntax error")
+        if len(command_args) == 2:
+            try:
+                count = int(command_args[1])
+            except ValueError:
+                count = -1
+            if count < 0:
+                return self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "ERR value is out of range, must be positive"
+                )
+
+        sorted_set = self._lookup_zset(key)
+        if sorted_set is False:
+            return self._wrong_type()
+        if sorted_set is None or not count:
+            return self._zset_reply([], True)
+
+        old_size = sys.getsizeof(sorted_set)
+        entries = sorted_set.range_by_rank(0, min(count, len(sorted_set)) - 1)
+        for member, _ in entries:
+            sorted_set.remove(member)
+        self.keyspace.value_resized(key, old_size)
+        self.keyspace.dirty += len(entries)
+        if not len(sorted_set):
+            self.keyspace.delete(key)
+        if len(command_args) == 1 and self.response_builder.resp3:
+            # Without count RESP3 clients get the pair itself, not a list of pairs
+            member, score = entries[0]
+            return self.response_builder.build_response(Protocol_2_Data_Types.ARRAY, [member, score])
+        return self._zset_reply(entries, True)
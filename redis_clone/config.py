@@ -0,0 +1,165 @@
+"""
+Server configuration, option names follow redis.conf
+Every option can be overridden with a REDIS_<NAME> environment variable
+eg: client-output-buffer-limit can be set with REDIS_CLIENT_OUTPUT_BUFFER_LIMIT=64mb
+"""
+import logging
+import os
+
+DEFAULT_CONFIG = {
+    # Max bytes of replies a client can have pending before it's disconnected, 0 means no limit
+    "client-output-buffer-limit": 0,
+    # Same for pub/sub subscribers, which are disconnected right away past the hard limit and
+    # after staying over the soft limit for soft-seconds, same as redis client-output-buffer-limit pubsub
+    "client-output-buffer-limit-pubsub-hard": 32 * 1024 * 1024,
+    "client-output-buffer-limit-pubsub-soft": 8 * 1024 * 1024,
+    "client-output-buffer-limit-pubsub-soft-seconds": 60,
+    # Times per second background tasks like the active expire cycle run
+    "hz": 10,
+    # The server cron spends a millisecond moving keys of a key table being resized, so
+    # resizes finish even without writes, same as redis activerehashing
+    "activerehashing": True,
+    # Directory and file name of the snapshot written by SAVE/BGSAVE and loaded at startup
+    "dir": ".",
+    "dbfilename": "dump.rdb",
+    # Log every write command to the append only file, it's loaded instead of the snapshot at startup
+    "appendonly": False,
+    "appendfilename": "appendonly.aof",
+    # When the append only file is synced to disk: always, everysec or no
+    "appendfsync": "everysec",
+    # Sharded mode, see redis_clone/launcher.py. Shard i of cluster-shards listens on base port + i
+    "cluster-enabled": False,
+    "cluster-shards": 1,
+    "cluster-shard-index": 0,
+    # Address of the shards given to clients in MOVED redirects and CLUSTER SLOTS
+    "cluster-announce-ip": "127.0.0.1",
+    # "host port" of the primary this server replicates, empty for a primary
+    "replicaof": "",
+    # Bytes of the replication stream kept for replicas which reconnect
+    "repl-backlog-size": 1024 * 1024,
+    # Replicas reject writes from clients
+    "replica-read-only": True,
+    # Bytes of keys and values above which keys are evicted, 0 means no limit
+    "maxmemory": 0,
+    # Keys evicted: noeviction, allkeys-lru, allkeys-lfu, volatile-lru or volatile-ttl
+    "maxmemory-policy": "noeviction",
+    # Keys sampled for every eviction, more samples get closer to the exact policy
+    "maxmemory-samples": 5,
+    # Accesses needed to grow the lfu counter and minutes it takes to decrease it by one
+    "lfu-log-factor": 10,
+    "lfu-decay-time": 1,
+    # Messages logged: debug (also every command), notice or warning
+    "loglevel": "notice",
+    # Commands running for at least this many microseconds are kept in the slow log, negative disables it
+    "slowlog-log-slower-than": 10000,
+    # Entries kept in the slow log, the oldest are dropped
+    "slowlog-max-len": 128,
+    # Port of the HTTP listener serving /metrics in the Prometheus text format, 0 disables it
+    "metrics-port": 0,
+    # Event loop running the server: asyncio or uvloop, which falls back to asyncio if not installed
+    "event-loop": "asyncio",
+    # Path of a unix domain socket listened on besides the tcp port, empty disables it
+    "unixsocket": "",
+    # Octal permissions of the unix socket eg: 700, empty keeps the umask default
+    "unixsocketperm": "",
+    # Pending connections queue of the listening sockets
+    "tcp-backlog": 511,
+    # Seconds of silence before a tcp keepalive probe is sent to a client, 0 disables keepalive
+    "tcp-keepalive": 300,
+    # Connections above this limit are refused with an error
+    "maxclients": 10000,
+    # Seconds after which idle clients are disconnected, 0 means never
+    "timeout": 0,
+    # Keys remembered for client side caching in the default tracking mode, the oldest are invalidated past it
+    "tracking-table-max-keys": 1000000,
+    # Hashes are stored as a compact listpack until they have more fields or a longer field or value than these
+    "hash-max-listpack-entries": 128,
+    "hash-max-listpack-value": 64,
+    # Same for sorted sets, past them members are kept in a skiplist
+    "zset-max-listpack-entries": 128,
+    "zset-max-listpack-value": 64,
+    # Lists are a sequence of listpack nodes, positive values limit the entries of a node,
+    # -1 to -5 its size to 4, 8, 16, 32 or 64 KB
+    "list-max-listpack-size": -2,
+}
+
+# Options which hold a memory size and accept units eg: 64mb
+MEMORY_OPTIONS = {
+    "client-output-buffer-limit",
+    "client-output-buffer-limit-pubsub-hard",
+    "client-output-buffer-limit-pubsub-soft",
+    "repl-backlog-size",
+    "maxmemory",
+}
+
+LOG_LEVELS = {
+    "debug": logging.DEBUG,
+    "notice": logging.INFO,
+    "warning": logging.WARNING,
+}
+
+MEMORY_UNITS = {
+    "b": 1,
+    "k": 1000,
+    "kb": 1024,
+    "m": 1000 * 1000,
+    "mb": 1024 * 1024,
+    "g": 1000 * 1000 * 1000,
+    "gb": 1024 * 1024 * 1024,
+}
+
+
+def parse_memory(value):
+    """
+    Converts a memory size like 100, 64mb or 1gb to bytes
+    """
+    value = str(value).strip().lower()
+    for unit in sorted(MEMORY_UNITS, key=len, reverse=True):
+        if value.endswith(unit):
+            return int(value[:-len(unit)]) * MEMORY_UNITS[unit]
+    return int(value)
+
+
+def parse_option(name, value):
+    """
+    Converts value to the type of the option's default value
+    """
+    if name in MEMORY_OPTIONS:
+        return parse_memory(value)
+
+    default = DEFAULT_CONFIG[name]
+    if isinstance(default, bool):
+        return str(value).lower() in ("yes", "true", "1")
+    if isinstance(default, int):
+        return int(value)
+    return str(value)
+
+
+def log_level(config):
+    """
+    Python logging level of the loglevel option
+    """
+    if config["loglevel"] not in LOG_LEVELS:
+        raise Exception(f"Invalid loglevel {config['loglevel']}")
+    return LOG_LEVELS[config["loglevel"]]
+
+
+def load_config(overrides=None, environ=None):
+    """
+    Builds the server configuration from the defaults, environment variables and overrides
+    Overrides take precedence over environment variables
+    """
+    environ = os.environ if environ is None else environ
+    config = dict(DEFAULT_CONFIG)
+
+    for name in DEFAULT_CONFIG:
+        env_name = "REDIS_" + name.upper().replace("-", "_")
+        if env_name in environ:
+            config[name] = parse_option(name, environ[env_name])
+
+    for name, value in (overrides or {}).items():
+        if name not in DEFAULT_CONFIG:
+            raise Exception(f"Unknown config option {name}")
+        config[name] = parse_option(name, value)
+
+    return config
@@ -0,0 +1,155 @@
+"""
+Eviction of keys when the keyspace uses more than maxmemory, same approach as redis evict.c
+
+Finding the globally least recently used key would need an ordered structure updated by
+every read. Instead a few random keys are sampled for every eviction and the best candidates
+seen so far are kept in a small pool, so the cost of an access is a single dict store and
+the evicted keys are close to the ones an exact LRU/LFU would pick.
+"""
+import bisect
+import random
+import time
+
+EVICTION_POLICIES = {"noeviction", "allkeys-lru", "allkeys-lfu", "volatile-lru", "volatile-ttl"}
+# Policies which record the accesses of every key in Keyspace.access
+ACCESS_TRACKING_POLICIES = {"allkeys-lru", "allkeys-lfu", "volatile-lru"}
+LFU_POLICIES = {"allkeys-lfu"}
+
+# Candidates kept between evictions, same as redis EVPOOL_SIZE
+EVICTION_POOL_SIZE = 16
+
+# Counter of new keys so they are not evicted before they had a chance to be accessed again
+LFU_INIT_VAL = 5
+LFU_MAX_COUNTER = 255
+# The LFU access time is stored in minutes in the bits above the 8 bits of the counter
+LFU_COUNTER_BITS = 8
+
+
+def lru_clock():
+    """
+    Milliseconds clock stored as the last access time of keys
+    """
+    return int(time.monotonic() * 1000)
+
+
+def lfu_minutes(clock):
+    return clock // 60000
+
+
+def lfu_init(minutes):
+    """
+    Packed access counter of a new key
+    """
+    return (minutes << LFU_COUNTER_BITS) | LFU_INIT_VAL
+
+
+def lfu_decay(packed, minutes, decay_time):
+    """
+    Counter of packed after removing one for every decay_time minutes without accesses
+    """
+    counter = packed & LFU_MAX_COUNTER
+    if decay_time:
+        elapsed = minutes - (packed >> LFU_COUNTER_BITS)
+        counter = max(counter - elapsed // decay_time, 0)
+    return counter
+
+
+def lfu_increment(packed, minutes, log_factor, decay_time):
+    """
+    Records an access, the counter grows logarithmically so 8 bits can tell apart keys
+    accessed a few times from keys accessed millions of times, same as redis LFULogIncr
+    """
+    counter = lfu_decay(packed, minutes, decay_time)
+    if counter < LFU_MAX_COUNTER:
+        base = max(counter - LFU_INIT_VAL, 0)
+        if random.random() < 1.0 / (base * log_factor + 1):
+            counter += 1
+    return (minutes << LFU_COUNTER_BITS) | counter
+
+
+class EvictionPool:
+    """
+    Best candidates for eviction, as (score, key) sorted by score, the highest is evicted first
+    """
+
+    def __init__(self, size=EVICTION_POOL_SIZE) -> None:
+        self.size = size
+        self.entries = []
+
+    def __len__(self):
+        return len(self.entries)
+
+    def populate(self, keys, score):
+        """
+        Adds the keys whose score is better than the worst of a full pool
+        """
+        entries = self.entries
+        for key in keys:
+            key_score = score(key)
+            if len(entries) >= self.size and key_score <= entries[0][0]:
+                continue
+            if any(entry_key == key for _, entry_key in entries):
+                continue
+            bisect.insort(entries, (key_score, key))
+            if len(entries) > self.size:
+                del entries[0]
+
+    def pop(self):
+        return self.entries.pop()[1]
+
+    def clear(self):
+        self.entries.clear()
+
+
+def _score_function(keyspace):
+    """
+    Returns the function giving the eviction score of a key for the policy of keyspace
+    """
+    policy = keyspace.eviction_policy
+    access = keyspace.access
+    if policy == "volatile-ttl":
+        expires = keyspace.expires
+        # Sooner deadlines are evicted first
+        return lambda key: -expires.get(key, 0)
+    if policy == "allkeys-lfu":
+        minutes = lfu_minutes(keyspace.lru_clock)
+        decay_time = keyspace.lfu_decay_time
+        initial = lfu_init(minutes)
+        return lambda key: LFU_MAX_COUNTER - lfu_decay(access.get(key, initial), minutes, decay_time)
+    # Keys never accessed since they were loaded are the most idle
+    clock = keyspace.lru_clock
+    return lambda key: clock - access.get(key, 0)
+
+
+def select_key(keyspace, pool, samples):
+    """
+    Returns the key to evict or None if the policy has no candidate
+    """
+    volatile = keyspace.eviction_policy.startswith("volatile-")
+    table = keyspace.volatile_keys if volatile else keyspace.key_table
+    candidates = keyspace.expires if volatile else keyspace.data
+    score = _score_function(keyspace)
+    while len(table):
+        pool.populate(table.sample(samples), score)
+        while len(pool):
+            key = pool.pop()
+            # Entries left by previous evictions can be gone or lost their ttl since
+            if key in candidates:
+                return key
+    return None
+
+
+def perform_evictions(keyspace, maxmemory, pool, samples):
+    """
+    Evicts keys until keyspace uses at most maxmemory, returns the evicted keys
+    """
+    evicted = []
+    if keyspace.eviction_policy == "noeviction":
+        return evicted
+    while keyspace.used_memory > maxmemory:
+        key = select_key(keyspace, pool, samples)
+        if key is None:
+            break
+        keyspace.evict(key)
+        evicted.append(key)
+    return evicted
@@ -0,0 +1,39 @@
+import heapq
+
+
+class ExpireIndex:
+    """
+    Min heap of (deadline in milliseconds, key) used by the active expire cycle to find
+    the keys which expired without scanning the whole data store.
+
+    Entries are not removed when a key is deleted or gets a new deadline, instead the
+    caller checks the key's current deadline when an entry is popped and skips stale ones.
+    """
+
+    def __init__(self) -> None:
+        self.heap = []
+
+    def __len__(self):
+        return len(self.heap)
+
+    def add(self, key, deadline_ms):
+        heapq.heappush(self.heap, (deadline_ms, key))
+
+    def pop_expired(self, now_ms):
+        """
+        Pops the entry with the smallest deadline if it's before now_ms
+        Returns (deadline_ms, key) or None when no entry expired yet
+        """
+        if self.heap and self.heap[0][0] < now_ms:
+            return heapq.heappop(self.heap)
+        return None
+
+    def rebuild(self, expires):
+        """
+        Rebuilds the heap from the current deadlines, dropping every stale entry
+        """
+        self.heap = [(deadline_ms, key) for key, deadline_ms in expires.items()]
+        heapq.heapify(self.heap)
+
+    def clear(self):
+        self.heap = []
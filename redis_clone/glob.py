@@ -0,0 +1,82 @@
+"""
+Glob style patterns of KEYS, SCAN MATCH and PSUBSCRIBE, same syntax as redis stringmatchlen:
+    * any sequence of bytes, ? any single byte
+    [abc] [a-z] a byte of the set, [^abc] a byte out of it
+    \\x the byte x itself
+
+Patterns are compiled once to a regular expression, matching a key is then a single call
+into the re engine instead of a python loop over the pattern
+"""
+import functools
+import re
+
+
+def _translate(pattern):
+    parts = []
+    idx = 0
+    length = len(pattern)
+    while idx < length:
+        char = pattern[idx:idx + 1]
+        idx += 1
+        if char == b"*":
+            # Consecutive stars match the same as one
+            while pattern[idx:idx + 1] == b"*":
+                idx += 1
+            parts.append(b".*")
+        elif char == b"?":
+            parts.append(b".")
+        elif char == b"\\" and idx < length:
+            parts.append(re.escape(pattern[idx:idx + 1]))
+            idx += 1
+        elif char == b"[":
+            idx = _translate_set(pattern, idx, parts)
+        else:
+            parts.append(re.escape(char))
+    return b"".join(parts)
+
+
+def _translate_set(pattern, idx, parts):
+    """
+    Appends the class of the set starting at idx, right after its [, returns the index after it
+    An unterminated set runs to the end of the pattern, same as redis
+    """
+    length = len(pattern)
+    negate = pattern[idx:idx + 1] == b"^"
+    if negate:
+        idx += 1
+    members = []
+    while idx < length and pattern[idx:idx + 1] != b"]":
+        char = pattern[idx:idx + 1]
+        if char == b"\\" and idx + 1 < length:
+            idx += 1
+            char = pattern[idx:idx + 1]
+        if pattern[idx + 1:idx + 2] == b"-" and idx + 2 < length and pattern[idx + 2:idx + 3] != b"]":
+            end = pattern[idx + 2:idx + 3]
+            # Reversed ranges match the same bytes as the ordered ones
+            low, high = sorted((char, end))
+            members.append(re.escape(low) + b"-" + re.escape(high))
+            idx += 3
+        else:
+            members.append(re.escape(char))
+            idx += 1
+    if not members:
+        # [] and [^] can't match any byte, same as redis
+        parts.append(b"(?!)" if not negate else b".")
+    else:
+        parts.append(b"[" + (b"^" if negate else b"") + b"".join(members) + b"]")
+    return idx + 1
+
+
+def compile_pattern(pattern):
+    """
+    Returns a function telling if a key matches pattern, None for * which matches everything
+    """
+    return _compile(bytes(pattern))
+
+
+# Clients repeat the same few patterns, they are compiled once
+@functools.lru_cache(maxsize=1024)
+def _compile(pattern):
+    if pattern == b"*":
+        return None
+    return re.compile(_translate(pattern), re.DOTALL).fullmatch
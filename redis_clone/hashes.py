@@ -0,0 +1,137 @@
+"""
+Hash values, same encodings as redis t_hash.c
+
+Small hashes are a listpack with every field followed by its value. Once a hash has more
+than max_listpack_entries fields or gets a field or value longer than max_listpack_value
+it's converted to a dict, and it stays a dict even if it shrinks again.
+"""
+import sys
+
+from redis_clone.listpack import Listpack
+
+ENCODING_LISTPACK = "listpack"
+ENCODING_HASHTABLE = "hashtable"
+
+
+class Hash:
+    """
+    Field -> value map stored as a Listpack or as a dict
+
+    The memory of the fields and values of the dict is summed as they change, so the size
+    of a hash is known without walking it, see entry_memory
+    """
+
+    __slots__ = ("listpack", "table", "table_entries_size")
+
+    def __init__(self) -> None:
+        self.listpack = Listpack()
+        self.table = None
+        self.table_entries_size = 0
+
+    @property
+    def encoding(self):
+        return ENCODING_LISTPACK if self.table is None else ENCODING_HASHTABLE
+
+    def __len__(self):
+        if self.table is None:
+            return len(self.listpack) // 2
+        return len(self.table)
+
+    def __sizeof__(self):
+        if self.table is None:
+            return object.__sizeof__(self) + sys.getsizeof(self.listpack)
+        return object.__sizeof__(self) + sys.getsizeof(self.table) + self.table_entries_size
+
+    def get(self, field):
+        """
+        Returns the value of field or None if it doesn't exist
+        """
+        if self.table is not None:
+            return self.table.get(field)
+        offset = self.listpack.find(field, skip=1)
+        if offset < 0:
+            return None
+        return self.listpack.get(self.listpack.entry_end(offset))[0]
+
+    def set(self, field, value, max_listpack_entries, max_listpack_value):
+        """
+        Sets field to value, returns True if the field is new
+        """
+        field = bytes(field)
+        value = bytes(value)
+        if self.table is None:
+            listpack = self.listpack
+            if len(field) <= max_listpack_value and len(value) <= max_listpack_value:
+                offset = listpack.find(field, skip=1)
+                if offset >= 0:
+                    listpack.replace(listpack.entry_end(offset), value)
+                    return False
+                if len(listpack) // 2 < max_listpack_entries:
+                    listpack.append(field)
+                    listpack.append(value)
+                    return True
+            self._convert_to_table()
+
+        old_value = self.table.get(field)
+        self.table[field] = value
+        if old_value is None:
+            self.table_entries_size += sys.getsizeof(field) + sys.getsizeof(value)
+            return True
+        self.table_entries_size += sys.getsizeof(value) - sys.getsizeof(old_value)
+        return False
+
+    def delete(self, field):
+        """
+        Deletes field, returns True if it existed
+        """
+        if self.table is not None:
+            value = self.table.pop(field, None)
+            if value is None:
+                return False
+            self.table_entries_size -= sys.getsizeof(bytes(field)) + sys.getsizeof(value)
+            return True
+        offset = self.listpack.find(field, skip=1)
+        if offset < 0:
+            return False
+        self.listpack.delete(offset, 2)
+        return True
+
+    def items(self):
+        """
+        Yields the fields and their values
+        """
+        if self.table is not None:
+            yield from self.table.items()
+            return
+        entries = iter(self.listpack)
+        for field in entries:
+            yield field, next(entries)
+
+    def _convert_to_table(self):
+        table = {}
+        entries_size = 0
+        for field, value in self.items():
+            table[field] = value
+            entries_size += sys.getsizeof(field) + sys.getsizeof(value)
+        self.table = table
+        self.table_entries_size = entries_size
+        self.listpack = None
+
+    @classmethod
+    def from_listpack(cls, listpack):
+        hash_value = cls()
+        hash_value.listpack = listpack
+        return hash_value
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Builds a dict encoded hash eg: while loading a snapshot
+        """
+        hash_value = cls()
+        hash_value.listpack = None
+        hash_value.table = {}
+        for field, value in items:
+            hash_value.table[field] = value
+            hash_value.table_entries_size += sys.getsizeof(field) + sys.getsizeof(value)
+        return hash_value
@@ -0,0 +1,283 @@
+import random
+import time
+
+# Buckets of a new table, always a power of two
+KEY_TABLE_INITIAL_BUCKETS = 16
+# Average number of keys per bucket before the number of buckets is doubled
+KEY_TABLE_MAX_LOAD = 8
+# The table is shrunk when there are more than this many buckets per key
+KEY_TABLE_MIN_FILL = 8
+# Buckets visited by sample for every key asked, so sampling a sparse table always ends
+KEY_TABLE_SAMPLE_STEPS_PER_KEY = 10
+# Empty buckets scan can visit for every key asked, same as the maxiterations of redis SCAN
+KEY_TABLE_SCAN_STEPS_PER_KEY = 10
+# Buckets moved to the new table by every add and remove during a rehash, same as redis _dictRehashStep
+KEY_TABLE_REHASH_STEP = 1
+# Empty buckets a rehash step can skip for every bucket it moves, same as redis dictRehash
+KEY_TABLE_REHASH_EMPTY_VISITS = 10
+# Buckets moved between checks of the time budget of rehash_milliseconds
+KEY_TABLE_REHASH_CHECK_INTERVAL = 100
+
+
+def _next_cursor(cursor, mask):
+    """
+    Increments the reversed bits of cursor within mask, see KeyTable.scan
+    """
+    # Set the bits above the mask so the increment carries through them
+    cursor |= ~mask
+    cursor = _reverse_bits(cursor)
+    cursor += 1
+    return _reverse_bits(cursor)
+
+
+class KeyTable:
+    """
+    Keys grouped in buckets by their hash, the same shape as the hash table of a redis dict
+    python dicts can't return a random key without a copy of all the keys, the buckets
+    can, so random keys for eviction are picked in constant time
+
+    Empty buckets are None, so a table of millions of buckets is allocated in one go.
+    Resizing is incremental, same as redis dict rehashing. A second table of the new size
+    is allocated and every add and remove moves a bucket of the current table to it, the
+    server cron moves more with rehash_milliseconds. Once every bucket moved the new table
+    replaces the current one, so growing a table of millions of keys never blocks.
+    """
+
+    def __init__(self) -> None:
+        self.buckets = [None] * KEY_TABLE_INITIAL_BUCKETS
+        self.mask = KEY_TABLE_INITIAL_BUCKETS - 1
+        self.size = 0
+        # Table being filled by a rehash, None when not rehashing
+        self.rehash_buckets = None
+        self.rehash_mask = 0
+        # Buckets of the current table below this index were moved to the new one
+        self.rehash_index = 0
+
+    def __len__(self):
+        return self.size
+
+    def __iter__(self):
+        for buckets in (self.buckets, self.rehash_buckets or ()):
+            for bucket in buckets:
+                if bucket:
+                    yield from bucket
+
+    @property
+    def rehashing(self):
+        return self.rehash_buckets is not None
+
+    def add(self, key):
+        """
+        Adds a key which is not in the table
+        """
+        if self.rehash_buckets is not None:
+            self._rehash(KEY_TABLE_REHASH_STEP)
+        if self.rehash_buckets is not None:
+            # Keys added during a rehash go to the new table
+            buckets, index = self.rehash_buckets, hash(key) & self.rehash_mask
+        else:
+            buckets, index = self.buckets, hash(key) & self.mask
+        bucket = buckets[index]
+        if bucket is None:
+            buckets[index] = [key]
+        else:
+            bucket.append(key)
+        self.size += 1
+        if self.rehash_buckets is None and self.size > KEY_TABLE_MAX_LOAD * len(self.buckets):
+            self._start_rehash(len(self.buckets) * 2)
+
+    def remove(self, key):
+        if self.rehash_buckets is not None:
+            self._rehash(KEY_TABLE_REHASH_STEP)
+        index = hash(key) & self.mask
+        bucket = self.buckets[index]
+        if bucket is not None and key in bucket:
+            buckets = self.buckets
+        else:
+            # Moved by the rehash, or added since it started
+            buckets = self.rehash_buckets
+            index = hash(key) & self.rehash_mask
+            bucket = buckets[index]
+        bucket.remove(key)
+        if not bucket:
+            buckets[index] = None
+        self.size -= 1
+        # Shrunk once mostly empty, sample would otherwise walk many empty buckets
+        if (
+            self.rehash_buckets is None
+            and len(self.buckets) > KEY_TABLE_INITIAL_BUCKETS
+            and self.size * KEY_TABLE_MIN_FILL < len(self.buckets)
+        ):
+            self._start_rehash(_buckets_for(self.size))
+
+    def clear(self):
+        self.buckets = [None] * KEY_TABLE_INITIAL_BUCKETS
+        self.mask = KEY_TABLE_INITIAL_BUCKETS - 1
+        self.size = 0
+        self.rehash_buckets = None
+        self.rehash_index = 0
+
+    def rebuild(self, keys):
+        """
+        Replaces the content of the table with keys, sized for them up front
+        """
+        buckets = KEY_TABLE_INITIAL_BUCKETS
+        while len(keys) > KEY_TABLE_MAX_LOAD * buckets:
+            buckets *= 2
+        self.clear()
+        self.buckets = [None] * buckets
+        self.mask = buckets - 1
+        for key in keys:
+            index = hash(key) & self.mask
+            bucket = self.buckets[index]
+            if bucket is None:
+                self.buckets[index] = [key]
+            else:
+                bucket.append(key)
+        self.size = len(keys)
+
+    def _start_rehash(self, buckets):
+        self.rehash_buckets = [None] * buckets
+        self.rehash_mask = buckets - 1
+        self.rehash_index = 0
+
+    def _rehash(self, count):
+        """
+        Moves count buckets of the current table to the new one, skipping a bounded number
+        of empty buckets. Returns True while there are buckets left to move
+        """
+        buckets = self.buckets
+        new_buckets = self.rehash_buckets
+        new_mask = self.rehash_mask
+        index = self.rehash_index
+        empty_visits = count * KEY_TABLE_REHASH_EMPTY_VISITS
+        while count and index < len(buckets):
+            bucket = buckets[index]
+            if bucket is None:
+                index += 1
+                empty_visits -= 1
+                if not empty_visits:
+                    break
+                continue
+            for key in bucket:
+                new_index = hash(key) & new_mask
+                new_bucket = new_buckets[new_index]
+                if new_bucket is None:
+                    new_buckets[new_index] = [key]
+                else:
+                    new_bucket.append(key)
+            buckets[index] = None
+            index += 1
+            count -= 1
+        self.rehash_index = index
+
+        if index < len(buckets):
+            return True
+        self.buckets = new_buckets
+        self.mask = new_mask
+        self.rehash_buckets = None
+        self.rehash_index = 0
+        return False
+
+    def rehash_milliseconds(self, time_limit_ms):
+        """
+        Moves buckets to the new table for up to time_limit_ms, called by the server cron
+        so a table nobody writes to still finishes its rehash. Returns True while rehashing
+        """
+        if self.rehash_buckets is None:
+            return False
+        deadline = time.monotonic() + time_limit_ms / 1000
+        while self._rehash(KEY_TABLE_REHASH_CHECK_INTERVAL):
+            if time.monotonic() > deadline:
+                return True
+        return False
+
+    def _tables(self):
+        """
+        (buckets, mask) of the tables holding keys, the new one last
+        """
+        if self.rehash_buckets is None:
+            return ((self.buckets, self.mask),)
+        return ((self.buckets, self.mask), (self.rehash_buckets, self.rehash_mask))
+
+    def sample(self, count):
+        """
+        Returns up to count keys read from consecutive buckets starting at a random one,
+        same as redis dictGetSomeKeys. Keys can be returned more than once
+        During a rehash both tables are read at the same indexes, the buckets already moved
+        are empty in the current one
+        """
+        if not self.size:
+            return []
+        keys = []
+        tables = self._tables()
+        max_mask = max(mask for _, mask in tables)
+        index = random.getrandbits(32) & max_mask
+        for _ in range(count * KEY_TABLE_SAMPLE_STEPS_PER_KEY):
+            for buckets, mask in tables:
+                if index > mask:
+                    continue
+                bucket = buckets[index]
+                if bucket:
+                    keys.extend(bucket[:count - len(keys)])
+            if len(keys) >= count:
+                break
+            index = (index + 1) & max_mask
+        return keys
+
+    def scan(self, cursor, count):
+        """
+        Returns the keys of the buckets from cursor on, up to about count of them, and the
+        cursor to continue from, 0 once the whole table was visited. Same as redis dictScan:
+
+        The cursor is incremented from its highest bit down, so it walks the buckets in the
+        order of their reversed index. Doubling the table splits bucket i into i and
+        i + old size, which come right after each other in that order, and halving it merges
+        them back, so a resize between two calls never skips the buckets left to visit.
+        During a rehash the bucket of the smaller table is visited together with every
+        bucket of the larger one it expands to, which keeps the same guarantee.
+        Every key present for the whole scan is returned at least once, a key can be returned
+        twice if the table shrinks
+        """
+        keys = []
+        for _ in range(max(count, 1) * KEY_TABLE_SCAN_STEPS_PER_KEY):
+            if self.rehash_buckets is None:
+                bucket = self.buckets[cursor & self.mask]
+                if bucket:
+                    keys.extend(bucket)
+                cursor = _next_cursor(cursor, self.mask)
+            else:
+                (small, small_mask), (large, large_mask) = sorted(self._tables(), key=lambda table: table[1])
+                bucket = small[cursor & small_mask]
+                if bucket:
+                    keys.extend(bucket)
+                while True:
+                    bucket = large[cursor & large_mask]
+                    if bucket:
+                        keys.extend(bucket)
+                    cursor = _next_cursor(cursor, large_mask)
+                    # Until the bits of the larger mask only roll back to 0
+                    if not cursor & (small_mask ^ large_mask):
+                        break
+            if not cursor or len(keys) >= count:
+                break
+        return keys, cursor
+
+
+def _buckets_for(size):
+    """
+    Smallest number of buckets which holds size keys with about one key per bucket
+    """
+    buckets = KEY_TABLE_INITIAL_BUCKETS
+    while buckets < size:
+        buckets *= 2
+    return buckets
+
+
+# Cursors are 64 bits wide like redis ones, so they stay valid whatever the table size
+CURSOR_BITS = 64
+CURSOR_MASK = (1 << CURSOR_BITS) - 1
+
+
+def _reverse_bits(value):
+    return int(format(value & CURSOR_MASK, "064b")[::-1], 2)
@@ -0,0 +1,340 @@
+import sys
+import time
+
+from redis_clone import evict
+from redis_clone.expire import ExpireIndex
+from redis_clone.hashes import Hash
+from redis_clone.key_table import KeyTable
+from redis_clone.quicklist import Quicklist
+from redis_clone.zsets import SortedSet
+
+# Number of keys expired between checks of the active expire cycle's time budget
+ACTIVE_EXPIRE_CYCLE_CHECK_INTERVAL = 16
+# Expire index is rebuilt when stale entries make it this many times bigger than expires
+EXPIRE_INDEX_MAX_STALE_RATIO = 2
+# Estimated bytes of the entries of a key in data and in the key table, on top of the key and the value
+KEY_ENTRY_OVERHEAD = 80
+
+# How keys past their deadline are handled, see Keyspace.expire_mode
+# Deleted when accessed and by the active expire cycle
+EXPIRE_DELETE = "delete"
+# Reported missing but kept, replicas wait for the DEL of their primary
+EXPIRE_HIDE = "hide"
+# Deadlines are not enforced, while the append only file is replayed or commands of the
+# primary are applied. Both have a DEL for every key which expired, where it expired
+EXPIRE_IGNORE = "ignore"
+
+WRONGTYPE_ERROR = "WRONGTYPE Operation against a key holding the wrong kind of value"
+
+
+def now_ms():
+    """
+    Current unix time in milliseconds
+    """
+    return int(time.time() * 1000)
+
+
+def entry_memory(key, value):
+    """
+    Estimated bytes used by a key and its value
+    Values which hold other objects report their whole size with __sizeof__
+    """
+    return KEY_ENTRY_OVERHEAD + sys.getsizeof(key) + sys.getsizeof(value)
+
+
+def value_type(value):
+    """
+    Type name of a value as returned by TYPE
+    Strings are stored as bytes, or as int for counters
+    """
+    if type(value) is Hash:
+        return "hash"
+    if type(value) is SortedSet:
+        return "zset"
+    if type(value) is Quicklist:
+        return "list"
+    return "string"
+
+
+class Keyspace:
+    """
+    Keys and their values, same as a redis database
+
+    Values are stored bare in data, without any wrapper object.
+    Keys with a ttl also have an entry in expires holding the unix time in milliseconds
+    when they expire, so keys without a ttl don't pay anything for expiry.
+    The same goes for eviction, access times are only kept by the lru and lfu policies.
+
+    dirty counts the changes made by commands, same as redis server.dirty. set, delete,
+    set_deadline, persist and clear count theirs, commands modifying a value in place add
+    theirs. A command which didn't change it is not propagated and doesn't touch watched keys.
+    Expiry and eviction don't count, they are propagated on their own.
+    """
+
+    def __init__(self, stats=None, eviction_policy="noeviction", lfu_log_factor=10, lfu_decay_time=1) -> None:
+        self.data = {}
+        self.expires = {}
+        # Deadlines ordered by time, used to reclaim keys which are never read again
+        self.expire_index = ExpireIndex()
+        # Keys of data and of expires in buckets, to pick random keys
+        self.key_table = KeyTable()
+        self.volatile_keys = KeyTable()
+        # Estimated bytes of all the keys and values, updated with every change
+        self.used_memory = 0
+        self.stats = stats if stats is not None else {}
+        self.stats.setdefault("expired_keys", 0)
+        self.stats.setdefault("expire_cycle_cpu_milliseconds", 0)
+        self.stats.setdefault("evicted_keys", 0)
+
+        if eviction_policy not in evict.EVICTION_POLICIES:
+            raise Exception(f"Invalid maxmemory-policy {eviction_policy}")
+        self.eviction_policy = eviction_policy
+        # Key -> last access clock (lru) or packed access counter (lfu), None when not needed
+        self.access = {} if eviction_policy in evict.ACCESS_TRACKING_POLICIES else None
+        self.lfu = eviction_policy in evict.LFU_POLICIES
+        self.lfu_log_factor = lfu_log_factor
+        self.lfu_decay_time = lfu_decay_time
+        # Milliseconds clock stored as the access time of keys, updated by the server cron
+        # so accessing a key doesn't read the time
+        self.lru_clock = evict.lru_clock()
+        # Called with every key deleted by expiry or eviction, outside of any command on the key
+        self.on_key_removed = None
+        self.expire_mode = EXPIRE_DELETE
+        self.dirty = 0
+
+    def __len__(self):
+        return len(self.data)
+
+    def lookup(self, key):
+        """
+        Returns the value of key or None if it doesn't exist
+        Keys whose deadline passed are deleted on access, see expire_mode
+        """
+        value = self.data.get(key)
+        if value is None:
+            return None
+        if self.expires:
+            deadline = self.expires.get(key)
+            if deadline is not None and deadline < now_ms() and self.expire_mode != EXPIRE_IGNORE:
+                if self.expire_mode == EXPIRE_DELETE:
+                    self._expire_key(key)
+                return None
+        if self.access is not None:
+            self._touch(key)
+        return value
+
+    def lookup_many(self, keys):
+        """
+        Returns the values of keys in one pass, None for the missing ones
+        Deadlines are compared against a single clock read
+        """
+        data = self.data
+        expires = self.expires
+        # No deadline is before 0, nothing expires when deadlines are ignored
+        now = now_ms() if expires and self.expire_mode != EXPIRE_IGNORE else 0
+        values = []
+        for key in keys:
+            value = data.get(key)
+            if value is not None and expires:
+                deadline = expires.get(key)
+                if deadline is not None and deadline < now:
+                    if self.expire_mode == EXPIRE_DELETE:
+                        self._expire_key(key)
+                    value = None
+            if value is not None and self.access is not None:
+                self._touch(key)
+            values.append(value)
+        return values
+
+    def expire_if_needed(self, key):
+        """
+        Deletes key if its deadline passed, without counting an access to it
+        Returns True if it was deleted
+        """
+        deadline = self.expires.get(key)
+        if deadline is not None and deadline < now_ms() and self.expire_mode == EXPIRE_DELETE:
+            self._expire_key(key)
+            return True
+        return False
+
+    def _touch(self, key):
+        """
+        Records an access to key for the lru and lfu policies
+        """
+        if self.lfu:
+            minutes = evict.lfu_minutes(self.lru_clock)
+            self.access[key] = evict.lfu_increment(
+                self.access.get(key) or evict.lfu_init(minutes), minutes, self.lfu_log_factor, self.lfu_decay_time
+            )
+        else:
+            self.access[key] = self.lru_clock
+
+    def exists(self, key):
+        return self.lookup(key) is not None
+
+    def set(self, key, value, deadline_ms=None, keep_ttl=False):
+        """
+        Sets the value of key
+        Any existing ttl is removed unless keep_ttl is set or a new deadline is given
+        """
+        data = self.data
+        old_value = data.get(key)
+        data[key] = value
+        if old_value is None:
+            self.key_table.add(key)
+            self.used_memory += entry_memory(key, value)
+        else:
+            self.used_memory += sys.getsizeof(value) - sys.getsizeof(old_value)
+        if self.access is not None:
+            self._touch(key)
+
+        if deadline_ms is not None:
+            # Counted as a single change by set_deadline
+            self.set_deadline(key, deadline_ms)
+            return
+        self.dirty += 1
+        if not keep_ttl and key in self.expires:
+            del self.expires[key]
+            self.volatile_keys.remove(key)
+
+    def value_resized(self, key, old_size):
+        """
+        Updates the memory accounting after the value of key was modified in place
+        old_size is sys.getsizeof of the value before the change
+        """
+        self.used_memory += sys.getsizeof(self.data[key]) - old_size
+
+    def delete(self, key):
+        """
+        Deletes key, returns True if it existed
+        """
+        if self.lookup(key) is None:
+            return False
+        self._remove(key)
+        self.dirty += 1
+        return True
+
+    def _remove(self, key):
+        value = self.data.pop(key)
+        self.key_table.remove(key)
+        self.used_memory -= entry_memory(key, value)
+        if self.expires.pop(key, None) is not None:
+            self.volatile_keys.remove(key)
+        if self.access is not None:
+            self.access.pop(key, None)
+
+    def evict(self, key):
+        """
+        Deletes key to free memory
+        """
+        self._remove(key)
+        self.stats["evicted_keys"] += 1
+        if self.on_key_removed is not None:
+            self.on_key_removed(key)
+
+    def rebuild_after_load(self):
+        """
+        Rebuilds the key tables and the memory accounting after keys were inserted
+        straight into data and expires, which is how snapshots are loaded fast
+        """
+        self.key_table.rebuild(list(self.data))
+        self.volatile_keys.rebuild(list(self.expires))
+        self.used_memory = sum(entry_memory(key, value) for key, value in self.data.items())
+
+    def incremental_rehash(self, time_limit_ms):
+        """
+        Moves keys of the key tables being resized, see KeyTable.rehash_milliseconds
+        """
+        self.key_table.rehash_milliseconds(time_limit_ms)
+        self.volatile_keys.rehash_milliseconds(time_limit_ms)
+
+    def scan(self, cursor, count, delete_expired=True):
+        """
+        Returns about count keys from cursor on and the cursor to continue from, 0 once every
+        key was returned, see KeyTable.scan. Expired keys are skipped, and deleted unless
+        delete_expired is False, which keeps the table as it is for a caller iterating it
+        in one go
+        """
+        keys, cursor = self.key_table.scan(cursor, count)
+        if self.expires and self.expire_mode != EXPIRE_IGNORE:
+            expires = self.expires
+            now = now_ms()
+            expired = [key for key in keys if expires.get(key, now) < now]
+            if expired:
+                if delete_expired and self.expire_mode == EXPIRE_DELETE:
+                    for key in expired:
+                        self._expire_key(key)
+                expired = set(expired)
+                keys = [key for key in keys if key not in expired]
+        return keys, cursor
+
+    def get_deadline(self, key):
+        """
+        Returns the unix time in milliseconds when key expires or None if it has no ttl
+        """
+        return self.expires.get(key)
+
+    def set_deadline(self, key, deadline_ms):
+        self.dirty += 1
+        if key not in self.expires:
+            self.volatile_keys.add(key)
+        self.expires[key] = deadline_ms
+        self.expire_index.add(key, deadline_ms)
+        if len(self.expire_index) > EXPIRE_INDEX_MAX_STALE_RATIO * len(self.expires) + 1024:
+            self.expire_index.rebuild(self.expires)
+
+    def persist(self, key):
+        """
+        Removes the ttl of key, returns True if it had one
+        """
+        if self.expires.pop(key, None) is None:
+            return False
+        self.volatile_keys.remove(key)
+        self.dirty += 1
+        return True
+
+    def clear(self):
+        self.dirty += len(self.data)
+        self.data.clear()
+        self.expires.clear()
+        self.expire_index.clear()
+        self.key_table.clear()
+        self.volatile_keys.clear()
+        self.used_memory = 0
+        if self.access is not None:
+            self.access.clear()
+
+    def _expire_key(self, key):
+        self._remove(key)
+        self.stats["expired_keys"] += 1
+        if self.on_key_removed is not None:
+            self.on_key_removed(key)
+
+    def active_expire_cycle(self, time_limit_ms):
+        """
+        Deletes keys whose deadline passed, starting from the smallest deadline
+        Stops once time_limit_ms is used so the event loop is never stalled, the rest is
+        picked up by the next cycle
+        """
+        if self.expire_mode != EXPIRE_DELETE:
+            return 0
+        start = time.monotonic()
+        start_cpu = time.process_time()
+        now = now_ms()
+        deadline = start + time_limit_ms / 1000
+        expired = 0
+        iterations = 0
+
+        while (entry := self.expire_index.pop_expired(now)) is not None:
+            iterations += 1
+            deadline_ms, key = entry
+            # Skip stale entries of keys which were deleted or got a new deadline
+            if self.expires.get(key) == deadline_ms:
+                self._expire_key(key)
+                expired += 1
+
+            if iterations % ACTIVE_EXPIRE_CYCLE_CHECK_INTERVAL == 0 and time.monotonic() > deadline:
+                break
+
+        self.stats["expire_cycle_cpu_milliseconds"] += (time.process_time() - start_cpu) * 1000
+        return expired
@@ -0,0 +1,86 @@
+"""
+Starts a sharded deployment, one server process per shard so every shard runs on its own core
+
+Shard i listens on base port + i and owns 1/N of the hash slots, see redis_clone/cluster.py.
+Cluster aware clients (eg: redis.RedisCluster) read the slot map with CLUSTER SLOTS from any
+shard and send every command straight to the shard owning its keys, other clients get MOVED
+redirects.
+
+Usage:
+    python redis_clone/launcher.py [number of shards, default REDIS_CLUSTER_SHARDS or the number of cores]
+Shards are configured with the same REDIS_* environment variables as a single server,
+their snapshot and append only files get the port as suffix eg: dump-7000.rdb
+"""
+import logging
+import multiprocessing
+import os
+import signal
+import sys
+
+from redis_clone.config import load_config, log_level
+from redis_clone.server import HOST, PORT, RedisServer, serve
+
+logger = logging.getLogger(__name__)
+
+
+def shard_file_name(file_name, port):
+    root, ext = os.path.splitext(file_name)
+    return f"{root}-{port}{ext}"
+
+
+def run_shard(host, port, shards, shard_index, config=None):
+    """
+    Entry point of a shard process
+    """
+    config = dict(config or {})
+    defaults = load_config(config)
+    logging.basicConfig(level=log_level(defaults))
+    config.update({
+        "cluster-enabled": True,
+        "cluster-shards": shards,
+        "cluster-shard-index": shard_index,
+        "dbfilename": shard_file_name(defaults["dbfilename"], port),
+        "appendfilename": shard_file_name(defaults["appendfilename"], port),
+    })
+    server = RedisServer(host=host, port=port, config=config)
+    serve(server)
+
+
+def start_shards(shards, host=HOST, base_port=PORT, config=None):
+    """
+    Starts the shard processes and returns them
+    """
+    processes = []
+    for shard_index in range(shards):
+        process = multiprocessing.Process(
+            target=run_shard,
+            args=(host, base_port + shard_index, shards, shard_index, config),
+            name=f"redis-clone-shard-{shard_index}",
+        )
+        process.start()
+        processes.append(process)
+    return processes
+
+
+def main():
+    logging.basicConfig(level=log_level(load_config()))
+    if len(sys.argv) > 1:
+        shards = int(sys.argv[1])
+    else:
+        shards = int(os.environ.get("REDIS_CLUSTER_SHARDS", os.cpu_count() or 1))
+
+    processes = start_shards(shards)
+    logger.info(f"Started {shards} shards on ports {PORT}-{PORT + shards - 1}")
+
+    def _terminate(signum, frame):
+        for process in processes:
+            process.terminate()
+
+    signal.signal(signal.SIGTERM, _terminate)
+    signal.signal(signal.SIGINT, _terminate)
+    for process in processes:
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,181 @@
+"""
+Compact sequence of byte strings in a single buffer, same idea as redis listpack
+
+Small collections are stored as one bytearray instead of a dict or a list of bytes objects,
+which saves the per object header and the hash table of every entry. Finding an entry is a
+linear scan, which is cheaper than hashing for the few dozens of entries they are used for.
+
+Every entry is its length, its bytes, then its back length:
+    lengths below 128 take a single byte
+    longer ones take 4 big endian bytes with the highest bit set
+    the back length is the size of the length and the bytes, encoded the same way but little
+    endian, so its last byte tells how long it is and the entry before any offset is found
+    by reading backwards, same as redis lpPrev. Popping the last entry doesn't walk the
+    whole buffer
+"""
+import sys
+
+SHORT_ENTRY_MAX_LENGTH = 0x7F
+LONG_ENTRY_FLAG = 0x80000000
+
+
+def _encode_header(length):
+    if length <= SHORT_ENTRY_MAX_LENGTH:
+        return bytes((length,))
+    return (length | LONG_ENTRY_FLAG).to_bytes(4, "big")
+
+
+def _encode_entry(entry):
+    encoded = _encode_header(len(entry)) + entry
+    if len(encoded) <= SHORT_ENTRY_MAX_LENGTH:
+        return encoded + bytes((len(encoded),))
+    return encoded + (len(encoded) | LONG_ENTRY_FLAG).to_bytes(4, "little")
+
+
+def encoded_size(entry):
+    """
+    Bytes entry takes in a listpack, its length, its bytes and its back length
+    """
+    length = len(entry) + (1 if len(entry) <= SHORT_ENTRY_MAX_LENGTH else 4)
+    return length + _back_length_size(length)
+
+
+def _back_length_size(length):
+    """
+    Bytes taken by the back length of an entry whose length and bytes take length bytes
+    """
+    return 1 if length <= SHORT_ENTRY_MAX_LENGTH else 4
+
+
+class Listpack:
+    """
+    Entries are addressed by the offset of their header in buffer
+    """
+
+    __slots__ = ("buffer", "count")
+
+    def __init__(self, entries=()) -> None:
+        self.buffer = bytearray()
+        self.count = 0
+        for entry in entries:
+            self.append(entry)
+
+    def __len__(self):
+        return self.count
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self.buffer)
+
+    def __iter__(self):
+        buffer = self.buffer
+        pos = 0
+        end = len(buffer)
+        while pos < end:
+            entry, pos = self.get(pos)
+            yield entry
+
+    def entry_end(self, offset):
+        """
+        Offset right after the entry at offset, which is where the next one starts
+        """
+        buffer = self.buffer
+        length = buffer[offset]
+        if length <= SHORT_ENTRY_MAX_LENGTH:
+            length += 1
+        else:
+            length = (int.from_bytes(buffer[offset:offset + 4], "big") & ~LONG_ENTRY_FLAG) + 4
+        return offset + length + _back_length_size(length)
+
+    def prev_offset(self, offset):
+        """
+        Offset of the entry before the one at offset, offset can be the end of the buffer
+        """
+        buffer = self.buffer
+        length = buffer[offset - 1]
+        if length <= SHORT_ENTRY_MAX_LENGTH:
+            return offset - 1 - length
+        length = int.from_bytes(buffer[offset - 4:offset], "little") & ~LONG_ENTRY_FLAG
+        return offset - 4 - length
+
+    def get(self, offset):
+        """
+        Returns the entry at offset and the offset of the next one
+        """
+        buffer = self.buffer
+        length = buffer[offset]
+        if length <= SHORT_ENTRY_MAX_LENGTH:
+            start = offset + 1
+        else:
+            length = int.from_bytes(buffer[offset:offset + 4], "big") & ~LONG_ENTRY_FLAG
+            start = offset + 4
+        end = start + length
+        return bytes(buffer[start:end]), end + _back_length_size(end - offset)
+
+    def offset_of(self, index):
+        """
+        Offset of the entry at index, which must be within the listpack
+        Entries in the second half are found walking back from the end
+        """
+        if index > self.count // 2:
+            offset = len(self.buffer)
+            for _ in range(self.count - index):
+                offset = self.prev_offset(offset)
+            return offset
+        offset = 0
+        for _ in range(index):
+            offset = self.entry_end(offset)
+        return offset
+
+    def find(self, entry, skip=0, start=0):
+        """
+        Returns the offset of the first entry equal to entry, -1 if there is none
+        skip entries are skipped after every entry compared, eg: 1 compares only the fields
+        of fields and values stored one after the other
+        """
+        buffer = self.buffer
+        # An entry equal to entry is its header followed by its bytes and back length,
+        # bytearray.find gives the candidates and walking the headers only checks they start
+        # an entry which is compared
+        needle = _encode_entry(entry)
+        candidate = buffer.find(needle, start)
+        pos = start
+        step = skip + 1
+        index = 0
+        while candidate >= 0:
+            while pos < candidate:
+                pos = self.entry_end(pos)
+                index += 1
+            if pos == candidate and index % step == 0:
+                return pos
+            # Inside another entry or a skipped one, look for the next occurrence
+            candidate = buffer.find(needle, candidate + 1)
+        return -1
+
+    def append(self, entry):
+        self.buffer += _encode_entry(entry)
+        self.count += 1
+
+    def insert(self, offset, entry):
+        """
+        Inserts entry before the entry at offset
+        """
+        self.buffer[offset:offset] = _encode_entry(entry)
+        self.count += 1
+
+    def replace(self, offset, entry):
+        """
+        Replaces the entry at offset, returns the offset of the next entry
+        """
+        encoded = _encode_entry(entry)
+        self.buffer[offset:self.entry_end(offset)] = encoded
+        return offset + len(encoded)
+
+    def delete(self, offset, count=1):
+        """
+        Deletes count entries starting at offset
+        """
+        end = offset
+        for _ in range(count):
+            end = self.entry_end(end)
+        del self.buffer[offset:end]
+        self.count -= count
@@ -0,0 +1,173 @@
+"""
+Metrics recorded while serving commands and their export in the Prometheus text format
+
+Latencies are kept in log-linear histograms like HdrHistogram: every power of two range
+of microseconds is split in the same number of linear buckets, so recording a value is a
+few integer operations and every percentile is within 1/LATENCY_SUB_BUCKETS of the truth.
+"""
+import math
+
+# Linear buckets in every power of two range, values below it are counted exactly
+LATENCY_SUB_BUCKETS = 16
+LATENCY_HALF_SUB_BUCKETS = LATENCY_SUB_BUCKETS // 2
+LATENCY_SUB_BUCKET_BITS = LATENCY_SUB_BUCKETS.bit_length() - 1
+# Latencies are recorded up to about 19 hours, longer ones are counted in the last bucket
+LATENCY_MAX_VALUE = (1 << 36) - 1
+
+# Percentiles reported by INFO latencystats, same as redis latency-tracking-info-percentiles
+LATENCY_PERCENTILES = (50, 99, 99.9)
+
+# Upper bounds in seconds of the buckets exported to Prometheus
+PROMETHEUS_LATENCY_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1)
+
+# Samples averaged by instantaneous metrics, same as redis STATS_METRIC_SAMPLES
+INSTANTANEOUS_METRIC_SAMPLES = 16
+
+
+class LatencyHistogram:
+    """
+    Counts of latencies in microseconds
+    All the buckets are allocated up front so recording never checks the size of counts
+    """
+
+    def __init__(self) -> None:
+        self.counts = [0] * (self.bucket_index(LATENCY_MAX_VALUE) + 1)
+
+    @property
+    def count(self):
+        return sum(self.counts)
+
+    @staticmethod
+    def bucket_index(value):
+        if value < LATENCY_SUB_BUCKETS:
+            return value
+        shift = value.bit_length() - LATENCY_SUB_BUCKET_BITS
+        return shift * LATENCY_HALF_SUB_BUCKETS + (value >> shift)
+
+    @staticmethod
+    def bucket_upper_bound(index):
+        """
+        Highest value counted in the bucket at index
+        """
+        if index < LATENCY_SUB_BUCKETS:
+            return index
+        shift = index // LATENCY_HALF_SUB_BUCKETS - 1
+        top = index - shift * LATENCY_HALF_SUB_BUCKETS
+        return ((top + 1) << shift) - 1
+
+    def record(self, value):
+        # Same as bucket_index, inlined since it runs for every command
+        if value < LATENCY_SUB_BUCKETS:
+            self.counts[value] += 1
+        elif value <= LATENCY_MAX_VALUE:
+            shift = value.bit_length() - LATENCY_SUB_BUCKET_BITS
+            self.counts[shift * LATENCY_HALF_SUB_BUCKETS + (value >> shift)] += 1
+        else:
+            self.counts[-1] += 1
+
+    def record_many(self, value, count):
+        """
+        Records value count times eg: the latency of a pipeline for every command in it
+        """
+        self.counts[self.bucket_index(min(value, LATENCY_MAX_VALUE))] += count
+
+    def percentile(self, percentile):
+        """
+        Value below which percentile percent of the recorded values are, 0 if nothing was recorded
+        """
+        count = self.count
+        if not count:
+            return 0
+        target = max(math.ceil(count * percentile / 100), 1)
+        seen = 0
+        for index, bucket_count in enumerate(self.counts):
+            seen += bucket_count
+            if seen >= target:
+                return self.bucket_upper_bound(index)
+        return self.bucket_upper_bound(len(self.counts) - 1)
+
+    def count_up_to(self, value):
+        """
+        Number of recorded values whose bucket is entirely at most value
+        """
+        counted = 0
+        for index, count in enumerate(self.counts):
+            if self.bucket_upper_bound(index) > value:
+                break
+            counted += count
+        return counted
+
+    def reset(self):
+        self.counts = [0] * len(self.counts)
+
+
+class InstantaneousMetric:
+    """
+    Rate per second of a counter averaged over the last samples, same as redis trackInstantaneousMetric
+    """
+
+    def __init__(self) -> None:
+        self.samples = [0] * INSTANTANEOUS_METRIC_SAMPLES
+        self.index = 0
+        self.last_time = None
+        self.last_value = 0
+
+    def track(self, value, now):
+        """
+        Records the counter value at monotonic time now, in seconds
+        """
+        if self.last_time is not None and now > self.last_time:
+            self.samples[self.index] = (value - self.last_value) / (now - self.last_time)
+            self.index = (self.index + 1) % INSTANTANEOUS_METRIC_SAMPLES
+        self.last_time = now
+        self.last_value = value
+
+    def rate(self):
+        return int(sum(self.samples) / INSTANTANEOUS_METRIC_SAMPLES)
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    return "{" + ",".join(f'{name}="{value}"' for name, value in labels) + "}"
+
+
+def prometheus_text(metrics, command_table):
+    """
+    Renders metrics in the Prometheus text exposition format
+    metrics is a list of (name, type, help, value), command statistics come from the command table
+    """
+    lines = []
+    for name, metric_type, help_text, value in metrics:
+        lines.append(f"# HELP redis_{name} {help_text}")
+        lines.append(f"# TYPE redis_{name} {metric_type}")
+        lines.append(f"redis_{name} {value}")
+
+    commands = [redis_command for redis_command in command_table.values() if redis_command.calls]
+    lines.append("# HELP redis_commands_total Calls of every command")
+    lines.append("# TYPE redis_commands_total counter")
+    for redis_command in commands:
+        labels = _format_labels([("cmd", redis_command.name.lower())])
+        lines.append(f"redis_commands_total{labels} {redis_command.calls}")
+
+    lines.append("# HELP redis_commands_failed_total Calls of every command which replied with an error")
+    lines.append("# TYPE redis_commands_failed_total counter")
+    for redis_command in commands:
+        labels = _format_labels([("cmd", redis_command.name.lower())])
+        lines.append(f"redis_commands_failed_total{labels} {redis_command.failed_calls}")
+
+    lines.append("# HELP redis_command_duration_seconds Time spent running every command")
+    lines.append("# TYPE redis_command_duration_seconds histogram")
+    for redis_command in commands:
+        latency = redis_command.latency
+        count = latency.count
+        name = redis_command.name.lower()
+        for bound in PROMETHEUS_LATENCY_BUCKETS:
+            labels = _format_labels([("cmd", name), ("le", repr(bound))])
+            lines.append(f"redis_command_duration_seconds_bucket{labels} {latency.count_up_to(int(bound * 1000000))}")
+        labels = _format_labels([("cmd", name), ("le", "+Inf")])
+        lines.append(f"redis_command_duration_seconds_bucket{labels} {count}")
+        labels = _format_labels([("cmd", name)])
+        lines.append(f"redis_command_duration_seconds_sum{labels} {redis_command.microseconds / 1000000}")
+        lines.append(f"redis_command_duration_seconds_count{labels} {count}")
+    return "\n".join(lines) + "\n"
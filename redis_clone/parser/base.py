@@ -1,7 +1,29 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, List, AnyStr
+from typing import Tuple, List, AnyStr, Union
 
 class BaseParser(ABC):
     @abstractmethod
     def parse(self, data, *args, **kwargs) -> Tuple[AnyStr, List[AnyStr]]:
-        pass
\ No newline at end of file
+        pass
+
+    @abstractmethod
+    def feed(self, data) -> None:
+        """
+        Appends data received from the connection to the parser's buffer
+        """
+        pass
+
+    @abstractmethod
+    def gets(self) -> Union[Tuple[AnyStr, List[AnyStr]], bool]:
+        """
+        Returns the next complete command in the buffer as (command_name, command_args)
+        or False when more data is needed, same as hiredis.Reader.gets
+        """
+        pass
+
+    def __iter__(self):
+        """
+        Yields every complete command currently in the buffer
+        """
+        while (request := self.gets()) is not False:
+            yield request
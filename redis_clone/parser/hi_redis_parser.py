@@ -1,18 +1,31 @@
 from hiredis import Reader
 
 from redis_clone.parser.base import BaseParser
+from redis_clone.parser.redis_parser import command_name_from_bytes
 
 
 class HiRedisParser(BaseParser):
-    def __init__(self):
+    def __init__(self, protocol_version=2, **reader_kwargs):
+        self.protocol_version = protocol_version
         self.reader_class = Reader
+        # One reader per connection, it keeps partially received frames between feeds
+        self.reader = self.reader_class(**reader_kwargs)
 
     def parse(self, data, *args, **kwargs):
-        reader = self.reader_class(*args, **kwargs)
-        reader.feed(data)
-        if data := reader.gets():
-            command = data[0]
-            arguments = data[1:]
-            return command, arguments
-        
-        raise Exception("Invalid data received")
\ No newline at end of file
+        self.feed(data)
+        if (request := self.gets()) is not False:
+            return request
+
+        raise Exception("Invalid data received")
+
+    def feed(self, data):
+        self.reader.feed(data)
+
+    def gets(self):
+        data = self.reader.gets()
+        if data is False:
+            return False
+        if not isinstance(data, list) or not data:
+            raise Exception("Invalid protocol data")
+
+        return command_name_from_bytes(data[0]), data[1:]
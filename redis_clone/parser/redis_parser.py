@@ -4,18 +4,11 @@ from redis_clone.parser.base import BaseParser
 
 PROTOCOL_SEPARATOR = b'\r\n'
 
-COMMANDS_METADATA = {
-    "SET": {
-        "EX": {"takes_value": True},
-        "PX": {"takes_value": True},
-        "EXAT": {"takes_value": True},
-        "PXAT": {"takes_value": True},
-        "NX": {"takes_value": False},
-        "XX": {"takes_value": False},
-        "KEEPTTL": {"takes_value": False},
-        "GET": {"takes_value": False},
-    }
-}
+# Longest bulk string and most elements of an array accepted in a request, same as the redis
+# defaults of proto-max-bulk-len and the multibulk limit. A header past them is a protocol
+# error instead of a connection buffering without limit
+PROTO_MAX_BULK_LEN = 512 * 1024 * 1024
+PROTO_MAX_MULTIBULK_LEN = 2 ** 31 - 1
 
 
 class Protocol_2_Data_Types(Enum):
@@ -33,20 +26,95 @@ class Protocol_2_Data_Types(Enum):
     ARRAY = b"*"
 
 
+class Protocol_3_Data_Types(Enum):
+    """
+    Types added by RESP3, ref: https://github.com/redis/redis-specifications/blob/master/protocol/RESP3.md
+    Requests are arrays of bulk strings in both versions, these types only appear in replies
+    RESP2 clients get them converted to the closest RESP2 type, see ResponseBuilder
+    """
+    NULL = b"_"
+    BOOLEAN = b"#"
+    DOUBLE = b","
+    MAP = b"%"
+    SET = b"~"
+    PUSH = b">"
+
+
+# Protocol versions a client can switch to with HELLO
+SUPPORTED_PROTOCOL_VERSIONS = (2, 3)
+
+# First bytes of arrays and bulk strings as ints, compared without slicing the buffer
+ARRAY_PREFIX = Protocol_2_Data_Types.ARRAY.value[0]
+BULK_STRING_PREFIX = Protocol_2_Data_Types.BULK_STRING.value[0]
+
+
+def command_name_from_bytes(data):
+    """
+    Command names and option tokens are the only arguments converted to uppercase str
+    """
+    return data.decode("latin-1").upper()
+
+
 class Parser(BaseParser):
     def __init__(self, protocol_version) -> None:
         self.protocol_version = protocol_version
+        # Data received from the connection which is not consumed yet
+        self._buffer = bytearray()
+        self._pos = 0
+        # State of a partially received command.
+        # Kept between feeds so a large bulk string is never re-scanned, only its length is checked.
+        self._pending_count = None
+        self._pending_items = []
+        self._bulk_length = None
+        # Bytes dropped from the front of the buffer and stream offset of the pending command
+        self._discarded = 0
+        self._command_start = 0
 
     def parse(self, data, *args, **kwargs):
         """
         This function parses the client request and returns the command name and arguments
         """
-        if self.protocol_version == 2:
+        if self.protocol_version in SUPPORTED_PROTOCOL_VERSIONS:
             return self._parse_v2_client_request(data)
         else:
             raise Exception("Protocol version not supported")
 
-    def _parse_v2_client_request(self, data):
+    def feed(self, data):
+        """
+        Appends data received from the connection to the buffer
+        """
+        self._buffer += data
+
+    def gets(self):
+        """
+        Returns the next complete command in the buffer as (command_name, command_args)
+        or False if the buffer does not hold a complete command yet
+        """
+        if self.protocol_version not in SUPPORTED_PROTOCOL_VERSIONS:
+            raise Exception("Protocol version not supported")
+
+        items = self._read_v2_array()
+        if items is False:
+            # Drop the consumed part of the buffer, deleting a bytearray prefix does not move the data
+            if self._pos:
+                self._discarded += self._pos
+                del self._buffer[:self._pos]
+                self._pos = 0
+            return False
+
+        # Only the command name is normalized, arguments are kept as the bytes the client sent
+        return command_name_from_bytes(items[0]), items[1:]
+
+    def processed_bytes(self):
+        """
+        Length of the stream fed so far which holds complete commands, anything after it
+        belongs to a command not received completely yet
+        """
+        if self._pending_count is not None:
+            return self._command_start
+        return self._discarded + self._pos
+
+    def _read_v2_array(self):
         """
         Implementing the RESP2 protocol ref: https://redis.io/docs/reference/protocol-spec/#resp-versions
         Commands are Array of Bulk Strings
@@ -54,48 +122,91 @@ class Parser(BaseParser):
         Where each element has its own type specifier
         Syntax for Bulk Strings is: $<length>\r\n<data>\r\n
         Where length is the number of bytes in data
+
+        Returns the list of elements or False if the array is not complete yet
+        """
+        buffer = self._buffer
+        pos = self._pos
+
+        if self._pending_count is None:
+            if pos >= len(buffer):
+                return False
+            if buffer[pos] != ARRAY_PREFIX:
+                raise Exception("Invalid protocol data")
+            end = buffer.find(PROTOCOL_SEPARATOR, pos)
+            if end == -1:
+                return False
+            num_elements = int(buffer[pos + 1:end])
+            if not 1 <= num_elements <= PROTO_MAX_MULTIBULK_LEN:
+                raise Exception("Invalid multibulk length")
+            self._pending_count = num_elements
+            self._pending_items = []
+            self._command_start = self._discarded + pos
+            pos = end + 2
+
+        items = self._pending_items
+        # Arguments are sliced from a view of the buffer so each one is copied only once
+        view = memoryview(buffer)
+        try:
+            self._read_v2_bulk_strings(view, pos)
+        finally:
+            # Buffer can't be resized while the view is alive
+            view.release()
+
+        if len(items) < self._pending_count:
+            return False
+
+        self._pending_count = None
+        self._pending_items = []
+        return items
+
+    def _read_v2_bulk_strings(self, view, pos):
+        """
+        Reads the bulk strings of the pending array that are completely buffered
+        """
+        buffer = self._buffer
+        buffer_length = len(buffer)
+        items = self._pending_items
+        count = self._pending_count
+        bulk_length = self._bulk_length
+        while len(items) < count:
+            if bulk_length is None:
+                end = buffer.find(PROTOCOL_SEPARATOR, pos)
+                if end == -1:
+                    break
+                if buffer[pos] != BULK_STRING_PREFIX:
+                    raise Exception("Invalid protocol data")
+                bulk_length = int(buffer[pos + 1:end])
+                if not 0 <= bulk_length <= PROTO_MAX_BULK_LEN:
+                    raise Exception("Invalid bulk length")
+                pos = end + 2
+
+            # Wait until the whole bulk string and its separator are buffered
+            if buffer_length - pos < bulk_length + 2:
+                break
+            if buffer[pos + bulk_length:pos + bulk_length + 2] != PROTOCOL_SEPARATOR:
+                # Data longer than its length, what follows can't be trusted to be a command
+                raise Exception("Expected '\\r\\n' after bulk data")
+            items.append(bytes(view[pos:pos + bulk_length]))
+            pos += bulk_length + 2
+            bulk_length = None
+
+        self._bulk_length = bulk_length
+        self._pos = pos
+
+    def _parse_v2_client_request(self, data):
+        """
+        Parses a single client request held completely in data
         """
         if not data:
             return None
 
-        if data[0:1] != Protocol_2_Data_Types.ARRAY.value:
-            raise Exception("Invalid protocol data")
-
-        num_elements = int(data[1:data.index(PROTOCOL_SEPARATOR)])
-        remaining_data = data.split(PROTOCOL_SEPARATOR, num_elements * 2 + 1)[1:]
-        
-        # Convert only the command name to uppercase, leaving arguments in their original case.
-        command_name = self._parse_bulk_string(remaining_data[0] + PROTOCOL_SEPARATOR + remaining_data[1]).upper()
-
-        idx = 2
-        command_args = []
-
-        while idx < num_elements * 2:
-            # Fetch the argument but keep its original casing.
-            arg = self._parse_bulk_string(remaining_data[idx] + PROTOCOL_SEPARATOR + remaining_data[idx+1])
-            
-            # If the command is recognized and the argument is a subargument, uppercase it for consistent processing.
-            if command_name in COMMANDS_METADATA and arg.upper() in COMMANDS_METADATA[command_name]:
-                arg = arg.upper()  # Convert subarguments to uppercase.
-
-                if COMMANDS_METADATA[command_name][arg]["takes_value"]:
-                    idx += 2
-                    if idx < num_elements * 2:
-                        subarg_value = self._parse_bulk_string(remaining_data[idx] + PROTOCOL_SEPARATOR + remaining_data[idx+1])
-                        command_args.append((arg, subarg_value))
-                    else:
-                        raise Exception(f"Expected value for subargument {arg}, but none provided.")
-                else:
-                    # Subargument does not take a value, so just append it to the command args.
-                    # Adding True as a placeholder value to indicate that the subargument is present.
-                    command_args.append((arg, True))
-            
-            else:
-                command_args.append(arg)
-            
-            idx += 2
-
-        return command_name, command_args
+        parser = Parser(protocol_version=self.protocol_version)
+        parser.feed(data)
+        request = parser.gets()
+        if request is False:
+            raise Exception("Incomplete protocol data")
+        return request
 
     def parse_data(self, data):
         """
@@ -104,18 +215,42 @@ class Parser(BaseParser):
         Data format differs based on the type of data but general syntax is
         <type>[data-specific-fields\r\n]<data>\r\n
         """
-        data_type = data[0]
-
         # Using dictionary mapping for performance
         parsing_funcs = {
-            Protocol_2_Data_Types.SIMPLE_STRING: self._parse_simple_string,
-            Protocol_2_Data_Types.ERROR: self._parse_error,
-            Protocol_2_Data_Types.INTEGER: self._parse_integer,
-            Protocol_2_Data_Types.BULK_STRING: self._parse_bulk_string,
-            Protocol_2_Data_Types.ARRAY: self._parse_array,
+            Protocol_2_Data_Types.SIMPLE_STRING.value: self._parse_simple_string,
+            Protocol_2_Data_Types.ERROR.value: self._parse_error,
+            Protocol_2_Data_Types.INTEGER.value: self._parse_integer,
+            Protocol_2_Data_Types.BULK_STRING.value: self._parse_bulk_string,
+            Protocol_2_Data_Types.ARRAY.value: self._parse_array,
+            Protocol_3_Data_Types.NULL.value: self._parse_null,
+            Protocol_3_Data_Types.BOOLEAN.value: self._parse_boolean,
+            Protocol_3_Data_Types.DOUBLE.value: self._parse_double,
         }
-        
-        return parsing_funcs[data_type](data)
+        parse = parsing_funcs.get(data[0:1])
+        if parse is None:
+            raise Exception("Invalid protocol data type")
+        return parse(data)
+
+    def _parse_null(self, data):
+        """
+        RESP3 null, replaces the nil bulk string and array of RESP2:
+        _\r\n
+        """
+        return None
+
+    def _parse_boolean(self, data):
+        """
+        RESP3 boolean:
+        #t\r\n or #f\r\n
+        """
+        return data[1:2] == b"t"
+
+    def _parse_double(self, data):
+        """
+        RESP3 double, inf and -inf included:
+        ,<floating-point-number>\r\n
+        """
+        return float(data[1:-2])
 
     def _parse_simple_string(self, data):
         """
@@ -148,10 +283,13 @@ class Parser(BaseParser):
         They are encoded in the following way:
         $<length>\r\n<data>\r\n
         Where length is the number of bytes in data
+        Data is returned as bytes since it can be binary
         """
         length = int(data[1:data.index(PROTOCOL_SEPARATOR)])
+        if length == -1:
+            return None
         # Get data from index after separator till length of data
-        return data[data.index(PROTOCOL_SEPARATOR) + 2:data.index(PROTOCOL_SEPARATOR) + 2 + length].decode('utf-8')
+        return data[data.index(PROTOCOL_SEPARATOR) + 2:data.index(PROTOCOL_SEPARATOR) + 2 + length]
 
     def _parse_array(self, data):
         """
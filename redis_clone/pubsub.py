@@ -0,0 +1,126 @@
+"""
+Index of the pattern subscriptions, so a publish doesn't try every pattern against the channel
+
+Patterns are stored in a trie under their literal prefix, the part before the first glob
+special character eg: news.* under "news." and * at the root. A channel only has to be
+matched against the patterns found along its own bytes in the trie, a publish to
+"orders.42" never looks at the patterns starting with "news.". Those candidates are then
+checked with their compiled matcher, see redis_clone/glob.py
+"""
+from redis_clone.glob import compile_pattern
+
+GLOB_SPECIAL_CHARACTERS = b"*?[\\"
+
+
+def literal_prefix(pattern):
+    """
+    Part of pattern before its first special character, every matching channel starts with it
+    """
+    for idx, byte in enumerate(pattern):
+        if byte in GLOB_SPECIAL_CHARACTERS:
+            return pattern[:idx]
+    return pattern
+
+
+class PatternSubscription:
+    __slots__ = ("pattern", "match", "clients")
+
+    def __init__(self, pattern) -> None:
+        self.pattern = pattern
+        # None for patterns matching every channel
+        self.match = compile_pattern(pattern)
+        # Subscribed clients, in the order they subscribed
+        self.clients = {}
+
+
+class PatternTrieNode:
+    __slots__ = ("children", "subscriptions")
+
+    def __init__(self) -> None:
+        # Next byte of the prefix -> PatternTrieNode
+        self.children = {}
+        # Pattern -> PatternSubscription of the patterns whose prefix ends here
+        self.subscriptions = {}
+
+
+class PatternIndex:
+    def __init__(self) -> None:
+        self.root = PatternTrieNode()
+        self.size = 0
+
+    def __len__(self):
+        """
+        Number of distinct patterns with at least one client
+        """
+        return self.size
+
+    def add(self, pattern, client):
+        """
+        Subscribes client to pattern, returns False if it already was
+        """
+        node = self.root
+        for byte in literal_prefix(pattern):
+            child = node.children.get(byte)
+            if child is None:
+                child = node.children[byte] = PatternTrieNode()
+            node = child
+        subscription = node.subscriptions.get(pattern)
+        if subscription is None:
+            subscription = node.subscriptions[pattern] = PatternSubscription(pattern)
+            self.size += 1
+        if client in subscription.clients:
+            return False
+        subscription.clients[client] = None
+        return True
+
+    def remove(self, pattern, client):
+        """
+        Unsubscribes client from pattern, returns False if it wasn't subscribed
+        Nodes left without patterns nor children are dropped
+        """
+        path = [self.root]
+        for byte in literal_prefix(pattern):
+            node = path[-1].children.get(byte)
+            if node is None:
+                return False
+            path.append(node)
+        subscription = path[-1].subscriptions.get(pattern)
+        if subscription is None or client not in subscription.clients:
+            return False
+        del subscription.clients[client]
+        if not subscription.clients:
+            del path[-1].subscriptions[pattern]
+            self.size -= 1
+            prefix = literal_prefix(pattern)
+            for idx in range(len(path) - 1, 0, -1):
+                if path[idx].subscriptions or path[idx].children:
+                    break
+                del path[idx - 1].children[prefix[idx - 1]]
+        return True
+
+    def matching(self, channel):
+        """
+        Yields the subscriptions of the patterns matching channel
+        """
+        node = self.root
+        depth = 0
+        while True:
+            for subscription in node.subscriptions.values():
+                if subscription.match is None or subscription.match(channel):
+                    yield subscription
+            if depth == len(channel):
+                return
+            node = node.children.get(channel[depth])
+            if node is None:
+                return
+            depth += 1
+
+    def patterns(self):
+        """
+        Yields every pattern with at least one client
+        """
+        nodes = [self.root]
+        while nodes:
+            node = nodes.pop()
+            yield from node.subscriptions
+            nodes.extend(node.children.values())
@@ -0,0 +1,149 @@
+"""
+List values, same layout as redis quicklist.c
+
+A list is a deque of Listpack nodes instead of a python list, so a queue of millions of
+elements costs a few thousands bytearrays instead of millions of bytes objects. Pushes and
+pops only touch the node at their end and a node is added once the last one is full.
+
+How full a node gets is given by fill, same as redis list-max-listpack-size:
+    positive values are a max number of entries per node
+    -1 to -5 are a max size of 4, 8, 16, 32 or 64 KB per node
+"""
+import sys
+from collections import deque
+
+from redis_clone.listpack import Listpack, encoded_size
+
+ENCODING_QUICKLIST = "quicklist"
+
+# Max bytes of a node for the negative fill values
+NODE_SIZE_LIMITS = {-1: 4096, -2: 8192, -3: 16384, -4: 32768, -5: 65536}
+
+
+def node_size_limit(fill):
+    if fill not in NODE_SIZE_LIMITS:
+        raise Exception(f"Invalid list-max-listpack-size {fill}")
+    return NODE_SIZE_LIMITS[fill]
+
+
+class Quicklist:
+    """
+    Sequence of byte strings, indexes are 0 based
+    """
+
+    __slots__ = ("nodes", "length", "nodes_size")
+
+    def __init__(self) -> None:
+        self.nodes = deque()
+        self.length = 0
+        # Sum of the sizes of the nodes, updated as they change
+        self.nodes_size = 0
+
+    encoding = ENCODING_QUICKLIST
+
+    def __len__(self):
+        return self.length
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self.nodes) + self.nodes_size
+
+    def __iter__(self):
+        for node in self.nodes:
+            yield from node
+
+    def _has_room(self, node, entry, fill):
+        if fill > 0:
+            return len(node) < fill
+        # An entry bigger than a whole node gets a node of its own
+        return len(node.buffer) + encoded_size(entry) <= node_size_limit(fill)
+
+    def push(self, entry, fill, left=False):
+        entry = bytes(entry)
+        nodes = self.nodes
+        node = (nodes[0] if left else nodes[-1]) if nodes else None
+        if node is None or not self._has_room(node, entry, fill):
+            node = Listpack()
+            self.nodes_size += sys.getsizeof(node)
+            if left:
+                nodes.appendleft(node)
+            else:
+                nodes.append(node)
+        old_size = sys.getsizeof(node)
+        if left:
+            node.insert(0, entry)
+        else:
+            node.append(entry)
+        self.nodes_size += sys.getsizeof(node) - old_size
+        self.length += 1
+
+    def pop(self, left=False):
+        """
+        Removes and returns the first or the last entry, None if the list is empty
+        """
+        if not self.length:
+            return None
+        node = self.nodes[0] if left else self.nodes[-1]
+        # The last entry is found from its back length, without walking the node
+        offset = 0 if left else node.prev_offset(len(node.buffer))
+        old_size = sys.getsizeof(node)
+        entry = node.get(offset)[0]
+        node.delete(offset)
+        self.length -= 1
+        if len(node):
+            self.nodes_size += sys.getsizeof(node) - old_size
+        else:
+            self.nodes_size -= old_size
+            if left:
+                self.nodes.popleft()
+            else:
+                self.nodes.pop()
+        return entry
+
+    def index(self, index):
+        """
+        Entry at index, negative indexes count from the end, None if it's out of the list
+        """
+        if index < 0:
+            index += self.length
+        if not 0 <= index < self.length:
+            return None
+        for node in self.nodes:
+            if index < len(node):
+                return node.get(node.offset_of(index))[0]
+            index -= len(node)
+        return None
+
+    def range(self, start, stop):
+        """
+        Entries from index start to index stop included, both already within the list
+        Nodes before start are skipped by their length, without reading their entries
+        """
+        result = []
+        if start > stop:
+            return result
+        count = stop - start + 1
+        for node in self.nodes:
+            if start >= len(node):
+                start -= len(node)
+                continue
+            offset = node.offset_of(start)
+            end = len(node.buffer)
+            while offset < end and len(result) < count:
+                entry, offset = node.get(offset)
+                result.append(entry)
+            if len(result) == count:
+                break
+            start = 0
+        return result
+
+    @classmethod
+    def from_nodes(cls, nodes):
+        """
+        Builds a list from its listpacks eg: while loading a snapshot
+        """
+        quicklist = cls()
+        for node in nodes:
+            quicklist.nodes.append(node)
+            quicklist.length += len(node)
+            quicklist.nodes_size += sys.getsizeof(node)
+        return quicklist
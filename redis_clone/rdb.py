@@ -0,0 +1,312 @@
+"""
+Point in time snapshot of the keyspace in a compact binary format
+
+File layout, all numbers are little endian:
+    RDB_MAGIC
+    entries, each one starting with an opcode byte:
+        EXPIRE_MS <deadline:int64>, applies to the entry that follows
+        TYPE_STRING <key length:uint32> <value length:uint32> <key> <value>
+        TYPE_INTEGER <key length:uint32> <value:int64> <key>
+        TYPE_HASH_LISTPACK <key length:uint32> <entries:uint32> <listpack length:uint32> <key> <listpack buffer>
+        TYPE_HASH <key length:uint32> <fields:uint32> <key> then <length:uint32> <bytes> for every field and value
+        TYPE_ZSET_LISTPACK same as TYPE_HASH_LISTPACK
+        TYPE_ZSET <key length:uint32> <members:uint32> <key> then <length:uint32> <member> <score:double> for every member
+        TYPE_LIST <key length:uint32> <nodes:uint32> <key> then <entries:uint32> <listpack length:uint32> <listpack buffer> for every node
+    EOF <crc32 of everything before it:uint32>
+
+Deadlines are absolute unix times in milliseconds, so a snapshot loaded later keeps the
+remaining ttl of every key and keys which expired meanwhile are skipped
+Small hashes and sorted sets are saved as their listpack buffer, so loading them is a single copy,
+lists are saved node by node the same way
+"""
+import mmap
+import os
+import struct
+import zlib
+
+from redis_clone.hashes import Hash
+from redis_clone.listpack import Listpack
+from redis_clone.quicklist import Quicklist
+from redis_clone.zsets import SortedSet
+
+RDB_MAGIC = b"REDISCLONE-RDB-1"
+
+OPCODE_EXPIRE_MS = 0xFC
+OPCODE_EOF = 0xFF
+TYPE_STRING = 0
+TYPE_INTEGER = 1
+TYPE_HASH_LISTPACK = 2
+TYPE_HASH = 3
+TYPE_ZSET_LISTPACK = 4
+TYPE_ZSET = 5
+TYPE_LIST = 6
+
+EXPIRE_STRUCT = struct.Struct("<Bq")
+STRING_HEADER_STRUCT = struct.Struct("<BII")
+INTEGER_HEADER_STRUCT = struct.Struct("<BIq")
+LISTPACK_HEADER_STRUCT = struct.Struct("<BIII")
+COLLECTION_HEADER_STRUCT = struct.Struct("<BII")
+LENGTH_STRUCT = struct.Struct("<I")
+SCORE_STRUCT = struct.Struct("<d")
+LIST_NODE_STRUCT = struct.Struct("<II")
+EOF_STRUCT = struct.Struct("<BI")
+
+# Entries are gathered in chunks of this size before being written to the file
+WRITE_CHUNK_SIZE = 1024 * 1024
+
+
+class RDBError(Exception):
+    pass
+
+
+def dump(keyspace, path):
+    """
+    Writes a snapshot of keyspace to path, returns the size of the file
+    The snapshot is written to a temporary file first and renamed over path, so a
+    crash while saving never leaves a truncated snapshot behind
+    """
+    temp_path = f"{path}.temp-{os.getpid()}"
+    expires = keyspace.expires
+    crc = 0
+    size = 0
+
+    try:
+        with open(temp_path, "wb") as file:
+            chunk = bytearray(RDB_MAGIC)
+            for key, value in keyspace.data.items():
+                deadline = expires.get(key)
+                if deadline is not None:
+                    chunk += EXPIRE_STRUCT.pack(OPCODE_EXPIRE_MS, deadline)
+
+                if type(value) is int:
+                    chunk += INTEGER_HEADER_STRUCT.pack(TYPE_INTEGER, len(key), value)
+                    chunk += key
+                elif type(value) is Hash:
+                    _dump_hash(chunk, key, value)
+                elif type(value) is SortedSet:
+                    _dump_zset(chunk, key, value)
+                elif type(value) is Quicklist:
+                    _dump_list(chunk, key, value)
+                else:
+                    chunk += STRING_HEADER_STRUCT.pack(TYPE_STRING, len(key), len(value))
+                    chunk += key
+                    chunk += value
+
+                if len(chunk) >= WRITE_CHUNK_SIZE:
+                    crc = zlib.crc32(chunk, crc)
+                    size += len(chunk)
+                    file.write(chunk)
+                    chunk = bytearray()
+
+            crc = zlib.crc32(chunk, crc)
+            chunk += EOF_STRUCT.pack(OPCODE_EOF, crc)
+            size += len(chunk)
+            file.write(chunk)
+            file.flush()
+            os.fsync(file.fileno())
+    except BaseException:
+        # Nothing half written is left behind, eg: a value which can't be encoded
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+        raise
+
+    os.replace(temp_path, path)
+    return size
+
+
+def _dump_listpack(chunk, opcode, key, listpack):
+    chunk += LISTPACK_HEADER_STRUCT.pack(opcode, len(key), len(listpack), len(listpack.buffer))
+    chunk += key
+    chunk += listpack.buffer
+
+
+def _dump_hash(chunk, key, value):
+    if value.table is None:
+        _dump_listpack(chunk, TYPE_HASH_LISTPACK, key, value.listpack)
+        return
+    chunk += COLLECTION_HEADER_STRUCT.pack(TYPE_HASH, len(key), len(value.table))
+    chunk += key
+    for field, field_value in value.table.items():
+        chunk += LENGTH_STRUCT.pack(len(field))
+        chunk += field
+        chunk += LENGTH_STRUCT.pack(len(field_value))
+        chunk += field_value
+
+
+def _dump_zset(chunk, key, value):
+    if value.table is None:
+        _dump_listpack(chunk, TYPE_ZSET_LISTPACK, key, value.listpack)
+        return
+    chunk += COLLECTION_HEADER_STRUCT.pack(TYPE_ZSET, len(key), len(value))
+    chunk += key
+    for member, score in value.items():
+        chunk += LENGTH_STRUCT.pack(len(member))
+        chunk += member
+        chunk += SCORE_STRUCT.pack(score)
+
+
+def _dump_list(chunk, key, value):
+    chunk += COLLECTION_HEADER_STRUCT.pack(TYPE_LIST, len(key), len(value.nodes))
+    chunk += key
+    for node in value.nodes:
+        chunk += LIST_NODE_STRUCT.pack(len(node), len(node.buffer))
+        chunk += node.buffer
+
+
+def _load_list_nodes(view, pos, count):
+    nodes = []
+    for _ in range(count):
+        entries, buffer_length = LIST_NODE_STRUCT.unpack_from(view, pos)
+        pos += LIST_NODE_STRUCT.size
+        node = Listpack()
+        node.buffer = bytearray(view[pos:pos + buffer_length])
+        node.count = entries
+        nodes.append(node)
+        pos += buffer_length
+    return nodes, pos
+
+
+def _load_listpack(view, pos):
+    """
+    Reads a listpack entry, returns its key, the listpack and the position after it
+    """
+    _, key_length, entries, buffer_length = LISTPACK_HEADER_STRUCT.unpack_from(view, pos)
+    pos += LISTPACK_HEADER_STRUCT.size
+    key = view[pos:pos + key_length]
+    pos += key_length
+    listpack = Listpack()
+    listpack.buffer = bytearray(view[pos:pos + buffer_length])
+    listpack.count = entries
+    return key, listpack, pos + buffer_length
+
+
+def _load_zset_members(view, pos, count):
+    members = []
+    for _ in range(count):
+        length = LENGTH_STRUCT.unpack_from(view, pos)[0]
+        pos += LENGTH_STRUCT.size
+        member = view[pos:pos + length]
+        pos += length
+        members.append((member, SCORE_STRUCT.unpack_from(view, pos)[0]))
+        pos += SCORE_STRUCT.size
+    return members, pos
+
+
+def _load_strings(view, pos, count):
+    """
+    Reads count length prefixed strings, returns them and the position after the last one
+    """
+    strings = []
+    for _ in range(count):
+        length = LENGTH_STRUCT.unpack_from(view, pos)[0]
+        pos += LENGTH_STRUCT.size
+        strings.append(view[pos:pos + length])
+        pos += length
+    return strings, pos
+
+
+def load(keyspace, path, now_ms):
+    """
+    Loads the snapshot at path into keyspace, returns the number of keys loaded
+    The file is memory mapped and parsed in place, keys expired before now_ms are skipped
+    """
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            raise RDBError("Empty snapshot file")
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return _load_from_mapping(keyspace, mapped, now_ms)
+
+
+def _load_from_mapping(keyspace, view, now_ms):
+    """
+    Slicing the mmap copies straight into the key and value bytes, without a file read
+    """
+    if view[:len(RDB_MAGIC)] != RDB_MAGIC:
+        raise RDBError("Wrong signature trying to load the snapshot")
+
+    end = len(view) - EOF_STRUCT.size
+    if end < len(RDB_MAGIC) or view[end] != OPCODE_EOF:
+        raise RDBError("Unexpected end of snapshot file")
+    if _crc32(view, end) != EOF_STRUCT.unpack_from(view, end)[1]:
+        raise RDBError("Wrong checksum of the snapshot")
+
+    data = keyspace.data
+    pos = len(RDB_MAGIC)
+    deadline = None
+    loaded = 0
+
+    # Locals for the hot loop
+    unpack_string_header = STRING_HEADER_STRUCT.unpack_from
+    unpack_integer_header = INTEGER_HEADER_STRUCT.unpack_from
+    unpack_expire = EXPIRE_STRUCT.unpack_from
+    string_header_size = STRING_HEADER_STRUCT.size
+    integer_header_size = INTEGER_HEADER_STRUCT.size
+
+    while pos < end:
+        opcode = view[pos]
+        if opcode == TYPE_STRING:
+            _, key_length, value_length = unpack_string_header(view, pos)
+            pos += string_header_size
+            key = view[pos:pos + key_length]
+            pos += key_length
+            value = view[pos:pos + value_length]
+            pos += value_length
+        elif opcode == TYPE_INTEGER:
+            _, key_length, value = unpack_integer_header(view, pos)
+            pos += integer_header_size
+            key = view[pos:pos + key_length]
+            pos += key_length
+        elif opcode == TYPE_HASH_LISTPACK:
+            key, listpack, pos = _load_listpack(view, pos)
+            value = Hash.from_listpack(listpack)
+        elif opcode == TYPE_ZSET_LISTPACK:
+            key, listpack, pos = _load_listpack(view, pos)
+            value = SortedSet.from_listpack(listpack)
+        elif opcode == TYPE_HASH:
+            _, key_length, fields = COLLECTION_HEADER_STRUCT.unpack_from(view, pos)
+            pos += COLLECTION_HEADER_STRUCT.size
+            key = view[pos:pos + key_length]
+            pos += key_length
+            entries, pos = _load_strings(view, pos, fields * 2)
+            value = Hash.from_items(zip(entries[::2], entries[1::2]))
+        elif opcode == TYPE_ZSET:
+            _, key_length, members = COLLECTION_HEADER_STRUCT.unpack_from(view, pos)
+            pos += COLLECTION_HEADER_STRUCT.size
+            key = view[pos:pos + key_length]
+            pos += key_length
+            entries, pos = _load_zset_members(view, pos, members)
+            value = SortedSet.from_items(entries)
+        elif opcode == TYPE_LIST:
+            _, key_length, node_count = COLLECTION_HEADER_STRUCT.unpack_from(view, pos)
+            pos += COLLECTION_HEADER_STRUCT.size
+            key = view[pos:pos + key_length]
+            pos += key_length
+            nodes, pos = _load_list_nodes(view, pos, node_count)
+            value = Quicklist.from_nodes(nodes)
+        elif opcode == OPCODE_EXPIRE_MS:
+            deadline = unpack_expire(view, pos)[1]
+            pos += EXPIRE_STRUCT.size
+            continue
+        else:
+            raise RDBError(f"Unknown opcode {opcode} in snapshot")
+
+        if deadline is None:
+            data[key] = value
+            loaded += 1
+        else:
+            if deadline >= now_ms:
+                keyspace.set(key, value, deadline_ms=deadline)
+                loaded += 1
+            deadline = None
+
+    # Keys were stored straight into data, the key tables and the memory accounting are built once at the end
+    keyspace.rebuild_after_load()
+    return loaded
+
+
+def _crc32(mapped, end):
+    """
+    Checksum of the first end bytes of the mapping, computed through a view to avoid copying them
+    """
+    with memoryview(mapped) as view:
+        return zlib.crc32(view[:end])
@@ -0,0 +1,50 @@
+"""
+Replication stream bookkeeping shared by primaries and replicas
+
+A primary sends every write command to its replicas in the same RESP encoding clients use.
+Bytes of the stream are numbered by the replication offset, a replica tracks the offset it
+processed so after a disconnect it asks for the stream from offset + 1 (PSYNC). The primary
+keeps the last repl-backlog-size bytes of the stream in the backlog and continues from there
+when it still has that offset, otherwise the replica is sent a new snapshot (full resync).
+"""
+import os
+
+
+def new_replication_id():
+    """
+    Random 40 hex chars id of a replication history, same format as redis
+    """
+    return os.urandom(20).hex()
+
+
+class ReplicationBacklog:
+    """
+    Last size bytes of the replication stream
+    """
+
+    def __init__(self, size, offset=0) -> None:
+        self.size = size
+        self.buffer = bytearray()
+        # Offset of the last byte in the buffer
+        self.offset = offset
+
+    @property
+    def first_byte_offset(self):
+        return self.offset - len(self.buffer) + 1
+
+    def feed(self, data):
+        self.buffer += data
+        self.offset += len(data)
+        if len(self.buffer) > self.size:
+            # Deleting a bytearray prefix only moves its start, the data is not copied
+            del self.buffer[:len(self.buffer) - self.size]
+
+    def can_continue_from(self, offset):
+        """
+        True if the stream starting at offset is still in the backlog
+        offset can be right after the last byte, then there is nothing to send
+        """
+        return self.first_byte_offset <= offset <= self.offset + 1
+
+    def read_from(self, offset):
+        return bytes(self.buffer[offset - self.first_byte_offset:])
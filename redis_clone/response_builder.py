@@ -1,43 +1,97 @@
-from redis_clone.parser.redis_parser import Protocol_2_Data_Types, PROTOCOL_SEPARATOR
+from redis_clone.parser.redis_parser import (
+    Protocol_2_Data_Types,
+    Protocol_3_Data_Types,
+    PROTOCOL_SEPARATOR,
+    SUPPORTED_PROTOCOL_VERSIONS,
+)
+
+# Replies which never change are built once and shared, like the shared objects of redis
+OK_RESPONSE = b"+OK\r\n"
+PONG_RESPONSE = b"+PONG\r\n"
+QUEUED_RESPONSE = b"+QUEUED\r\n"
+NIL_BULK_STRING_RESPONSE = b"$-1\r\n"
+NIL_ARRAY_RESPONSE = b"*-1\r\n"
+EMPTY_ARRAY_RESPONSE = b"*0\r\n"
+EMPTY_BULK_STRING_RESPONSE = b"$0\r\n\r\n"
+NULL_RESPONSE = b"_\r\n"
+
+# Integer replies from 0 to SHARED_INTEGERS - 1 are preallocated, same as redis OBJ_SHARED_INTEGERS
+SHARED_INTEGERS = 10000
+SHARED_INTEGER_RESPONSES = [b":%d\r\n" % i for i in range(SHARED_INTEGERS)]
+
+# Headers of short bulk strings and arrays, same as redis OBJ_SHARED_BULKHDR_LEN
+SHARED_HEADERS = 32
+SHARED_BULK_HEADERS = [b"$%d\r\n" % i for i in range(SHARED_HEADERS)]
+SHARED_ARRAY_HEADERS = [b"*%d\r\n" % i for i in range(SHARED_HEADERS)]
+
+
+def format_double(value):
+    """
+    Shortest text reading back as the same float, integral values without a fraction
+    and infinities as inf and -inf, same as redis
+    """
+    value = float(value)
+    if value.is_integer() and abs(value) < 1e17:
+        return b"%d" % value
+    return repr(value).encode()
+
+
+class ReplyError:
+    """
+    Error element of an array reply
+    """
+    __slots__ = ("message",)
+
+    def __init__(self, message) -> None:
+        self.message = message
 
 
 class ResponseBuilder:
     """
     Builds the response that will be sent to the client
     Data is encoded according to the Redis protocol and types are converted to bytes
+
+    There is one builder per protocol version, handlers build RESP3 types like maps with
+    either of them and RESP2 clients get the closest RESP2 type eg: a flat array for a map
     """
 
     def __init__(self, protocol_version=2) -> None:
+        if protocol_version not in SUPPORTED_PROTOCOL_VERSIONS:
+            raise Exception("Protocol version not supported")
         self.protocol_version = protocol_version
+        self.resp3 = protocol_version == 3
+        # Nil replies are a single null type in RESP3
+        self.nil_bulk_string = NULL_RESPONSE if self.resp3 else NIL_BULK_STRING_RESPONSE
+        self.nil_array = NULL_RESPONSE if self.resp3 else NIL_ARRAY_RESPONSE
+        # Built once instead of on every response
+        self._builders = {
+            Protocol_2_Data_Types.ERROR: self._build_protocol_2_error,
+            Protocol_2_Data_Types.SIMPLE_STRING: self._build_protocol_2_simple_string,
+            Protocol_2_Data_Types.BULK_STRING: self._build_protocol_2_bulk_string,
+            Protocol_2_Data_Types.INTEGER: self._build_protocol_2_integer,
+            Protocol_2_Data_Types.ARRAY: self._build_protocol_2_array,
+            Protocol_3_Data_Types.NULL: self._build_null,
+            Protocol_3_Data_Types.BOOLEAN: self._build_boolean,
+            Protocol_3_Data_Types.DOUBLE: self._build_double,
+            Protocol_3_Data_Types.MAP: self._build_map,
+            Protocol_3_Data_Types.SET: self._build_set,
+            Protocol_3_Data_Types.PUSH: self._build_push,
+        }
 
     def respond_with_ok(self):
         """
         Respond with ok
         """
-        return self.build_response("OK", Protocol_2_Data_Types.SIMPLE_STRING)
+        return OK_RESPONSE
 
     def build_response(self, type, data=None):
         """
         Build response according to protocol version
         """
-        if self.protocol_version == 2:
-            return self._build_protocol_2_response(type, data)
-        else:
-            raise Exception("Protocol version not supported")
-
-    def _build_protocol_2_response(self, data_type, data):
-        """
-        Build response according to protocol version 2
-        """
-        function_dict = {
-            Protocol_2_Data_Types.ERROR: self._build_protocol_2_error,
-            Protocol_2_Data_Types.SIMPLE_STRING: self._build_protocol_2_simple_string,
-            Protocol_2_Data_Types.BULK_STRING: self._build_protocol_2_bulk_string,
-            Protocol_2_Data_Types.INTEGER: self._build_protocol_2_integer,
-        }
-        if data_type not in function_dict:
+        builder = self._builders.get(type)
+        if builder is None:
             raise Exception("Invalid response type")
-        return function_dict[data_type](data)
+        return builder(data)
 
     def _build_protocol_2_error(self, data):
         """
@@ -56,9 +110,15 @@ class ResponseBuilder:
         They are encoded in the following way:
         +<data>\r\n
         """
+        if data == "OK":
+            return OK_RESPONSE
+        elif data == "PONG":
+            return PONG_RESPONSE
         # Syntax of simple string is +<data>
         # So data is second element after simple string specifier
-        data = b"+" + data.encode("utf-8") + PROTOCOL_SEPARATOR
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        data = b"+" + data + PROTOCOL_SEPARATOR
         return data
 
     def _build_protocol_2_bulk_string(self, data):
@@ -68,26 +128,206 @@ class ResponseBuilder:
         $<data length>\r\n
         For example, "foobar" is encoded as "$6\r\nfoobar\r\n".
         For nil values bulk strings are encoded with $-1\r\n
+        Stored values are bytes and are sent as they are, the length is their number of bytes
         """
 
         # If data is None then return nil value
         if data is None:
-            return b"$-1" + PROTOCOL_SEPARATOR
+            return self.nil_bulk_string
         else:
             # Syntax of bulk string is $<data length>
             # So data is second element after bulk string specifier
-            length = str(len(data)).encode("utf-8")
-            data = b"$" + length + PROTOCOL_SEPARATOR + data.encode("utf-8") + PROTOCOL_SEPARATOR
+            if isinstance(data, str):
+                data = data.encode("utf-8")
+            length = len(data)
+            if length < SHARED_HEADERS:
+                return SHARED_BULK_HEADERS[length] + data + PROTOCOL_SEPARATOR
+
+            # Large values are copied once into the response instead of once per concatenation
+            response = bytearray()
+            self.write_bulk_string(response, data)
+            return response
 
-            return data
-        
     def _build_protocol_2_integer(self, data):
         """
         Integers are used in order to represent whole numbers between -(2^63) and 2^63-1.
         They are encoded in the following way:
         :<data>\r\n
         """
+        if 0 <= data < SHARED_INTEGERS:
+            return SHARED_INTEGER_RESPONSES[data]
         # Syntax of integer is :<data>
         # So data is second element after integer specifier
-        data = b":" + str(data).encode("utf-8") + PROTOCOL_SEPARATOR
-        return data
+        return b":%d\r\n" % data
+
+    def _build_protocol_2_array(self, data):
+        """
+        Arrays are used in order to represent a list of other RESP data types.
+        They are encoded in the following way:
+        *<number-of-elements>\r\n<element-1>...<element-n>
+        Elements are encoded by their python type, see write_value
+        """
+        if data is None:
+            return self.nil_array
+        if not data:
+            return EMPTY_ARRAY_RESPONSE
+
+        response = bytearray()
+        self.write_array(response, data)
+        return response
+
+    def _build_null(self, data=None):
+        """
+        RESP3 null, a nil bulk string for RESP2 clients:
+        _\r\n
+        """
+        return self.nil_bulk_string
+
+    def _build_boolean(self, data):
+        """
+        RESP3 boolean, the integer 1 or 0 for RESP2 clients:
+        #t\r\n or #f\r\n
+        """
+        response = bytearray()
+        self.write_boolean(response, data)
+        return bytes(response)
+
+    def _build_double(self, data):
+        """
+        RESP3 double, a bulk string for RESP2 clients:
+        ,<floating-point-number>\r\n
+        """
+        response = bytearray()
+        self.write_double(response, data)
+        return bytes(response)
+
+    def _build_map(self, data):
+        """
+        RESP3 map of a dict, a flat array of keys and values for RESP2 clients:
+        %<number-of-entries>\r\n<key-1><value-1>...<key-n><value-n>
+        """
+        response = bytearray()
+        self.write_map(response, data)
+        return response
+
+    def _build_set(self, data):
+        """
+        RESP3 set, an array for RESP2 clients:
+        ~<number-of-elements>\r\n<element-1>...<element-n>
+        """
+        response = bytearray()
+        self.write_set(response, data)
+        return response
+
+    def _build_push(self, data):
+        """
+        RESP3 out of band data like invalidation messages, an array for RESP2 clients:
+        ><number-of-elements>\r\n<element-1>...<element-n>
+        """
+        response = bytearray()
+        self.write_push(response, data)
+        return response
+
+    # Streaming encoder, every write_* method appends the encoded data to out, a bytearray which
+    # usually is the output buffer of the client, so nested replies don't build intermediate bytes
+
+    def write_bulk_string(self, out, data):
+        if data is None:
+            out += self.nil_bulk_string
+            return
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        length = len(data)
+        out += SHARED_BULK_HEADERS[length] if length < SHARED_HEADERS else b"$%d\r\n" % length
+        out += data
+        out += PROTOCOL_SEPARATOR
+
+    def write_integer(self, out, data):
+        out += SHARED_INTEGER_RESPONSES[data] if 0 <= data < SHARED_INTEGERS else b":%d\r\n" % data
+
+    def write_array_header(self, out, length):
+        out += SHARED_ARRAY_HEADERS[length] if 0 <= length < SHARED_HEADERS else b"*%d\r\n" % length
+
+    def write_array(self, out, data):
+        """
+        Appends an array, nested lists are written as nested arrays
+        """
+        if data is None:
+            out += self.nil_array
+            return
+        self.write_array_header(out, len(data))
+        for element in data:
+            # Bytes are the common element type, written inline to skip the type dispatch
+            if type(element) is bytes:
+                length = len(element)
+                out += SHARED_BULK_HEADERS[length] if length < SHARED_HEADERS else b"$%d\r\n" % length
+                out += element
+                out += PROTOCOL_SEPARATOR
+            else:
+                self.write_value(out, element)
+
+    def write_value(self, out, data):
+        """
+        Appends data encoded by its python type:
+        bytes and str as bulk strings, int as integers, None as nil, lists and tuples as arrays
+        and ReplyError as errors. bool, float, dict and set are the RESP3 boolean, double, map
+        and set, converted for RESP2 clients
+        """
+        if isinstance(data, (bytes, bytearray, str)):
+            self.write_bulk_string(out, data)
+        elif data is None:
+            out += self.nil_bulk_string
+        elif isinstance(data, bool):
+            self.write_boolean(out, data)
+        elif isinstance(data, int):
+            self.write_integer(out, data)
+        elif isinstance(data, (list, tuple)):
+            self.write_array(out, data)
+        elif isinstance(data, ReplyError):
+            out += self._build_protocol_2_error(data.message)
+        elif isinstance(data, float):
+            self.write_double(out, data)
+        elif isinstance(data, dict):
+            self.write_map(out, data)
+        elif isinstance(data, (set, frozenset)):
+            self.write_set(out, data)
+        else:
+            raise Exception(f"Can't encode {type(data)} in a response")
+
+    def write_boolean(self, out, data):
+        if self.resp3:
+            out += b"#t\r\n" if data else b"#f\r\n"
+        else:
+            out += SHARED_INTEGER_RESPONSES[1 if data else 0]
+
+    def write_double(self, out, data):
+        encoded = format_double(data)
+        if self.resp3:
+            out += b"," + encoded + PROTOCOL_SEPARATOR
+        else:
+            self.write_bulk_string(out, encoded)
+
+    def write_map(self, out, data):
+        if self.resp3:
+            out += b"%%%d\r\n" % len(data)
+        else:
+            self.write_array_header(out, len(data) * 2)
+        for key, value in data.items():
+            self.write_value(out, key)
+            self.write_value(out, value)
+
+    def write_set(self, out, data):
+        if self.resp3:
+            out += b"~%d\r\n" % len(data)
+        else:
+            self.write_array_header(out, len(data))
+        for element in data:
+            self.write_value(out, element)
+
+    def write_push(self, out, data):
+        if self.resp3:
+            out += b">%d\r\n" % len(data)
+        else:
+            self.write_array_header(out, len(data))
+        for element in data:
+            self.write_value(out, element)
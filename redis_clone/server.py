@@ -1,306 +1,594 @@
-import time
 import os
 import asyncio
 import logging
+import socket
+import time
 
 
-from enum import Enum
-from hiredis import Reader
 from redis_clone.parser.redis_parser import Parser, Protocol_2_Data_Types
 from redis_clone.parser.hi_redis_parser import HiRedisParser
 from redis_clone.response_builder import ResponseBuilder
+from redis_clone.aof import encode_command
+from redis_clone.client import Client
+from redis_clone.config import load_config, log_level
+from redis_clone.evict import EvictionPool, lru_clock, perform_evictions
+from redis_clone.keyspace import Keyspace
+from redis_clone.metrics import InstantaneousMetric, prometheus_text
+from redis_clone.slowlog import SlowLog
+from redis_clone.commands import (
+    build_command_table,
+    BLOCKED_RESPONSE,
+    TRANSACTION_COMMANDS,
+    ClusterCommandsMixin,
+    ConnectionCommandsMixin,
+    GenericCommandsMixin,
+    HashCommandsMixin,
+    ListCommandsMixin,
+    PersistenceCommandsMixin,
+    PubSubCommandsMixin,
+    ReplicationCommandsMixin,
+    ServerCommandsMixin,
+    SortedSetCommandsMixin,
+    StringCommandsMixin,
+    TrackingCommandsMixin,
+    TransactionCommandsMixin,
+)
 
 logger = logging.getLogger(__name__)
 
 HOST = os.environ.get("REDIS_HOST", "0.0.0.0")
 PORT = int(os.environ.get("REDIS_PORT", 9999))
+# Request parser used for every connection, "python" or "hiredis"
+PARSER = os.environ.get("REDIS_PARSER", "python")
 
+# Size of a single read from the connection, same as redis PROTO_IOBUF_LEN
+READ_BUFFER_SIZE = 16 * 1024
 
-class Protocol_2_Commands(Enum):
-    """
-    Some common redis commands
-    """
+# Share of every 1/hz period the active expire cycle can use, same as redis ACTIVE_EXPIRE_CYCLE_SLOW_TIME_PERC
+ACTIVE_EXPIRE_CYCLE_TIME_PERC = 25
+
+# Time of every cron run spent on key tables being resized, same as redis databasesCron
+ACTIVE_REHASHING_MILLISECONDS = 1
+
+MAX_CLIENTS_REACHED_RESPONSE = b"-ERR max number of clients reached\r\n"
+
+PARSER_CLASSES = {
+    "python": Parser,
+    "hiredis": HiRedisParser,
+}
 
-    SET = "SET"
-    GET = "GET"
-    DEL = "DEL"
-    EXISTS = "EXISTS"
-    INCR = "INCR"
-    DECR = "DECR"
-    PING = "PING"
-    ECHO = "ECHO"
-    
-class ExpiryValue:
-    def __init__(self, value, expiry_seconds=None, expiry_milliseconds=None, expiry_unix_timestamp_seconds=None, expiry_unix_timestamp_milliseconds=None) -> None:
-        self.value = value
-        self.expiry_seconds = time.time() + expiry_seconds if expiry_seconds else None
-        self.expiry_milliseconds = time.time() * 1000 + expiry_milliseconds if expiry_milliseconds else None
-        self.expiry_unix_timestamp_seconds = expiry_unix_timestamp_seconds
-        self.expiry_unix_timestamp_milliseconds = expiry_unix_timestamp_milliseconds
-
-    def get_value(self):
-        if self.expiry_milliseconds:
-            if self.expiry_milliseconds < int(time.time() * 1000):
-                return None
-        elif self.expiry_seconds:
-            if self.expiry_seconds < int(time.time()):
-                return None
-        elif self.expiry_unix_timestamp_milliseconds:
-            if self.expiry_unix_timestamp_milliseconds < int(time.time() * 1000):
-                return None
-        elif self.expiry_unix_timestamp_seconds:
-            if self.expiry_unix_timestamp_seconds < int(time.time()):
-                return None
-
-        return self.value
-    
-    def get_expiry_seconds(self):
-        return self.expiry_seconds
-
-    def get_expiry_milliseconds(self):
-        return self.expiry_milliseconds
-
-    def get_expiry_unix_timestamp_seconds(self):
-        return self.expiry_unix_timestamp_seconds
-    
-    def get_expiry_unix_timestamp_milliseconds(self):
-        return self.expiry_unix_timestamp_milliseconds
-
-
-
-class RedisServer:
-    def __init__(self, host, port) -> None:
+
+class RedisServer(
+    ClusterCommandsMixin,
+    ConnectionCommandsMixin,
+    GenericCommandsMixin,
+    HashCommandsMixin,
+    ListCommandsMixin,
+    PersistenceCommandsMixin,
+    PubSubCommandsMixin,
+    ReplicationCommandsMixin,
+    ServerCommandsMixin,
+    SortedSetCommandsMixin,
+    StringCommandsMixin,
+    TrackingCommandsMixin,
+    TransactionCommandsMixin,
+):
+    def __init__(self, host, port, parser=PARSER, config=None) -> None:
         self.host = host
         self.port = port
-        self.parser = Parser(protocol_version=2)
-        self.response_builder = ResponseBuilder(protocol_version=2)
-        self.data_store = {}
+        self.config = load_config(config)
+        if parser not in PARSER_CLASSES:
+            raise Exception(f"Unknown parser {parser}")
+        self.parser_class = PARSER_CLASSES[parser]
+        # Handlers use self.response_builder, it's switched to the builder of the protocol of
+        # the client whose commands are running
+        self.response_builders = {version: ResponseBuilder(protocol_version=version) for version in (2, 3)}
+        self.response_builder = self.response_builders[2]
+        self.stats = {
+            "expired_keys": 0,
+            "expire_cycle_cpu_milliseconds": 0,
+            "total_connections_received": 0,
+            "rejected_connections": 0,
+            "used_memory_peak": 0,
+        }
+        self.keyspace = Keyspace(
+            stats=self.stats,
+            eviction_policy=self.config["maxmemory-policy"],
+            lfu_log_factor=self.config["lfu-log-factor"],
+            lfu_decay_time=self.config["lfu-decay-time"],
+        )
+        self.eviction_pool = EvictionPool()
+        self.slowlog = SlowLog(self.config["slowlog-max-len"])
+        self.slowlog_log_slower_than = self.config["slowlog-log-slower-than"]
+        self.ops_per_sec = InstantaneousMetric()
+        # Connected clients by id, including replicas and the connection to the primary
+        self.clients = {}
+        self.next_client_id = 1
+        self.metrics_server = None
+        self.unix_server = None
+        # Command name -> RedisCommand with the handler and its metadata
+        self.command_table = build_command_table(self)
+        self._init_persistence()
+        self._init_cluster()
+        self._init_replication()
+        self._init_tracking()
+        self._init_lists()
+        self._init_transactions()
+        self._init_pubsub()
+        self.keyspace.on_key_removed = self._key_removed
+        # Set by handlers whose command must be logged differently than it was received
+        self._propagate_as = None
         self.running = False
+        self.start_time = time.monotonic()
+
+    @property
+    def data_store(self):
+        return self.keyspace.data
 
     async def start(self):
         logger.info("Starting server...")
+        self.load_data()
+        if self.config["appendonly"]:
+            self.aof_open()
         self.server = await asyncio.start_server(
-            self._handle_connection, self.host, self.port
+            self._handle_connection, self.host, self.port, backlog=self.config["tcp-backlog"]
         )
+        if self.config["unixsocket"]:
+            await self._start_unix_server(self.config["unixsocket"])
+        if self.config["metrics-port"]:
+            self.metrics_server = await asyncio.start_server(
+                self._handle_metrics_connection, self.host, self.config["metrics-port"]
+            )
+        self.running = True
+        self.cron_task = asyncio.create_task(self._server_cron_loop())
+        self.start_replication()
         async with self.server:
             await self.server.serve_forever()
 
+    async def _start_unix_server(self, path):
+        """
+        Listens on a unix domain socket, clients on the same host skip the tcp stack
+        """
+        if os.path.exists(path):
+            os.unlink(path)
+        self.unix_server = await asyncio.start_unix_server(
+            self._handle_connection, path, backlog=self.config["tcp-backlog"]
+        )
+        if self.config["unixsocketperm"]:
+            os.chmod(path, int(self.config["unixsocketperm"], 8))
+        logger.info(f"Accepting connections on unix socket {path}")
+
+    async def _server_cron_loop(self):
+        """
+        Runs the periodic background work hz times per second, same as redis serverCron
+        """
+        period = 1 / self.config["hz"]
+        time_limit_ms = period * 1000 * ACTIVE_EXPIRE_CYCLE_TIME_PERC / 100
+        while self.running:
+            await asyncio.sleep(period)
+            self.keyspace.lru_clock = lru_clock()
+            self._track_metrics()
+            if self.config["timeout"]:
+                self._close_idle_clients()
+            self._active_expire_cycle(time_limit_ms)
+            if self.config["activerehashing"]:
+                self.keyspace.incremental_rehash(ACTIVE_REHASHING_MILLISECONDS)
+            self._check_background_save()
+            self._check_background_rewrite()
+            self._replication_cron()
+            if self.aof is not None:
+                self.aof.cron()
+
+    def _track_metrics(self):
+        self.ops_per_sec.track(self._total_commands_processed(), time.monotonic())
+        self.stats["used_memory_peak"] = max(self.stats["used_memory_peak"], self.keyspace.used_memory)
+
+    def _total_commands_processed(self):
+        return sum(redis_command.calls for redis_command in self.command_table.values())
+
+    def _close_idle_clients(self):
+        """
+        Disconnects clients idle for longer than timeout, replicas and primaries are never idle
+        and neither are clients waiting in a blocking command, which have their own timeout
+        """
+        idle_since = time.monotonic() - self.config["timeout"]
+        for client in list(self.clients.values()):
+            if client.role == "normal" and client.blocked_future is None and client.last_interaction < idle_since:
+                logger.debug("Closing idle client %s", client.address)
+                client.writer.close()
+
+    def _configure_socket(self, sock):
+        """
+        Replies are sent with one write per batch so Nagle's algorithm only adds latency,
+        keepalive detects clients which vanished without closing the connection
+        """
+        if sock is None or sock.family not in (socket.AF_INET, socket.AF_INET6):
+            return
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        keepalive = self.config["tcp-keepalive"]
+        if not keepalive:
+            return
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+        # Same probing as redis anetKeepAlive, where the platform supports it
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE, keepalive)
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPINTVL, max(keepalive // 3, 1))
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPCNT, 3)
+
+    def _active_expire_cycle(self, time_limit_ms):
+        return self.keyspace.active_expire_cycle(time_limit_ms)
+
     async def _handle_connection(self, reader, writer):
         addr = writer.get_extra_info("peername")
-        logger.info(f"Connection established with {addr}")
+        if len(self.clients) >= self.config["maxclients"]:
+            self.stats["rejected_connections"] += 1
+            writer.write(MAX_CLIENTS_REACHED_RESPONSE)
+            writer.close()
+            return
+        logger.debug("Connection established with %s", addr)
+        self._configure_socket(writer.get_extra_info("socket"))
+
+        # Every connection gets its own parser so partially received commands are kept between reads
+        client = Client(
+            reader,
+            writer,
+            self.parser_class(protocol_version=2),
+            output_buffer_limit=self.config["client-output-buffer-limit"],
+            client_id=self.next_client_id,
+        )
+        self.next_client_id += 1
+
+        self.clients[client.id] = client
+        self.stats["total_connections_received"] += 1
+        try:
+            closed_gracefully = await self._read_client_commands(client)
+        finally:
+            del self.clients[client.id]
+            self._replica_disconnected(client)
+            self._disable_tracking(client)
+            self.unblock_client(client)
+            self._discard_transaction(client)
+            self._pubsub_unsubscribe_all(client)
+        if not closed_gracefully:
+            return
+
+        logger.debug("Connection closed with %s", addr)
+        writer.close()
+        await writer.wait_closed()
 
+    async def _read_client_commands(self, client):
+        """
+        Reads, runs and replies to the commands of a client until it disconnects
+        Returns False if the connection was dropped and must not be closed gracefully
+        """
+        reader = client.reader
+        addr = client.address
         while True:
-            data = await reader.read(1024)
+            if client.pending_input:
+                # Read while the client was blocked, it may already hold whole commands
+                data, client.pending_input = client.pending_input, bytearray()
+            else:
+                data = await reader.read(READ_BUFFER_SIZE)
             if not data:
                 break
+            client.last_interaction = time.monotonic()
 
-            logger.info(f"Received data: {data}")
-            command_name, command_args = self.parser.parse(data, encoding="utf-8", errors="strict")
-            logger.info(f"Command name: {command_name}")
-            logger.info(f"Command args: {command_args}")
-            response = self._process_command(command_name, command_args)
-            logger.info(f"Response: {response}")
-            writer.write(response)
-            await writer.drain()
+            client.parser.feed(data)
+            self.response_builder = self.response_builders[client.protocol_version]
+            try:
+                # A single read can hold several pipelined commands
+                requests = list(client.parser)
+            except Exception as e:
+                # Stream can't be resynchronized after invalid data, so reply and close the connection
+                logger.error(f"Protocol error from {addr}: {e}")
+                client.add_reply(self.response_builder.build_response(
+                    Protocol_2_Data_Types.ERROR, "ERR Protocol error"
+                ))
+                await client.flush()
+                break
+
+            # Nothing else runs during the batch, so the buffer grows only with this client's writes
+            aof_buffered = len(self.aof.buffer) if self.aof is not None else 0
+            # Checked once per batch, commands are only logged at debug level and without
+            # their arguments, which can hold any value
+            debug = logger.isEnabledFor(logging.DEBUG)
+            for command_name, command_args in requests:
+                if debug:
+                    logger.debug("Command %s with %d arguments from %s", command_name, len(command_args), addr)
+                response = self._process_command(command_name, command_args, client)
+                if response is BLOCKED_RESPONSE:
+                    # Replies of the commands before it are not held back while it waits
+                    await self._send_replies(client, aof_buffered)
+                    response = await self._wait_until_unblocked(client)
+                    if response is None:
+                        return True
+                    self.response_builder = self.response_builders[client.protocol_version]
+                    aof_buffered = len(self.aof.buffer) if self.aof is not None else 0
+                client.add_reply(response)
+                if client.is_output_buffer_over_limit():
+                    break
+
+            if client.is_output_buffer_over_limit():
+                # Slow consumer, don't let its replies grow without limit
+                logger.warning(f"Client {addr} closed for overcoming of output buffer limits")
+                client.abort()
+                return False
+
+            # Replies of the whole batch are sent together
+            await self._send_replies(client, aof_buffered)
+        return True
+
+    async def _send_replies(self, client, aof_buffered):
+        if self.aof is not None and len(self.aof.buffer) != aof_buffered:
+            # Writes are acknowledged only once they are in the file, the writes of every
+            # client in this loop iteration share the same write and fsync
+            client.replies_held = True
+            try:
+                await self.aof.wait_for_flush()
+            finally:
+                client.replies_held = False
+        await client.flush()
 
-        logger.info(f"Connection closed with {addr}")
+    async def _wait_until_unblocked(self, client):
+        """
+        Waits until a blocked client is served by a push or its timeout passes, returns its reply
+        The connection is still read meanwhile, only to notice the client leaving, so nothing is
+        popped for a client which is gone. Returns None if it disconnected
+        """
+        future = client.blocked_future
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + client.blocked_timeout if client.blocked_timeout else None
+        while not future.done():
+            remaining = None if deadline is None else max(deadline - loop.time(), 0)
+            read = asyncio.ensure_future(client.reader.read(READ_BUFFER_SIZE))
+            try:
+                await asyncio.wait((future, read), timeout=remaining, return_when=asyncio.FIRST_COMPLETED)
+            finally:
+                if not read.done():
+                    # Cancelling a read loses no data, it stays in the reader's buffer. The reader
+                    # allows a single read at a time, so the cancellation must be done first
+                    read.cancel()
+                    await asyncio.wait((read,))
+            if read.done() and not read.cancelled():
+                data = read.result()
+                if not data:
+                    self.unblock_client(client)
+                    return None
+                client.pending_input += data
+            elif not future.done() and deadline is not None and loop.time() >= deadline:
+                self.unblock_client(client)
+                return self.response_builders[client.protocol_version].nil_array
+
+        response, flushed = future.result()
+        if flushed is not None:
+            await flushed
+        return response
+
+    async def _handle_metrics_connection(self, reader, writer):
+        """
+        Minimal HTTP/1.0 server for Prometheus scrapes, every connection gets a single response
+        """
+        try:
+            request = await reader.readuntil(b"\r\n\r\n")
+        except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError):
+            writer.close()
+            return
+
+        request_line = request.split(b"\r\n", 1)[0].split()
+        if len(request_line) >= 2 and request_line[0] == b"GET" and request_line[1].split(b"?")[0] == b"/metrics":
+            status = b"200 OK"
+            body = prometheus_text(self._metrics(), self.command_table).encode()
+        else:
+            status = b"404 Not Found"
+            body = b"Not found\n"
+        writer.write(
+            b"HTTP/1.0 " + status + b"\r\n"
+            b"Content-Type: text/plain; version=0.0.4\r\n"
+            b"Content-Length: %d\r\n\r\n" % len(body) + body
+        )
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
         writer.close()
-        await writer.wait_closed()
 
-    def _process_command(self, command_name, command_args) -> bytes:
+    def _metrics(self):
+        """
+        Server wide metrics exported to Prometheus as (name, type, help, value)
+        """
+        return [
+            ("uptime_in_seconds", "gauge", "Seconds since the server started", int(time.monotonic() - self.start_time)),
+            ("connected_clients", "gauge", "Connected clients", len(self.clients)),
+            ("connections_received_total", "counter", "Connections accepted", self.stats["total_connections_received"]),
+            ("commands_processed_total", "counter", "Commands run", self._total_commands_processed()),
+            ("instantaneous_ops_per_sec", "gauge", "Commands run per second, averaged", self.ops_per_sec.rate()),
+            ("memory_used_bytes", "gauge", "Estimated bytes of keys and values", self.keyspace.used_memory),
+            ("memory_max_bytes", "gauge", "maxmemory, 0 if unlimited", self.config["maxmemory"]),
+            ("db_keys", "gauge", "Keys in the keyspace", len(self.keyspace)),
+            ("db_keys_expiring", "gauge", "Keys with a ttl", len(self.keyspace.expires)),
+            ("expired_keys_total", "counter", "Keys deleted because their ttl passed", self.stats["expired_keys"]),
+            ("evicted_keys_total", "counter", "Keys evicted because of maxmemory", self.stats["evicted_keys"]),
+            ("slowlog_length", "gauge", "Entries in the slow log", len(self.slowlog)),
+        ]
+
+    def _process_command(self, command_name, command_args, client=None) -> bytes:
         # Convert command name to uppercase
         command_name = command_name.upper()
-        if command_name == Protocol_2_Commands.PING.value:
-            return self.response_builder.build_response(
-                Protocol_2_Data_Types.SIMPLE_STRING, "PONG"
-            )
-        elif command_name == Protocol_2_Commands.ECHO.value:
-            # Echo command returns the same string
-            if len(command_args) == 0:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.ERROR,
-                    "ERR wrong number of arguments for 'ECHO' command",
-                )
-            return self.response_builder.build_response(
-                Protocol_2_Data_Types.SIMPLE_STRING, " ".join(command_args)
-            )
-        elif command_name == Protocol_2_Commands.SET.value:
-            return self._handle_set_command(command_args)
-
-        elif command_name == Protocol_2_Commands.GET.value:
-            # Only 1 argument required key
-            if len(command_args) != 1:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.ERROR,
-                    "ERR wrong number of arguments for 'GET' command",
-                )
-            key = command_args[0]
-            value = None
-            if key not in self.data_store:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.BULK_STRING
-                )
-            else:
-                # Check the key is of type ExpiryValue
-                # This is to ensure uniformity in the when setting and getting values
-                if isinstance(self.data_store[key], ExpiryValue):
-                    value = self.data_store[key].get_value()
-
-            if value is None:
-                self._delete_expired_key(key)
-            
-            return self.response_builder.build_response(
-                Protocol_2_Data_Types.BULK_STRING, value
-            )
-        
-        elif command_name == Protocol_2_Commands.DEL.value:
-            # Minimum 1 argument required key
-            if len(command_args) < 1:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.ERROR,
-                    "ERR wrong number of arguments for 'DEL' command",
-                )
-            
-            keys_deleted = 0
-            for key in command_args:
-                if key in self.data_store:
-                    del self.data_store[key]
-                    keys_deleted += 1 
-            
+        redis_command = self.command_table.get(command_name)
+        if redis_command is None:
+            self.flag_multi_error(client)
             return self.response_builder.build_response(
-                Protocol_2_Data_Types.INTEGER, keys_deleted
+                Protocol_2_Data_Types.ERROR, "ERR unknown command '{}'".format(command_name)
             )
-                
 
-        return self.response_builder.build_response(
-            Protocol_2_Data_Types.ERROR, "ERR unknown command '{}'".format(command_name)
-        )
-        
-    def _handle_set_command(self, command_args):
-        # Minimum 2 arguments required key and value
-        if len(command_args) < 2:
+        if not redis_command.check_arity(command_args):
+            redis_command.rejected_calls += 1
+            self.flag_multi_error(client)
             return self.response_builder.build_response(
                 Protocol_2_Data_Types.ERROR,
-                "ERR wrong number of arguments for 'SET' command",
+                f"ERR wrong number of arguments for '{command_name}' command",
             )
-        key = command_args[0]
-        value = command_args[1]
-        
-        subarg_values = {
-            "EX": None, # seconds
-            "PX": None, # milliseconds
-            "EXAT": None, # unix timestamp in seconds
-            "PXAT": None, # unix timestamp in milliseconds
-            "KEEPTTL": None, # keep the ttl of the key boolean
-            "GET": None, # return the value of the key booelan
-            "NX": None, # set if key does not exist boolean
-            "XX": None, # set if key exists boolean
-        }
 
-        # Check set command has optional arguments
-        if len(command_args) > 2:
-            # Subargs are in format (arg, value)
-            for subarg in command_args[2:]:
-                subarg_values[subarg[0]] = subarg[1]
-        
-        # Process subargs
-        # Check keepttl is not set with any other expiry subarg
-        if subarg_values["KEEPTTL"] and (subarg_values["EX"] or subarg_values["PX"] or subarg_values["EXAT"] or subarg_values["PXAT"]):
+        if client is not None and self.is_pubsub_context_rejected(client, command_name):
             return self.response_builder.build_response(
                 Protocol_2_Data_Types.ERROR,
-                "ERR invalid expire command syntax",
+                f"ERR Can't execute '{command_name.lower()}': only (P)SUBSCRIBE / (P)UNSUBSCRIBE / PING are allowed in this context",
             )
-        
-        # Return error if both NX and XX are set
-        if subarg_values["NX"] and subarg_values["XX"]:
+
+        if client is not None and client.multi_state is not None and command_name not in TRANSACTION_COMMANDS:
+            # Checked again when EXEC runs it, the state may change until then
+            return self.queue_multi_command(client, command_name, command_args)
+
+        if self.master_host is not None and self._is_read_only_replica_write(redis_command, client):
+            redis_command.rejected_calls += 1
             return self.response_builder.build_response(
-                Protocol_2_Data_Types.ERROR,
-                "ERR XX and NX options at the same time are not compatible",
+                Protocol_2_Data_Types.ERROR, "READONLY You can't write against a read only replica."
             )
-        
-        # Handle NX
-        # NX -- Only set the key if it does not already exist.
-        if subarg_values["NX"]:
-            if key in self.data_store:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.BULK_STRING
-                )
-            else:
-                return self._assign_key_to_value(key, value, subarg_values)
-        
-        # Handle XX
-        # XX -- Only set the key if it already exists.
-        if subarg_values["XX"]:
-            if key not in self.data_store:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.BULK_STRING
-                )
-            else:
-                return self._assign_key_to_value(key, value, subarg_values)
-        
-        # Handle GET
-        # GET -- Return the value of key
-        if subarg_values["GET"]:
-            if key in self.data_store:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.BULK_STRING, self.data_store[key].get_value()
-                )
-            else:
-                return self.response_builder.build_response(
-                    Protocol_2_Data_Types.BULK_STRING
-                )
-        
-        # Handle KEEPTTL
-        # KEEPTTL -- Retain the time to live associated with the key.
-        if subarg_values["KEEPTTL"]:
-            if key in self.data_store:
-                self.data_store[key] = ExpiryValue(
-                    value=value,
-                    expiry_seconds=self.data_store[key].get_expiry_seconds(),
-                    expiry_milliseconds=self.data_store[key].get_expiry_milliseconds(),
-                    expiry_unix_timestamp_seconds=self.data_store[key].get_expiry_unix_timestamp_seconds(),
-                    expiry_unix_timestamp_milliseconds=self.data_store[key].get_expiry_unix_timestamp_milliseconds(),
-                )
-                
+
+        if self.cluster is not None and redis_command.first_key:
+            redirect = self._cluster_redirect(redis_command, command_args)
+            if redirect is not None:
+                redis_command.rejected_calls += 1
+                return redirect
+
+        # Replicas don't evict, they get a DEL for every key their primary evicts
+        if self.config["maxmemory"] and client is not None and self.master_host is None:
+            if not self._evict_keys_if_needed() and "denyoom" in redis_command.flags:
+                redis_command.rejected_calls += 1
                 return self.response_builder.build_response(
-                    Protocol_2_Data_Types.SIMPLE_STRING, "OK"
+                    Protocol_2_Data_Types.ERROR,
+                    "OOM command not allowed when used memory > 'maxmemory'.",
                 )
-            else:
+
+        if redis_command.is_write:
+            self._propagate_as = None
+
+        raw_args = command_args
+        if redis_command.subargs:
+            try:
+                command_args = redis_command.group_subargs(command_args)
+            except Exception:
+                redis_command.calls += 1
+                redis_command.failed_calls += 1
                 return self.response_builder.build_response(
-                    Protocol_2_Data_Types.BULK_STRING
+                    Protocol_2_Data_Types.ERROR, "ERR syntax error"
                 )
-        
-        # Normal case for set
-        return self._assign_key_to_value(key, value, subarg_values)
 
-    def _assign_key_to_value(self, key, value, subargs):
-        try:
-            self.data_store[key] = ExpiryValue(
-                value=value,
-                expiry_seconds=int(subargs["EX"]) if subargs["EX"] else None,
-                expiry_milliseconds=int(subargs["PX"]) if subargs["PX"] else None,
-                expiry_unix_timestamp_seconds=int(subargs["EXAT"]) if subargs["EXAT"] else None,
-                expiry_unix_timestamp_milliseconds=int(subargs["PXAT"]) if subargs["PXAT"] else None,
-            )
-            return self.response_builder.build_response(
-                Protocol_2_Data_Types.SIMPLE_STRING, "OK"
-            )
-        except ValueError:
-            return self.response_builder.build_response(
-                Protocol_2_Data_Types.ERROR,
-                "ERR value is not an integer or out of range",
-            )
-            
-    def _delete_expired_key(self, key):
-        if key in self.data_store:
-            del self.data_store[key]
-    
+        dirty = self.keyspace.dirty
+        start = time.perf_counter()
+        response = redis_command.handler(client, command_args)
+        duration_us = int((time.perf_counter() - start) * 1000000)
+        redis_command.calls += 1
+        redis_command.microseconds += duration_us
+        redis_command.latency.record(duration_us)
+        blocked = response is BLOCKED_RESPONSE
+        failed = not blocked and response[:1] == b"-"
+        if failed:
+            redis_command.failed_calls += 1
+        if 0 <= self.slowlog_log_slower_than <= duration_us:
+            self.slowlog.push(command_name, raw_args, duration_us, client.address if client is not None else None)
+
+        if blocked:
+            # Nothing changed yet, the pop is propagated once the client is served
+            return response
+        # Writes which changed nothing eg: SET NX of an existing key, are not propagated
+        # and don't invalidate anything. EXEC counts nothing, its commands count their own
+        changes = self.keyspace.dirty - dirty if redis_command.is_write else 0
+        if changes:
+            self.stats["rdb_changes_since_last_save"] += changes
+            if self.aof is not None or self.repl_backlog is not None:
+                self.propagate(*(self._propagate_as or (command_name, raw_args)))
+        if self.ready_keys and (client is None or not client.in_exec):
+            # Inside a transaction waiting clients are served once EXEC is done
+            self.serve_blocked_clients()
+        if self.watched_keys and changes and redis_command.first_key:
+            for key in redis_command.get_keys(raw_args):
+                self.touch_watched_key(bytes(key))
+        if self.tracking_clients and redis_command.first_key:
+            if redis_command.is_write:
+                if changes:
+                    for key in redis_command.get_keys(raw_args):
+                        self.tracking_invalidate_key(bytes(key), client)
+            elif client is not None and client.tracking and not client.tracking_bcast and "readonly" in redis_command.flags:
+                self.tracking_remember_keys(client, [bytes(key) for key in redis_command.get_keys(raw_args)])
+        return response
+
+    def _key_removed(self, key):
+        """
+        Called by the keyspace with every key which expired or was evicted
+        Replicas and the log get a DEL, they never delete keys on their own. Otherwise
+        replaying writes done to a key before it expired would bring it back
+        """
+        if self.aof is not None or self.repl_backlog is not None:
+            self.propagate("DEL", [key])
+        self.touch_watched_key(key)
+        self.tracking_invalidate_key(key)
+
+    def _evict_keys_if_needed(self):
+        """
+        Evicts keys until used memory is under maxmemory, returns False if it's still over
+        """
+        maxmemory = self.config["maxmemory"]
+        if self.keyspace.used_memory <= maxmemory:
+            return True
+        # Evicted keys are propagated as DEL by _key_removed
+        perform_evictions(self.keyspace, maxmemory, self.eviction_pool, self.config["maxmemory-samples"])
+        return self.keyspace.used_memory <= maxmemory
+
+    def propagate(self, command_name, command_args):
+        """
+        Logs a write command to the append only file and sends it to the replicas
+        The command is encoded once and the same bytes are shared by all of them
+        """
+        if self._exec_multi_propagated is False:
+            # First write of a transaction
+            self._exec_multi_propagated = True
+            self.propagate("MULTI", [])
+        data = bytes(encode_command(command_name, command_args))
+        if self.aof is not None:
+            self.aof.append(data)
+        if self.repl_backlog is not None:
+            self.feed_replicas(data)
+
+    def rewrite_propagated_command(self, command_name, command_args):
+        """
+        Makes the current command be logged as a different one eg: relative expire times
+        become absolute, so replaying the log later gives the same deadlines
+        """
+        self._propagate_as = (command_name, command_args)
+
     def stop(self):
         logger.info("Stopping server...")
+        self.running = False
+        self.cron_task.cancel()
         self.server.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        if self.unix_server is not None:
+            self.unix_server.close()
+            os.unlink(self.config["unixsocket"])
+        self._stop_replication()
+        if self.aof is not None:
+            self.aof.close()
+
+
+def serve(server):
+    """
+    Runs server until it's stopped, on the event loop selected by the event-loop option
+    """
+    if server.config["event-loop"] == "uvloop":
+        try:
+            import uvloop
+        except ImportError:
+            logger.warning("uvloop is not installed, using the asyncio event loop")
+        else:
+            uvloop.install()
+    elif server.config["event-loop"] != "asyncio":
+        raise Exception(f"Unknown event loop {server.config['event-loop']}")
+    asyncio.run(server.start())
 
 
 if __name__ == "__main__":
-    logging.basicConfig(level=logging.INFO)
     server = RedisServer(host=HOST, port=PORT)
-    asyncio.run(server.start())
+    logging.basicConfig(level=log_level(server.config))
+    serve(server)
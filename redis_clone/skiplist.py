@@ -0,0 +1,179 @@
+"""
+Indexed skiplist ordered by score then member, same as the zskiplist of redis t_zset.c
+
+Every forward link also stores its span, the number of nodes it jumps over, so the rank of
+a node and the node at a rank are found in O(log n) by adding up the spans on the way,
+without walking the bottom level.
+"""
+import random
+import sys
+
+# Enough for 2^64 elements with P = 1/4, same as redis ZSKIPLIST_MAXLEVEL
+SKIPLIST_MAX_LEVEL = 32
+SKIPLIST_P = 0.25
+
+
+class SkipListNode:
+    __slots__ = ("member", "score", "backward", "forward", "span")
+
+    def __init__(self, level, score, member) -> None:
+        self.member = member
+        self.score = score
+        self.backward = None
+        # Next node and number of nodes skipped at every level of the node
+        self.forward = [None] * level
+        self.span = [0] * level
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self.forward) + sys.getsizeof(self.span)
+
+
+def random_level():
+    level = 1
+    while level < SKIPLIST_MAX_LEVEL and random.random() < SKIPLIST_P:
+        level += 1
+    return level
+
+
+class SkipList:
+    """
+    Ranks are 0 based, nodes are compared by (score, member)
+    """
+
+    def __init__(self) -> None:
+        self.header = SkipListNode(SKIPLIST_MAX_LEVEL, 0, None)
+        self.tail = None
+        self.level = 1
+        self.length = 0
+
+    def __len__(self):
+        return self.length
+
+    def insert(self, score, member):
+        """
+        Inserts a member which is not in the list yet, returns its node
+        """
+        update = [None] * SKIPLIST_MAX_LEVEL
+        rank = [0] * SKIPLIST_MAX_LEVEL
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            rank[i] = 0 if i == self.level - 1 else rank[i + 1]
+            node = x.forward[i]
+            while node is not None and (node.score < score or (node.score == score and node.member < member)):
+                rank[i] += x.span[i]
+                x = node
+                node = x.forward[i]
+            update[i] = x
+
+        level = random_level()
+        if level > self.level:
+            for i in range(self.level, level):
+                rank[i] = 0
+                update[i] = self.header
+                update[i].span[i] = self.length
+            self.level = level
+
+        x = SkipListNode(level, score, member)
+        for i in range(level):
+            x.forward[i] = update[i].forward[i]
+            update[i].forward[i] = x
+            # update[i] now jumps to x, x takes over the rest of its span
+            x.span[i] = update[i].span[i] - (rank[0] - rank[i])
+            update[i].span[i] = rank[0] - rank[i] + 1
+        # Links above the new node jump over one more node
+        for i in range(level, self.level):
+            update[i].span[i] += 1
+
+        x.backward = None if update[0] is self.header else update[0]
+        if x.forward[0] is not None:
+            x.forward[0].backward = x
+        else:
+            self.tail = x
+        self.length += 1
+        return x
+
+    def delete(self, score, member):
+        """
+        Deletes the node of member with score, returns it or None if it isn't in the list
+        """
+        update = [None] * SKIPLIST_MAX_LEVEL
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            node = x.forward[i]
+            while node is not None and (node.score < score or (node.score == score and node.member < member)):
+                x = node
+                node = x.forward[i]
+            update[i] = x
+
+        x = x.forward[0]
+        if x is None or x.score != score or x.member != member:
+            return None
+        self._delete_node(x, update)
+        return x
+
+    def _delete_node(self, x, update):
+        for i in range(self.level):
+            if update[i].forward[i] is x:
+                update[i].span[i] += x.span[i] - 1
+                update[i].forward[i] = x.forward[i]
+            else:
+                update[i].span[i] -= 1
+        if x.forward[0] is not None:
+            x.forward[0].backward = x.backward
+        else:
+            self.tail = x.backward
+        while self.level > 1 and self.header.forward[self.level - 1] is None:
+            self.level -= 1
+        self.length -= 1
+
+    def rank(self, score, member):
+        """
+        Rank of the node of member with score, None if it isn't in the list
+        """
+        rank = 0
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            node = x.forward[i]
+            while node is not None and (node.score < score or (node.score == score and node.member <= member)):
+                rank += x.span[i]
+                x = node
+                node = x.forward[i]
+            if x.member is not None and x.member == member:
+                return rank - 1
+        return None
+
+    def node_at(self, rank):
+        """
+        Node at rank, None if rank is out of the list
+        """
+        if not 0 <= rank < self.length:
+            return None
+        traversed = 0
+        # Spans count the node they land on, ranks of the spans are 1 based
+        target = rank + 1
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            while x.forward[i] is not None and traversed + x.span[i] <= target:
+                traversed += x.span[i]
+                x = x.forward[i]
+            if traversed == target:
+                return x
+        return None
+
+    def count_below(self, score, inclusive):
+        """
+        Number of nodes with a score lower than score, or lower or equal if inclusive
+        It's also the rank of the first node above that bound
+        """
+        count = 0
+        x = self.header
+        for i in range(self.level - 1, -1, -1):
+            node = x.forward[i]
+            while node is not None and (node.score < score or (inclusive and node.score == score)):
+                count += x.span[i]
+                x = node
+                node = x.forward[i]
+        return count
+
+    def first(self):
+        return self.header.forward[0]
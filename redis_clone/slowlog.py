@@ -0,0 +1,55 @@
+"""
+Slow log, the last commands whose execution took longer than slowlog-log-slower-than
+Only the time spent running the command is measured, not reading or replying to it
+"""
+import collections
+import time
+
+# Arguments of a command kept in an entry, the rest are summarized, same as redis
+SLOWLOG_ENTRY_MAX_ARGC = 32
+# Bytes of an argument kept in an entry
+SLOWLOG_ENTRY_MAX_STRING = 128
+
+
+class SlowLog:
+    def __init__(self, max_len) -> None:
+        # Newest entries first, the oldest are dropped once max_len is reached
+        self.entries = collections.deque(maxlen=max_len)
+        self.next_id = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def push(self, command_name, command_args, duration_us, address):
+        """
+        Adds an entry, arguments are truncated so a slow command with a huge payload
+        doesn't keep it in memory
+        """
+        args = [command_name.encode()]
+        argc = len(command_args) + 1
+        if argc > SLOWLOG_ENTRY_MAX_ARGC:
+            # Last slot is taken by the number of arguments left out
+            command_args = command_args[:SLOWLOG_ENTRY_MAX_ARGC - 2]
+        for arg in command_args:
+            if isinstance(arg, int):
+                arg = b"%d" % arg
+            if len(arg) > SLOWLOG_ENTRY_MAX_STRING:
+                arg = bytes(arg[:SLOWLOG_ENTRY_MAX_STRING]) + b"... (%d more bytes)" % (len(arg) - SLOWLOG_ENTRY_MAX_STRING)
+            args.append(bytes(arg))
+        if argc > SLOWLOG_ENTRY_MAX_ARGC:
+            args.append(b"... (%d more arguments)" % (argc - SLOWLOG_ENTRY_MAX_ARGC + 1))
+
+        client = f"{address[0]}:{address[1]}" if address else ""
+        self.entries.appendleft([self.next_id, int(time.time()), duration_us, args, client, ""])
+        self.next_id += 1
+
+    def get(self, count):
+        """
+        Returns the count newest entries, all of them if count is negative
+        """
+        if count < 0:
+            return list(self.entries)
+        return list(self.entries)[:count]
+
+    def reset(self):
+        self.entries.clear()
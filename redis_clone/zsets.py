@@ -0,0 +1,238 @@
+"""
+Sorted set values, same encodings as redis t_zset.c
+
+Small sorted sets are a listpack of members each followed by its score, kept in order so
+ranges are read front to back. Once a set has more than max_listpack_entries members or
+gets a member longer than max_listpack_value it's converted to a dict from member to score
+plus a SkipList, which gives O(log n) updates, ranks and range lookups.
+"""
+import sys
+
+from redis_clone.listpack import Listpack
+from redis_clone.skiplist import SkipList
+
+ENCODING_LISTPACK = "listpack"
+ENCODING_SKIPLIST = "skiplist"
+
+
+def encode_score(score):
+    """
+    Scores are stored in the listpack with repr, which reads back as the same float
+    """
+    return repr(score).encode()
+
+
+class SortedSet:
+    """
+    Members with a float score, ordered by score then member
+    Ranks are 0 based and ranges are lists of (member, score)
+
+    Like Hash, the memory of the skiplist encoding is summed as members change, see entry_memory
+    """
+
+    __slots__ = ("listpack", "table", "skiplist", "table_entries_size")
+
+    def __init__(self) -> None:
+        self.listpack = Listpack()
+        self.table = None
+        self.skiplist = None
+        self.table_entries_size = 0
+
+    @property
+    def encoding(self):
+        return ENCODING_LISTPACK if self.table is None else ENCODING_SKIPLIST
+
+    def __len__(self):
+        if self.table is None:
+            return len(self.listpack) // 2
+        return len(self.table)
+
+    def __sizeof__(self):
+        if self.table is None:
+            return object.__sizeof__(self) + sys.getsizeof(self.listpack)
+        return object.__sizeof__(self) + sys.getsizeof(self.table) + self.table_entries_size
+
+    def _listpack_entries(self):
+        """
+        Yields the offset, member and score of every member of the listpack, in order
+        """
+        listpack = self.listpack
+        offset = 0
+        end = len(listpack.buffer)
+        while offset < end:
+            member, score_offset = listpack.get(offset)
+            score, next_offset = listpack.get(score_offset)
+            yield offset, member, float(score)
+            offset = next_offset
+
+    def score(self, member):
+        """
+        Returns the score of member or None if it isn't in the set
+        """
+        if self.table is not None:
+            return self.table.get(member)
+        offset = self.listpack.find(member, skip=1)
+        if offset < 0:
+            return None
+        return float(self.listpack.get(self.listpack.entry_end(offset))[0])
+
+    def add(self, member, score, max_listpack_entries, max_listpack_value):
+        """
+        Adds member or updates its score, returns True if the member is new
+        """
+        member = bytes(member)
+        if self.table is None:
+            if len(member) <= max_listpack_value:
+                existed = self._listpack_remove(member)
+                if existed or len(self) < max_listpack_entries:
+                    self._listpack_insert(member, score)
+                    return not existed
+            self._convert_to_skiplist()
+
+        old_score = self.table.get(member)
+        if old_score is not None:
+            if old_score == score:
+                return False
+            self._delete_node(old_score, member)
+            self.table[member] = score
+            self._insert_node(score, member)
+            return False
+        self.table[member] = score
+        self.table_entries_size += sys.getsizeof(member) + sys.getsizeof(score)
+        self._insert_node(score, member)
+        return True
+
+    def _insert_node(self, score, member):
+        # Nodes have a random level, so their size is counted one by one
+        self.table_entries_size += sys.getsizeof(self.skiplist.insert(score, member))
+
+    def _delete_node(self, score, member):
+        self.table_entries_size -= sys.getsizeof(self.skiplist.delete(score, member))
+
+    def remove(self, member):
+        """
+        Removes member, returns True if it was in the set
+        """
+        if self.table is None:
+            return self._listpack_remove(member)
+        score = self.table.pop(member, None)
+        if score is None:
+            return False
+        self._delete_node(score, member)
+        self.table_entries_size -= sys.getsizeof(member) + sys.getsizeof(score)
+        return True
+
+    def _listpack_remove(self, member):
+        offset = self.listpack.find(member, skip=1)
+        if offset < 0:
+            return False
+        self.listpack.delete(offset, 2)
+        return True
+
+    def _listpack_insert(self, member, score):
+        for offset, entry_member, entry_score in self._listpack_entries():
+            if entry_score > score or (entry_score == score and entry_member > member):
+                self.listpack.insert(offset, encode_score(score))
+                self.listpack.insert(offset, member)
+                return
+        self.listpack.append(member)
+        self.listpack.append(encode_score(score))
+
+    def rank(self, member, reverse=False):
+        """
+        Rank of member, None if it isn't in the set
+        """
+        if self.table is None:
+            for rank, (_, entry_member, _) in enumerate(self._listpack_entries()):
+                if entry_member == member:
+                    return len(self) - 1 - rank if reverse else rank
+            return None
+        score = self.table.get(member)
+        if score is None:
+            return None
+        rank = self.skiplist.rank(score, member)
+        return len(self) - 1 - rank if reverse else rank
+
+    def range_by_rank(self, start, stop, reverse=False):
+        """
+        Members from rank start to rank stop included, both already within the set
+        """
+        if start > stop:
+            return []
+        if self.table is None:
+            entries = [(member, score) for _, member, score in self._listpack_entries()]
+            if reverse:
+                entries.reverse()
+            return entries[start:stop + 1]
+
+        result = []
+        if reverse:
+            node = self.skiplist.node_at(len(self) - 1 - start)
+            for _ in range(stop - start + 1):
+                result.append((node.member, node.score))
+                node = node.backward
+        else:
+            node = self.skiplist.node_at(start)
+            for _ in range(stop - start + 1):
+                result.append((node.member, node.score))
+                node = node.forward[0]
+        return result
+
+    def score_range_ranks(self, min_score, min_exclusive, max_score, max_exclusive):
+        """
+        Ranks of the first member within the score range and right after the last one
+        """
+        if self.table is None:
+            first = end = 0
+            for _, _, score in self._listpack_entries():
+                if score < min_score or (min_exclusive and score == min_score):
+                    first += 1
+                if score < max_score or (not max_exclusive and score == max_score):
+                    end += 1
+            return first, max(first, end)
+        first = self.skiplist.count_below(min_score, inclusive=min_exclusive)
+        end = self.skiplist.count_below(max_score, inclusive=not max_exclusive)
+        return first, max(first, end)
+
+    def items(self):
+        """
+        Yields the members and their scores in order
+        """
+        if self.table is None:
+            for _, member, score in self._listpack_entries():
+                yield member, score
+            return
+        node = self.skiplist.first()
+        while node is not None:
+            yield node.member, node.score
+            node = node.forward[0]
+
+    def _convert_to_skiplist(self):
+        entries = list(self.items())
+        self.listpack = None
+        self.table = {}
+        self.skiplist = SkipList()
+        self.table_entries_size = 0
+        for member, score in entries:
+            self.table[member] = score
+            self.table_entries_size += sys.getsizeof(member) + sys.getsizeof(score)
+            self._insert_node(score, member)
+
+    @classmethod
+    def from_listpack(cls, listpack):
+        sorted_set = cls()
+        sorted_set.listpack = listpack
+        return sorted_set
+
+    @classmethod
+    def from_items(cls, items):
+        """
+        Builds a skiplist encoded sorted set eg: while loading a snapshot
+        """
+        sorted_set = cls()
+        sorted_set._convert_to_skiplist()
+        for member, score in items:
+            sorted_set.table[member] = score
+            sorted_set.table_entries_size += sys.getsizeof(member) + sys.getsizeof(score)
+            sorted_set._insert_node(score, member)
+        return sorted_set
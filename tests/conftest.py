@@ -0,0 +1,53 @@
+import os
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+import redis
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _get_free_port():
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def start_server():
+    """
+    Starts servers in separate processes with their own configuration
+    Config is passed with REDIS_* environment variables eg: {"REDIS_MAXMEMORY": "1mb"}
+    """
+    processes = []
+
+    def _start(env=None, port=None):
+        port = port or _get_free_port()
+        process_env = dict(os.environ, REDIS_HOST="127.0.0.1", REDIS_PORT=str(port), PYTHONPATH=ROOT_DIR)
+        process_env.update(env or {})
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT_DIR, "redis_clone", "server.py")],
+            env=process_env,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL,
+        )
+        processes.append(process)
+
+        # Wait for the server to accept connections
+        deadline = time.time() + 10
+        while time.time() < deadline:
+            try:
+                redis.StrictRedis(host="127.0.0.1", port=port).ping()
+                return port
+            except redis.ConnectionError:
+                time.sleep(0.05)
+        raise Exception(f"Server on port {port} did not start")
+
+    yield _start
+
+    for process in processes:
+        process.terminate()
+        process.wait()
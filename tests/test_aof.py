@@ -0,0 +1,190 @@
+# Using pytest for tests
+import os
+import time
+
+import pytest
+import redis
+
+from redis_clone import aof
+from redis_clone.keyspace import Keyspace, now_ms
+from redis_clone.server import RedisServer
+
+
+def _replay(path):
+    server = RedisServer(host="127.0.0.1", port=0)
+    commands = aof.load(path, server._process_command)
+    return server, commands
+
+
+class TestAppendOnlyFile:
+    def test_encode_command(self):
+        assert aof.encode_command("SET", [b"key", b"value"]) == b"*3\r\n$3\r\nSET\r\n$3\r\nkey\r\n$5\r\nvalue\r\n"
+        assert aof.encode_command("PEXPIREAT", [b"key", 100]) == b"*3\r\n$9\r\nPEXPIREAT\r\n$3\r\nkey\r\n$3\r\n100\r\n"
+
+    def test_load(self, tmp_path):
+        path = str(tmp_path / "appendonly.aof")
+        with open(path, "wb") as file:
+            file.write(aof.encode_command("SET", [b"key", b"\x00\r\n"]))
+            file.write(aof.encode_command("INCR", [b"counter"]))
+            file.write(aof.encode_command("INCR", [b"counter"]))
+
+        server, commands = _replay(path)
+        assert commands == 3
+        assert server.data_store == {b"key": b"\x00\r\n", b"counter": 2}
+
+    def test_load_truncates_incomplete_command(self, tmp_path):
+        path = str(tmp_path / "appendonly.aof")
+        complete = aof.encode_command("SET", [b"key", b"value"])
+        with open(path, "wb") as file:
+            file.write(complete)
+            file.write(aof.encode_command("SET", [b"other", b"value"])[:-5])
+
+        server, commands = _replay(path)
+        assert commands == 1
+        assert server.data_store == {b"key": b"value"}
+        assert os.path.getsize(path) == len(complete)
+
+    def test_load_bad_format(self, tmp_path):
+        path = str(tmp_path / "appendonly.aof")
+        with open(path, "wb") as file:
+            file.write(b"not a command\r\n")
+
+        with pytest.raises(aof.AOFError):
+            _replay(path)
+
+    def test_rewrite(self, tmp_path):
+        keyspace = Keyspace()
+        for i in range(200):
+            keyspace.set(b"key:%d" % i, b"value:%d" % i)
+        keyspace.set(b"counter", 10)
+        keyspace.set(b"ttl_key", b"value", deadline_ms=now_ms() + 100000)
+        keyspace.set(b"expired", b"value", deadline_ms=now_ms() - 1)
+
+        path = str(tmp_path / "appendonly.aof")
+        size = aof.rewrite(keyspace, path)
+        assert size == os.path.getsize(path)
+
+        server, commands = _replay(path)
+        # Keys without a ttl are grouped by MSET
+        assert commands == 5
+        expected = {key: value for key, value in keyspace.data.items() if key != b"expired"}
+        expected[b"counter"] = b"10"
+        assert server.data_store == expected
+        assert server.keyspace.expires == {b"ttl_key": keyspace.expires[b"ttl_key"]}
+
+
+@pytest.mark.parametrize("appendfsync", ["always", "everysec", "no"])
+def test_writes_are_replayed_on_restart(start_server, tmp_path, appendfsync):
+    env = {"REDIS_DIR": str(tmp_path), "REDIS_APPENDONLY": "yes", "REDIS_APPENDFSYNC": appendfsync}
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("key", "value")
+    client.set("ttl_key", "value", ex=100)
+    client.set("expire_key", "value")
+    client.expire("expire_key", 100)
+    client.incr("counter")
+    client.incrbyfloat("float", "1.5")
+    client.set("deleted", "value")
+    client.delete("deleted")
+    ttl_key_deadline = client.pttl("ttl_key")
+    client.close()
+
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.mget("key", "ttl_key", "expire_key", "counter", "float", "deleted") == [
+        b"value", b"value", b"value", b"1", b"1.5", None
+    ]
+    # Relative ttls are logged as absolute deadlines
+    assert 0 < client.pttl("ttl_key") <= ttl_key_deadline
+    assert client.ttl("expire_key") > 0
+    client.close()
+
+
+def test_expired_keys_stay_expired_on_restart(start_server, tmp_path):
+    env = {"REDIS_DIR": str(tmp_path), "REDIS_APPENDONLY": "yes"}
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("rate_limit", 5, ex=1)
+    assert client.incr("rate_limit") == 6
+    client.set("kept", 5, ex=100)
+    assert client.incr("kept") == 6
+    time.sleep(1.5)
+    client.close()
+    # Expired by the active expire cycle, which logs a DEL
+    with open(tmp_path / "appendonly.aof", "rb") as file:
+        assert file.read().endswith(aof.encode_command("DEL", [b"rate_limit"]))
+
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.get("rate_limit") is None
+    assert client.ttl("rate_limit") == -2
+    assert client.get("kept") == b"6"
+    assert client.ttl("kept") > 90
+    client.close()
+
+
+def test_deadlines_are_not_enforced_while_loading(tmp_path):
+    # Written to a key before it expired, without the DEL which follows once it expires
+    with open(tmp_path / "appendonly.aof", "wb") as file:
+        file.write(aof.encode_command("SET", [b"rate_limit", b"5", b"PXAT", now_ms() - 1000]))
+        file.write(aof.encode_command("INCRBY", [b"rate_limit", b"1"]))
+    server = RedisServer(host="127.0.0.1", port=0, config={"dir": str(tmp_path), "appendonly": "yes"})
+    server.load_data()
+    assert server.data_store == {b"rate_limit": 6}
+    assert server._process_command("GET", [b"rate_limit"]) == b"$-1\r\n"
+
+
+def test_writes_which_change_nothing_are_not_logged(start_server, tmp_path):
+    port = start_server({"REDIS_DIR": str(tmp_path), "REDIS_APPENDONLY": "yes"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("key", "value")
+    client.hset("hash", "field", "value")
+    assert client.set("key", "other", nx=True) is None
+    assert client.delete("missing") == 0
+    assert client.hdel("hash", "missing") == 0
+    assert client.zrem("missing", "member") == 0
+    assert client.persist("key") is False
+    client.close()
+
+    with open(tmp_path / "appendonly.aof", "rb") as file:
+        assert file.read().endswith(aof.encode_command("HSET", [b"hash", b"field", b"value"]))
+
+
+def test_failed_rewrite_leaves_no_temporary_file(tmp_path, monkeypatch):
+    # Rewritten in the foreground, like on platforms without fork
+    monkeypatch.delattr(os, "fork")
+    server = RedisServer(host="127.0.0.1", port=0, config={"dir": str(tmp_path)})
+    server.keyspace.set(b"key", b"value")
+    # A value which can't be encoded fails the rewrite half way
+    server.keyspace.set(b"broken", object())
+    assert server._process_command("BGREWRITEAOF", []).startswith(b"-ERR")
+    assert server.stats["aof_last_bgrewrite_status"] == "err"
+    assert os.listdir(tmp_path) == []
+
+
+def test_bgrewriteaof(start_server, tmp_path):
+    env = {"REDIS_DIR": str(tmp_path), "REDIS_APPENDONLY": "yes"}
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    for _ in range(100):
+        client.incr("counter")
+    client.set("key", "value")
+
+    path = str(tmp_path / "appendonly.aof")
+    size_before = os.path.getsize(path)
+    previous_inode = os.stat(path).st_ino
+    assert client.bgrewriteaof() == True
+    # Written while the rewrite may still be running, it's kept by the rewrite buffer
+    client.set("late_key", "value")
+    deadline = time.time() + 10
+    while os.stat(path).st_ino == previous_inode and time.time() < deadline:
+        time.sleep(0.05)
+    assert os.path.getsize(path) < size_before
+
+    client.set("after_rewrite", "value")
+    client.close()
+
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.mget("counter", "key", "late_key", "after_rewrite") == [b"100", b"value", b"value", b"value"]
+    client.close()
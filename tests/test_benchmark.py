@@ -0,0 +1,49 @@
+# Using pytest for tests
+import asyncio
+
+import pytest
+
+from redis_clone.benchmark import compare_with_baseline, parse_command_mix, reply_end, run_benchmark
+
+
+def test_reply_end():
+    replies = b"+OK\r\n$5\r\nvalue\r\n$-1\r\n*2\r\n:1\r\n$1\r\na\r\n-ERR error\r\n"
+    positions = [0]
+    while positions[-1] < len(replies):
+        positions.append(reply_end(replies, positions[-1]))
+    assert positions == [0, 5, 16, 21, 36, len(replies)]
+    # Incomplete replies
+    assert reply_end(b"$5\r\nval", 0) == -1
+    assert reply_end(b"*2\r\n:1\r\n", 0) == -1
+
+
+def test_parse_command_mix():
+    assert parse_command_mix("get:80,SET:20,ping") == {"get": 80, "set": 20, "ping": 1}
+    with pytest.raises(Exception):
+        parse_command_mix("flushall:1")
+
+
+def test_compare_with_baseline():
+    baseline = {"fast": {"ops_per_sec": 1000}, "slow": 100, "removed": 10}
+    results = {"fast": {"ops_per_sec": 850}, "slow": 95, "new": 1}
+    regressions = compare_with_baseline(results, baseline, max_regression=10)
+    assert len(regressions) == 1
+    assert regressions[0].startswith("fast:")
+
+
+def test_run_benchmark(start_server):
+    port = start_server()
+    results = asyncio.run(run_benchmark(
+        "127.0.0.1",
+        port,
+        clients=4,
+        pipeline=8,
+        requests=1000,
+        keyspace=100,
+        value_sizes=[16, 1024],
+        command_mix=parse_command_mix("get:4,set:4,mget:1,mset:1,incr:1,del:1,ping:1"),
+        seed=0,
+    ))
+    assert results["requests"] == 1000
+    assert results["errors"] == 0
+    assert 0 < results["p50_usec"] <= results["p99_usec"] <= results["p99.9_usec"]
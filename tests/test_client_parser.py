@@ -1,5 +1,9 @@
 # Using pytest for tests
+import pytest
+
 from redis_clone.parser.redis_parser import Parser, Protocol_2_Data_Types
+from redis_clone.parser.hi_redis_parser import HiRedisParser
+from redis_clone.server import RedisServer
 
 
 class TestParserClient:
@@ -24,7 +28,7 @@ class TestParserClient:
         command, args = self.parser.parse(test_str)
 
         assert command == "SET"
-        assert args == ["mykey", "myvalue"]
+        assert args == [b"mykey", b"myvalue"]
 
     def test_get_command_request(self):
         """
@@ -34,19 +38,95 @@ class TestParserClient:
         command, args = self.parser.parse(test_str)
 
         assert command == "GET"
-        assert args == ["mykey"]
+        assert args == [b"mykey"]
         
     def test_subargs_parsing(self):
         '''
         Some commands in redis supports optional subargs.
         eg: SET mykey myvalue EX 10 NX
+        Subargs are grouped using the command's metadata from the command table
         '''
-        test_str = b"*6\r\n$3\r\nSET\r\n$5\r\nmykey\r\n$7\r\nmyvalue\r\n$2\r\nEX\r\n$2\r\n10\r\n$2\r\nNX\r\n"
+        test_str = b"*6\r\n$3\r\nSET\r\n$5\r\nmykey\r\n$7\r\nmyvalue\r\n$2\r\nex\r\n$2\r\n10\r\n$2\r\nNX\r\n"
         command, args = self.parser.parse(test_str)
         
-        print(args)
         assert command == "SET"
-        assert args == ['mykey', 'myvalue', ('EX', '10'), ('NX', True)]
+        assert args == [b'mykey', b'myvalue', b'ex', b'10', b'NX']
+
+        set_command = RedisServer(host="127.0.0.1", port=0).command_table[command]
+        assert set_command.group_subargs(args) == [b'mykey', b'myvalue', ('EX', b'10'), ('NX', True)]
+
+        # Positional arguments are never taken as subargs
+        assert set_command.group_subargs([b'ex', b'nx', b'get']) == [b'ex', b'nx', ('GET', True)]
+
+    def test_pipelined_commands(self):
+        """
+        A single buffer can hold several commands, all of them are returned
+        """
+        self.parser.feed(b"*1\r\n$4\r\nPING\r\n*2\r\n$3\r\nGET\r\n$5\r\nmykey\r\n*1\r\n$4\r\nPING\r\n")
+
+        assert list(self.parser) == [("PING", []), ("GET", [b"mykey"]), ("PING", [])]
+        assert self.parser.gets() is False
+
+    def test_partial_command(self):
+        """
+        Partially received commands are kept in the buffer until they are complete
+        """
+        test_str = b"*3\r\n$3\r\nSET\r\n$5\r\nmykey\r\n$7\r\nmyvalue\r\n"
+        for i in range(len(test_str) - 1):
+            self.parser.feed(test_str[i:i + 1])
+            assert self.parser.gets() is False
+
+        self.parser.feed(test_str[-1:])
+        assert self.parser.gets() == ("SET", [b"mykey", b"myvalue"])
+
+    def test_large_bulk_string_in_chunks(self):
+        """
+        Bulk strings larger than a single read are assembled from several feeds
+        """
+        value = b"x" * (3 * 1024 * 1024)
+        test_str = b"*3\r\n$3\r\nSET\r\n$5\r\nmykey\r\n$%d\r\n%s\r\n" % (len(value), value)
+        for i in range(0, len(test_str), 16 * 1024):
+            assert self.parser.gets() is False
+            self.parser.feed(test_str[i:i + 16 * 1024])
+
+        assert self.parser.gets() == ("SET", [b"mykey", value])
+
+    def test_hiredis_parser_keeps_partial_frames(self):
+        """
+        HiRedisParser uses one reader for all the feeds of a connection
+        """
+        parser = HiRedisParser(protocol_version=2)
+        parser.feed(b"*6\r\n$3\r\nset\r\n$5\r\nmykey\r\n$7\r\nmyva")
+        assert parser.gets() is False
+
+        parser.feed(b"lue\r\n$2\r\nex\r\n$2\r\n10\r\n$2\r\nNX\r\n*1\r\n$4\r\nPING\r\n")
+        assert list(parser) == [("SET", [b"mykey", b"myvalue", b"ex", b"10", b"NX"]), ("PING", [])]
+
+    def test_binary_arguments(self):
+        """
+        Arguments are returned as the exact bytes sent, including separators and invalid utf-8
+        """
+        value = b"\r\n\x00\xff\xfe$*"
+        test_str = b"*3\r\n$3\r\nset\r\n$3\r\nkey\r\n$%d\r\n%s\r\n" % (len(value), value)
+        assert self.parser.parse(test_str) == ("SET", [b"key", value])
+
+    def test_invalid_requests(self):
+        """
+        Bulk data must end with its separator, and lengths are bounded
+        """
+        for test_str in (
+            # abc followed by XY instead of \r\n, the PING after it is never run
+            b"*2\r\n$4\r\nECHO\r\n$3\r\nabcXY*1\r\n$4\r\nPING\r\n",
+            # Rejected from the header, before any of the data is buffered
+            b"*1\r\n$999999999\r\n",
+            b"*1\r\n$-1\r\n",
+            b"*4294967296\r\n",
+            b"*0\r\n",
+        ):
+            parser = Parser(protocol_version=2)
+            parser.feed(test_str)
+            with pytest.raises(Exception):
+                parser.gets()
 
     def setup_method(self):
         self.parser = Parser(protocol_version=2)
@@ -0,0 +1,117 @@
+# Using pytest for tests
+import socket
+
+import pytest
+import redis
+from redis.cluster import RedisCluster
+
+from redis_clone.cluster import CLUSTER_SLOTS, ClusterState, key_hash_slot, split_slots
+
+SHARDS = 3
+
+
+def _get_free_ports(count):
+    """
+    Returns the first of count consecutive free ports
+    """
+    for base_port in range(20000, 60000, 97):
+        try:
+            for port in range(base_port, base_port + count):
+                with socket.socket() as sock:
+                    sock.bind(("127.0.0.1", port))
+            return base_port
+        except OSError:
+            continue
+    raise Exception("No free ports")
+
+
+@pytest.fixture
+def cluster(start_server):
+    base_port = _get_free_ports(SHARDS)
+    for shard_index in range(SHARDS):
+        start_server({
+            "REDIS_CLUSTER_ENABLED": "yes",
+            "REDIS_CLUSTER_SHARDS": str(SHARDS),
+            "REDIS_CLUSTER_SHARD_INDEX": str(shard_index),
+        }, port=base_port + shard_index)
+    return base_port
+
+
+class TestHashSlots:
+    def test_key_hash_slot(self):
+        # Values from the redis cluster specification
+        assert key_hash_slot(b"123456789") == 0x31C3
+        assert key_hash_slot(b"foo") == 12182
+        assert key_hash_slot(b"{user1000}.following") == key_hash_slot(b"{user1000}.followers")
+        assert key_hash_slot(b"{user1000}.following") == key_hash_slot(b"user1000")
+        # Empty or unterminated hash tags hash the whole key
+        assert key_hash_slot(b"foo{}{bar}") != key_hash_slot(b"bar")
+        assert key_hash_slot(b"foo{bar") != key_hash_slot(b"bar")
+
+    def test_split_slots(self):
+        ranges = split_slots(SHARDS)
+        assert ranges[0][0] == 0
+        assert ranges[-1][1] == CLUSTER_SLOTS - 1
+        for (_, end), (start, _) in zip(ranges, ranges[1:]):
+            assert start == end + 1
+
+    def test_slot_owners(self):
+        state = ClusterState("127.0.0.1", 7000, SHARDS, 1)
+        assert len(state.slot_owners) == CLUSTER_SLOTS
+        assert state.myself.port == 7001
+        start, end = state.myself.slot_range
+        assert state.owner(start) is state.myself
+        assert state.owner(end) is state.myself
+        assert state.owner(end + 1) is state.nodes[2]
+
+
+def test_moved_redirect(cluster):
+    client = redis.StrictRedis(host="127.0.0.1", port=cluster)
+    slot = key_hash_slot(b"foo")
+    owner = next(node for node in client.cluster("SLOTS") if node[0] <= slot <= node[1])
+    if owner[2][1] != cluster:
+        with pytest.raises(redis.ResponseError, match=f"MOVED {slot} 127.0.0.1:{owner[2][1]}"):
+            client.execute_command("GET", "foo")
+
+    # Keys of different slots can't be used by the same command
+    with pytest.raises(redis.ResponseError, match="CROSSSLOT"):
+        client.execute_command("MSET", "foo", "1", "bar", "2")
+    # Commands without keys run on any shard
+    assert client.ping() == True
+    client.close()
+
+
+def test_cluster_commands(cluster):
+    client = redis.StrictRedis(host="127.0.0.1", port=cluster, decode_responses=True)
+    slots = client.execute_command("CLUSTER SLOTS")
+    assert [(start, end) for start, end, _ in slots] == split_slots(SHARDS)
+    assert [node[1] for _, _, node in slots] == [cluster + i for i in range(SHARDS)]
+
+    shards = client.execute_command("CLUSTER SHARDS")
+    assert len(shards) == SHARDS
+    assert shards[0][0] == "slots"
+
+    assert client.execute_command("CLUSTER KEYSLOT", "foo") == 12182
+    assert client.execute_command("CLUSTER MYID") == slots[0][2][2]
+    assert client.execute_command("CLUSTER INFO")["cluster_state"] == "ok"
+    assert client.info("cluster")["cluster_enabled"] == 1
+    client.close()
+
+
+def test_cluster_client(cluster):
+    client = RedisCluster(host="127.0.0.1", port=cluster)
+    for i in range(100):
+        client.set(f"key:{i}", f"value:{i}")
+    assert [client.get(f"key:{i}") for i in range(100)] == [b"value:%d" % i for i in range(100)]
+    # Keys are spread over every shard
+    for node in client.get_primaries():
+        assert node.redis_connection.info("keyspace")["db0"]["keys"] > 0
+    client.close()
+
+
+def test_cluster_disabled(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    with pytest.raises(redis.ResponseError, match="cluster support disabled"):
+        client.execute_command("CLUSTER SLOTS")
+    client.close()
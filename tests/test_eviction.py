@@ -0,0 +1,161 @@
+# Using pytest for tests
+import pytest
+import redis
+
+from redis_clone.evict import EvictionPool, perform_evictions
+from redis_clone.key_table import KeyTable
+from redis_clone.keyspace import Keyspace, entry_memory
+
+
+class TestKeyTable:
+    def test_grows_shrinks_and_samples(self):
+        table = KeyTable()
+        keys = [b"key_%d" % i for i in range(1000)]
+        for key in keys:
+            table.add(key)
+        assert len(table) == 1000
+        assert len(table.buckets) > 16
+        assert set(table.sample(5)) <= set(keys)
+
+        for key in keys[10:]:
+            table.remove(key)
+        # Shrunk incrementally, the cron finishes what the removes didn't move
+        while table.rehash_milliseconds(1):
+            pass
+        assert len(table.buckets) < 100
+        assert sorted(table) == sorted(keys[:10])
+
+    def test_resizes_are_incremental(self):
+        table = KeyTable()
+        keys = [b"key_%d" % i for i in range(16 * 8 * 64 + 1)]
+        for key in keys[:-1]:
+            table.add(key)
+        assert not table.rehashing
+        # The add growing the table only allocates the new one, keys move a bucket at a time
+        table.add(keys[-1])
+        assert table.rehashing
+        assert sum(len(bucket) for bucket in table.buckets if bucket) > len(keys) - 10
+        assert set(table.sample(len(keys))) <= set(keys)
+
+        reference = set(keys)
+        for i in range(20000):
+            if i % 3:
+                key = reference.pop()
+                table.remove(key)
+            else:
+                key = b"new_%d" % i
+                reference.add(key)
+                table.add(key)
+            if i % 5000 == 0:
+                assert sorted(table) == sorted(reference)
+        assert len(table) == len(reference)
+        assert sorted(table) == sorted(reference)
+
+    def test_sample_of_empty_table(self):
+        assert KeyTable().sample(5) == []
+
+
+class TestMemoryAccounting:
+    def test_used_memory_follows_changes(self):
+        keyspace = Keyspace()
+        keyspace.set(b"key", b"value")
+        assert keyspace.used_memory == entry_memory(b"key", b"value")
+
+        keyspace.set(b"key", b"a much longer value", deadline_ms=10**15)
+        keyspace.set(b"other", 10)
+        assert keyspace.used_memory == entry_memory(b"key", b"a much longer value") + entry_memory(b"other", 10)
+
+        keyspace.delete(b"key")
+        keyspace.delete(b"other")
+        assert keyspace.used_memory == 0
+        assert len(keyspace.key_table) == 0
+        assert len(keyspace.volatile_keys) == 0
+
+
+def _fill(keyspace, count):
+    for i in range(count):
+        keyspace.set(b"key_%d" % i, b"value")
+
+
+class TestEvictionPolicies:
+    def test_lru_evicts_idle_keys(self):
+        keyspace = Keyspace(eviction_policy="allkeys-lru")
+        keyspace.lru_clock = 0
+        _fill(keyspace, 100)
+        keyspace.lru_clock = 1000
+        recent = [b"key_%d" % i for i in range(50)]
+        keyspace.lookup_many(recent)
+
+        limit = keyspace.used_memory - 10 * entry_memory(b"key_0", b"value")
+        evicted = perform_evictions(keyspace, limit, EvictionPool(), samples=10)
+        assert len(evicted) == 10
+        assert keyspace.used_memory <= limit
+        assert not set(evicted) & set(recent)
+        assert keyspace.stats["evicted_keys"] == 10
+
+    def test_lfu_evicts_rarely_used_keys(self):
+        keyspace = Keyspace(eviction_policy="allkeys-lfu", lfu_log_factor=0)
+        _fill(keyspace, 100)
+        frequent = [b"key_%d" % i for i in range(50)]
+        for _ in range(20):
+            keyspace.lookup_many(frequent)
+
+        evicted = perform_evictions(keyspace, keyspace.used_memory - 1, EvictionPool(), samples=10)
+        assert len(evicted) == 1
+        assert evicted[0] not in frequent
+
+    def test_volatile_ttl_evicts_soonest_deadline(self):
+        keyspace = Keyspace(eviction_policy="volatile-ttl")
+        _fill(keyspace, 10)
+        keyspace.set(b"later", b"value", deadline_ms=10**15 + 1)
+        keyspace.set(b"sooner", b"value", deadline_ms=10**15)
+
+        assert perform_evictions(keyspace, keyspace.used_memory - 1, EvictionPool(), samples=5) == [b"sooner"]
+        # Keys without ttl are never evicted by volatile policies
+        assert perform_evictions(keyspace, 0, EvictionPool(), samples=5) == [b"later"]
+        assert len(keyspace) == 10
+
+    def test_noeviction(self):
+        keyspace = Keyspace()
+        _fill(keyspace, 10)
+        assert perform_evictions(keyspace, 0, EvictionPool(), samples=5) == []
+
+    def test_invalid_policy(self):
+        with pytest.raises(Exception):
+            Keyspace(eviction_policy="random")
+
+
+def test_maxmemory_eviction(start_server):
+    port = start_server({"REDIS_MAXMEMORY": "100kb", "REDIS_MAXMEMORY_POLICY": "allkeys-lru"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    for i in range(2000):
+        client.set(f"key_{i}", "x" * 100)
+
+    info = client.info()
+    assert info["used_memory"] <= 100 * 1024
+    assert info["maxmemory_policy"] == "allkeys-lru"
+    assert info["evicted_keys"] > 0
+    assert client.get("key_1999") == b"x" * 100
+    client.close()
+
+
+def test_maxmemory_noeviction_rejects_writes(start_server):
+    port = start_server({"REDIS_MAXMEMORY": "10kb"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    with pytest.raises(redis.exceptions.OutOfMemoryError):
+        for i in range(1000):
+            client.set(f"key_{i}", "x" * 100)
+    # Reads and deletes still work
+    assert client.get("key_0") == b"x" * 100
+    assert client.delete("key_0") == 1
+    client.close()
+
+
+def test_memory_usage(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("key", "value")
+    assert client.execute_command("MEMORY", "USAGE", "key") == entry_memory(b"key", b"value")
+    assert client.execute_command("MEMORY", "USAGE", "key", "SAMPLES", "5") == entry_memory(b"key", b"value")
+    assert client.execute_command("MEMORY", "USAGE", "missing") is None
+    client.close()
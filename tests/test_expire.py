@@ -0,0 +1,63 @@
+# Using pytest for tests
+import time
+
+from redis_clone.server import RedisServer
+
+
+class TestActiveExpire:
+    def test_expired_keys_are_reclaimed_without_reads(self):
+        """
+        Keys with a ttl are deleted by the active expire cycle even if nobody reads them
+        """
+        for i in range(100):
+            self.server._process_command("SET", [b"key_%d" % i, b"value", b"PX", b"10"])
+        self.server._process_command("SET", [b"persistent_key", b"value"])
+        self.server._process_command("SET", [b"later_key", b"value", b"EX", b"100"])
+
+        time.sleep(0.05)
+        assert self.server._active_expire_cycle(time_limit_ms=100) == 100
+
+        assert list(self.server.data_store) == [b"persistent_key", b"later_key"]
+        assert self.server.stats["expired_keys"] == 100
+
+    def test_stale_index_entries_are_skipped(self):
+        """
+        Keys which got a new ttl or were deleted after being indexed are not expired twice
+        """
+        self.server._process_command("SET", [b"key", b"value", b"PX", b"10"])
+        self.server._process_command("SET", [b"key", b"value", b"EX", b"100"])
+        self.server._process_command("SET", [b"deleted_key", b"value", b"PX", b"10"])
+        self.server._process_command("DEL", [b"deleted_key"])
+
+        time.sleep(0.05)
+        assert self.server._active_expire_cycle(time_limit_ms=100) == 0
+        assert b"key" in self.server.data_store
+
+    def test_cycle_respects_time_limit(self):
+        """
+        A cycle stops when its time budget is used and the next cycle continues
+        """
+        for i in range(50000):
+            self.server._process_command("SET", [b"key_%d" % i, b"value", b"PX", b"1"])
+
+        time.sleep(0.05)
+        expired = self.server._active_expire_cycle(time_limit_ms=1)
+        assert 0 < expired < 50000
+
+        while self.server._active_expire_cycle(time_limit_ms=100):
+            pass
+        assert self.server.data_store == {}
+        assert self.server.stats["expired_keys"] == 50000
+
+    def test_values_are_stored_without_wrapper(self):
+        """
+        Values are stored bare and only keys with a ttl have a deadline in expires
+        """
+        self.server._process_command("SET", [b"key", b"value"])
+        self.server._process_command("SET", [b"ttl_key", b"value", b"PXAT", b"32503680000000"])
+
+        assert self.server.data_store == {b"key": b"value", b"ttl_key": b"value"}
+        assert self.server.keyspace.expires == {b"ttl_key": 32503680000000}
+
+    def setup_method(self):
+        self.server = RedisServer(host="127.0.0.1", port=0)
@@ -0,0 +1,150 @@
+# Using pytest for tests
+import pytest
+import redis
+
+from redis_clone import aof, rdb
+from redis_clone.hashes import Hash
+from redis_clone.keyspace import Keyspace, entry_memory, now_ms
+from redis_clone.listpack import Listpack
+
+
+class TestListpack:
+    def test_entries(self):
+        listpack = Listpack([b"a", b"", b"x" * 300, b"b"])
+        assert len(listpack) == 4
+        assert list(listpack) == [b"a", b"", b"x" * 300, b"b"]
+
+        offset = listpack.find(b"b")
+        assert listpack.get(offset) == (b"b", len(listpack.buffer))
+        listpack.replace(listpack.find(b"x" * 300), b"short")
+        listpack.insert(0, b"first")
+        listpack.delete(listpack.find(b"a"), 2)
+        assert list(listpack) == [b"first", b"short", b"b"]
+        assert listpack.find(b"missing") == -1
+
+    def test_walks_back_from_the_end(self):
+        entries = [b"a", b"x" * 126, b"y" * 300, b"", b"b"]
+        listpack = Listpack(entries)
+        offset = len(listpack.buffer)
+        found = []
+        while offset:
+            offset = listpack.prev_offset(offset)
+            found.append(listpack.get(offset)[0])
+        assert found == entries[::-1]
+        assert [listpack.get(listpack.offset_of(i))[0] for i in range(len(entries))] == entries
+
+    def test_find_skips_values(self):
+        listpack = Listpack([b"field", b"value", b"value", b"other"])
+        assert listpack.find(b"value", skip=1) == listpack.entry_end(listpack.entry_end(0))
+
+
+class TestHash:
+    def test_converts_to_table_past_the_limits(self):
+        hash_value = Hash()
+        for i in range(4):
+            assert hash_value.set(b"field_%d" % i, b"value", 4, 64)
+        assert hash_value.encoding == "listpack"
+        assert not hash_value.set(b"field_0", b"new", 4, 64)
+
+        hash_value.set(b"field_4", b"value", 4, 64)
+        assert hash_value.encoding == "hashtable"
+        assert hash_value.get(b"field_0") == b"new"
+        assert len(hash_value) == 5
+
+        long_value = Hash()
+        long_value.set(b"field", b"x" * 65, 128, 64)
+        assert long_value.encoding == "hashtable"
+
+    def test_listpack_uses_less_memory(self):
+        keyspace = Keyspace()
+        packed = Hash()
+        table = Hash()
+        for i in range(50):
+            packed.set(b"field_%d" % i, b"value_%d" % i, 128, 64)
+            table.set(b"field_%d" % i, b"value_%d" % i, 0, 64)
+        keyspace.set(b"packed", packed)
+        keyspace.set(b"table", table)
+        assert entry_memory(b"packed", packed) * 3 < entry_memory(b"table", table)
+
+        # The tracked size of the table follows the deletes back to an empty hash
+        empty_size = entry_memory(b"key", Hash.from_items([]))
+        for i in range(50):
+            table.delete(b"field_%d" % i)
+        assert table.table_entries_size == 0
+        assert entry_memory(b"table", table) >= empty_size
+
+
+def _hash_keyspace():
+    keyspace = Keyspace()
+    small = Hash()
+    small.set(b"field", b"value", 128, 64)
+    large = Hash()
+    for i in range(10):
+        large.set(b"field_%d" % i, b"%d" % i, 0, 64)
+    keyspace.set(b"small", small)
+    keyspace.set(b"large", large, deadline_ms=now_ms() + 100000)
+    return keyspace
+
+
+def test_snapshot_round_trip(tmp_path):
+    keyspace = _hash_keyspace()
+    path = str(tmp_path / "dump.rdb")
+    rdb.dump(keyspace, path)
+
+    loaded = Keyspace()
+    assert rdb.load(loaded, path, now_ms()) == 2
+    assert loaded.data[b"small"].encoding == "listpack"
+    assert loaded.data[b"large"].encoding == "hashtable"
+    for key in (b"small", b"large"):
+        assert dict(loaded.data[key].items()) == dict(keyspace.data[key].items())
+    assert loaded.expires == keyspace.expires
+    assert loaded.used_memory == keyspace.used_memory
+
+
+def test_aof_rewrite(tmp_path):
+    path = str(tmp_path / "appendonly.aof")
+    aof.rewrite(_hash_keyspace(), path)
+    with open(path, "rb") as file:
+        content = file.read()
+    assert content.startswith(aof.encode_command("HSET", [b"small", b"field", b"value"]))
+    assert b"PEXPIREAT" in content
+
+
+def test_hash_commands(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    used_memory = client.info()["used_memory"]
+    assert client.hset("session", mapping={"user": "alice", "visits": "1"}) == 2
+    assert client.hset("session", "user", "bob") == 0
+    assert client.hget("session", "user") == b"bob"
+    assert client.hget("session", "missing") is None
+    assert client.hmget("session", "user", "missing", "visits") == [b"bob", None, b"1"]
+    assert client.hincrby("session", "visits", 10) == 11
+    assert client.hlen("session") == 2
+    assert client.hgetall("session") == {b"user": b"bob", b"visits": b"11"}
+    assert client.type("session") == b"hash"
+
+    with pytest.raises(redis.exceptions.ResponseError, match="not an integer"):
+        client.hincrby("session", "user", 1)
+    client.set("string", "value")
+    with pytest.raises(redis.exceptions.ResponseError, match="WRONGTYPE"):
+        client.hget("string", "field")
+    with pytest.raises(redis.exceptions.ResponseError, match="WRONGTYPE"):
+        client.get("session")
+    assert client.mget("session", "string") == [None, b"value"]
+
+    assert client.hdel("session", "user", "visits", "missing") == 2
+    assert client.exists("session") == 0
+    assert client.info()["used_memory"] == used_memory + entry_memory(b"string", b"value")
+    client.close()
+
+
+def test_encoding_conversion(start_server):
+    port = start_server({"REDIS_HASH_MAX_LISTPACK_ENTRIES": "4"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.hset("small", mapping={f"field_{i}": "value" for i in range(4)})
+    client.hset("large", mapping={f"field_{i}": "value" for i in range(5)})
+    assert client.object("encoding", "small") == b"listpack"
+    assert client.object("encoding", "large") == b"hashtable"
+    assert client.memory_usage("small") < client.memory_usage("large")
+    client.close()
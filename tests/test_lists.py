@@ -0,0 +1,206 @@
+# Using pytest for tests
+import random
+import threading
+import time
+
+import pytest
+import redis
+
+from redis_clone import aof, rdb
+from redis_clone.keyspace import Keyspace, now_ms
+from redis_clone.quicklist import Quicklist
+
+
+class TestQuicklist:
+    def test_matches_a_list(self):
+        quicklist = Quicklist()
+        expected = []
+        for i in range(3000):
+            operation = random.random()
+            if operation < 0.3:
+                entry = b"x" * random.randrange(300)
+                quicklist.push(entry, -1, left=True)
+                expected.insert(0, entry)
+            elif operation < 0.6:
+                entry = b"%d" % i
+                quicklist.push(entry, 16)
+                expected.append(entry)
+            elif operation < 0.8:
+                assert quicklist.pop(left=True) == (expected.pop(0) if expected else None)
+            else:
+                assert quicklist.pop() == (expected.pop() if expected else None)
+
+        assert list(quicklist) == expected
+        assert len(quicklist) == len(expected)
+        assert quicklist.range(0, len(expected) - 1) == expected
+        assert quicklist.range(5, 20) == expected[5:21]
+        assert quicklist.index(-1) == expected[-1]
+        assert quicklist.index(len(expected)) is None
+
+    def test_nodes_are_filled_up_to_the_limit(self):
+        quicklist = Quicklist()
+        for i in range(100):
+            quicklist.push(b"entry", 10)
+        assert len(quicklist.nodes) == 10
+
+        sized = Quicklist()
+        for i in range(1000):
+            sized.push(b"x" * 100, -1)
+        assert all(len(node.buffer) <= 4096 for node in sized.nodes)
+
+        # Entries with a 4 bytes length and back length take 256 bytes, 16 fill a node exactly
+        exact = Quicklist()
+        for i in range(16):
+            exact.push(b"x" * 248, -1)
+        assert [len(node.buffer) for node in exact.nodes] == [4096]
+        exact.pop()
+        # 2 bytes more than the room left, its length and back length count too
+        exact.push(b"x" * 250, -1)
+        assert [len(node.buffer) for node in exact.nodes] == [3840, 258]
+
+        # The tracked size of the nodes goes back to nothing with the last pop
+        while sized.pop() is not None:
+            pass
+        assert sized.nodes_size == 0
+
+    def test_pop_from_the_tail_of_full_nodes(self):
+        # Nodes of 8 KB hold thousands of small entries, the tail must not be found by walking them
+        timings = []
+        for left in (True, False):
+            quicklist = Quicklist()
+            for i in range(40000):
+                quicklist.push(b"%d" % i, -2)
+            assert len(quicklist.nodes[0]) > 1000
+            started = time.perf_counter()
+            for _ in range(20000):
+                quicklist.pop(left)
+            timings.append(time.perf_counter() - started)
+            assert quicklist.pop(left) == (b"20000" if left else b"19999")
+        lpop_time, rpop_time = timings
+        assert rpop_time < lpop_time * 5
+
+
+def _list_keyspace():
+    keyspace = Keyspace()
+    quicklist = Quicklist()
+    for i in range(300):
+        quicklist.push(b"job_%d" % i, 128)
+    keyspace.set(b"queue", quicklist, deadline_ms=now_ms() + 100000)
+    return keyspace
+
+
+def test_snapshot_round_trip(tmp_path):
+    keyspace = _list_keyspace()
+    path = str(tmp_path / "dump.rdb")
+    rdb.dump(keyspace, path)
+
+    loaded = Keyspace()
+    assert rdb.load(loaded, path, now_ms()) == 1
+    assert list(loaded.data[b"queue"]) == list(keyspace.data[b"queue"])
+    assert len(loaded.data[b"queue"].nodes) == 3
+    assert loaded.expires == keyspace.expires
+    # Loaded nodes are exact copies, without the spare capacity buffers get as they grow
+    assert 0 < loaded.used_memory <= keyspace.used_memory
+
+
+def test_aof_rewrite(tmp_path):
+    path = str(tmp_path / "appendonly.aof")
+    aof.rewrite(_list_keyspace(), path)
+    with open(path, "rb") as file:
+        content = file.read()
+    assert content.startswith(b"*66\r\n$5\r\nRPUSH\r\n$5\r\nqueue\r\n$5\r\njob_0\r\n")
+    assert b"PEXPIREAT" in content
+
+
+def test_list_commands(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.rpush("queue", "b", "c") == 2
+    assert client.lpush("queue", "a", "z") == 4
+    assert client.lrange("queue", 0, -1) == [b"z", b"a", b"b", b"c"]
+    assert client.lrange("queue", -2, 100) == [b"b", b"c"]
+    assert client.lrange("queue", 3, 1) == []
+    assert client.llen("queue") == 4
+    assert client.lindex("queue", 1) == b"a"
+    assert client.lindex("queue", -1) == b"c"
+    assert client.lindex("queue", 10) is None
+    assert client.type("queue") == b"list"
+    assert client.object("encoding", "queue") == b"quicklist"
+
+    assert client.lpop("queue") == b"z"
+    assert client.rpop("queue", 2) == [b"c", b"b"]
+    assert client.lpop("queue", 5) == [b"a"]
+    assert client.exists("queue") == 0
+    assert client.lpop("queue") is None
+    assert client.lpop("queue", 2) is None
+
+    client.set("string", "value")
+    with pytest.raises(redis.exceptions.ResponseError, match="WRONGTYPE"):
+        client.lpush("string", "a")
+    with pytest.raises(redis.exceptions.ResponseError, match="WRONGTYPE"):
+        client.blpop(["string"], timeout=1)
+    client.close()
+
+
+def test_blocking_pop_is_woken_by_a_push(start_server):
+    port = start_server()
+    worker = redis.StrictRedis(host="127.0.0.1", port=port)
+    producer = redis.StrictRedis(host="127.0.0.1", port=port)
+    producer.rpush("ready", "first")
+    assert worker.blpop(["empty", "ready"], timeout=1) == (b"ready", b"first")
+
+    results = []
+    thread = threading.Thread(target=lambda: results.append(worker.brpop(["jobs"], timeout=0)))
+    thread.start()
+    while producer.info("clients")["blocked_clients"] != 1:
+        time.sleep(0.01)
+    assert producer.rpush("jobs", "job_1", "job_2") == 2
+    thread.join(timeout=5)
+    assert results == [(b"jobs", b"job_2")]
+    assert producer.lrange("jobs", 0, -1) == [b"job_1"]
+    assert producer.info("clients")["blocked_clients"] == 0
+
+    started = time.monotonic()
+    assert worker.blpop(["missing"], timeout=0.2) is None
+    assert time.monotonic() - started >= 0.2
+    worker.close()
+    producer.close()
+
+
+def test_disconnected_waiter_is_not_served(start_server):
+    port = start_server()
+    gone = redis.StrictRedis(host="127.0.0.1", port=port)
+    gone.execute_command("CLIENT", "SETNAME", "gone")
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    connection = gone.connection_pool.get_connection("BLPOP")
+    connection.send_command("BLPOP", "jobs", 0)
+    while client.info("clients")["blocked_clients"] != 1:
+        time.sleep(0.01)
+    connection.disconnect()
+    while client.info("clients")["blocked_clients"] != 0:
+        time.sleep(0.01)
+    client.rpush("jobs", "job")
+    assert client.lrange("jobs", 0, -1) == [b"job"]
+    client.close()
+
+
+def test_served_pop_is_logged_as_a_pop(start_server, tmp_path):
+    env = {"REDIS_DIR": str(tmp_path), "REDIS_APPENDONLY": "yes"}
+    port = start_server(env)
+    worker = redis.StrictRedis(host="127.0.0.1", port=port)
+    producer = redis.StrictRedis(host="127.0.0.1", port=port)
+    results = []
+    thread = threading.Thread(target=lambda: results.append(worker.blpop(["jobs"], timeout=0)))
+    thread.start()
+    while producer.info("clients")["blocked_clients"] != 1:
+        time.sleep(0.01)
+    producer.rpush("jobs", "job_1", "job_2")
+    thread.join(timeout=5)
+    assert results == [(b"jobs", b"job_1")]
+    worker.close()
+    producer.close()
+
+    with open(tmp_path / "appendonly.aof", "rb") as file:
+        content = file.read()
+    assert content.endswith(aof.encode_command("LPOP", [b"jobs"]))
+    assert b"BLPOP" not in content
@@ -0,0 +1,98 @@
+# Using pytest for tests
+import socket
+
+import redis
+
+from redis_clone.metrics import InstantaneousMetric, LatencyHistogram, LATENCY_SUB_BUCKETS, prometheus_text
+from redis_clone.server import RedisServer
+
+
+class TestLatencyHistogram:
+    def test_buckets_cover_every_value_once(self):
+        histogram = LatencyHistogram()
+        for value in range(100000):
+            index = histogram.bucket_index(value)
+            assert histogram.bucket_upper_bound(index) >= value
+            if index:
+                assert histogram.bucket_upper_bound(index - 1) < value
+
+    def test_percentiles_are_within_bucket_precision(self):
+        histogram = LatencyHistogram()
+        for value in range(1, 10001):
+            histogram.record(value)
+        assert histogram.count == 10000
+        for percentile in (50, 99, 99.9):
+            exact = 10000 * percentile / 100
+            assert exact <= histogram.percentile(percentile) <= exact * (1 + 2 / LATENCY_SUB_BUCKETS)
+        assert histogram.count_up_to(9) == 9
+
+    def test_values_above_max_are_counted(self):
+        histogram = LatencyHistogram()
+        histogram.record(1 << 40)
+        assert histogram.counts[-1] == 1
+
+    def test_empty_histogram(self):
+        assert LatencyHistogram().percentile(99) == 0
+
+
+def test_instantaneous_metric():
+    metric = InstantaneousMetric()
+    for second in range(20):
+        metric.track(second * 100, second)
+    assert metric.rate() == 100
+
+
+def test_command_statistics():
+    server = RedisServer(host="127.0.0.1", port=0)
+    server._process_command("SET", [b"key", b"value"])
+    server._process_command("GET", [b"key"])
+    server._process_command("GET", [b"key", b"extra"])
+    server._process_command("INCR", [b"key"])
+
+    assert server.command_table["GET"].calls == 1
+    assert server.command_table["GET"].rejected_calls == 1
+    assert server.command_table["INCR"].failed_calls == 1
+    assert server._total_commands_processed() == 3
+
+    text = prometheus_text(server._metrics(), server.command_table)
+    assert 'redis_commands_total{cmd="get"} 1' in text
+    assert 'redis_command_duration_seconds_bucket{cmd="set",le="+Inf"} 1' in text
+    assert 'redis_commands_failed_total{cmd="incr"} 1' in text
+
+
+def test_info_sections(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("key", "value")
+    client.get("key")
+
+    info = client.info()
+    assert info["connected_clients"] == 1
+    assert info["total_commands_processed"] >= 3
+    assert info["used_memory_rss"] > 0
+    assert "cmdstat_get" not in info
+
+    commandstats = client.info("commandstats")
+    assert commandstats["cmdstat_get"]["calls"] == 1
+    latencystats = client.info("latencystats")
+    assert "p99" in latencystats["latency_percentiles_usec_get"]
+    client.close()
+
+
+def test_prometheus_endpoint(start_server):
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        metrics_port = sock.getsockname()[1]
+    port = start_server({"REDIS_METRICS_PORT": str(metrics_port)})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("key", "value")
+
+    with socket.create_connection(("127.0.0.1", metrics_port)) as sock:
+        sock.sendall(b"GET /metrics HTTP/1.1\r\nHost: localhost\r\n\r\n")
+        response = b""
+        while chunk := sock.recv(65536):
+            response += chunk
+    assert response.startswith(b"HTTP/1.0 200 OK")
+    assert b'redis_commands_total{cmd="set"} 1' in response
+    assert b"redis_db_keys 1" in response
+    client.close()
@@ -0,0 +1,140 @@
+# Using pytest for tests
+import socket
+import time
+
+import pytest
+import redis
+
+from redis_clone.aof import encode_command
+from redis_clone.pubsub import PatternIndex, literal_prefix
+
+
+class TestPatternIndex:
+    def test_only_patterns_sharing_the_prefix_are_tried(self):
+        index = PatternIndex()
+        for pattern in (b"*", b"news.*", b"news.sport.*", b"orders.[0-9]*", b"orders.42"):
+            assert index.add(pattern, "client")
+        assert not index.add(b"news.*", "client")
+        assert len(index) == 5
+        assert literal_prefix(b"orders.[0-9]*") == b"orders."
+
+        matched = [subscription.pattern for subscription in index.matching(b"news.sport.tennis")]
+        assert sorted(matched) == [b"*", b"news.*", b"news.sport.*"]
+        matched = [subscription.pattern for subscription in index.matching(b"orders.42")]
+        assert sorted(matched) == [b"*", b"orders.42", b"orders.[0-9]*"]
+
+    def test_remove_prunes_the_trie(self):
+        index = PatternIndex()
+        index.add(b"news.*", "first")
+        index.add(b"news.*", "second")
+        assert index.remove(b"news.*", "first")
+        assert not index.remove(b"news.*", "first")
+        assert list(index.patterns()) == [b"news.*"]
+        assert index.remove(b"news.*", "second")
+        assert len(index) == 0
+        assert not index.root.children
+
+
+def _wait_for_message(pubsub):
+    message = pubsub.get_message(ignore_subscribe_messages=True, timeout=2)
+    while message is None:
+        message = pubsub.get_message(ignore_subscribe_messages=True, timeout=2)
+    return message
+
+
+def test_publish_subscribe(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    pubsub = client.pubsub()
+    pubsub.subscribe("orders")
+    pubsub.psubscribe("news.*")
+    assert pubsub.get_message(timeout=2)["type"] == "subscribe"
+    assert pubsub.get_message(timeout=2)["type"] == "psubscribe"
+
+    assert client.publish("orders", "order 1") == 1
+    assert _wait_for_message(pubsub) == {"type": "message", "pattern": None, "channel": b"orders", "data": b"order 1"}
+    assert client.publish("news.sport", "goal") == 1
+    assert _wait_for_message(pubsub) == {
+        "type": "pmessage", "pattern": b"news.*", "channel": b"news.sport", "data": b"goal"
+    }
+    assert client.publish("weather", "rain") == 0
+
+    assert client.pubsub_channels() == [b"orders"]
+    assert client.pubsub_channels("news*") == []
+    assert client.pubsub_numsub("orders", "weather") == [(b"orders", 1), (b"weather", 0)]
+    assert client.pubsub_numpat() == 1
+    assert client.info()["pubsub_channels"] == 1
+
+    # A subscribed RESP2 connection only accepts pub/sub commands
+    pubsub.connection.send_command("GET", "key")
+    with pytest.raises(redis.exceptions.ResponseError, match="only \\(P\\)SUBSCRIBE"):
+        pubsub.connection.read_response()
+
+    pubsub.unsubscribe()
+    pubsub.punsubscribe()
+    time.sleep(0.1)
+    assert client.pubsub_numpat() == 0
+    assert client.publish("orders", "order 2") == 0
+    pubsub.close()
+    client.close()
+
+
+def test_resp3_messages_are_pushes(start_server):
+    port = start_server()
+    sock = socket.create_connection(("127.0.0.1", port))
+    sock.settimeout(2)
+    sock.sendall(encode_command("HELLO", [b"3"]))
+    sock.recv(65536)
+    sock.sendall(encode_command("SUBSCRIBE", [b"orders"]))
+    assert sock.recv(65536) == b">3\r\n$9\r\nsubscribe\r\n$6\r\norders\r\n:1\r\n"
+
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.publish("orders", "order 1") == 1
+    assert sock.recv(65536) == b">3\r\n$7\r\nmessage\r\n$6\r\norders\r\n$7\r\norder 1\r\n"
+    # RESP3 connections can still run any command while subscribed
+    sock.sendall(encode_command("GET", [b"missing"]))
+    assert sock.recv(65536) == b"_\r\n"
+    sock.close()
+    client.close()
+
+
+def test_tracking_redirect_to_resp2_subscriber(start_server):
+    port = start_server()
+    target = redis.StrictRedis(host="127.0.0.1", port=port)
+    pubsub = target.pubsub()
+    pubsub.connection = target.connection_pool.get_connection("SUBSCRIBE")
+    pubsub.connection.send_command("CLIENT", "ID")
+    target_id = pubsub.connection.read_response()
+    pubsub.subscribe("__redis__:invalidate")
+    assert pubsub.get_message(timeout=2)["type"] == "subscribe"
+
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.execute_command("CLIENT", "TRACKING", "on", "REDIRECT", target_id)
+    client.set("key", "value")
+    client.get("key")
+    client.set("key", "other")
+    assert _wait_for_message(pubsub) == {
+        "type": "message", "pattern": None, "channel": b"__redis__:invalidate", "data": [b"key"]
+    }
+    pubsub.close()
+    client.close()
+
+
+def test_slow_subscriber_is_disconnected(start_server):
+    port = start_server({"REDIS_CLIENT_OUTPUT_BUFFER_LIMIT_PUBSUB_HARD": "1mb"})
+    subscriber = socket.create_connection(("127.0.0.1", port))
+    subscriber.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, 4096)
+    subscriber.sendall(encode_command("SUBSCRIBE", [b"events"]))
+    time.sleep(0.1)
+
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    message = b"x" * 1024 * 1024
+    started = time.monotonic()
+    # The subscriber never reads, the publisher isn't slowed down by it
+    receivers = [client.publish("events", message) for _ in range(50)]
+    assert time.monotonic() - started < 5
+    assert receivers[0] == 1
+    assert receivers[-1] == 0
+    assert client.info()["client_output_buffer_limit_disconnections"] == 1
+    subscriber.close()
+    client.close()
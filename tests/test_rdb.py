@@ -0,0 +1,90 @@
+# Using pytest for tests
+import os
+import time
+
+import pytest
+import redis
+
+from redis_clone import rdb
+from redis_clone.keyspace import Keyspace, now_ms
+from redis_clone.server import RedisServer
+
+
+class TestSnapshot:
+    def test_round_trip(self, tmp_path):
+        keyspace = Keyspace()
+        keyspace.set(b"key", b"value")
+        keyspace.set(b"binary\xff", b"\x00\r\n" * 1000)
+        keyspace.set(b"empty", b"")
+        keyspace.set(b"counter", -42)
+        keyspace.set(b"ttl_key", b"value", deadline_ms=now_ms() + 100000)
+
+        path = str(tmp_path / "dump.rdb")
+        size = rdb.dump(keyspace, path)
+        assert size == os.path.getsize(path)
+
+        loaded = Keyspace()
+        assert rdb.load(loaded, path, now_ms()) == 5
+        assert loaded.data == keyspace.data
+        assert loaded.expires == keyspace.expires
+
+    def test_expired_keys_are_skipped(self, tmp_path):
+        keyspace = Keyspace()
+        keyspace.set(b"expired", b"value", deadline_ms=now_ms() - 1)
+        keyspace.set(b"key", b"value")
+
+        path = str(tmp_path / "dump.rdb")
+        rdb.dump(keyspace, path)
+
+        loaded = Keyspace()
+        assert rdb.load(loaded, path, now_ms()) == 1
+        assert loaded.data == {b"key": b"value"}
+
+    def test_corrupted_file(self, tmp_path):
+        keyspace = Keyspace()
+        keyspace.set(b"key", b"value")
+        path = str(tmp_path / "dump.rdb")
+        rdb.dump(keyspace, path)
+
+        with open(path, "r+b") as file:
+            file.seek(len(rdb.RDB_MAGIC) + 10)
+            file.write(b"X")
+
+        with pytest.raises(rdb.RDBError, match="checksum"):
+            rdb.load(Keyspace(), path, now_ms())
+
+    def test_failed_save_leaves_no_temporary_file(self, tmp_path):
+        server = RedisServer(host="127.0.0.1", port=0, config={"dir": str(tmp_path)})
+        server.keyspace.set(b"key", b"value", deadline_ms=2 ** 63)
+        # Replied as an error, the connection is kept
+        assert server._process_command("SAVE", []) == b"-ERR\r\n"
+        assert server.stats["rdb_last_bgsave_status"] == "err"
+        assert os.listdir(tmp_path) == []
+
+
+def test_save_and_load_on_restart(start_server, tmp_path):
+    env = {"REDIS_DIR": str(tmp_path)}
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("key", "value")
+    client.set("ttl_key", "value", ex=100)
+    client.incr("counter")
+    assert client.save() == True
+
+    # Written after the snapshot, it's saved by BGSAVE
+    client.set("late_key", "value")
+    # Snapshots are renamed over the previous one once complete
+    path = str(tmp_path / "dump.rdb")
+    previous_inode = os.stat(path).st_ino
+    assert client.bgsave() == True
+    deadline = time.time() + 10
+    while os.stat(path).st_ino == previous_inode and time.time() < deadline:
+        time.sleep(0.05)
+    client.close()
+
+    port = start_server(env)
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.mget("key", "ttl_key", "counter", "late_key") == [b"value", b"value", b"1", b"value"]
+    assert client.ttl("ttl_key") > 0
+    assert client.incr("counter") == 2
+    client.close()
@@ -0,0 +1,199 @@
+# Using pytest for tests
+import socket
+import time
+
+import pytest
+import redis
+
+from redis_clone import rdb
+from redis_clone.aof import encode_command
+from redis_clone.keyspace import Keyspace, now_ms
+from redis_clone.parser.redis_parser import Parser
+from redis_clone.replication import ReplicationBacklog
+
+
+def _wait_for(condition, timeout=10):
+    deadline = time.time() + timeout
+    while not condition():
+        if time.time() > deadline:
+            raise Exception("Condition not met in time")
+        time.sleep(0.05)
+
+
+def _read_line(sock, buffer):
+    while b"\r\n" not in buffer:
+        buffer += sock.recv(65536)
+    line, _, rest = bytes(buffer).partition(b"\r\n")
+    buffer[:] = rest
+    return line
+
+
+def _read_exactly(sock, buffer, length):
+    while len(buffer) < length:
+        buffer += sock.recv(65536)
+    data = bytes(buffer[:length])
+    del buffer[:length]
+    return data
+
+
+class TestReplicationBacklog:
+    def test_feed_and_read(self):
+        backlog = ReplicationBacklog(10)
+        backlog.feed(b"abcdef")
+        assert backlog.offset == 6
+        assert backlog.first_byte_offset == 1
+        assert backlog.read_from(4) == b"def"
+        assert backlog.can_continue_from(7)
+        assert not backlog.can_continue_from(8)
+
+    def test_only_size_bytes_are_kept(self):
+        backlog = ReplicationBacklog(10, offset=100)
+        backlog.feed(b"0123456789abc")
+        assert backlog.offset == 113
+        assert backlog.first_byte_offset == 104
+        assert not backlog.can_continue_from(103)
+        assert backlog.read_from(104) == b"3456789abc"
+
+
+@pytest.fixture
+def primary_and_replica(start_server, tmp_path):
+    (tmp_path / "primary").mkdir()
+    (tmp_path / "replica").mkdir()
+    primary_port = start_server({"REDIS_DIR": str(tmp_path / "primary")})
+    primary = redis.StrictRedis(host="127.0.0.1", port=primary_port)
+    primary.set("before_sync", "value")
+    primary.set("ttl_key", "value", ex=100)
+
+    replica_port = start_server({
+        "REDIS_DIR": str(tmp_path / "replica"),
+        "REDIS_REPLICAOF": f"127.0.0.1 {primary_port}",
+    })
+    replica = redis.StrictRedis(host="127.0.0.1", port=replica_port)
+    _wait_for(lambda: replica.info("replication")["master_link_status"] == "up")
+    yield primary, replica
+    primary.close()
+    replica.close()
+
+
+def test_full_sync_and_command_stream(primary_and_replica):
+    primary, replica = primary_and_replica
+    assert replica.get("before_sync") == b"value"
+    assert replica.ttl("ttl_key") > 0
+
+    primary.set("after_sync", "value")
+    primary.incr("counter")
+    primary.expire("after_sync", 100)
+    primary.delete("before_sync")
+    _wait_for(lambda: replica.get("counter") == b"1")
+    assert replica.get("after_sync") == b"value"
+    assert replica.ttl("after_sync") > 0
+    assert replica.get("before_sync") is None
+
+
+def test_replica_is_read_only(primary_and_replica):
+    _, replica = primary_and_replica
+    with pytest.raises(redis.exceptions.ReadOnlyError):
+        replica.set("key", "value")
+
+
+def test_info_replication(primary_and_replica):
+    primary, replica = primary_and_replica
+    primary.set("key", "value")
+    _wait_for(lambda: primary.info("replication")["slave0"]["offset"] == primary.info("replication")["master_repl_offset"])
+
+    info = primary.info("replication")
+    assert info["role"] == "master"
+    assert info["connected_slaves"] == 1
+    assert info["slave0"]["state"] == "online"
+    assert info["slave0"]["lag"] <= 1
+
+    info = replica.info("replication")
+    assert info["role"] == "slave"
+    assert info["master_link_status"] == "up"
+    assert info["slave_repl_offset"] == primary.info("replication")["master_repl_offset"]
+
+
+def test_replicaof_no_one(primary_and_replica):
+    _, replica = primary_and_replica
+    assert replica.execute_command("REPLICAOF", "NO", "ONE") == b"OK"
+    assert replica.info("replication")["role"] == "master"
+    assert replica.set("key", "value") == True
+
+
+def test_partial_resync(start_server):
+    port = start_server()
+    primary = redis.StrictRedis(host="127.0.0.1", port=port)
+    primary.set("key", "value")
+
+    # Fake replica doing a full sync
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        buffer = bytearray()
+        sock.sendall(encode_command("PSYNC", [b"?", b"-1"]))
+        _, replid, offset = _read_line(sock, buffer).split()
+        assert int(offset) == 0
+        length = int(_read_line(sock, buffer)[1:])
+        _read_exactly(sock, buffer, length)
+
+        primary.set("streamed", "value")
+        stream = encode_command("SET", [b"streamed", b"value"])
+        assert _read_exactly(sock, buffer, len(stream)) == stream
+
+    # Written while the replica is disconnected, it's sent from the backlog
+    primary.set("missed", "value")
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        buffer = bytearray()
+        sock.sendall(encode_command("PSYNC", [replid, b"%d" % (len(stream) + 1)]))
+        assert _read_line(sock, buffer) == b"+CONTINUE " + replid
+        missed = encode_command("SET", [b"missed", b"value"])
+        parser = Parser(protocol_version=2)
+        parser.feed(_read_exactly(sock, buffer, len(missed)))
+        assert parser.gets() == ("SET", [b"missed", b"value"])
+
+    primary.close()
+
+
+def test_replica_waits_for_the_primary_to_expire_keys(start_server, tmp_path):
+    # Fake primary whose keys expire later than on the replica's clock
+    keyspace = Keyspace()
+    keyspace.set(b"counter", 5, deadline_ms=now_ms() + 300)
+    rdb.dump(keyspace, str(tmp_path / "primary.rdb"))
+    with open(tmp_path / "primary.rdb", "rb") as file:
+        snapshot = file.read()
+
+    with socket.socket() as listener:
+        listener.bind(("127.0.0.1", 0))
+        listener.listen()
+        replica_port = start_server({
+            "REDIS_DIR": str(tmp_path),
+            "REDIS_REPLICAOF": "127.0.0.1 %d" % listener.getsockname()[1],
+        })
+        sock, _ = listener.accept()
+
+    with sock:
+        parser = Parser(protocol_version=2)
+        handshake = []
+        while len(handshake) < 4:
+            parser.feed(sock.recv(65536))
+            while command := parser.gets():
+                handshake.append(command[0])
+                if command[0] != "PSYNC":
+                    sock.sendall(b"+OK\r\n")
+        assert handshake == ["PING", "REPLCONF", "REPLCONF", "PSYNC"]
+        sock.sendall(b"+FULLRESYNC %s 0\r\n$%d\r\n" % (b"0" * 40, len(snapshot)) + snapshot)
+
+        replica = redis.StrictRedis(host="127.0.0.1", port=replica_port)
+        _wait_for(lambda: replica.info("replication")["master_link_status"] == "up")
+        time.sleep(0.5)
+        # Past its deadline for the replica, which doesn't delete it
+        assert replica.get("counter") is None
+        assert replica.dbsize() == 1
+
+        # The primary wrote to the key before it expired there
+        sock.sendall(encode_command("INCR", [b"counter"]) + encode_command("PERSIST", [b"counter"]))
+        _wait_for(lambda: replica.get("counter") == b"6")
+        assert replica.ttl("counter") == -1
+
+        sock.sendall(encode_command("SET", [b"gone", b"value", b"PXAT", b"%d" % (now_ms() - 1)]))
+        sock.sendall(encode_command("DEL", [b"gone"]))
+        _wait_for(lambda: replica.dbsize() == 1)
+        replica.close()
@@ -0,0 +1,51 @@
+# Using pytest for tests
+from redis_clone.parser.redis_parser import Protocol_2_Data_Types
+from redis_clone.response_builder import ResponseBuilder, ReplyError
+
+
+class TestResponseBuilder:
+    def test_constant_responses_are_shared(self):
+        """
+        Constant replies and small integers are not rebuilt on every call
+        """
+        ok = self.builder.build_response(Protocol_2_Data_Types.SIMPLE_STRING, "OK")
+        assert ok == b"+OK\r\n"
+        assert ok is self.builder.build_response(Protocol_2_Data_Types.SIMPLE_STRING, "OK")
+        assert self.builder.build_response(Protocol_2_Data_Types.BULK_STRING) is \
+            self.builder.build_response(Protocol_2_Data_Types.BULK_STRING)
+        assert self.builder.build_response(Protocol_2_Data_Types.INTEGER, 42) is \
+            self.builder.build_response(Protocol_2_Data_Types.INTEGER, 42)
+
+    def test_integers(self):
+        assert self.builder.build_response(Protocol_2_Data_Types.INTEGER, 0) == b":0\r\n"
+        assert self.builder.build_response(Protocol_2_Data_Types.INTEGER, -5) == b":-5\r\n"
+        assert self.builder.build_response(Protocol_2_Data_Types.INTEGER, 2 ** 40) == b":1099511627776\r\n"
+
+    def test_bulk_string_length_is_byte_length(self):
+        value = "héllo".encode("utf-8")
+        assert self.builder.build_response(Protocol_2_Data_Types.BULK_STRING, value) == b"$6\r\nh\xc3\xa9llo\r\n"
+        assert self.builder.build_response(Protocol_2_Data_Types.BULK_STRING, b"") == b"$0\r\n\r\n"
+
+        large_value = b"x" * 1000
+        assert self.builder.build_response(Protocol_2_Data_Types.BULK_STRING, large_value) == \
+            b"$1000\r\n" + large_value + b"\r\n"
+
+    def test_nested_arrays(self):
+        response = self.builder.build_response(
+            Protocol_2_Data_Types.ARRAY,
+            [b"a", None, 1, [b"b", [2]], ReplyError("ERR nested")],
+        )
+        assert response == b"*5\r\n$1\r\na\r\n$-1\r\n:1\r\n*2\r\n$1\r\nb\r\n*1\r\n:2\r\n-ERR nested\r\n"
+        assert self.builder.build_response(Protocol_2_Data_Types.ARRAY, []) == b"*0\r\n"
+        assert self.builder.build_response(Protocol_2_Data_Types.ARRAY, None) == b"*-1\r\n"
+
+    def test_streaming_into_output_buffer(self):
+        """
+        Arrays are appended to an existing buffer
+        """
+        out = bytearray(b"+OK\r\n")
+        self.builder.write_array(out, [b"x" * 40, 7])
+        assert out == b"+OK\r\n*2\r\n$40\r\n" + b"x" * 40 + b"\r\n:7\r\n"
+
+    def setup_method(self):
+        self.builder = ResponseBuilder(protocol_version=2)
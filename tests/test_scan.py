@@ -0,0 +1,143 @@
+# Using pytest for tests
+import gc
+import time
+
+import pytest
+import redis
+
+from redis_clone.glob import compile_pattern
+from redis_clone.key_table import KeyTable
+from redis_clone.keyspace import Keyspace, now_ms
+from redis_clone.server import RedisServer
+
+
+@pytest.mark.parametrize("pattern,key,matches", [
+    (b"h?llo", b"hello", True),
+    (b"h*llo", b"heeeello", True),
+    (b"h[ae]llo", b"hallo", True),
+    (b"h[ae]llo", b"hillo", False),
+    (b"h[^e]llo", b"hello", False),
+    (b"h[a-c]llo", b"hbllo", True),
+    (b"user:\\*", b"user:*", True),
+    (b"user:\\*", b"user:1", False),
+    (b"a.b", b"axb", False),
+    (b"line*", b"line\nbreak", True),
+])
+def test_glob(pattern, key, matches):
+    assert bool(compile_pattern(pattern)(key)) == matches
+
+
+def _scan_all(table, count, between_calls=None):
+    seen = []
+    cursor = 0
+    while True:
+        keys, cursor = table.scan(cursor, count)
+        seen.extend(keys)
+        if not cursor:
+            return seen
+        if between_calls is not None:
+            between_calls()
+
+
+class TestKeyTableScan:
+    def test_returns_every_key_once_without_changes(self):
+        table = KeyTable()
+        keys = [b"key_%d" % i for i in range(5000)]
+        for key in keys:
+            table.add(key)
+        seen = _scan_all(table, 10)
+        assert sorted(seen) == sorted(keys)
+
+    def test_scan_during_a_rehash(self):
+        table = KeyTable()
+        keys = [b"key_%d" % i for i in range(16 * 8 * 16 + 1)]
+        for key in keys:
+            table.add(key)
+        assert table.rehashing
+        seen = _scan_all(table, 10)
+        assert sorted(seen) == sorted(keys)
+
+        # Keeps rehashing between calls, until the new table replaces the current one
+        seen = _scan_all(table, 10, lambda: table.rehash_milliseconds(0))
+        assert not table.rehashing
+        assert set(seen) == set(keys)
+
+    def test_keys_present_during_resizes_are_returned(self):
+        table = KeyTable()
+        stable = [b"stable_%d" % i for i in range(2000)]
+        for key in stable:
+            table.add(key)
+        churn = []
+
+        def grow_or_shrink():
+            # Grows the table to several times its size and shrinks it back
+            if len(churn) < 50000:
+                for i in range(len(churn), len(churn) + 10000):
+                    churn.append(b"churn_%d" % i)
+                    table.add(churn[-1])
+            else:
+                while churn:
+                    table.remove(churn.pop())
+
+        seen = set(_scan_all(table, 20, grow_or_shrink))
+        assert seen >= set(stable)
+
+
+def test_keyspace_scan_skips_expired_keys():
+    keyspace = Keyspace()
+    keyspace.set(b"live", b"value")
+    keyspace.set(b"expired", b"value", deadline_ms=now_ms() - 1)
+    assert keyspace.scan(0, 10, delete_expired=False) == ([b"live"], 0)
+    assert len(keyspace) == 2
+    assert keyspace.scan(0, 10) == ([b"live"], 0)
+    assert len(keyspace) == 1
+
+
+def test_scan_calls_are_bounded():
+    """
+    Every call reads a few buckets whatever the size of the keyspace, see benchmarks/bench_scan.py
+    for the same measure over 10M keys
+    """
+    server = RedisServer(host="127.0.0.1", port=0)
+    keys = [b"key_%d" % i for i in range(300000)]
+    server.keyspace.data.update(dict.fromkeys(keys, b"value"))
+    server.keyspace.rebuild_after_load()
+    # A collection of the keys just created would be counted against the first calls
+    gc.collect()
+
+    slowest = 0
+    cursor = b"0"
+    calls = 0
+    while True:
+        start = time.perf_counter()
+        response = server._process_command("SCAN", [cursor, b"MATCH", b"key_1*", b"COUNT", b"100"])
+        slowest = max(slowest, time.perf_counter() - start)
+        cursor = bytes(response).split(b"\r\n")[2]
+        calls += 1
+        if cursor == b"0":
+            break
+    assert calls > 1000
+    assert slowest < 0.01
+
+
+def test_scan_commands(start_server, tmp_path):
+    # An empty directory, so no snapshot is loaded
+    port = start_server({"REDIS_DIR": str(tmp_path)})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.mset({f"user:{i}": "value" for i in range(500)})
+    client.hset("session", "user", "alice")
+    client.rpush("queue", "job")
+
+    assert client.dbsize() == 502
+    assert set(client.scan_iter(count=7)) == set(client.keys())
+    assert len(client.keys()) == 502
+    assert sorted(client.keys("user:1?")) == sorted(b"user:1%d" % i for i in range(10))
+    assert set(client.scan_iter(match="user:4[0-2]")) == {b"user:40", b"user:41", b"user:42"}
+    assert list(client.scan_iter(_type="HASH")) == [b"session"]
+    assert list(client.scan_iter(_type="list")) == [b"queue"]
+
+    with pytest.raises(redis.exceptions.ResponseError, match="invalid cursor"):
+        client.scan(cursor="abc")
+    with pytest.raises(redis.exceptions.ResponseError, match="syntax error"):
+        client.execute_command("SCAN", 0, "COUNT", 0)
+    client.close()
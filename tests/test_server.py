@@ -1,6 +1,7 @@
 import redis
 import pytest
 import os
+import time
 
 REDIS_HOST = os.environ.get("REDIS_HOST", "localhost")
 REDIS_PORT = os.environ.get("REDIS_PORT", 9999)
@@ -35,3 +36,239 @@ def test_set_get(client):
 def test_nonexistent_get(client):
     value = client.get("random")
     assert value is None
+
+
+def test_pipeline(client):
+    pipe = client.pipeline(transaction=False)
+    for i in range(100):
+        pipe.set(f"pipeline_key_{i}", f"value_{i}")
+    for i in range(100):
+        pipe.get(f"pipeline_key_{i}")
+    responses = pipe.execute()
+
+    assert responses[:100] == [True] * 100
+    assert responses[100:] == [f"value_{i}" for i in range(100)]
+
+
+def test_large_value(client):
+    value = "x" * (2 * 1024 * 1024)
+    assert client.set("large_key", value) == True
+    assert client.get("large_key") == value
+
+
+def test_output_buffer_limit(start_server):
+    port = start_server({"REDIS_CLIENT_OUTPUT_BUFFER_LIMIT": "1kb"})
+    r = redis.StrictRedis(host="127.0.0.1", port=port, decode_responses=True)
+
+    assert r.set("small_key", "x" * 100) == True
+    assert r.get("small_key") == "x" * 100
+
+    # Reply is over the limit so the client gets disconnected
+    assert r.set("big_key", "x" * 10 * 1024) == True
+    with pytest.raises(redis.ConnectionError):
+        r.get("big_key")
+    r.close()
+
+
+def test_ttl_commands(client):
+    client.set("ttl_key", "value", ex=100)
+    assert 99 <= client.ttl("ttl_key") <= 100
+    assert 99000 <= client.pttl("ttl_key") <= 100000
+
+    # KEEPTTL keeps the deadline of the previous value
+    client.set("ttl_key", "new_value", keepttl=True)
+    assert client.ttl("ttl_key") > 0
+    assert client.get("ttl_key") == "new_value"
+
+    assert client.persist("ttl_key") == True
+    assert client.ttl("ttl_key") == -1
+    assert client.persist("ttl_key") == False
+
+    assert client.expire("ttl_key", 50) == True
+    assert 49 <= client.ttl("ttl_key") <= 50
+
+    # A plain SET removes the ttl
+    client.set("ttl_key", "value")
+    assert client.ttl("ttl_key") == -1
+
+    assert client.pexpire("ttl_key", -1) == True
+    assert client.get("ttl_key") is None
+    assert client.ttl("ttl_key") == -2
+    assert client.expire("ttl_key", 10) == False
+
+
+def test_invalid_expire_times(client):
+    client.set("key", "value")
+    for args in (("EX", 0), ("EX", -5), ("PX", -1), ("EXAT", 0), ("PX", 2 ** 63 - 1), ("EX", 2 ** 62)):
+        with pytest.raises(redis.exceptions.ResponseError, match="invalid expire time in 'set' command"):
+            client.execute_command("SET", "key", "value", *args)
+    with pytest.raises(redis.exceptions.ResponseError, match="not an integer"):
+        client.execute_command("SET", "key", "value", "EX", "99999999999999999999")
+    # An empty time is not an integer, the key doesn't silently lose its expiry
+    for subarg in ("EX", "PX", "EXAT", "PXAT"):
+        with pytest.raises(redis.exceptions.ResponseError, match="not an integer"):
+            client.execute_command("SET", "empty_ttl", "value", subarg, "")
+    assert client.exists("empty_ttl") == 0
+
+    with pytest.raises(redis.exceptions.ResponseError, match="not an integer"):
+        client.expire("key", 99999999999999999999)
+    with pytest.raises(redis.exceptions.ResponseError, match="invalid expire time in 'expire' command"):
+        client.expire("key", 2 ** 62)
+    with pytest.raises(redis.exceptions.ResponseError, match="invalid expire time in 'pexpire' command"):
+        client.pexpire("key", 2 ** 63 - 1)
+    with pytest.raises(redis.exceptions.ResponseError, match="invalid expire time in 'expireat' command"):
+        client.expireat("key", -(2 ** 62))
+    assert client.ttl("key") == -1
+
+    assert client.pexpireat("key", 2 ** 63 - 1) == True
+    assert client.ttl("key") > 0
+
+
+def test_set_px_expires(client):
+    client.set("px_key", "value", px=50)
+    assert client.get("px_key") == "value"
+    time.sleep(0.1)
+    assert client.get("px_key") is None
+
+
+def test_command_table(client):
+    assert client.execute_command("COMMAND COUNT") >= 10
+
+    get_info, unknown_info = client.execute_command("COMMAND INFO", "get", "nosuchcommand")
+    assert get_info[:6] == ["get", 2, ["fast", "readonly"], 1, 1, 1]
+    assert unknown_info is None
+
+    commands = client.command()
+    assert commands["set"]["arity"] == -3
+    assert "write" in commands["set"]["flags"]
+
+
+def test_arity_errors(client):
+    with pytest.raises(redis.ResponseError, match="wrong number of arguments"):
+        client.execute_command("GET")
+    with pytest.raises(redis.ResponseError, match="wrong number of arguments"):
+        client.execute_command("GET", "a", "b")
+    with pytest.raises(redis.ResponseError, match="unknown command"):
+        client.execute_command("NOSUCHCOMMAND")
+    with pytest.raises(redis.ResponseError, match="syntax error"):
+        client.execute_command("SET", "key", "value", "EX")
+
+
+def test_exists(client):
+    client.set("exists_key", "value")
+    client.delete("missing_key")
+    assert client.exists("exists_key", "missing_key", "exists_key") == 2
+
+
+@pytest.fixture(scope="function")
+def binary_client():
+    r = redis.StrictRedis(host=REDIS_HOST, port=REDIS_PORT)
+    yield r
+    r.close()
+
+
+@pytest.mark.parametrize("size", [0, 1024 * 1024, 100 * 1024 * 1024])
+def test_binary_round_trip(binary_client, size):
+    # Every byte value, including separators and invalid utf-8
+    value = (bytes(range(256)) * (size // 256 + 1))[:size]
+    assert binary_client.set(b"binary_key\xff", value) == True
+    assert binary_client.get(b"binary_key\xff") == value
+    binary_client.delete(b"binary_key\xff")
+
+
+def test_non_ascii_value(binary_client):
+    value = "héllo wörld ✓".encode("utf-8")
+    binary_client.set("unicode_key", value)
+    assert binary_client.get("unicode_key") == value
+    assert binary_client.echo(value) == value
+
+
+def test_mset_mget(client):
+    assert client.mset({f"mkey_{i}": f"value_{i}" for i in range(500)}) == True
+    client.delete("mkey_missing")
+
+    keys = [f"mkey_{i}" for i in range(500)] + ["mkey_missing"]
+    assert client.mget(keys) == [f"value_{i}" for i in range(500)] + [None]
+
+    # MSET removes the ttl of existing keys
+    client.expire("mkey_0", 100)
+    client.mset({"mkey_0": "new_value"})
+    assert client.ttl("mkey_0") == -1
+
+    with pytest.raises(redis.ResponseError, match="wrong number of arguments"):
+        client.execute_command("MSET", "mkey_0", "value", "mkey_1")
+
+
+def test_mget_skips_expired_keys(client):
+    client.set("mget_expired", "value", px=10)
+    client.set("mget_alive", "value")
+    time.sleep(0.05)
+    assert client.mget("mget_expired", "mget_alive") == [None, "value"]
+
+
+def test_msetnx(client):
+    client.delete("msetnx_a", "msetnx_b", "msetnx_c")
+    assert client.msetnx({"msetnx_a": "1", "msetnx_b": "2"}) == True
+
+    # msetnx_b exists, so nothing is set
+    assert client.msetnx({"msetnx_b": "20", "msetnx_c": "30"}) == False
+    assert client.mget("msetnx_a", "msetnx_b", "msetnx_c") == ["1", "2", None]
+
+
+def test_counters(client):
+    client.delete("counter")
+    assert client.incr("counter") == 1
+    assert client.incrby("counter", 10) == 11
+    assert client.decr("counter") == 10
+    assert client.decrby("counter", 15) == -5
+    assert client.get("counter") == "-5"
+
+    # Counters keep working on values set as strings
+    client.set("counter", "41")
+    assert client.incr("counter") == 42
+    assert client.mget("counter") == ["42"]
+
+
+def test_counter_keeps_ttl(client):
+    client.set("ttl_counter", "1", ex=100)
+    assert client.incr("ttl_counter") == 2
+    assert client.ttl("ttl_counter") > 0
+
+
+def test_counter_errors(client):
+    client.set("not_a_counter", "abc")
+    with pytest.raises(redis.ResponseError, match="not an integer"):
+        client.incr("not_a_counter")
+
+    client.set("padded_counter", " 1")
+    with pytest.raises(redis.ResponseError, match="not an integer"):
+        client.incr("padded_counter")
+
+    with pytest.raises(redis.ResponseError, match="not an integer"):
+        client.incrby("counter", "1.5")
+
+    client.set("max_counter", str(2 ** 63 - 1))
+    with pytest.raises(redis.ResponseError, match="overflow"):
+        client.incr("max_counter")
+    assert client.get("max_counter") == str(2 ** 63 - 1)
+
+    client.set("min_counter", str(-(2 ** 63)))
+    with pytest.raises(redis.ResponseError, match="overflow"):
+        client.decr("min_counter")
+
+
+def test_incrbyfloat(client):
+    client.set("float_counter", "10.50")
+    assert client.incrbyfloat("float_counter", 0.1) == 10.6
+    assert client.get("float_counter") == "10.6"
+    assert client.incrbyfloat("float_counter", -0.6) == 10
+    assert client.get("float_counter") == "10"
+    assert client.incrbyfloat("float_counter", "5.0e3") == 5010
+
+    with pytest.raises(redis.ResponseError, match="not a valid float"):
+        client.incrbyfloat("float_counter", "abc")
+    with pytest.raises(redis.ResponseError, match="not a valid float"):
+        client.incrbyfloat("float_counter", "1_000")
+    client.set("separated", "1_000")
+    with pytest.raises(redis.ResponseError, match="not a valid float"):
+        client.incrbyfloat("separated", 1)
@@ -0,0 +1,52 @@
+# Using pytest for tests
+import redis
+
+from redis_clone.slowlog import SlowLog
+
+
+class TestSlowLog:
+    def test_oldest_entries_are_dropped(self):
+        slowlog = SlowLog(max_len=2)
+        for i in range(3):
+            slowlog.push("GET", [b"key_%d" % i], 100, ("127.0.0.1", 1234))
+        assert len(slowlog) == 2
+        assert [entry[0] for entry in slowlog.get(-1)] == [2, 1]
+        assert slowlog.get(1)[0][3] == [b"GET", b"key_2"]
+        assert slowlog.get(1)[0][4] == "127.0.0.1:1234"
+
+    def test_arguments_are_truncated(self):
+        slowlog = SlowLog(max_len=10)
+        slowlog.push("SET", [b"key", b"x" * 200], 100, None)
+        slowlog.push("MSET", [b"%d" % i for i in range(40)], 100, None)
+
+        args = slowlog.get(2)[1][3]
+        assert args[2] == b"x" * 128 + b"... (72 more bytes)"
+        args = slowlog.get(2)[0][3]
+        assert len(args) == 32
+        assert args[-1] == b"... (10 more arguments)"
+
+
+def test_slowlog_commands(start_server):
+    port = start_server({"REDIS_SLOWLOG_LOG_SLOWER_THAN": "0", "REDIS_SLOWLOG_MAX_LEN": "3"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    for i in range(5):
+        client.set(f"key_{i}", "value")
+
+    entries = client.slowlog_get(-1)
+    assert [entry["command"] for entry in entries] == [b"SET key_4 value", b"SET key_3 value", b"SET key_2 value"]
+    # Ids keep growing after entries are dropped, commands sent by redis-py on connect come first
+    assert [entry["id"] for entry in entries] == [entries[0]["id"] - i for i in range(3)]
+    assert entries[0]["id"] >= 5
+    assert client.slowlog_len() == 3
+    assert client.slowlog_reset() == True
+    # SLOWLOG RESET itself is logged after running
+    assert client.slowlog_len() == 1
+    client.close()
+
+
+def test_slowlog_disabled(start_server):
+    port = start_server({"REDIS_SLOWLOG_LOG_SLOWER_THAN": "-1"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("key", "value")
+    assert client.slowlog_len() == 0
+    client.close()
@@ -0,0 +1,241 @@
+# Using pytest for tests
+import asyncio
+import socket
+import threading
+import time
+
+import pytest
+import redis
+
+from redis_clone.aof import encode_command
+from redis_clone.client import Client
+from redis_clone.parser.redis_parser import Parser, Protocol_2_Data_Types, Protocol_3_Data_Types
+from redis_clone.response_builder import ResponseBuilder
+from redis_clone.server import RedisServer
+
+
+class TestResp3Builder:
+    def test_resp3_types(self):
+        builder = ResponseBuilder(protocol_version=3)
+        assert builder.build_response(Protocol_2_Data_Types.BULK_STRING, None) == b"_\r\n"
+        assert builder.build_response(Protocol_3_Data_Types.MAP, {b"a": 1}) == b"%1\r\n$1\r\na\r\n:1\r\n"
+        assert builder.build_response(Protocol_3_Data_Types.PUSH, [b"invalidate", [b"key"]]) == (
+            b">2\r\n$10\r\ninvalidate\r\n*1\r\n$3\r\nkey\r\n"
+        )
+        assert builder.build_response(Protocol_3_Data_Types.BOOLEAN, True) == b"#t\r\n"
+
+    def test_resp2_fallbacks(self):
+        builder = ResponseBuilder(protocol_version=2)
+        assert builder.build_response(Protocol_3_Data_Types.NULL) == b"$-1\r\n"
+        assert builder.build_response(Protocol_3_Data_Types.MAP, {b"a": 1}) == b"*2\r\n$1\r\na\r\n:1\r\n"
+        assert builder.build_response(Protocol_3_Data_Types.BOOLEAN, False) == b":0\r\n"
+
+
+class RawConnection:
+    """
+    Connection reading replies as bytes, so push messages can be checked exactly
+    """
+
+    def __init__(self, port) -> None:
+        self.sock = socket.create_connection(("127.0.0.1", port))
+        self.sock.settimeout(2)
+
+    def send(self, *args):
+        self.sock.sendall(encode_command(args[0], [arg.encode() for arg in args[1:]]))
+
+    def call(self, *args):
+        self.send(*args)
+        return self.read()
+
+    def read(self):
+        data = self.sock.recv(65536)
+        # Replies of a single command are small enough to come in one segment
+        time.sleep(0.05)
+        self.sock.setblocking(False)
+        try:
+            data += self.sock.recv(65536)
+        except BlockingIOError:
+            pass
+        self.sock.settimeout(2)
+        return data
+
+    def close(self):
+        self.sock.close()
+
+
+INVALIDATE_KEY = b">2\r\n$10\r\ninvalidate\r\n*1\r\n$3\r\nkey\r\n"
+
+
+def test_hello(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port, protocol=3)
+    assert client.set("key", "value")
+    assert client.get("missing") is None
+    hello = client.execute_command("HELLO", "3")
+    assert hello[b"proto"] == 3
+    assert hello[b"role"] == b"master"
+    assert hello[b"id"] == client.client_id()
+    client.close()
+
+    raw = RawConnection(port)
+    assert raw.call("HELLO", "4").startswith(b"-NOPROTO")
+    assert raw.call("GET", "missing") == b"$-1\r\n"
+    raw.close()
+
+
+def test_default_mode_invalidation(start_server):
+    port = start_server()
+    reader = RawConnection(port)
+    writer = redis.StrictRedis(host="127.0.0.1", port=port)
+    reader.call("HELLO", "3")
+    assert reader.call("CLIENT", "TRACKING", "on") == b"+OK\r\n"
+    writer.set("key", "value")
+    assert reader.call("GET", "key") == b"$5\r\nvalue\r\n"
+
+    writer.set("key", "other")
+    assert reader.read() == INVALIDATE_KEY
+    # Keys are forgotten once invalidated, until they are read again
+    writer.set("key", "again")
+    assert reader.call("PING") == b"+PONG\r\n"
+
+    reader.call("GET", "key")
+    writer.pexpire("key", 50)
+    assert reader.read() == INVALIDATE_KEY
+    assert writer.info("stats")["tracking_total_keys"] == 0
+    reader.close()
+    writer.close()
+
+
+def test_invalidation_on_expiry(start_server):
+    port = start_server()
+    reader = RawConnection(port)
+    reader.call("HELLO", "3")
+    reader.call("CLIENT", "TRACKING", "on")
+    reader.call("SET", "key", "value", "PX", "100")
+    reader.call("GET", "key")
+    # Removed by the active expire cycle, without any command on the key
+    assert reader.read() == INVALIDATE_KEY
+    reader.close()
+
+
+def test_noloop_and_bcast(start_server):
+    port = start_server()
+    reader = RawConnection(port)
+    reader.call("HELLO", "3")
+    assert reader.call("CLIENT", "TRACKING", "on", "PREFIX", "user:").startswith(b"-ERR PREFIX")
+    assert reader.call("CLIENT", "TRACKING", "on", "BCAST", "PREFIX", "user:", "NOLOOP") == b"+OK\r\n"
+    assert reader.call("CLIENT", "TRACKING", "on").startswith(b"-ERR You can't switch BCAST")
+
+    # Keys modified by the client itself are skipped with NOLOOP
+    assert reader.call("SET", "user:1", "a") == b"+OK\r\n"
+    writer = redis.StrictRedis(host="127.0.0.1", port=port)
+    writer.mset({"user:2": "b", "other": "c"})
+    assert reader.read() == b">2\r\n$10\r\ninvalidate\r\n*1\r\n$6\r\nuser:2\r\n"
+    assert writer.info("stats")["tracking_total_prefixes"] == 1
+
+    assert reader.call("CLIENT", "TRACKING", "off") == b"+OK\r\n"
+    writer.set("user:3", "d")
+    assert reader.call("PING") == b"+PONG\r\n"
+    reader.close()
+    writer.close()
+
+
+def test_redirect(start_server):
+    port = start_server()
+    target = RawConnection(port)
+    target.call("HELLO", "3")
+    target_id = target.call("CLIENT", "ID")[1:-2].decode()
+    client = redis.StrictRedis(host="127.0.0.1", port=port, single_connection_client=True)
+    assert client.execute_command("CLIENT", "TRACKING", "on", "REDIRECT", target_id)
+    assert client.execute_command("CLIENT", "GETREDIR") == int(target_id)
+
+    client.set("key", "value")
+    client.get("key")
+    client.set("key", "other")
+    assert target.read() == INVALIDATE_KEY
+    target.close()
+    client.close()
+
+
+def test_full_resync_invalidates_everything(start_server, tmp_path):
+    (tmp_path / "primary").mkdir()
+    (tmp_path / "replica").mkdir()
+    primary_port = start_server({"REDIS_DIR": str(tmp_path / "primary")})
+    primary = redis.StrictRedis(host="127.0.0.1", port=primary_port)
+    primary.set("key", "primary value")
+    replica_port = start_server({"REDIS_DIR": str(tmp_path / "replica")})
+    replica = redis.StrictRedis(host="127.0.0.1", port=replica_port)
+    replica.set("key", "stale value")
+
+    reader = RawConnection(replica_port)
+    reader.call("HELLO", "3")
+    reader.call("CLIENT", "TRACKING", "on")
+    assert reader.call("GET", "key") == b"$11\r\nstale value\r\n"
+    with replica.pipeline() as pipe:
+        pipe.watch("key")
+        other = redis.StrictRedis(host="127.0.0.1", port=replica_port)
+        other.execute_command("REPLICAOF", "127.0.0.1", primary_port)
+        # The snapshot of the primary replaces every key, the whole cache is dropped
+        assert reader.read() == b">2\r\n$10\r\ninvalidate\r\n_\r\n"
+        assert other.get("key") == b"primary value"
+        pipe.multi()
+        pipe.get("key")
+        with pytest.raises(redis.exceptions.WatchError):
+            pipe.execute()
+    assert replica.info("stats")["tracking_total_keys"] == 0
+    reader.close()
+    other.close()
+    replica.close()
+    primary.close()
+
+
+def test_invalidation_waits_for_the_replies_held_by_fsync(tmp_path):
+    """
+    An invalidation for a client whose write replies wait for fsync isn't sent before them
+    """
+    async def scenario():
+        server = RedisServer(
+            host="127.0.0.1", port=0, config={"dir": str(tmp_path), "appendonly": "yes", "appendfsync": "always"}
+        )
+        server.aof_open()
+        # The fsync runs after this job on the single thread of the file, until it's released
+        fsync_released = threading.Event()
+        server.aof._executor.submit(fsync_released.wait)
+
+        server_side, client_side = socket.socketpair()
+        client_side.setblocking(False)
+        reader, writer = await asyncio.open_connection(sock=server_side)
+        client = Client(reader, writer, Parser(protocol_version=2), client_id=1)
+        client.protocol_version = 3
+        server.clients[client.id] = client
+        server.response_builder = server.response_builders[3]
+        async def batch():
+            # Same as the connection handler, the replies are sent right after the commands
+            # of the batch and the invalidation of its own write is queued among them
+            aof_buffered = len(server.aof.buffer)
+            for command_name, command_args in (
+                ("CLIENT", [b"TRACKING", b"on"]), ("GET", [b"key"]), ("SET", [b"key", b"value"])
+            ):
+                client.add_reply(server._process_command(command_name, command_args, client))
+            await server._send_replies(client, aof_buffered)
+
+        try:
+            sending = asyncio.ensure_future(batch())
+            await asyncio.sleep(0.05)
+            try:
+                received = client_side.recv(65536)
+            except BlockingIOError:
+                received = b""
+            assert received == b""
+        finally:
+            fsync_released.set()
+        await sending
+        await asyncio.sleep(0.05)
+        received = client_side.recv(65536)
+        invalidate = b">2\r\n$10\r\ninvalidate\r\n*1\r\n$3\r\nkey\r\n"
+        assert received == b"+OK\r\n_\r\n" + invalidate + b"+OK\r\n"
+        writer.close()
+        client_side.close()
+        server.aof.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,154 @@
+# Using pytest for tests
+import time
+
+import pytest
+import redis
+
+from redis_clone import aof
+
+
+def test_multi_exec(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.delete("counter", "queue")
+    pipe = client.pipeline(transaction=True)
+    pipe.incr("counter").incrby("counter", 10).rpush("queue", "job").get("counter")
+    assert pipe.execute() == [1, 11, 1, b"11"]
+
+    # Errors of commands which ran don't stop the others
+    client.set("string", "value")
+    pipe = client.pipeline(transaction=True)
+    pipe.lpush("string", "a").incr("counter")
+    assert pipe.execute(raise_on_error=False)[1] == 12
+
+    # A command which can't be queued discards the whole transaction
+    connection = redis.StrictRedis(host="127.0.0.1", port=port, single_connection_client=True)
+    assert connection.execute_command("MULTI") == b"OK"
+    assert connection.execute_command("INCR", "counter") == b"QUEUED"
+    with pytest.raises(redis.exceptions.ResponseError, match="wrong number of arguments"):
+        connection.execute_command("INCR")
+    with pytest.raises(redis.exceptions.ExecAbortError):
+        connection.execute_command("EXEC")
+    assert client.get("counter") == b"12"
+
+    assert connection.execute_command("MULTI") == b"OK"
+    with pytest.raises(redis.exceptions.ResponseError, match="nested"):
+        connection.execute_command("MULTI")
+    connection.execute_command("INCR", "counter")
+    assert connection.execute_command("DISCARD") == b"OK"
+    assert client.get("counter") == b"12"
+    with pytest.raises(redis.exceptions.ResponseError, match="EXEC without MULTI"):
+        connection.execute_command("EXEC")
+    connection.close()
+    client.close()
+
+
+def test_watch(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    other = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("balance", 100)
+
+    with client.pipeline() as pipe:
+        pipe.watch("balance")
+        balance = int(pipe.get("balance"))
+        pipe.multi()
+        pipe.set("balance", balance - 30)
+        assert pipe.execute() == [True]
+
+    with client.pipeline() as pipe:
+        pipe.watch("balance")
+        other.incrby("balance", 5)
+        pipe.multi()
+        pipe.set("balance", 0)
+        with pytest.raises(redis.exceptions.WatchError):
+            pipe.execute()
+    assert client.get("balance") == b"75"
+
+    # A key expiring after WATCH counts as modified
+    client.set("lease", "owner", px=50)
+    with client.pipeline() as pipe:
+        pipe.watch("lease")
+        time.sleep(0.1)
+        pipe.multi()
+        pipe.set("lease", "new owner")
+        with pytest.raises(redis.exceptions.WatchError):
+            pipe.execute()
+
+    # UNWATCH forgets the keys, later changes don't matter
+    with client.pipeline() as pipe:
+        pipe.watch("balance")
+        pipe.unwatch()
+        other.incr("balance")
+        pipe.multi()
+        pipe.get("balance")
+        assert pipe.execute() == [b"76"]
+    client.close()
+    other.close()
+
+
+def test_blocking_pop_inside_transaction_does_not_block(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    pipe = client.pipeline(transaction=True)
+    pipe.blpop(["missing"], timeout=0).rpush("jobs", "job").blpop(["jobs"], timeout=0)
+    assert pipe.execute() == [None, 1, (b"jobs", b"job")]
+    client.close()
+
+
+def test_transaction_is_logged_as_one(start_server, tmp_path):
+    port = start_server({"REDIS_DIR": str(tmp_path), "REDIS_APPENDONLY": "yes"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    pipe = client.pipeline(transaction=True)
+    pipe.set("a", 1).get("a").set("b", 2)
+    pipe.execute()
+    client.close()
+
+    with open(tmp_path / "appendonly.aof", "rb") as file:
+        content = file.read()
+    assert content.endswith(
+        aof.encode_command("MULTI", [])
+        + aof.encode_command("SET", [b"a", b"1"])
+        + aof.encode_command("SET", [b"b", b"2"])
+        + aof.encode_command("EXEC", [])
+    )
+
+
+def test_writes_which_change_nothing_do_not_touch_watched_keys(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    other = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.delete("lock", "missing")
+    client.set("lock", "owner")
+    with client.pipeline() as pipe:
+        pipe.watch("lock", "missing")
+        assert other.set("lock", "thief", nx=True) is None
+        assert other.delete("missing") == 0
+        assert other.lpop("missing") is None
+        pipe.multi()
+        pipe.get("lock")
+        assert pipe.execute() == [b"owner"]
+    client.close()
+    other.close()
+
+
+def test_transaction_which_changes_nothing_is_not_logged(start_server, tmp_path):
+    port = start_server({"REDIS_DIR": str(tmp_path), "REDIS_APPENDONLY": "yes"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    client.set("a", 1)
+    pipe = client.pipeline(transaction=True)
+    pipe.set("a", 2, nx=True).delete("missing")
+    pipe.execute()
+    pipe = client.pipeline(transaction=True)
+    pipe.delete("missing").set("b", 2)
+    pipe.execute()
+    client.close()
+
+    with open(tmp_path / "appendonly.aof", "rb") as file:
+        content = file.read()
+    assert content.endswith(
+        aof.encode_command("SET", [b"a", b"1"])
+        + aof.encode_command("MULTI", [])
+        + aof.encode_command("SET", [b"b", b"2"])
+        + aof.encode_command("EXEC", [])
+    )
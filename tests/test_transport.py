@@ -0,0 +1,58 @@
+# Using pytest for tests
+import socket
+import time
+
+import redis
+
+from redis_clone.server import RedisServer
+
+
+def test_unix_socket(start_server, tmp_path):
+    path = str(tmp_path / "redis.sock")
+    start_server({"REDIS_UNIXSOCKET": path, "REDIS_UNIXSOCKETPERM": "700"})
+    client = redis.StrictRedis(unix_socket_path=path)
+    assert client.set("key", "value")
+    assert client.get("key") == b"value"
+    client.close()
+
+
+def test_maxclients(start_server):
+    port = start_server({"REDIS_MAXCLIENTS": "2"})
+    time.sleep(0.2)
+    sockets = []
+    replies = []
+    for _ in range(3):
+        sock = socket.create_connection(("127.0.0.1", port))
+        sockets.append(sock)
+        sock.sendall(b"*1\r\n$4\r\nPING\r\n")
+        replies.append(sock.recv(1024))
+    assert replies[0] == b"+PONG\r\n"
+    assert replies[-1] == b"-ERR max number of clients reached\r\n"
+    for sock in sockets:
+        sock.close()
+    time.sleep(0.2)
+
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.info("stats")["rejected_connections"] >= 1
+    client.close()
+
+
+def test_idle_clients_are_disconnected(start_server):
+    port = start_server({"REDIS_TIMEOUT": "1"})
+    with socket.create_connection(("127.0.0.1", port)) as sock:
+        sock.settimeout(5)
+        sock.sendall(b"*1\r\n$4\r\nPING\r\n")
+        assert sock.recv(1024) == b"+PONG\r\n"
+        start = time.monotonic()
+        assert sock.recv(1024) == b""
+        assert time.monotonic() - start >= 0.5
+
+
+def test_tcp_socket_options():
+    server = RedisServer(host="127.0.0.1", port=0, config={"tcp-keepalive": 60})
+    with socket.socket() as sock:
+        server._configure_socket(sock)
+        assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY)
+        assert sock.getsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE)
+        if hasattr(socket, "TCP_KEEPIDLE"):
+            assert sock.getsockopt(socket.IPPROTO_TCP, socket.TCP_KEEPIDLE) == 60
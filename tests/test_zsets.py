@@ -0,0 +1,133 @@
+# Using pytest for tests
+import random
+
+import pytest
+import redis
+
+from redis_clone import aof, rdb
+from redis_clone.keyspace import Keyspace, now_ms
+from redis_clone.skiplist import SkipList
+from redis_clone.zsets import SortedSet
+
+
+class TestSkipList:
+    def test_ranks_follow_inserts_and_deletes(self):
+        skiplist = SkipList()
+        expected = []
+        for i in range(500):
+            entry = (float(random.randrange(100)), b"member_%d" % i)
+            skiplist.insert(*entry)
+            expected.append(entry)
+        for entry in random.sample(expected, 200):
+            assert skiplist.delete(*entry) is not None
+            expected.remove(entry)
+        assert skiplist.delete(1000.0, b"missing") is None
+
+        expected.sort()
+        assert len(skiplist) == len(expected)
+        for rank, (score, member) in enumerate(expected):
+            assert skiplist.rank(score, member) == rank
+            node = skiplist.node_at(rank)
+            assert (node.score, node.member) == (score, member)
+        assert skiplist.node_at(len(expected)) is None
+        assert skiplist.count_below(50.0, inclusive=False) == sum(1 for score, _ in expected if score < 50)
+        assert skiplist.count_below(50.0, inclusive=True) == sum(1 for score, _ in expected if score <= 50)
+
+
+@pytest.mark.parametrize("max_entries", [128, 0])
+def test_sorted_set_encodings(max_entries):
+    sorted_set = SortedSet()
+    for member, score in [(b"c", 3.0), (b"a", 1.0), (b"b", 1.0), (b"d", -2.5)]:
+        assert sorted_set.add(member, score, max_entries, 64)
+    assert not sorted_set.add(b"d", 5.0, max_entries, 64)
+    assert sorted_set.encoding == ("listpack" if max_entries else "skiplist")
+
+    assert list(sorted_set.items()) == [(b"a", 1.0), (b"b", 1.0), (b"c", 3.0), (b"d", 5.0)]
+    assert sorted_set.score(b"c") == 3.0
+    assert sorted_set.rank(b"c") == 2
+    assert sorted_set.rank(b"c", reverse=True) == 1
+    assert sorted_set.range_by_rank(1, 2, reverse=True) == [(b"c", 3.0), (b"b", 1.0)]
+    assert sorted_set.score_range_ranks(1.0, True, 5.0, False) == (2, 4)
+    assert sorted_set.remove(b"a") and not sorted_set.remove(b"a")
+    assert len(sorted_set) == 3
+
+
+def test_skiplist_memory_is_tracked():
+    sorted_set = SortedSet()
+    empty_entries_size = sorted_set.table_entries_size
+    for i in range(100):
+        sorted_set.add(b"member_%d" % i, float(i), 0, 64)
+    for i in range(100):
+        sorted_set.add(b"member_%d" % i, float(-i), 0, 64)
+        sorted_set.remove(b"member_%d" % i)
+    assert sorted_set.table_entries_size == empty_entries_size
+
+
+def test_snapshot_and_rewrite(tmp_path):
+    keyspace = Keyspace()
+    small = SortedSet()
+    small.add(b"member", 1.5, 128, 64)
+    large = SortedSet()
+    for i in range(10):
+        large.add(b"member_%d" % i, float(i), 0, 64)
+    keyspace.set(b"small", small)
+    keyspace.set(b"large", large, deadline_ms=now_ms() + 100000)
+
+    path = str(tmp_path / "dump.rdb")
+    rdb.dump(keyspace, path)
+    loaded = Keyspace()
+    assert rdb.load(loaded, path, now_ms()) == 2
+    assert loaded.data[b"small"].encoding == "listpack"
+    assert loaded.data[b"large"].encoding == "skiplist"
+    for key in (b"small", b"large"):
+        assert list(loaded.data[key].items()) == list(keyspace.data[key].items())
+
+    aof_path = str(tmp_path / "appendonly.aof")
+    aof.rewrite(keyspace, aof_path)
+    with open(aof_path, "rb") as file:
+        assert file.read().startswith(aof.encode_command("ZADD", [b"small", b"1.5", b"member"]))
+
+
+def test_sorted_set_commands(start_server):
+    port = start_server()
+    client = redis.StrictRedis(host="127.0.0.1", port=port)
+    assert client.zadd("board", {"alice": 10, "bob": 20, "carol": 15}) == 3
+    assert client.zadd("board", {"alice": 30, "dave": 1}, ch=True) == 2
+    assert client.zadd("board", {"bob": 5}, gt=True) == 0
+    assert client.zadd("board", {"erin": 7}, xx=True) == 0
+    assert client.zincrby("board", 2.5, "carol") == 17.5
+    assert client.zscore("board", "carol") == 17.5
+    assert client.zscore("board", "missing") is None
+    assert client.zcard("board") == 4
+
+    assert client.zrank("board", "alice") == 3
+    assert client.zrevrank("board", "alice") == 0
+    assert client.zrange("board", 0, -1) == [b"dave", b"carol", b"bob", b"alice"]
+    assert client.zrange("board", 0, 1, desc=True, withscores=True) == [(b"alice", 30.0), (b"bob", 20.0)]
+    assert client.zrangebyscore("board", "(1", "+inf", start=1, num=2) == [b"bob", b"alice"]
+    assert client.zcount("board", "-inf", 20) == 3
+    assert client.zpopmin("board", 2) == [(b"dave", 1.0), (b"carol", 17.5)]
+    assert client.zrem("board", "bob", "alice", "missing") == 2
+    assert client.exists("board") == 0
+
+    client.set("string", "value")
+    with pytest.raises(redis.exceptions.ResponseError, match="WRONGTYPE"):
+        client.zadd("string", {"member": 1})
+    with pytest.raises(redis.exceptions.ResponseError, match="not a valid float"):
+        client.zadd("scores", {"member": "nan"})
+    with pytest.raises(redis.exceptions.ResponseError, match="not a valid float"):
+        client.zadd("scores", {"member": "1_000"})
+    client.close()
+
+
+def test_large_sorted_set_over_resp3(start_server):
+    port = start_server({"REDIS_ZSET_MAX_LISTPACK_ENTRIES": "16"})
+    client = redis.StrictRedis(host="127.0.0.1", port=port, protocol=3)
+    client.zadd("board", {f"member_{i}": i for i in range(100)})
+    assert client.object("encoding", "board") == b"skiplist"
+    assert client.zscore("board", "member_42") == 42.0
+    assert client.zrank("board", "member_42") == 42
+    assert client.zrangebyscore("board", 10, 12, withscores=True) == [
+        [b"member_10", 10.0], [b"member_11", 11.0], [b"member_12", 12.0]
+    ]
+    client.close()